@@ -0,0 +1,424 @@
+""" Parallel backfill of the aggregate tables
+
+Rebuilds the facility daily, demand, flows and energy aggregates over a date range. The range
+is partitioned by network, network region (for aggregates that run per region) and month,
+and the partitions are run over a process pool. The pool is capped so that the workers stay
+within settings.backfill_db_connections on the database server.
+
+Aggregates that read another aggregate (facility_daily sums the energy that the energy
+aggregate writes) run in a later stage, after every partition of their dependencies.
+
+Failed partitions are retried after the rest of the run rather than stopping it, and
+progress and throughput are logged as partitions complete.
+"""
+import logging
+import os
+import time
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any
+
+from opennem import settings
+from opennem.aggregates.facility_daily import exec_aggregates_facility_daily_query
+from opennem.aggregates.network_demand import exec_aggregates_network_demand_query
+from opennem.aggregates.network_flows import run_and_store_flows_for_range
+from opennem.core.networks import network_from_network_code
+from opennem.core.profiler import flush_profiles_at_worker_exit, profile_task
+from opennem.db import get_database_engine
+from opennem.schema.network import (
+    NetworkAEMORooftop,
+    NetworkAPVI,
+    NetworkNEM,
+    NetworkOpenNEMRooftopBackfill,
+    NetworkSchema,
+    NetworkWEM,
+)
+from opennem.utils.dates import get_last_completed_interval_for_network
+from opennem.utils.process import can_start_process_pool
+from opennem.workers.energy import get_energy_fueltechs, run_energy_calc
+
+logger = logging.getLogger("opennem.aggregates.backfill")
+
+# database connections a partition holds at once
+BACKFILL_PARTITION_DB_CONNECTIONS = 2
+
+
+class BackfillException(Exception):
+    """Exception raised when planning or running a backfill"""
+
+    pass
+
+
+@dataclass(frozen=True)
+class BackfillPartition:
+    aggregate: str
+    network_code: str
+    date_min: datetime
+    date_max: datetime
+    network_region: str | None = None
+    fueltech_id: str | None = None
+
+    @property
+    def days(self) -> float:
+        return (self.date_max - self.date_min).total_seconds() / 86400
+
+    def __str__(self) -> str:
+        region = f" {self.network_region}" if self.network_region else ""
+        fueltech = f" {self.fueltech_id}" if self.fueltech_id else ""
+        return f"{self.aggregate} {self.network_code}{region}{fueltech} {self.date_min.date()} => {self.date_max.date()}"
+
+
+@dataclass
+class BackfillAggregate:
+    """An aggregate that can be backfilled. run is called with a partition and its network and
+    raises when the partition fails. depends_on are the aggregates it reads from. Aggregates
+    by_fueltech can be limited to fueltechs with a partition for each"""
+
+    name: str
+    run: Callable[[BackfillPartition, NetworkSchema], Any]
+    networks: list[NetworkSchema]
+    by_region: bool = False
+    by_fueltech: bool = False
+    depends_on: list[str] = field(default_factory=list)
+
+
+def _run_facility_daily(partition: BackfillPartition, network: NetworkSchema) -> None:
+    exec_aggregates_facility_daily_query(partition.date_min, partition.date_max, network)
+
+
+def _run_demand(partition: BackfillPartition, network: NetworkSchema) -> None:
+    exec_aggregates_network_demand_query(date_min=partition.date_min, date_max=partition.date_max, network=network)
+
+
+def _run_flows(partition: BackfillPartition, network: NetworkSchema) -> None:
+    run_and_store_flows_for_range(partition.date_min, partition.date_max, network=network, raise_errors=True)
+
+
+def _run_energy(partition: BackfillPartition, network: NetworkSchema) -> None:
+    # padded either side to pick up the intervals the energy sum needs at the month edges
+    # as in opennem.workers.energy.run_energy_update_archive
+    date_min = partition.date_min - timedelta(minutes=10)
+    date_max = partition.date_max + timedelta(minutes=10)
+
+    fueltech_ids = [partition.fueltech_id] if partition.fueltech_id else get_energy_fueltechs(network=network)
+
+    for fueltech_id in fueltech_ids:
+        run_energy_calc(
+            date_min, date_max, network=network, region=partition.network_region, fueltech_id=fueltech_id, raise_errors=True
+        )
+
+
+BACKFILL_AGGREGATES: dict[str, BackfillAggregate] = {
+    i.name: i
+    for i in [
+        BackfillAggregate(
+            name="facility_daily",
+            run=_run_facility_daily,
+            networks=[NetworkNEM, NetworkWEM, NetworkAPVI, NetworkAEMORooftop, NetworkOpenNEMRooftopBackfill],
+            depends_on=["energy"],
+        ),
+        BackfillAggregate(name="demand", run=_run_demand, networks=[NetworkNEM, NetworkWEM]),
+        BackfillAggregate(name="flows", run=_run_flows, networks=[NetworkNEM]),
+        BackfillAggregate(name="energy", run=_run_energy, networks=[NetworkNEM], by_region=True, by_fueltech=True),
+    ]
+}
+
+
+@dataclass
+class BackfillResult:
+    completed: list[BackfillPartition] = field(default_factory=list)
+    failed: list[BackfillPartition] = field(default_factory=list)
+    seconds: float = 0.0
+
+    @property
+    def days(self) -> float:
+        return sum(i.days for i in self.completed)
+
+    @property
+    def days_per_hour(self) -> float:
+        return self.days / self.seconds * 3600 if self.seconds else 0.0
+
+    def extend(self, result: "BackfillResult") -> None:
+        self.completed += result.completed
+        self.failed += result.failed
+        self.seconds += result.seconds
+
+
+def get_backfill_aggregate(name: str) -> BackfillAggregate:
+    if name not in BACKFILL_AGGREGATES:
+        raise BackfillException(f"Unknown aggregate {name}: must be one of {', '.join(BACKFILL_AGGREGATES)}")
+
+    return BACKFILL_AGGREGATES[name]
+
+
+def get_backfill_stages(aggregate_names: list[str]) -> list[list[str]]:
+    """Groups aggregates into stages that run in order, each after the aggregates it depends
+    on. Dependencies that aren't being run are taken to be up to date"""
+    stages: list[list[str]] = []
+    resolved: set[str] = set()
+    remaining = [get_backfill_aggregate(i) for i in aggregate_names]
+
+    while remaining:
+        stage = [i.name for i in remaining if not (set(i.depends_on) & set(aggregate_names)) - resolved]
+
+        if not stage:
+            raise BackfillException(f"Cycle in aggregate dependencies: {', '.join(i.name for i in remaining)}")
+
+        stages.append(stage)
+        resolved.update(stage)
+        remaining = [i for i in remaining if i.name not in stage]
+
+    return stages
+
+
+def month_ranges(date_min: datetime, date_max: datetime) -> list[tuple[datetime, datetime]]:
+    """Calendar month ranges covering date_min to date_max (end exclusive), newest first. The
+    first and last ranges are clipped to date_min and date_max"""
+    ranges = []
+    month_start = date_min.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+    while month_start < date_max:
+        month_end = (month_start + timedelta(days=32)).replace(day=1)
+        ranges.append((max(month_start, date_min), min(month_end, date_max)))
+        month_start = month_end
+
+    return list(reversed(ranges))
+
+
+def _network_time(dt: datetime, network: NetworkSchema) -> datetime:
+    """Datetime in network time. Naive datetimes are taken to be in network time"""
+    tz = network.get_fixed_offset()
+
+    return dt.astimezone(tz) if dt.tzinfo else dt.replace(tzinfo=tz)
+
+
+def plan_backfill_partitions(
+    aggregate_names: list[str],
+    networks: list[NetworkSchema] | None = None,
+    date_min: datetime | None = None,
+    date_max: datetime | None = None,
+    network_regions: list[str] | None = None,
+    fueltech_ids: list[str] | None = None,
+) -> list[BackfillPartition]:
+    """Partitions for each aggregate, network, region and month. Networks default to the
+    networks each aggregate runs for and the range is clipped to when the network was first
+    seen up to its latest interval. Aggregates by_fueltech have a partition for each of
+    fueltech_ids when they're set"""
+    partitions = []
+
+    for aggregate_name in aggregate_names:
+        aggregate = get_backfill_aggregate(aggregate_name)
+
+        for network in networks or aggregate.networks:
+            if network not in aggregate.networks:
+                logger.info(f"Skipping {aggregate.name} for {network.code}: not an aggregate network")
+                continue
+
+            if not network.data_first_seen:
+                raise BackfillException(f"Require a data_first_seen for network {network.code}")
+
+            # clipped to the range the network has data for
+            network_date_min = network.data_first_seen
+
+            if date_min:
+                network_date_min = max(_network_time(date_min, network), network_date_min)
+
+            network_date_max = get_last_completed_interval_for_network(network=network)
+
+            if date_max:
+                network_date_max = min(_network_time(date_max, network), network_date_max)
+
+            network_date_min = _network_time(network_date_min, network)
+            network_date_max = _network_time(network_date_max, network)
+
+            regions: list[str | None] = [None]
+
+            if aggregate.by_region:
+                regions = list(network_regions or network.regions or [None])  # type: ignore
+
+            partition_fueltech_ids: list[str | None] = [None]
+
+            if aggregate.by_fueltech and fueltech_ids:
+                partition_fueltech_ids = list(fueltech_ids)
+
+            for month_min, month_max in month_ranges(network_date_min, network_date_max):
+                for network_region in regions:
+                    for fueltech_id in partition_fueltech_ids:
+                        partitions.append(
+                            BackfillPartition(
+                                aggregate=aggregate.name,
+                                network_code=network.code,
+                                network_region=network_region,
+                                date_min=month_min,
+                                date_max=month_max,
+                                fueltech_id=fueltech_id,
+                            )
+                        )
+
+    logger.info(f"Planned {len(partitions)} backfill partitions for {', '.join(aggregate_names)}")
+
+    return partitions
+
+
+def get_backfill_workers(workers: int | None = None) -> int:
+    """Worker processes for a backfill - settings.backfill_workers by default. Each worker
+    has its own engine so the cap is the server side budget in settings.backfill_db_connections
+    rather than the pool size"""
+    return max(
+        1,
+        min(
+            workers or settings.backfill_workers,
+            os.cpu_count() or 1,
+            settings.backfill_db_connections // BACKFILL_PARTITION_DB_CONNECTIONS,
+        ),
+    )
+
+
+def _backfill_worker_init() -> None:
+    """Process pool initializer - drop the database connections inherited from the parent
+    without closing them from under it and write the worker's task profiles when it exits"""
+    get_database_engine().dispose(close=False)
+    flush_profiles_at_worker_exit()
+
+
+def run_backfill_partition(partition: BackfillPartition) -> float:
+    """Runs a single partition. Returns the seconds taken"""
+    time_start = time.perf_counter()
+
+    aggregate = get_backfill_aggregate(partition.aggregate)
+    network = network_from_network_code(partition.network_code)
+
+    if not network:
+        raise BackfillException(f"Unknown network {partition.network_code}")
+
+    aggregate.run(partition, network)
+
+    return time.perf_counter() - time_start
+
+
+def _log_progress(result: BackfillResult, total: int, time_start: float) -> None:
+    seconds = time.perf_counter() - time_start
+    done = len(result.completed) + len(result.failed)
+    rate = done / seconds if seconds else 0.0
+    eta = timedelta(seconds=int((total - done) / rate)) if rate else None
+
+    logger.info(
+        f"Backfill {done}/{total} partitions ({len(result.failed)} failed) in {timedelta(seconds=int(seconds))} - "
+        f"{rate * 3600:.0f} partitions/hour, {result.days / seconds * 3600 if seconds else 0:.0f} days/hour, eta {eta}"
+    )
+
+
+def run_backfill_partitions(
+    partitions: list[BackfillPartition], workers: int | None = None, retries: int | None = None
+) -> BackfillResult:
+    """Run partitions over a process pool. Failed partitions are retried after the rest have
+    run. With a single worker, or from a daemonic process (ie. a huey process worker) that
+    can't start a pool, partitions are run in this process"""
+    if retries is None:
+        retries = settings.backfill_retries
+
+    workers = get_backfill_workers(workers)
+
+    if workers > 1 and not can_start_process_pool():
+        logger.info("Running backfill partitions in process: can't start a process pool from a daemonic process")
+        workers = 1
+
+    logger.info(f"Running {len(partitions)} backfill partitions with {workers} workers")
+
+    result = BackfillResult()
+    time_start = time.perf_counter()
+    pending = partitions
+
+    for attempt in range(retries + 1):
+        if not pending:
+            break
+
+        if attempt:
+            logger.info(f"Retrying {len(pending)} failed backfill partitions (attempt {attempt + 1})")
+
+        # partitions that fail are counted in the progress until they're retried
+        result.failed = []
+        total = len(result.completed) + len(pending)
+
+        if workers == 1:
+            for partition in pending:
+                try:
+                    run_backfill_partition(partition)
+                    result.completed.append(partition)
+                except Exception as e:
+                    logger.error(f"Error running backfill partition {partition}: {e}")
+                    result.failed.append(partition)
+
+                _log_progress(result, total, time_start)
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_backfill_worker_init) as pool:
+                futures = {pool.submit(run_backfill_partition, partition): partition for partition in pending}
+
+                for future in as_completed(futures):
+                    partition = futures[future]
+
+                    try:
+                        future.result()
+                        result.completed.append(partition)
+                    except Exception as e:
+                        logger.error(f"Error running backfill partition {partition}: {e}")
+                        result.failed.append(partition)
+
+                    _log_progress(result, total, time_start)
+
+        pending = result.failed
+
+    result.seconds = time.perf_counter() - time_start
+
+    if result.failed:
+        logger.error(f"{len(result.failed)} backfill partitions failed after {retries + 1} attempts")
+
+    logger.info(
+        f"Backfilled {len(result.completed)} partitions ({result.days:.0f} days) in "
+        f"{timedelta(seconds=int(result.seconds))} - {result.days_per_hour:.0f} days/hour"
+    )
+
+    return result
+
+
+@profile_task(send_slack=False)
+def run_backfill(
+    aggregate_names: list[str] | None = None,
+    networks: list[NetworkSchema] | None = None,
+    date_min: datetime | None = None,
+    date_max: datetime | None = None,
+    network_regions: list[str] | None = None,
+    fueltech_ids: list[str] | None = None,
+    workers: int | None = None,
+) -> BackfillResult:
+    """Backfill aggregates over a date range. Defaults to every aggregate for its networks
+    over their whole range. Aggregates run in stages after the aggregates they depend on
+
+    Args:
+        aggregate_names: aggregates in BACKFILL_AGGREGATES. Defaults to all of them
+        date_min: defaults to when each network was first seen
+        date_max: defaults to the latest interval for each network
+        network_regions: regions for the aggregates that run per region. Defaults to all
+        fueltech_ids: limit the aggregates that run per fueltech to these fueltechs. Defaults to all
+        workers: number of worker processes. Defaults to settings.backfill_workers
+    """
+    result = BackfillResult()
+
+    for stage in get_backfill_stages(aggregate_names or list(BACKFILL_AGGREGATES)):
+        if result.failed:
+            logger.warning(f"Running {', '.join(stage)} after {len(result.failed)} failed partitions")
+
+        partitions = plan_backfill_partitions(
+            stage,
+            networks=networks,
+            date_min=date_min,
+            date_max=date_max,
+            network_regions=network_regions,
+            fueltech_ids=fueltech_ids,
+        )
+
+        result.extend(run_backfill_partitions(partitions, workers=workers))
+
+    return result
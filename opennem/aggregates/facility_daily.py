@@ -1,15 +1,27 @@
-""" Runs queries to populate the aggregate tables with facility data"""
+""" Runs queries to populate the aggregate tables with facility data
+
+The incremental mode re-aggregates only the trading days that have changed. The ingest
+controllers mark the days that receive new or changed facility scada or price rows in
+at_facility_daily_dirty, and each network has a watermark in at_facility_daily_watermark
+of the latest interval it has been aggregated up to. An incremental run aggregates the
+dirty days and the days from the watermark to the latest interval.
+"""
 import logging
-from datetime import date, datetime, timedelta
+from collections.abc import Iterable
+from datetime import date, datetime, time, timedelta
 from textwrap import dedent
 from typing import Any
 
+from sqlalchemy import func
 from sqlalchemy import text as sql
+from sqlalchemy.dialects.postgresql import insert
 
 from opennem import settings
 from opennem.aggregates.utils import get_aggregate_month_range, get_aggregate_year_range
 from opennem.core.profiler import ProfilerLevel, ProfilerRetentionTime, profile_task
 from opennem.db import get_database_engine
+from opennem.db.models.opennem import AggregateFacilityDailyDirty, AggregateFacilityDailyWatermark
+from opennem.queries.utils import bind_query
 from opennem.schema.network import (
     NetworkAEMORooftop,
     NetworkAPVI,
@@ -22,6 +34,9 @@ from opennem.utils.dates import chop_datetime_microseconds, get_last_completed_i
 
 logger = logging.getLogger("opennem.aggregates.facility_daily")
 
+# the most days an incremental run aggregates in one query
+INCREMENTAL_MAX_RANGE_DAYS = 31
+
 
 class AggregateFacilityDailyException(Exception):
     """ """
@@ -157,6 +172,148 @@ def exec_aggregates_facility_daily_query(date_min: datetime, date_max: datetime,
     return result
 
 
+def get_trading_days(trading_intervals: Iterable[datetime], network: NetworkSchema) -> set[date]:
+    """The network trading days of a set of intervals as at_facility_daily buckets them. Naive
+    intervals are in network time"""
+    tz = network.get_fixed_offset()
+    trading_days = set()
+
+    for trading_interval in trading_intervals:
+        # skip empty and NaT intervals
+        if not isinstance(trading_interval, datetime) or trading_interval != trading_interval:
+            continue
+
+        if not trading_interval.tzinfo:
+            trading_interval = trading_interval.replace(tzinfo=tz)
+
+        trading_days.add(trading_interval.astimezone(tz).date())
+
+    return trading_days
+
+
+def mark_facility_daily_dirty(network: NetworkSchema, trading_intervals: Iterable[datetime]) -> int:
+    """Marks the trading days of intervals that have new or changed facility scada or price
+    rows so that the next incremental run aggregates them. Called by the ingest controllers
+    after they store records. Returns the number of days marked"""
+    if not settings.aggregate_facility_daily_incremental:
+        return 0
+
+    trading_days = get_trading_days(trading_intervals, network=network)
+
+    if not trading_days:
+        return 0
+
+    # clock_timestamp rather than now() since now() is the start of the transaction and a day
+    # marked in a long transaction could sort before the max marked_at of a run that missed it
+    stmt = insert(AggregateFacilityDailyDirty).values(
+        [
+            {"network_id": network.code, "trading_day": trading_day, "marked_at": func.clock_timestamp()}
+            for trading_day in sorted(trading_days)
+        ]
+    )
+    stmt = stmt.on_conflict_do_update(index_elements=["network_id", "trading_day"], set_={"marked_at": func.clock_timestamp()})
+
+    engine = get_database_engine()
+
+    # the records are already stored so failing to mark them shouldn't fail ingest. days
+    # after the watermark are aggregated either way
+    try:
+        with engine.begin() as c:
+            c.execute(stmt)
+    except Exception as e:
+        logger.error(f"Error marking {network.code} facility daily days dirty: {e}")
+        return 0
+
+    return len(trading_days)
+
+
+def get_facility_daily_dirty_days(network: NetworkSchema) -> tuple[list[date], datetime | None]:
+    """The dirty trading days for a network and the latest time one of them was marked"""
+    query = bind_query(
+        """
+        select trading_day, marked_at
+        from at_facility_daily_dirty
+        where network_id = :network_id
+        order by trading_day
+        """,
+        network_id=network.code,
+    )
+
+    engine = get_database_engine()
+
+    with engine.connect() as c:
+        rows = list(c.execute(query))
+
+    if not rows:
+        return [], None
+
+    return [i[0] for i in rows], max(i[1] for i in rows)
+
+
+def clear_facility_daily_dirty_days(network: NetworkSchema, trading_days: list[date], marked_at_max: datetime) -> None:
+    """Clears dirty days that have been aggregated. Days marked again since they were read are kept"""
+    query = bind_query(
+        """
+        delete from at_facility_daily_dirty
+        where
+            network_id = :network_id
+            and trading_day = any(:trading_days)
+            and marked_at <= :marked_at_max
+        """,
+        network_id=network.code,
+        trading_days=trading_days,
+        marked_at_max=marked_at_max,
+    )
+
+    engine = get_database_engine()
+
+    with engine.begin() as c:
+        c.execute(query)
+
+
+def get_facility_daily_watermark(network: NetworkSchema) -> datetime | None:
+    """The latest interval at_facility_daily has been aggregated up to for a network"""
+    query = bind_query(
+        "select trading_interval from at_facility_daily_watermark where network_id = :network_id",
+        network_id=network.code,
+    )
+
+    engine = get_database_engine()
+
+    with engine.connect() as c:
+        return c.execute(query).scalar()
+
+
+def set_facility_daily_watermark(network: NetworkSchema, trading_interval: datetime) -> None:
+    stmt = insert(AggregateFacilityDailyWatermark).values(network_id=network.code, trading_interval=trading_interval)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["network_id"], set_={"trading_interval": trading_interval, "updated_at": func.now()}
+    )
+
+    engine = get_database_engine()
+
+    with engine.begin() as c:
+        c.execute(stmt)
+
+
+def get_trading_day_ranges(trading_days: Iterable[date], max_days: int = INCREMENTAL_MAX_RANGE_DAYS) -> list[tuple[date, date]]:
+    """Groups trading days into runs of consecutive days of at most max_days. Ranges are end
+    inclusive"""
+    ranges: list[tuple[date, date]] = []
+
+    for trading_day in sorted(set(trading_days)):
+        if ranges:
+            (day_min, day_max) = ranges[-1]
+
+            if trading_day == day_max + timedelta(days=1) and (trading_day - day_min).days < max_days:
+                ranges[-1] = (day_min, trading_day)
+                continue
+
+        ranges.append((trading_day, trading_day))
+
+    return ranges
+
+
 @profile_task(
     send_slack=True,
     level=ProfilerLevel.INFO,
@@ -265,6 +422,50 @@ def run_aggregate_facility_days(days: int = 1, network: NetworkSchema | None = N
     exec_aggregates_facility_daily_query(date_min, date_max, network)
 
 
+@profile_task(send_slack=False, level=ProfilerLevel.INFO, retention_period=ProfilerRetentionTime.MONTH)
+def run_aggregates_facility_daily_incremental(network: NetworkSchema, days: int = 1) -> int:
+    """Aggregates the dirty trading days for a network and the days from its watermark to the
+    latest interval. Networks without a watermark start from days ago. Returns the number of
+    days aggregated"""
+    tz = network.get_fixed_offset()
+    interval_max = get_last_completed_interval_for_network(network=network)
+
+    watermark = get_facility_daily_watermark(network)
+
+    if not watermark:
+        watermark = interval_max - timedelta(days=days)
+
+    day_watermark = watermark.astimezone(tz).date()
+    day_max = interval_max.astimezone(tz).date()
+
+    (dirty_days, marked_at_max) = get_facility_daily_dirty_days(network)
+    dirty_days = [i for i in dirty_days if i <= day_max]
+
+    trading_days = {day_watermark + timedelta(days=i) for i in range((day_max - day_watermark).days + 1)}
+    trading_days |= set(dirty_days)
+
+    # the query range is end exclusive so run to the end of the latest interval
+    date_end = interval_max + timedelta(minutes=network.interval_size)
+
+    for day_min, day_range_max in get_trading_day_ranges(trading_days):
+        date_min = datetime.combine(day_min, time.min, tzinfo=tz)
+        date_max = min(datetime.combine(day_range_max + timedelta(days=1), time.min, tzinfo=tz), date_end)
+
+        exec_aggregates_facility_daily_query(date_min, date_max, network)
+
+    logger.info(f"Aggregated {len(trading_days)} days for {network.code} ({len(dirty_days)} dirty)")
+
+    if settings.dry_run:
+        return len(trading_days)
+
+    if dirty_days and marked_at_max:
+        clear_facility_daily_dirty_days(network, dirty_days, marked_at_max)
+
+    set_facility_daily_watermark(network, interval_max)
+
+    return len(trading_days)
+
+
 def run_aggregate_facility_daily_all(networks: list[NetworkSchema]) -> None:
     """Runs the facility aggregate for all networks for all years in its range"""
     if not networks:
@@ -16,6 +16,7 @@ Changelog
 import logging
 from datetime import datetime, timedelta
 
+import numpy as np
 import pandas as pd
 
 from opennem import settings
@@ -169,46 +170,47 @@ def merge_interconnector_and_energy_data(df_energy: pd.DataFrame, df_inter: pd.D
 
     f = pd.concat([df_merged, df_merged_inverted])
 
-    f["energy_exports"] = f.apply(lambda x: x.generated if x.generated and x.generated >= 0 else 0, axis=1)
-    f["energy_imports"] = f.apply(lambda x: x.generated if x.generated and x.generated <= 0 else 0, axis=1)
+    generated = f["generated"].to_numpy(dtype=float)
 
-    # f["emission_exports"] = f.apply(
-    #     lambda x: x.energy_exports * x.emission_factor_to if x.generated and x.generated >= 0 else 0,
-    #     axis=1,
-    # )
-    # f["emission_imports"] = f.apply(
-    #     lambda x: x.energy_imports * x.emission_factor if x.generated and x.generated <= 0 else 0,
-    #     axis=1,
-    # )
+    # @NOTE nan and zero generated values are neither imports or exports
+    is_export = generated > 0
+    is_import = generated < 0
+    is_tas1 = (f["network_region"] == "TAS1").to_numpy()
+
+    f["energy_exports"] = np.where(is_export, generated, 0)
+    f["energy_imports"] = np.where(is_import, generated, 0)
+
+    energy_exports = f["energy_exports"].to_numpy()
+    energy_imports = f["energy_imports"].to_numpy()
+    emission_factor = f["emission_factor"].to_numpy(dtype=float)
+    emission_factor_to = f["emission_factor_to"].to_numpy(dtype=float)
 
     # @NOTE bad hack for issue 144 TAS1 specific
     # https://github.com/opennem/opennem/issues/144
-    f["emission_exports"] = f.apply(
-        lambda x: x.energy_exports * x.emission_factor
-        if x.generated and x.generated >= 0 and x.network_region == "TAS1"
-        else x.energy_imports * x.emission_factor_to,
-        axis=1,
-    )
-    f["emission_imports"] = f.apply(
-        lambda x: x.energy_imports * x.emission_factor_to
-        if x.generated and x.generated <= 0 and x.network_region == "TAS1"
-        else x.energy_imports * x.emission_factor,
-        axis=1,
+    f["emission_exports"] = np.where(is_export & is_tas1, energy_exports * emission_factor, energy_imports * emission_factor_to)
+    f["emission_imports"] = np.where(is_import & is_tas1, energy_imports * emission_factor_to, energy_imports * emission_factor)
+
+    f["market_value_exports"] = np.where(is_export, generated * f["price_to"].to_numpy(dtype=float), 0)
+    f["market_value_imports"] = np.where(is_import, generated * f["price"].to_numpy(dtype=float), 0)
+
+    energy_flows = (
+        f.groupby(["trading_interval", "interconnector_region_from"])[
+            [
+                "energy_imports",
+                "energy_exports",
+                "emission_imports",
+                "emission_exports",
+                "market_value_imports",
+                "market_value_exports",
+            ]
+        ].sum()
+        / scale
     )
 
-    f["market_value_exports"] = f.apply(lambda x: x.generated * x.price_to if x.generated and x.generated >= 0 else 0, axis=1)
-    f["market_value_imports"] = f.apply(lambda x: x.generated * x.price if x.generated and x.generated <= 0 else 0, axis=1)
-
-    energy_flows = pd.DataFrame(
-        {
-            "energy_imports": f.groupby(["trading_interval", "interconnector_region_from"]).energy_imports.sum() / scale,
-            "energy_exports": f.groupby(["trading_interval", "interconnector_region_from"]).energy_exports.sum() / scale,
-            "emissions_imports": f.groupby(["trading_interval", "interconnector_region_from"]).emission_imports.sum() / scale,
-            "emissions_exports": f.groupby(["trading_interval", "interconnector_region_from"]).emission_exports.sum() / scale,
-            "market_value_imports": f.groupby(["trading_interval", "interconnector_region_from"]).market_value_imports.sum()
-            / scale,
-            "market_value_exports": f.groupby(["trading_interval", "interconnector_region_from"]).market_value_exports.sum()
-            / scale,
+    energy_flows = energy_flows.rename(
+        columns={
+            "emission_imports": "emissions_imports",
+            "emission_exports": "emissions_exports",
         }
     )
 
@@ -336,8 +338,11 @@ def run_and_store_emission_flows(day: datetime) -> None:
     insert_flows(emissions_day)
 
 
-def run_and_store_flows_for_range(date_start: datetime, date_end: datetime, network: NetworkSchema | None = None) -> int | None:
-    """Runs and stores emission flows into the aggregate table"""
+def run_and_store_flows_for_range(
+    date_start: datetime, date_end: datetime, network: NetworkSchema | None = None, raise_errors: bool = False
+) -> int | None:
+    """Runs and stores emission flows into the aggregate table. Errors are logged unless
+    raise_errors is set"""
 
     if not network:
         network = NetworkNEM
@@ -346,6 +351,10 @@ def run_and_store_flows_for_range(date_start: datetime, date_end: datetime, netw
         emissions_day = calc_flows_for_range(date_start, date_end, network=network)
     except Exception as e:
         logger.exception(f"Flow storage error: {e}")
+
+        if raise_errors:
+            raise
+
         return None
 
     if emissions_day.empty:
@@ -358,6 +367,9 @@ def run_and_store_flows_for_range(date_start: datetime, date_end: datetime, netw
 
     inserted_records = insert_flows(emissions_day)
 
+    if raise_errors and not inserted_records:
+        raise FlowWorkerException(f"Error inserting flows for {date_start} => {date_end}")
+
     return inserted_records
 
 
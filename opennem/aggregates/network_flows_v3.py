@@ -8,9 +8,17 @@ and market_value
 import logging
 from datetime import datetime, timedelta
 
+import numpy as np
 import pandas as pd
 
-from opennem.core.flow_solver import solve_flow_emissions_for_interval
+from opennem.core.flow_solver import (
+    FLOW_SOLVER_BALANCE_REGIONS,
+    FLOW_SOLVER_PASSTHROUGH_FLOWS,
+    FLOW_SOLVER_SOLVED_FLOWS,
+    Region,
+    RegionFlow,
+    solve_flow_emissions_for_intervals,
+)
 from opennem.db import get_database_engine
 from opennem.db.bulk_insert_csv import build_insert_query, generate_csv_from_records
 from opennem.db.models.opennem import AggregateNetworkFlows
@@ -23,11 +31,13 @@ class FlowWorkerException(Exception):
     pass
 
 
-def load_interconnector_intervals(interval: datetime, network: NetworkSchema) -> pd.DataFrame:
-    """Load interconnector flows for an interval.
+def load_interconnector_intervals_for_range(
+    interval_start: datetime, interval_end: datetime, network: NetworkSchema
+) -> pd.DataFrame:
+    """Load interconnector flows for every interval from interval_start up to (not including) interval_end.
 
     Returns
-        pd.DataFrame: DataFrame containing interconnector flows for an interval.
+        pd.DataFrame: DataFrame containing interconnector flows for each interval.
 
 
     Example return dataframe:
@@ -37,6 +47,8 @@ def load_interconnector_intervals(interval: datetime, network: NetworkSchema) ->
         2023-04-09 10:15:00                       TAS1                     VIC1 -399.80002 -33.316668
         2023-04-09 10:15:00                       VIC1                     NSW1 -261.80997 -21.817498
         2023-04-09 10:15:00                       VIC1                      SA1  412.31787  34.359822
+        2023-04-09 10:20:00                       NSW1                     QLD1 -661.20001 -55.100001
+        ...
     """
     engine = get_database_engine()
 
@@ -51,7 +63,8 @@ def load_interconnector_intervals(interval: datetime, network: NetworkSchema) ->
         left join facility f
             on fs.facility_code = f.code
         where
-            fs.trading_interval = '{date_start}'
+            fs.trading_interval >= '{interval_start}'
+            and fs.trading_interval < '{interval_end}'
             and f.interconnector is True
             and f.network_id = '{network_id}'
         group by 1, 2, 3
@@ -59,7 +72,8 @@ def load_interconnector_intervals(interval: datetime, network: NetworkSchema) ->
             1 asc;
 
     """.format(
-        date_start=interval,
+        interval_start=interval_start,
+        interval_end=interval_end,
         timezone=network.timezone_database,
         network_id=network.code,
     )
@@ -69,11 +83,18 @@ def load_interconnector_intervals(interval: datetime, network: NetworkSchema) ->
     df_gen = pd.read_sql(query, con=engine, index_col=["trading_interval"])
 
     if df_gen.empty:
-        raise FlowWorkerException("No results from load_interconnector_intervals")
+        raise FlowWorkerException("No results from load_interconnector_intervals_for_range")
 
     return df_gen
 
 
+def load_interconnector_intervals(interval: datetime, network: NetworkSchema) -> pd.DataFrame:
+    """Load interconnector flows for an interval. See load_interconnector_intervals_for_range"""
+    return load_interconnector_intervals_for_range(
+        interval_start=interval, interval_end=interval + timedelta(minutes=network.interval_size), network=network
+    )
+
+
 def load_energy_and_emissions_for_intervals(
     interval_start: datetime, interval_end: datetime, network: NetworkSchema
 ) -> pd.DataFrame:
@@ -164,6 +185,95 @@ def load_energy_and_emissions_for_intervals(
     return df_gen
 
 
+def load_energy_and_emissions_for_interval_range(
+    interval_start: datetime, interval_end: datetime, network: NetworkSchema
+) -> pd.DataFrame:
+    """
+    Fetch energy and emissions for each network region for every interval from interval_start
+    up to (not including) interval_end.
+
+    The energy for an interval is the trapezium of the generation at the interval and the interval
+    before it, the same as load_energy_and_emissions_for_intervals returns for its interval_end.
+
+    Returns:
+        pd.DataFrame: DataFrame with the same columns as load_energy_and_emissions_for_intervals
+            with a row for each network region for each interval.
+
+    Raises:
+        FlowWorkerException: If there are no results for the range.
+    """
+
+    engine = get_database_engine()
+
+    query = """
+        select
+            generated_intervals.trading_interval,
+            generated_intervals.network_id,
+            generated_intervals.network_region,
+            sum(generated_intervals.energy) as energy,
+            sum(generated_intervals.emissions) as emissions,
+            case when sum(generated_intervals.emissions) > 0
+                then sum(generated_intervals.emissions) / sum(generated_intervals.energy)
+                else 0
+            end as emissions_intensity
+        from
+        (
+            select
+                fs.trading_interval as interval_tz,
+                fs.trading_interval at time zone '{timezone}' as trading_interval,
+                f.network_id,
+                f.network_region,
+                fs.facility_code,
+                (
+                    sum(fs.generated) +
+                    case when lag(fs.trading_interval) over w = fs.trading_interval - interval '{interval_size} minutes'
+                        then lag(sum(fs.generated)) over w
+                        else 0
+                    end
+                ) / 2 / 12 as energy,
+                case when f.emissions_factor_co2 > 0
+                    then (
+                        sum(fs.generated) +
+                        case when lag(fs.trading_interval) over w = fs.trading_interval - interval '{interval_size} minutes'
+                            then lag(sum(fs.generated)) over w
+                            else 0
+                        end
+                    ) / 2 / 12 * f.emissions_factor_co2
+                    else 0
+                end as emissions
+            from facility_scada fs
+            left join facility f on fs.facility_code = f.code
+            where
+                fs.trading_interval >= timestamptz '{interval_start}' - interval '{interval_size} minutes'
+                and fs.trading_interval < '{interval_end}'
+                and f.network_id IN ('{network_id}')
+                and f.interconnector is False
+                and fs.generated > 0
+            group by fs.trading_interval, fs.facility_code, f.emissions_factor_co2, f.network_region, f.network_id
+            window w as (partition by fs.facility_code order by fs.trading_interval asc)
+        ) as generated_intervals
+        where
+            generated_intervals.interval_tz >= '{interval_start}'
+        group by 1, 2, 3
+        order by 1 asc;
+    """.format(
+        interval_start=interval_start,
+        interval_end=interval_end,
+        interval_size=network.interval_size,
+        timezone=network.timezone_database,
+        network_id=network.code,
+    )
+
+    logger.debug(query)
+
+    df_gen = pd.read_sql(query, con=engine)
+
+    if df_gen.empty:
+        raise FlowWorkerException("No results from load_energy_and_emissions_for_interval_range")
+
+    return df_gen
+
+
 def calculate_total_import_and_export_per_region_for_interval(interconnector_data: pd.DataFrame) -> pd.DataFrame:
     """Calculates total import and export energy for a region using the interconnector dataframe
 
@@ -232,6 +342,125 @@ def calculate_demand_region_for_interval(energy_and_emissions: pd.DataFrame, imp
     return df_with_demand
 
 
+def calculate_flow_emissions_for_intervals(energy_and_emissions: pd.DataFrame, interconnector_data: pd.DataFrame) -> pd.DataFrame:
+    """Solves the flow emissions for every interval in the frames in a single batch
+
+    Args:
+        energy_and_emissions (pd.DataFrame): region energy and emissions from load_energy_and_emissions_for_intervals
+        interconnector_data (pd.DataFrame): interconnector flows from load_interconnector_intervals
+
+    Returns:
+        pd.DataFrame: energy and emissions for each interconnector direction for each interval
+
+    Example return dataframe:
+
+        trading_interval    interconnector_region_from interconnector_region_to     energy  emissions
+        2023-04-09 10:15:00                       NSW1                     QLD1   0.000000   0.000000
+        2023-04-09 10:15:00                       VIC1                     NSW1   0.000000   0.000000
+        ...
+    """
+    if "trading_interval" not in energy_and_emissions.columns:
+        energy_and_emissions = energy_and_emissions.reset_index()
+
+    if "trading_interval" not in interconnector_data.columns:
+        interconnector_data = interconnector_data.reset_index()
+
+    region_values = energy_and_emissions.pivot_table(
+        index="trading_interval", columns="network_region", values=["energy", "emissions"], aggfunc="sum"
+    )
+    intervals = region_values.index
+
+    # split signed interconnector energy into a flow for each direction
+    flows_forward = pd.DataFrame(
+        {
+            "trading_interval": interconnector_data.trading_interval,
+            "region_flow": interconnector_data.interconnector_region_from + "->" + interconnector_data.interconnector_region_to,
+            "energy": interconnector_data.energy.clip(lower=0),
+        }
+    )
+    flows_reverse = pd.DataFrame(
+        {
+            "trading_interval": interconnector_data.trading_interval,
+            "region_flow": interconnector_data.interconnector_region_to + "->" + interconnector_data.interconnector_region_from,
+            "energy": (-interconnector_data.energy).clip(lower=0),
+        }
+    )
+
+    region_flows = [i for i, _ in FLOW_SOLVER_SOLVED_FLOWS] + FLOW_SOLVER_PASSTHROUGH_FLOWS
+
+    flow_energy = (
+        pd.concat([flows_forward, flows_reverse])
+        .pivot_table(index="trading_interval", columns="region_flow", values="energy", aggfunc="sum")
+        .reindex(index=intervals, columns=region_flows)
+        .fillna(0)
+    )
+
+    region_energy = region_values["energy"].reindex(columns=FLOW_SOLVER_BALANCE_REGIONS)
+    region_emissions = region_values["emissions"].reindex(columns=FLOW_SOLVER_BALANCE_REGIONS)
+
+    # emissions out of regions without flow-through are at the intensity of the source region
+    with np.errstate(divide="ignore", invalid="ignore"):
+        region_intensity = (region_emissions / region_energy).fillna(0)
+
+    passthrough_emissions = {
+        region_flow: (flow_energy[region_flow] * region_intensity[region_flow.split("->")[0]]).to_numpy()
+        for region_flow in FLOW_SOLVER_PASSTHROUGH_FLOWS
+    }
+
+    flow_emissions = solve_flow_emissions_for_intervals(
+        region_generated_mwh={Region(i): region_energy[i].to_numpy() for i in FLOW_SOLVER_BALANCE_REGIONS},
+        region_emissions_t={Region(i): region_emissions[i].to_numpy() for i in FLOW_SOLVER_BALANCE_REGIONS},
+        interconnector_generated_mwh={RegionFlow(i): flow_energy[i].to_numpy() for i in region_flows},
+        interconnector_emissions_t=passthrough_emissions,
+    )
+
+    results = []
+
+    for region_flow in region_flows:
+        region_from, region_to = region_flow.split("->")
+
+        results.append(
+            pd.DataFrame(
+                {
+                    "trading_interval": intervals,
+                    "interconnector_region_from": region_from,
+                    "interconnector_region_to": region_to,
+                    "energy": flow_energy[region_flow].to_numpy(),
+                    "emissions": flow_emissions[region_flow],
+                }
+            )
+        )
+
+    return pd.concat(results, ignore_index=True).sort_values(["trading_interval", "interconnector_region_from"])
+
+
+def calculate_region_imports_and_exports_for_intervals(flows: pd.DataFrame, network: NetworkSchema) -> pd.DataFrame:
+    """Totals the energy and emissions imported into and exported out of each region for each
+    interval from the flows solved by calculate_flow_emissions_for_intervals
+
+    Example return dataframe:
+
+        trading_interval    network_id network_region  energy_imports  emissions_imports  energy_exports  emissions_exports
+        2023-04-09 10:15:00        NEM           NSW1            82.5              51.70             0.0               0.00
+        2023-04-09 10:15:00        NEM           QLD1             0.0               0.00            55.0              35.75
+        ...
+    """
+    region_totals = []
+
+    for region_column, direction in [("interconnector_region_to", "imports"), ("interconnector_region_from", "exports")]:
+        region_totals.append(
+            flows.groupby(["trading_interval", region_column])[["energy", "emissions"]]
+            .sum(min_count=1)
+            .rename_axis(["trading_interval", "network_region"])
+            .rename(columns={"energy": f"energy_{direction}", "emissions": f"emissions_{direction}"})
+        )
+
+    region_flows = pd.concat(region_totals, axis=1).reset_index()
+    region_flows.insert(1, "network_id", network.code)
+
+    return region_flows
+
+
 def persist_network_flows_and_emissions_for_interval(flow_results: list[dict]) -> int:
     """Takes a list of generation values and calculates energies and bulk-inserts
     into the database"""
@@ -302,9 +531,9 @@ def run_aggregate_flow_for_interval_v3(interval: datetime, network: NetworkSchem
     calculate_demand_region_for_interval(energy_and_emissions=energy_and_emissions, imports_and_export=region_imports_and_exports)
 
     # 4. Solve.
-    region_flows_and_emissions = solve_flow_emissions_for_interval(
+    region_flows_and_emissions = calculate_flow_emissions_for_intervals(
         energy_and_emissions=energy_and_emissions,
-        interconnector=interconnector_data,
+        interconnector_data=interconnector_data,
     )
 
     # 5. net out emissions and join with energy and emissions
@@ -316,6 +545,47 @@ def run_aggregate_flow_for_interval_v3(interval: datetime, network: NetworkSchem
     persist_network_flows_and_emissions_for_interval(region_flows_and_emissions)
 
 
+def run_aggregate_flow_for_interval_range_v3(interval_start: datetime, interval_end: datetime, network: NetworkSchema) -> int:
+    """Runs the aggregate for every interval from interval_start up to (not including) interval_end
+    solving the flow emissions for all of them in a single batch
+
+    Args:
+        interval_start (datetime): first interval
+        interval_end (datetime): end of the range, not inclusive
+        network (NetworkSchema): network to run for
+
+    Returns:
+        int: number of records persisted
+    """
+    energy_and_emissions = load_energy_and_emissions_for_interval_range(
+        interval_start=interval_start, interval_end=interval_end, network=network
+    )
+
+    interconnector_data = load_interconnector_intervals_for_range(
+        interval_start=interval_start, interval_end=interval_end, network=network
+    )
+
+    region_flows_and_emissions = calculate_flow_emissions_for_intervals(
+        energy_and_emissions=energy_and_emissions,
+        interconnector_data=interconnector_data,
+    )
+
+    region_imports_and_exports = calculate_region_imports_and_exports_for_intervals(region_flows_and_emissions, network=network)
+
+    datetime_now = datetime.now()
+
+    region_imports_and_exports["market_value_imports"] = None
+    region_imports_and_exports["market_value_exports"] = None
+    region_imports_and_exports["created_by"] = "opennem.aggregates.flows_v3"
+    region_imports_and_exports["created_at"] = datetime_now
+    region_imports_and_exports["updated_at"] = datetime_now
+
+    # intervals that couldn't be solved are stored as null
+    region_imports_and_exports = region_imports_and_exports.astype(object).where(region_imports_and_exports.notna(), None)
+
+    return persist_network_flows_and_emissions_for_interval(region_imports_and_exports.to_dict(orient="records"))
+
+
 # debug entry point
 if __name__ == "__main__":
     interval = datetime.fromisoformat("2023-04-09T10:15:00+10:00")
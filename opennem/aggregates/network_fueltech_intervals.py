@@ -0,0 +1,150 @@
+""" Runs queries to populate the per-interval network fueltech aggregate table
+
+This populates at_network_fueltech_intervals with power, emissions and market value for each
+network region and fueltech at the interval the data is reported at. The live power exports
+read from it (see opennem.api.export.queries) rather than bucketing facility_scada.
+
+The table is maintained by the per-interval pipelines for the latest intervals and by the
+daily runner for the last few days to pick up late data.
+"""
+import logging
+from datetime import datetime, timedelta
+from textwrap import dedent
+
+from opennem import settings
+from opennem.core.profiler import ProfilerLevel, ProfilerRetentionTime, profile_task
+from opennem.db import get_database_engine
+from opennem.schema.network import NetworkAPVI, NetworkNEM, NetworkSchema, NetworkWEM
+from opennem.utils.dates import chop_datetime_microseconds, get_last_completed_interval_for_network
+
+logger = logging.getLogger("opennem.aggregates.network_fueltech_intervals")
+
+
+class AggregateNetworkFueltechIntervalsException(Exception):
+    """Exception that is raised when there is an error in the network fueltech intervals aggregate"""
+
+    pass
+
+
+def aggregates_network_fueltech_intervals_query(date_min: datetime, date_max: datetime, network: NetworkSchema) -> str:
+    """This query updates the at_network_fueltech_intervals aggregate for a date range"""
+
+    __query = """
+    insert into at_network_fueltech_intervals
+        (trading_interval, network_id, network_region, fueltech_id, power, emissions, market_value)
+        select
+            fs.trading_interval,
+            f.network_id,
+            f.network_region,
+            f.fueltech_id,
+            coalesce(sum(fs.generated), 0) as power,
+            coalesce(sum(
+                case
+                    when fs.generated > 0 then fs.generated / {intervals_per_hour} * f.emissions_factor_co2
+                    else 0
+                end
+            ), 0) as emissions,
+            coalesce(sum(
+                fs.generated / {intervals_per_hour} * coalesce(bs.price_dispatch, bs.price)
+            ), 0) as market_value
+        from facility_scada fs
+        join facility f on fs.facility_code = f.code
+        join network n on f.network_id = n.code
+        left join balancing_summary bs on
+            bs.trading_interval = fs.trading_interval
+            and bs.network_id = n.network_price
+            and bs.network_region = f.network_region
+        where
+            fs.is_forecast is False
+            and f.fueltech_id is not null
+            and f.network_id = '{network_id}'
+            and fs.trading_interval >= '{date_min}'
+            and fs.trading_interval <= '{date_max}'
+        group by
+            1, 2, 3, 4
+    on conflict (trading_interval, network_id, network_region, fueltech_id) DO UPDATE set
+        power = EXCLUDED.power,
+        emissions = EXCLUDED.emissions,
+        market_value = EXCLUDED.market_value;
+    """
+
+    if date_max < date_min:
+        raise AggregateNetworkFueltechIntervalsException(
+            f"aggregates_network_fueltech_intervals_query: date_max ({date_max}) is before date_min ({date_min})"
+        )
+
+    query = __query.format(
+        date_min=chop_datetime_microseconds(date_min),
+        date_max=chop_datetime_microseconds(date_max),
+        network_id=network.code,
+        intervals_per_hour=network.intervals_per_hour,
+    )
+
+    return dedent(query)
+
+
+def exec_aggregates_network_fueltech_intervals_query(date_min: datetime, date_max: datetime, network: NetworkSchema) -> None:
+    """Executes the network fueltech intervals aggregate query for a date range and network"""
+    engine = get_database_engine()
+
+    query = aggregates_network_fueltech_intervals_query(date_min=date_min, date_max=date_max, network=network)
+
+    with engine.begin() as c:
+        logger.debug(query)
+
+        if not settings.dry_run:
+            c.execute(query)
+
+
+def run_aggregate_network_fueltech_intervals_for_interval(interval: datetime, network: NetworkSchema) -> None:
+    """Update the aggregate for the intervals up to interval. The lookback picks up facilities
+    that report late"""
+    date_min = interval - timedelta(minutes=settings.aggregate_fueltech_intervals_lookback_minutes)
+
+    exec_aggregates_network_fueltech_intervals_query(date_min=date_min, date_max=interval, network=network)
+
+
+def run_network_fueltech_intervals_for_latest_interval(network: NetworkSchema) -> None:
+    """Runs the network fueltech intervals aggregate for the latest interval"""
+    interval = get_last_completed_interval_for_network(network=network)
+
+    run_aggregate_network_fueltech_intervals_for_interval(interval=interval, network=network)
+
+
+@profile_task(send_slack=False, level=ProfilerLevel.INFO, retention_period=ProfilerRetentionTime.FOREVER)
+def run_aggregates_network_fueltech_intervals_days(days: int = 2, networks: list[NetworkSchema] | None = None) -> None:
+    """Update the aggregate for the last number of days - run daily for late data"""
+    if not networks:
+        networks = [NetworkNEM, NetworkWEM, NetworkAPVI]
+
+    for network in networks:
+        date_max = get_last_completed_interval_for_network(network=network)
+        date_min = date_max.replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=days)
+
+        exec_aggregates_network_fueltech_intervals_query(date_min=date_min, date_max=date_max, network=network)
+
+
+@profile_task(send_slack=False, level=ProfilerLevel.INFO, retention_period=ProfilerRetentionTime.FOREVER)
+def run_aggregates_network_fueltech_intervals_backfill(network: NetworkSchema, date_min: datetime | None = None) -> None:
+    """Backfill the aggregate for a network a day at a time back to date_min or when the network
+    was first seen"""
+    date_min = date_min or network.data_first_seen
+
+    if not date_min:
+        raise AggregateNetworkFueltechIntervalsException(f"Network {network.code} has no data_first_seen")
+
+    date_max = get_last_completed_interval_for_network(network=network)
+    day_start = date_max.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    while date_max > date_min:
+        logger.info(f"Backfilling network fueltech intervals for {network.code} {day_start} => {date_max}")
+
+        exec_aggregates_network_fueltech_intervals_query(date_min=max(day_start, date_min), date_max=date_max, network=network)
+
+        date_max = day_start - timedelta(seconds=1)
+        day_start = day_start - timedelta(days=1)
+
+
+# Debug entry point
+if __name__ == "__main__":
+    run_network_fueltech_intervals_for_latest_interval(network=NetworkNEM)
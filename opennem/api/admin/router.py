@@ -1,8 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException
 from starlette import status
 
+from opennem.api.auth.key import get_api_key
+from opennem.api.cache import get_coalesce_stats
 from opennem.core.networks import NetworkNEM, NetworkWEM
 from opennem.db import get_database_engine
+from opennem.db.instrumentation import get_query_stats
+from opennem.utils.cache import get_scada_cache_stats
 
 from .schema import ScraperStats, ScraperStatsResult
 
@@ -57,3 +61,21 @@ def scraper_stats(
     )
 
     return result
+
+
+@router.get("/cache/stats", dependencies=[Depends(get_api_key)])
+def cache_stats() -> dict[str, int]:
+    """Hit and miss counters for the scada range cache in this process"""
+    return get_scada_cache_stats()
+
+
+@router.get("/cache/coalesce/stats", dependencies=[Depends(get_api_key)])
+def coalesce_stats() -> dict[str, dict[str, int]]:
+    """Hit, stale and coalesced request counters per route for the API response cache in this process"""
+    return get_coalesce_stats()
+
+
+@router.get("/db/query/stats", dependencies=[Depends(get_api_key)])
+def query_stats(limit: int = 20) -> list[dict]:
+    """Top queries by total time in this process with their calls, rows and callers"""
+    return get_query_stats(limit=limit)
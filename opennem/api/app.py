@@ -26,6 +26,7 @@ from opennem.api.feedback.router import router as feedback_router
 from opennem.api.geo.router import router as geo_router
 from opennem.api.location.router import router as location_router
 from opennem.api.locations import router as locations_router
+from opennem.api.responses import OpennemJSONResponse
 from opennem.api.schema import APINetworkRegion, APINetworkSchema
 from opennem.api.station.router import router as station_router
 from opennem.api.stats.router import router as stats_router
@@ -43,7 +44,14 @@ from opennem.utils.version import get_version
 logger = logging.getLogger(__name__)
 
 
-app = FastAPI(title="OpenNEM", debug=settings.debug, version=get_version(), redoc_url="/docs", docs_url=None)
+app = FastAPI(
+    title="OpenNEM",
+    debug=settings.debug,
+    version=get_version(),
+    redoc_url="/docs",
+    docs_url=None,
+    default_response_class=OpennemJSONResponse,
+)
 
 # @TODO put CORS available/permissions in settings
 origins = [
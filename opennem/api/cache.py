@@ -0,0 +1,444 @@
+"""
+OpenNEM API response cache with request coalescing
+
+Cached endpoints are single-flight: when a key is missing only one request computes it and
+the others wait for the result rather than all running the same query at once. Requests in
+the same worker share the in-flight computation and requests in other workers wait on a
+lock in the shared redis at settings.cache_url.
+
+Entries are kept for settings.api_cache_stale_sec past their expiry. An expired entry is
+served as is while the request that takes the lock refreshes it in the background
+(stale-while-revalidate).
+
+If redis isn't configured or is unavailable the cache falls back to an in-process store,
+which still coalesces requests within the worker. A lock is always released in the store it
+was taken in - a lock taken in redis that can't be released is left to expire. Coalescing
+stats are kept per route and are available from get_coalesce_stats()
+
+"""
+import asyncio
+import hashlib
+import inspect
+import logging
+import time
+import uuid
+from collections import defaultdict
+from collections.abc import Awaitable, Callable
+from dataclasses import asdict, dataclass
+from functools import wraps
+from typing import Any
+
+from fastapi import params
+from fastapi.concurrency import run_in_threadpool
+from fastapi.dependencies.utils import get_typed_signature
+from pydantic import BaseModel
+from starlette.requests import Request
+from starlette.responses import Response
+
+from opennem import settings
+from opennem.exporter.encoders import model_dict, model_encoder, opennem_dumps
+
+logger = logging.getLogger("opennem.api.cache")
+
+API_CACHE_PREFIX = "opennem:api"
+
+# how often a request waiting on another worker checks for the value
+CACHE_POLL_SEC = 0.05
+
+# how long to stop using the shared store after a redis error
+CACHE_SHARED_RETRY_SEC = 30.0
+
+CACHE_STATUS_HEADER = "X-Cache"
+
+_INJECTED_REQUEST = "__coalesced_cache_request"
+
+# deletes the lock only if it still holds our token, in one step so that a lock that timed out
+# and was taken by another request between the check and the delete isn't released
+RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+@dataclass
+class CoalesceStats:
+    hits: int = 0
+    stale_hits: int = 0
+    misses: int = 0
+    coalesced_local: int = 0
+    coalesced_remote: int = 0
+    refreshes: int = 0
+    refresh_errors: int = 0
+    wait_timeouts: int = 0
+    shared_errors: int = 0
+
+
+@dataclass
+class CacheResult:
+    body: bytes
+    status: str
+    expires: float
+
+
+class LocalCacheStore:
+    """In-process store with the redis commands the coalescing cache uses"""
+
+    def __init__(self, maxsize: int = 1000) -> None:
+        self.maxsize = maxsize
+        self.values: dict[str, tuple[bytes, float | None]] = {}
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+
+        for key in [k for k, (_, expires) in self.values.items() if expires is not None and expires <= now]:
+            del self.values[key]
+
+        # oldest first
+        while len(self.values) >= self.maxsize:
+            del self.values[next(iter(self.values))]
+
+    async def get(self, key: str) -> bytes | None:
+        if key not in self.values:
+            return None
+
+        (value, expires) = self.values[key]
+
+        if expires is not None and expires <= time.monotonic():
+            del self.values[key]
+            return None
+
+        return value
+
+    async def set(self, key: str, value: bytes, px: int | None = None, nx: bool = False) -> bool:
+        if nx and await self.get(key) is not None:
+            return False
+
+        if key not in self.values:
+            self._evict()
+
+        self.values[key] = (value, time.monotonic() + px / 1000 if px else None)
+
+        return True
+
+    async def delete(self, key: str) -> int:
+        return 1 if self.values.pop(key, None) is not None else 0
+
+    async def eval(self, script: str, numkeys: int, *keys_and_args: Any) -> int:
+        """Runs the lock release script, the only script the cache uses"""
+        if script != RELEASE_LOCK_SCRIPT or numkeys != 1:
+            raise NotImplementedError("Local cache store only runs the lock release script")
+
+        (key, token) = keys_and_args
+        token = token.encode() if isinstance(token, str) else token
+
+        if await self.get(key) != token:
+            return 0
+
+        return await self.delete(key)
+
+
+def _encode_value(value: Any) -> bytes:
+    if isinstance(value, BaseModel):
+        value = model_dict(value)
+
+    return opennem_dumps(value, default=model_encoder)
+
+
+def _encode_entry(body: bytes, expires: float) -> bytes:
+    return f"{expires!r}|".encode() + body
+
+
+def _decode_entry(entry: bytes | str) -> CacheResult:
+    if isinstance(entry, str):
+        entry = entry.encode("utf-8")
+
+    (expires, body) = entry.split(b"|", 1)
+
+    return CacheResult(body=body, status="", expires=float(expires))
+
+
+class CoalescingCache:
+    """Response cache where only one request at a time computes a key
+
+    Values are the serialized JSON response bodies.
+    """
+
+    def __init__(
+        self,
+        prefix: str = API_CACHE_PREFIX,
+        redis_url: str | None = None,
+        shared_client: Any = None,
+        stale: int = settings.api_cache_stale_sec,
+        lock_timeout: int = settings.api_cache_lock_timeout_sec,
+        wait_timeout: float = settings.api_cache_wait_timeout_sec,
+    ) -> None:
+        self.prefix = prefix
+        self.stale = stale
+        self.lock_timeout = lock_timeout
+        self.wait_timeout = wait_timeout
+
+        self.local = LocalCacheStore()
+        self.stats: dict[str, CoalesceStats] = defaultdict(CoalesceStats)
+
+        self._redis_url = redis_url
+        self._shared_client = shared_client
+        self._shared_disabled_until = 0.0
+
+        # computations running in this worker by key
+        self._in_flight: dict[str, asyncio.Task] = {}
+
+    def _get_shared(self) -> Any:
+        """Lazily connect to redis"""
+        if time.monotonic() < self._shared_disabled_until:
+            return None
+
+        if self._shared_client or not self._redis_url:
+            return self._shared_client
+
+        try:
+            from redis import asyncio as aioredis
+        except ImportError:
+            logger.error("Coalescing API cache requires redis library")
+            self._redis_url = None
+            return None
+
+        self._shared_client = aioredis.from_url(self._redis_url, socket_timeout=1)
+
+        return self._shared_client
+
+    async def _call(self, route: str, command: str, *args: Any, **kwargs: Any) -> Any:
+        """Run a command on the shared store, or on the local store if it's unavailable"""
+        shared = self._get_shared()
+
+        if shared:
+            try:
+                return await getattr(shared, command)(*args, **kwargs)
+            except Exception as e:
+                self._disable_shared(route, e)
+
+        return await getattr(self.local, command)(*args, **kwargs)
+
+    def _disable_shared(self, route: str, error: Exception) -> None:
+        self.stats[route].shared_errors += 1
+        self._shared_disabled_until = time.monotonic() + CACHE_SHARED_RETRY_SEC
+        logger.warning(f"Shared API cache unavailable, using local cache only for {CACHE_SHARED_RETRY_SEC}s: {error}")
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}:{key}"
+
+    def _lock_key(self, key: str) -> str:
+        return f"{self.prefix}:{key}:lock"
+
+    async def _get_entry(self, route: str, key: str) -> CacheResult | None:
+        entry = await self._call(route, "get", self._key(key))
+
+        if entry is None:
+            return None
+
+        return _decode_entry(entry)
+
+    async def _acquire(self, route: str, key: str, token: str) -> Any:
+        """Takes the lock for key. Returns the store the lock was taken in, or None if another
+        request holds it"""
+        store = self._get_shared()
+
+        if store:
+            try:
+                acquired = await store.set(self._lock_key(key), token.encode(), px=self.lock_timeout * 1000, nx=True)
+                return store if acquired else None
+            except Exception as e:
+                self._disable_shared(route, e)
+
+        store = self.local
+        acquired = await store.set(self._lock_key(key), token.encode(), px=self.lock_timeout * 1000, nx=True)
+
+        return store if acquired else None
+
+    async def _release(self, route: str, key: str, token: str, store: Any) -> None:
+        # only release a lock we still hold - it may have timed out and been taken by another
+        # request. never fall back to the local store, which doesn't hold this lock
+        try:
+            await store.eval(RELEASE_LOCK_SCRIPT, 1, self._lock_key(key), token)
+        except Exception as e:
+            self._disable_shared(route, e)
+
+    async def _compute(self, route: str, key: str, compute: Callable[[], Awaitable[Any]], expire: int) -> CacheResult:
+        body = _encode_value(await compute())
+        expires = time.time() + expire
+
+        await self._call(route, "set", self._key(key), _encode_entry(body, expires), px=(expire + self.stale) * 1000)
+
+        return CacheResult(body=body, status="MISS", expires=expires)
+
+    async def _fill(self, route: str, key: str, compute: Callable[[], Awaitable[Any]], expire: int) -> CacheResult:
+        """Compute a missing key under the shared lock, or wait for the worker that holds it"""
+        stats = self.stats[route]
+        time_end = time.monotonic() + self.wait_timeout
+
+        while True:
+            token = uuid.uuid4().hex
+            lock_store = await self._acquire(route, key, token)
+
+            if lock_store:
+                try:
+                    # filled by another worker between the read and taking the lock
+                    entry = await self._get_entry(route, key)
+
+                    if entry and entry.expires > time.time():
+                        stats.coalesced_remote += 1
+                        entry.status = "COALESCED"
+                        return entry
+
+                    stats.misses += 1
+                    return await self._compute(route, key, compute, expire)
+                finally:
+                    await self._release(route, key, token, lock_store)
+
+            await asyncio.sleep(CACHE_POLL_SEC)
+
+            entry = await self._get_entry(route, key)
+
+            if entry:
+                stats.coalesced_remote += 1
+                entry.status = "COALESCED"
+                return entry
+
+            if time.monotonic() >= time_end:
+                logger.warning(f"Timed out waiting on API cache key {key} for {route}")
+                stats.wait_timeouts += 1
+                stats.misses += 1
+                return await self._compute(route, key, compute, expire)
+
+    async def _refresh(
+        self, route: str, key: str, compute: Callable[[], Awaitable[Any]], expire: int, token: str, lock_store: Any
+    ) -> None:
+        stats = self.stats[route]
+
+        try:
+            await self._compute(route, key, compute, expire)
+            stats.refreshes += 1
+        except Exception as e:
+            stats.refresh_errors += 1
+            logger.error(f"Error refreshing API cache key {key} for {route}: {e}")
+        finally:
+            await self._release(route, key, token, lock_store)
+
+    def _track(self, key: str, task: asyncio.Task) -> None:
+        self._in_flight[key] = task
+
+        def _done(task: asyncio.Task) -> None:
+            if self._in_flight.get(key) is task:
+                del self._in_flight[key]
+
+        task.add_done_callback(_done)
+
+    async def get_or_compute(self, route: str, key: str, compute: Callable[[], Awaitable[Any]], expire: int) -> CacheResult:
+        """The cached response body for key, computed by at most one request at a time"""
+        stats = self.stats[route]
+
+        entry = await self._get_entry(route, key)
+
+        if entry and entry.expires > time.time():
+            stats.hits += 1
+            entry.status = "HIT"
+            return entry
+
+        if entry:
+            stats.stale_hits += 1
+            entry.status = "STALE"
+
+            if key in self._in_flight:
+                return entry
+
+            token = uuid.uuid4().hex
+            lock_store = await self._acquire(route, key, token)
+
+            if lock_store:
+                self._track(key, asyncio.create_task(self._refresh(route, key, compute, expire, token, lock_store)))
+
+            return entry
+
+        in_flight = self._in_flight.get(key)
+
+        if in_flight:
+            stats.coalesced_local += 1
+            result = await asyncio.shield(in_flight)
+            return CacheResult(body=result.body, status="COALESCED", expires=result.expires)
+
+        task = asyncio.create_task(self._fill(route, key, compute, expire))
+        self._track(key, task)
+
+        # shielded so that the computation carries on for the waiting requests if this one
+        # is cancelled
+        return await asyncio.shield(task)
+
+    def get_stats(self) -> dict[str, dict[str, int]]:
+        return {route: asdict(stats) for route, stats in self.stats.items()}
+
+
+api_cache = CoalescingCache(redis_url=settings.cache_url if settings.api_cache_shared else None)
+
+
+def get_coalesce_stats() -> dict[str, dict[str, int]]:
+    return api_cache.get_stats()
+
+
+def _cache_key(func: Callable, kwargs: dict[str, Any]) -> str:
+    key = ":".join(f"{k}={v}" for k, v in sorted(kwargs.items()))
+    return f"{func.__module__}.{func.__name__}:" + hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+def coalesced_cache(expire: int, cache: CoalescingCache | None = None) -> Callable:
+    """
+    Caches the JSON response of an endpoint for expire seconds. Replaces
+    fastapi_cache.decorator.cache - see the module docstring.
+
+    The key is the endpoint and its arguments other than dependencies. Requests with
+    Cache-Control: no-store bypass the cache.
+    """
+
+    def _decorator(func: Callable) -> Callable:
+        # resolves forward references in the endpoint module rather than this one
+        signature = get_typed_signature(func)
+
+        dependencies = {name for name, param in signature.parameters.items() if isinstance(param.default, params.Depends)}
+
+        @wraps(func)
+        async def _coalesced_cache_wrapper(*args: Any, **kwargs: Any) -> Any:
+            request: Request | None = kwargs.pop(_INJECTED_REQUEST, None)
+
+            async def _compute() -> Any:
+                if inspect.iscoroutinefunction(func):
+                    return await func(*args, **kwargs)
+
+                return await run_in_threadpool(func, *args, **kwargs)
+
+            if request is not None and request.headers.get("Cache-Control") == "no-store":
+                return await _compute()
+
+            route = request.scope["route"].path if request is not None and "route" in request.scope else func.__name__
+            key = _cache_key(func, {k: v for k, v in kwargs.items() if k not in dependencies})
+
+            result = await (cache or api_cache).get_or_compute(route, key, _compute, expire)
+
+            return Response(
+                content=result.body,
+                media_type="application/json",
+                headers={
+                    "Cache-Control": f"max-age={max(int(result.expires - time.time()), 0)}",
+                    CACHE_STATUS_HEADER: result.status,
+                },
+            )
+
+        _coalesced_cache_wrapper.__signature__ = signature.replace(  # type: ignore
+            parameters=[
+                *signature.parameters.values(),
+                inspect.Parameter(_INJECTED_REQUEST, kind=inspect.Parameter.KEYWORD_ONLY, annotation=Request),
+            ]
+        )
+
+        return _coalesced_cache_wrapper
+
+    return _decorator
@@ -1,6 +1,7 @@
 import logging
 import re
 
+from opennem import settings
 from opennem.api.exceptions import OpennemBaseHttpException, OpenNEMInvalidNetworkRegion
 from opennem.api.export.queries import (
     country_stats_query,
@@ -9,7 +10,9 @@ from opennem.api.export.queries import (
     interconnector_flow_network_regions_query,
     interconnector_power_flow,
     network_demand_query,
+    power_and_emissions_network_fueltech_intervals_query,
     power_and_emissions_network_fueltech_query,
+    power_network_fueltech_intervals_query,
     power_network_fueltech_query,
     power_network_interconnector_emissions_query,
     power_network_rooftop_query,
@@ -18,7 +21,7 @@ from opennem.api.export.queries import (
 )
 from opennem.api.facility.capacities import get_facility_capacities
 from opennem.api.stats.controllers import get_latest_interval_live, stats_factory
-from opennem.api.stats.schema import DataQueryResult, OpennemDataSet
+from opennem.api.stats.schema import DataQueryColumns, DataQueryResult, OpennemDataSet
 from opennem.api.time import human_to_interval
 from opennem.controllers.output.schema import OpennemExportSeries
 from opennem.core.units import get_unit
@@ -390,7 +393,9 @@ def power_week(
     if network_region_code and not re.match(_valid_region, network_region_code):
         raise OpenNEMInvalidNetworkRegion()
 
-    query = power_network_fueltech_query(
+    power_query = power_network_fueltech_intervals_query if settings.power_fueltech_intervals else power_network_fueltech_query
+
+    query = power_query(
         time_series=time_series,
         networks_query=networks_query,
         network_region=network_region_code,
@@ -400,7 +405,7 @@ def power_week(
         logger.debug(query)
         row = list(c.execute(query))
 
-    stats = [DataQueryResult(interval=i[0], result=i[2], group_by=i[1] if len(i) > 1 else None) for i in row]
+    stats = DataQueryColumns.from_rows(row, interval=0, result=2, group_by=1)
 
     if not stats:
         logger.error(f"No results from power week query with {time_series}")
@@ -574,7 +579,13 @@ def power_and_emissions_for_network_interval(
     if network_region_code and not re.match(_valid_region, network_region_code):
         raise OpenNEMInvalidNetworkRegion()
 
-    query = power_and_emissions_network_fueltech_query(
+    emissions_query = (
+        power_and_emissions_network_fueltech_intervals_query
+        if settings.power_fueltech_intervals
+        else power_and_emissions_network_fueltech_query
+    )
+
+    query = emissions_query(
         time_series=time_series,
         network_region=network_region_code,
     )
@@ -583,8 +594,8 @@ def power_and_emissions_for_network_interval(
         logger.debug(query)
         row = list(c.execute(query))
 
-    power_stats = [DataQueryResult(interval=i[0], result=i[2], group_by=i[1] if len(i) > 1 else None) for i in row]
-    emission_stats = [DataQueryResult(interval=i[0], result=i[3], group_by=i[1] if len(i) > 1 else None) for i in row]
+    power_stats = DataQueryColumns.from_rows(row, interval=0, result=2, group_by=1)
+    emission_stats = DataQueryColumns.from_rows(row, interval=0, result=3, group_by=1)
 
     if not power_stats:
         logger.error(f"No results from emissions_for_network_interval query with {time_series}")
@@ -620,9 +631,7 @@ def power_and_emissions_for_network_interval(
     if include_emission_factors:
         emission_factor_unit = get_unit("emissions_factor")
 
-        emission_factor_results = [
-            DataQueryResult(interval=i[0], result=i[4], group_by=i[1] if len(i) > 1 else None) for i in row
-        ]
+        emission_factor_results = DataQueryColumns.from_rows(row, interval=0, result=4, group_by=1)
 
         emission_factor_set = stats_factory(
             emission_factor_results,
@@ -651,12 +660,22 @@ def demand_network_region_daily(
         logger.debug(query)
         row = list(c.execute(query))
 
-    results_energy = [DataQueryResult(interval=i[0], group_by=i[2], result=i[3] if len(i) > 1 else None) for i in row]
+    if not row:
+        logger.error(f"No results from query: {query}")
+        return None
+
+    return demand_network_region_daily_from_rows(row, time_series=time_series, network_region_code=network_region_code)
+
 
-    results_market_value = [DataQueryResult(interval=i[0], group_by=i[2], result=i[4] if len(i) > 1 else None) for i in row]
+def demand_network_region_daily_from_rows(
+    row: list, time_series: OpennemExportSeries, network_region_code: str | None = None
+) -> OpennemDataSet | None:
+    """Builds the demand set from demand_network_region_query rows"""
+    results_energy = DataQueryColumns.from_rows(row, interval=0, result=3, group_by=2)
+
+    results_market_value = DataQueryColumns.from_rows(row, interval=0, result=4, group_by=2)
 
     if not results_energy:
-        logger.error(f"No results from query: {query}")
         return None
 
     # demand based values for VWP
@@ -692,7 +711,6 @@ def energy_fueltech_daily(
     networks_query: list[NetworkSchema] | None = None,
 ) -> OpennemDataSet | None:
     engine = get_database_engine()
-    units = get_unit("energy_giga")
 
     query = energy_network_fueltech_query(
         time_series=time_series,
@@ -704,14 +722,26 @@ def energy_fueltech_daily(
         logger.debug(query)
         row = list(c.execute(query))
 
-    results_energy = [DataQueryResult(interval=i[0], group_by=i[1], result=i[2] if len(i) > 1 else None) for i in row]
+    if not row:
+        logger.error(f"No results from query: {query}")
+        return None
+
+    return energy_fueltech_daily_from_rows(row, time_series=time_series, network_region_code=network_region_code)
 
-    results_market_value = [DataQueryResult(interval=i[0], group_by=i[1], result=i[3] if len(i) > 1 else None) for i in row]
 
-    results_emissions = [DataQueryResult(interval=i[0], group_by=i[1], result=i[4] if len(i) > 1 else None) for i in row]
+def energy_fueltech_daily_from_rows(
+    row: list, time_series: OpennemExportSeries, network_region_code: str | None = None
+) -> OpennemDataSet | None:
+    """Builds the energy, market value and emissions set from energy_network_fueltech_query rows"""
+    units = get_unit("energy_giga")
+
+    results_energy = DataQueryColumns.from_rows(row, interval=0, result=2, group_by=1)
+
+    results_market_value = DataQueryColumns.from_rows(row, interval=0, result=3, group_by=1)
+
+    results_emissions = DataQueryColumns.from_rows(row, interval=0, result=4, group_by=1)
 
     if not results_energy:
-        logger.error(f"No results from query: {query}")
         return None
 
     stats = stats_factory(
@@ -760,8 +790,6 @@ def energy_interconnector_flows_and_emissions_v2(
     time_series: OpennemExportSeries, network_region_code: str, include_emission_factor: bool = True
 ) -> OpennemDataSet | None:
     engine = get_database_engine()
-    unit_energy = get_unit("energy_giga")
-    unit_emissions = get_unit("emissions")
 
     query = get_network_flows_emissions_market_value_query(time_series=time_series, network_region_code=network_region_code)
 
@@ -776,14 +804,29 @@ def energy_interconnector_flows_and_emissions_v2(
         )
         return None
 
-    imports = [DataQueryResult(interval=i[0], group_by="imports", result=i[3]) for i in row]
-    exports = [DataQueryResult(interval=i[0], group_by="exports", result=i[4]) for i in row]
+    return energy_interconnector_flows_and_emissions_v2_from_rows(
+        row,
+        time_series=time_series,
+        network_region_code=network_region_code,
+        include_emission_factor=include_emission_factor,
+    )
+
+
+def energy_interconnector_flows_and_emissions_v2_from_rows(
+    row: list, time_series: OpennemExportSeries, network_region_code: str, include_emission_factor: bool = True
+) -> OpennemDataSet | None:
+    """Builds the flows set from get_network_flows_emissions_market_value_query rows"""
+    unit_energy = get_unit("energy_giga")
+    unit_emissions = get_unit("emissions")
+
+    imports = DataQueryColumns.from_rows(row, interval=0, result=3, group_by="imports")
+    exports = DataQueryColumns.from_rows(row, interval=0, result=4, group_by="exports")
 
-    import_emissions = [DataQueryResult(interval=i[0], group_by="imports", result=i[5]) for i in row]
-    export_emissions = [DataQueryResult(interval=i[0], group_by="exports", result=i[6]) for i in row]
+    import_emissions = DataQueryColumns.from_rows(row, interval=0, result=5, group_by="imports")
+    export_emissions = DataQueryColumns.from_rows(row, interval=0, result=6, group_by="exports")
 
-    import_mv = [DataQueryResult(interval=i[0], group_by="imports", result=i[7]) for i in row]
-    export_mv = [DataQueryResult(interval=i[0], group_by="exports", result=i[8]) for i in row]
+    import_mv = DataQueryColumns.from_rows(row, interval=0, result=7, group_by="imports")
+    export_mv = DataQueryColumns.from_rows(row, interval=0, result=8, group_by="exports")
 
     result = stats_factory(
         imports,
@@ -856,8 +899,8 @@ def energy_interconnector_flows_and_emissions_v2(
     result.append_set(result_export_mv)
 
     if include_emission_factor:
-        import_emission_factor = [DataQueryResult(interval=i[0], group_by="imports", result=i[9]) for i in row]
-        export_emission_factor = [DataQueryResult(interval=i[0], group_by="exports", result=i[10]) for i in row]
+        import_emission_factor = DataQueryColumns.from_rows(row, interval=0, result=9, group_by="imports")
+        export_emission_factor = DataQueryColumns.from_rows(row, interval=0, result=10, group_by="exports")
 
         result_import_emission_factor = stats_factory(
             import_emission_factor,
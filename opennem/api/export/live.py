@@ -0,0 +1,178 @@
+"""
+Incremental "live tail" exports
+
+Live power exports are a rolling window (ie. the last 7 days) that only gains an interval
+every run. Rather than rebuilding the whole window from facility_scada each time, the
+last published OpennemDataSet for each export path is kept and the export queries only the
+tail - the intervals after the last published interval with a few intervals of overlap to
+pick up late updates. The tail is merged into the published set and the expired head is
+dropped.
+
+Sets are rebuilt in full every settings.export_power_full_rebuild_sec and whenever a
+backfill invalidates the live exports (see invalidate_live_exports). Invalidation goes
+through the shared cache generation so that it reaches the export worker from any process.
+
+"""
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from opennem import settings
+from opennem.api.stats.schema import OpennemData, OpennemDataHistory, OpennemDataSet
+from opennem.utils.cache import TwoTierCache
+
+logger = logging.getLogger("opennem.export.live")
+
+LIVE_EXPORT_PREFIX = "opennem:live_export"
+
+
+@dataclass
+class LiveExportEntry:
+    stat_set: OpennemDataSet
+    generation: int
+    rebuilt_at: float
+
+
+class LiveExportCache:
+    """Last published stat set per export path in this process
+
+    Entries expire after full_rebuild_sec from when they were last built in full and
+    are dropped when the shared generation moves on.
+    """
+
+    def __init__(self, full_rebuild_sec: int, generation_cache: TwoTierCache) -> None:
+        self.full_rebuild_sec = full_rebuild_sec
+        self.generation_cache = generation_cache
+        self._entries: dict[str, LiveExportEntry] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, path: str) -> OpennemDataSet | None:
+        """The published set for a path or None if it needs a full rebuild"""
+        entry = self._entries.get(path)
+
+        if not entry:
+            return None
+
+        if time.monotonic() - entry.rebuilt_at >= self.full_rebuild_sec:
+            logger.debug(f"Live export {path} due for full rebuild")
+            self._entries.pop(path, None)
+            return None
+
+        if entry.generation != self.generation_cache.get_generation():
+            logger.debug(f"Live export {path} invalidated")
+            self._entries.pop(path, None)
+            return None
+
+        return entry.stat_set
+
+    def set(self, path: str, stat_set: OpennemDataSet, rebuilt: bool = True) -> None:
+        """Store a published set. rebuilt is False when the set was built from a tail"""
+        entry = self._entries.get(path)
+
+        rebuilt_at = time.monotonic() if rebuilt or not entry else entry.rebuilt_at
+        generation = self.generation_cache.get_generation() if rebuilt or not entry else entry.generation
+
+        self._entries[path] = LiveExportEntry(stat_set=stat_set, generation=generation, rebuilt_at=rebuilt_at)
+
+    def invalidate(self) -> None:
+        """Force a full rebuild of every live export in every process"""
+        self._entries.clear()
+        self.generation_cache.invalidate()
+
+
+live_export_cache = LiveExportCache(
+    full_rebuild_sec=settings.export_power_full_rebuild_sec,
+    generation_cache=TwoTierCache(
+        prefix=LIVE_EXPORT_PREFIX,
+        ttl=settings.export_power_full_rebuild_sec,
+        redis_url=settings.cache_url,
+    ),
+)
+
+
+def invalidate_live_exports() -> None:
+    """Called when a backfill has stored data that could be inside a live export window"""
+    live_export_cache.invalidate()
+
+
+def get_tail_start(stat_set: OpennemDataSet, interval: timedelta, overlap_intervals: int | None = None) -> datetime | None:
+    """Start of the tail query for a published set - overlap_intervals before the most recent
+    published interval"""
+    if overlap_intervals is None:
+        overlap_intervals = settings.export_power_tail_intervals
+
+    if not stat_set.data:
+        return None
+
+    last = max(i.history.last for i in stat_set.data)
+
+    return last - interval * overlap_intervals
+
+
+def _merge_history(history: OpennemDataHistory, tail: OpennemDataHistory, window_start: datetime) -> OpennemDataHistory | None:
+    """Merge a tail history into a published history and drop values before the window
+    start. Returns None if there are no values left"""
+    interval = history.get_interval()
+
+    values = {dt: v for dt, v in history.values() if dt >= window_start}
+    values.update({dt: v for dt, v in tail.values() if dt >= window_start})
+
+    # trim leading and trailing nulls as stats_factory does
+    present = [dt for dt, v in values.items() if v is not None]
+
+    if not present:
+        return None
+
+    start = min(present).astimezone(history.start.tzinfo)
+    last = max(present).astimezone(history.last.tzinfo)
+
+    data = []
+    dt = start
+
+    while dt <= last:
+        data.append(values.get(dt))
+        dt = dt + interval
+
+    # stats_factory skips series without any non-zero values
+    if not [i for i in data if i]:
+        return None
+
+    return OpennemDataHistory.from_series(start=start, last=last, interval=history.interval, data=data)
+
+
+def merge_tail_stat_set(stat_set: OpennemDataSet, tail_set: OpennemDataSet, window_start: datetime) -> OpennemDataSet | None:
+    """Merge a tail into a published stat set. Returns None if the sets don't line up and
+    the export needs a full rebuild - ie. a series that is in the tail but wasn't published
+
+    Forecasts (ie. the rooftop forecast) run forward from the end of the series so the tail
+    forecast replaces the published one. A series missing from the tail keeps its forecast"""
+    published: dict[str | None, OpennemData] = {i.id: i for i in stat_set.data}
+    tail: dict[str | None, OpennemData] = {i.id: i for i in tail_set.data}
+
+    if None in published or not set(tail).issubset(published):
+        return None
+
+    merged_data = []
+
+    for series_id, series in published.items():
+        series_tail = tail.get(series_id)
+
+        if series_tail and series_tail.history.interval != series.history.interval:
+            return None
+
+        if series_tail:
+            history = _merge_history(series.history, series_tail.history, window_start)
+        else:
+            history = _merge_history(series.history, series.history, window_start)
+
+        if not history:
+            continue
+
+        forecast = series_tail.forecast if series_tail else series.forecast
+
+        merged_data.append(series.copy(update={"history": history, "forecast": forecast}))
+
+    return stat_set.copy(update={"data": merged_data, "created_at": tail_set.created_at or stat_set.created_at})
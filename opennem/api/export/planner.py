@@ -0,0 +1,184 @@
+"""
+Export planner for the per-region daily and monthly exports
+
+export_all_daily and export_all_monthly build the same energy, demand and flows sets for
+every network region over the same date range. Rather than querying per region, region
+exports are grouped by network, query networks, date range and interval and each query
+is run once for the group with results for every region. The rows are then fanned out into
+the per-region stat sets.
+
+"""
+import logging
+from collections import defaultdict
+from collections.abc import Callable, Iterable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any
+
+from sqlalchemy.sql.elements import TextClause
+
+from opennem import settings
+from opennem.api.export.controllers import (
+    demand_network_region_daily_from_rows,
+    energy_fueltech_daily_from_rows,
+    energy_interconnector_flows_and_emissions_v2_from_rows,
+)
+from opennem.api.export.queries import demand_network_region_query, energy_network_fueltech_query
+from opennem.api.stats.schema import OpennemDataSet
+from opennem.controllers.output.schema import OpennemExportSeries
+from opennem.db import get_database_engine
+from opennem.queries.flows import get_network_flows_emissions_market_value_query
+from opennem.schema.network import NetworkSchema
+
+logger = logging.getLogger("opennem.export.planner")
+
+# column of the network region in the grouped query rows
+ENERGY_REGION_COLUMN = 5
+DEMAND_REGION_COLUMN = 2
+FLOWS_REGION_COLUMN = 2
+
+
+@dataclass
+class RegionExport:
+    network: NetworkSchema
+    network_region: str
+    networks_query: list[NetworkSchema]
+    time_series: OpennemExportSeries
+
+
+@dataclass
+class RegionExportGroup:
+    """Region exports that can share queries"""
+
+    network: NetworkSchema
+    networks_query: list[NetworkSchema]
+    time_series: OpennemExportSeries
+    network_regions: list[str] = field(default_factory=list)
+
+    @property
+    def network_region_query(self) -> str | None:
+        """Filter the queries to the region when there is only the one"""
+        return self.network_regions[0] if len(self.network_regions) == 1 else None
+
+
+def plan_region_exports(region_exports: Iterable[RegionExport]) -> list[RegionExportGroup]:
+    """Group region exports by network, query networks, date range and interval"""
+    groups: dict[tuple, RegionExportGroup] = {}
+
+    for region_export in region_exports:
+        date_range = region_export.time_series.get_range()
+
+        group_key = (
+            region_export.network.code,
+            tuple(sorted(i.code for i in region_export.networks_query)),
+            date_range.start,
+            date_range.end,
+            region_export.time_series.interval.interval_human,
+        )
+
+        if group_key not in groups:
+            groups[group_key] = RegionExportGroup(
+                network=region_export.network,
+                networks_query=region_export.networks_query,
+                time_series=region_export.time_series,
+            )
+
+        groups[group_key].network_regions.append(region_export.network_region)
+
+    logger.info(f"Planned {sum(len(i.network_regions) for i in groups.values())} region exports in {len(groups)} groups")
+
+    return list(groups.values())
+
+
+def get_rows_by_region(query: str | TextClause, region_column: int) -> dict[str, list[Any]]:
+    """Run a query and split the rows by the network region column"""
+    engine = get_database_engine()
+
+    with engine.connect() as c:
+        logger.debug(query)
+        rows = list(c.execute(query))
+
+    rows_by_region: dict[str, list[Any]] = defaultdict(list)
+
+    for row in rows:
+        rows_by_region[row[region_column]].append(row)
+
+    return rows_by_region
+
+
+def build_region_stat_sets(group: RegionExportGroup, include_flows: bool = False) -> dict[str, OpennemDataSet]:
+    """Build the energy, demand and optionally flows sets for every region in the group with a
+    single query each"""
+    time_series = group.time_series
+
+    energy_rows = get_rows_by_region(
+        energy_network_fueltech_query(
+            time_series=time_series,
+            network_region=group.network_region_query,
+            networks_query=list(group.networks_query),
+            group_by_region=True,
+        ),
+        region_column=ENERGY_REGION_COLUMN,
+    )
+
+    demand_rows = get_rows_by_region(
+        demand_network_region_query(
+            time_series=time_series,
+            network_region=group.network_region_query,
+            networks=list(group.networks_query),
+            group_by_region=True,
+        ),
+        region_column=DEMAND_REGION_COLUMN,
+    )
+
+    flows_rows: dict[str, list[Any]] = {}
+
+    if include_flows:
+        flows_rows = get_rows_by_region(
+            get_network_flows_emissions_market_value_query(
+                time_series=time_series,
+                network_region_code=group.network_region_query,
+            ),
+            region_column=FLOWS_REGION_COLUMN,
+        )
+
+    stat_sets: dict[str, OpennemDataSet] = {}
+
+    for network_region in group.network_regions:
+        stat_set = energy_fueltech_daily_from_rows(
+            energy_rows.get(network_region, []), time_series=time_series, network_region_code=network_region
+        )
+
+        if not stat_set:
+            logger.error(f"No energy results for {group.network.code} and {network_region}")
+            continue
+
+        stat_set.append_set(
+            demand_network_region_daily_from_rows(
+                demand_rows.get(network_region, []), time_series=time_series, network_region_code=network_region
+            )
+        )
+
+        if include_flows and (region_flows_rows := flows_rows.get(network_region)):
+            stat_set.append_set(
+                energy_interconnector_flows_and_emissions_v2_from_rows(
+                    region_flows_rows, time_series=time_series, network_region_code=network_region
+                )
+            )
+
+        stat_sets[network_region] = stat_set
+
+    return stat_sets
+
+
+def run_region_exports(func: Callable[[str, OpennemDataSet], None], stat_sets: dict[str, OpennemDataSet]) -> None:
+    """Run func (ie. add weather and write the output) for each region set in parallel over
+    settings.export_workers threads"""
+    with ThreadPoolExecutor(max_workers=settings.export_workers) as executor:
+        futures = {
+            executor.submit(func, network_region, stat_set): network_region for network_region, stat_set in stat_sets.items()
+        }
+
+    for future, network_region in futures.items():
+        if error := future.exception():
+            logger.error(f"Error exporting {network_region}: {error}")
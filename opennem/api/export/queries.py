@@ -1,16 +1,21 @@
+"""
+Queries for the exports and stats
+
+Dates, network and region codes and lists are bound parameters so that the SQL text only
+depends on the shape of the query (the interval, timezone and which filters are used) and
+the compiled and prepared statements are reused. See opennem.queries.utils.bind_query
+"""
 from datetime import timedelta
-from textwrap import dedent
 
-from sqlalchemy import sql
 from sqlalchemy.sql.elements import TextClause
 
-from opennem.api.stats.controllers import networks_to_in
 from opennem.controllers.output.schema import OpennemExportSeries
+from opennem.queries.utils import bind_query
 from opennem.schema.network import NetworkAPVI, NetworkAU, NetworkNEM, NetworkSchema, NetworkWEM
 from opennem.schema.stats import StatTypes
 
 
-def weather_observation_query(time_series: OpennemExportSeries, station_codes: list[str]) -> str:
+def weather_observation_query(time_series: OpennemExportSeries, station_codes: list[str]) -> TextClause:
     # Get the time range using either the old way or the new v4 way
     fence_post_delta: timedelta = timedelta(minutes=0)
 
@@ -52,9 +57,9 @@ def weather_observation_query(time_series: OpennemExportSeries, station_codes: l
 
             from bom_observation fs
             where
-                fs.station_id in ({station_codes}) and
-                fs.observation_time <= '{date_end}' and
-                fs.observation_time >= '{date_start}'
+                fs.station_id = any(:station_codes) and
+                fs.observation_time <= :date_end and
+                fs.observation_time >= :date_start
             group by 1, 2
         ) as t
         group by 1, 2
@@ -64,9 +69,6 @@ def weather_observation_query(time_series: OpennemExportSeries, station_codes: l
         query = __query.format(
             trunc=time_series.interval.trunc,
             tz=time_series.network.timezone_database,
-            station_codes=",".join([f"'{i}'" for i in station_codes]),
-            date_start=date_start,
-            date_end=date_end,
         )
 
     else:
@@ -92,24 +94,20 @@ def weather_observation_query(time_series: OpennemExportSeries, station_codes: l
 
         from bom_observation fs
         where
-            fs.station_id in ({station_codes}) and
-            fs.observation_time <= '{date_end}' and
-            fs.observation_time >= '{date_start}'
+            fs.station_id = any(:station_codes) and
+            fs.observation_time <= :date_end and
+            fs.observation_time >= :date_start
         group by 1, 2
         order by 1 desc;
         """
 
-        query = __query.format(
-            station_codes=",".join([f"'{i}'" for i in station_codes]),
-            date_start=date_start,
-            date_end=date_end - fence_post_delta,
-            tz=time_series.network.timezone_database,
-        )
+        query = __query
+        date_end = date_end - fence_post_delta
 
-    return dedent(query)
+    return bind_query(query, station_codes=station_codes, date_start=date_start, date_end=date_end)
 
 
-def interconnector_power_flow(time_series: OpennemExportSeries, network_region: str) -> str:
+def interconnector_power_flow(time_series: OpennemExportSeries, network_region: str) -> TextClause:
     """Get interconnector region flows using materialized view"""
 
     ___query = """
@@ -126,10 +124,10 @@ def interconnector_power_flow(time_series: OpennemExportSeries, network_region:
         end as exports
     from balancing_summary bs
     where
-        bs.network_id = '{network_id}' and
-        bs.network_region= '{region}' and
-        bs.trading_interval <= '{date_end}' and
-        bs.trading_interval >= '{date_start}'
+        bs.network_id = :network_id and
+        bs.network_region = :network_region and
+        bs.trading_interval <= :date_end and
+        bs.trading_interval >= :date_start
     group by 1, 2
     order by trading_interval desc;
 
@@ -140,17 +138,16 @@ def interconnector_power_flow(time_series: OpennemExportSeries, network_region:
     date_max = time_series_range.end
     date_min = time_series_range.start
 
-    query = ___query.format(
+    return bind_query(
+        ___query,
         network_id=time_series.network.code,
-        region=network_region,
+        network_region=network_region,
         date_start=date_min,
         date_end=date_max,
     )
 
-    return dedent(query)
-
 
-def interconnector_flow_network_regions_query(time_series: OpennemExportSeries, network_region: str | None = None) -> str:
+def interconnector_flow_network_regions_query(time_series: OpennemExportSeries, network_region: str | None = None) -> TextClause:
     """ """
 
     __query = """
@@ -172,9 +169,9 @@ def interconnector_flow_network_regions_query(time_series: OpennemExportSeries,
         left join facility f on fs.facility_code = f.code
         where
             f.interconnector is True
-            and f.network_id='{network_id}'
-            and fs.trading_interval <= '{date_end}'
-            and fs.trading_interval >= '{date_start}'
+            and f.network_id = :network_id
+            and fs.trading_interval <= :date_end
+            and fs.trading_interval >= :date_start
             {region_query}
         group by 1, 2, 3, 4
     ) as t
@@ -187,7 +184,7 @@ def interconnector_flow_network_regions_query(time_series: OpennemExportSeries,
     region_query = ""
 
     if network_region:
-        region_query = f"and f.network_region='{network_region}'"
+        region_query = "and f.network_region = :network_region"
 
     # Get the time range using either the old way or the new v4 way
     time_series_range = time_series.get_range()
@@ -197,29 +194,31 @@ def interconnector_flow_network_regions_query(time_series: OpennemExportSeries,
     query = __query.format(
         timezone=time_series.network.timezone_database,
         interval_size=time_series.interval.interval_sql,
-        network_id=time_series.network.code,
         region_query=region_query,
+    )
+
+    return bind_query(
+        query,
+        network_id=time_series.network.code,
+        network_region=network_region,
         date_start=date_min,
         date_end=date_max,
     )
 
-    return dedent(query)
-
 
 def country_stats_query(stat_type: StatTypes, country: str = "au") -> TextClause:
-    return sql.text(
-        dedent(
-            """
-                select
-                    s.stat_date,
-                    s.value,
-                    s.stat_type
-                from stats s
-                where s.stat_type = :stat_type and s.country= :country
-                order by s.stat_date desc
-           """
-        )
-    ).bindparams(
+    __query = """
+        select
+            s.stat_date,
+            s.value,
+            s.stat_type
+        from stats s
+        where s.stat_type = :stat_type and s.country= :country
+        order by s.stat_date desc
+    """
+
+    return bind_query(
+        __query,
         stat_type=str(stat_type),
         country=country,
     )
@@ -230,7 +229,7 @@ def price_network_query(
     group_field: str = "bs.network_id",
     network_region: str | None = None,
     networks_query: list[NetworkSchema] | None = None,
-) -> str:
+) -> TextClause:
     if not networks_query:
         networks_query = [time_series.network]
 
@@ -244,24 +243,21 @@ def price_network_query(
             coalesce(avg(bs.price_dispatch), avg(bs.price)) as price
         from balancing_summary bs
         where
-            bs.trading_interval <= '{date_max}' and
-            bs.trading_interval >= '{date_min}' and
-            {network_query}
+            bs.trading_interval <= :date_max and
+            bs.trading_interval >= :date_min and
+            bs.network_id = any(:network_ids) and
             {network_region_query}
             1=1
         group by 1, 2
         order by 1 desc
     """
 
-    timezone = time_series.network.timezone_database
     network_region_query = ""
 
     if network_region:
-        network_region_query = f"bs.network_region='{network_region}' and "
+        network_region_query = "bs.network_region = :network_region and "
         group_field = "bs.network_region"
 
-    network_query = f"bs.network_id IN ({networks_to_in(networks_query)}) and "
-
     if len(networks_query) > 1:
         group_field = "'AU'"
 
@@ -270,16 +266,18 @@ def price_network_query(
     date_max = time_series_range.end
     date_min = time_series_range.start
 
-    return dedent(
-        __query.format(
-            network_query=network_query,
-            trunc=time_series.interval.interval_sql,
-            network_region_query=network_region_query,
-            timezone=timezone,
-            date_max=date_max,
-            date_min=date_min,
-            group_field=group_field,
-        )
+    query = __query.format(
+        trunc=time_series.interval.interval_sql,
+        network_region_query=network_region_query,
+        group_field=group_field,
+    )
+
+    return bind_query(
+        query,
+        network_ids=[i.code for i in networks_query],
+        network_region=network_region,
+        date_max=date_max,
+        date_min=date_min,
     )
 
 
@@ -287,7 +285,7 @@ def network_demand_query(
     time_series: OpennemExportSeries,
     network_region: str | None = None,
     networks_query: list[NetworkSchema] | None = None,
-) -> str:
+) -> TextClause:
     if not networks_query:
         networks_query = [time_series.network]
 
@@ -306,9 +304,9 @@ def network_demand_query(
             coalesce(max(demand_total), 0) as demand
         from balancing_summary bs
         where
-            bs.trading_interval <= '{date_max}' and
-            bs.trading_interval >= '{date_min}' and
-            {network_query}
+            bs.trading_interval <= :date_max and
+            bs.trading_interval >= :date_min and
+            bs.network_id = any(:network_ids) and
             {network_region_query}
             1=1
         group by
@@ -322,12 +320,10 @@ def network_demand_query(
 
     if network_region:
         group_keys.append("network_region")
-        network_region_query = f"bs.network_region = '{network_region}' and "
+        network_region_query = "bs.network_region = :network_region and "
 
     groups_additional = ", ".join(group_keys)
 
-    network_query = f"bs.network_id IN ({networks_to_in(networks_query)}) and "
-
     # Get the time range using either the old way or the new v4 way
     time_series_range = time_series.get_range()
     date_max = time_series_range.end
@@ -336,22 +332,24 @@ def network_demand_query(
     query = __query.format(
         timezone=time_series.network.timezone_database,
         interval=time_series.interval.interval_sql,
-        date_max=date_max,
-        date_min=date_min,
-        network_id=time_series.network.code,
-        network_query=network_query,
         network_region_query=network_region_query,
         groups_additional=groups_additional,
     )
 
-    return dedent(query)
+    return bind_query(
+        query,
+        network_ids=[i.code for i in networks_query],
+        network_region=network_region,
+        date_max=date_max,
+        date_min=date_min,
+    )
 
 
 def power_network_fueltech_query(
     time_series: OpennemExportSeries,
     network_region: str | None = None,
     networks_query: list[NetworkSchema] | None = None,
-) -> str:
+) -> TextClause:
     """Query power stats"""
 
     if not networks_query:
@@ -376,12 +374,11 @@ def power_network_fueltech_query(
         where
             fs.is_forecast is False and
             f.fueltech_id is not null and
-            f.fueltech_id not in ({fueltechs_exclude}) and
-            {network_query}
+            f.fueltech_id <> all(:fueltechs_exclude) and
+            (f.network_id = any(:network_ids) {wem_apvi_case}) and
             {network_region_query}
-            fs.trading_interval <= '{date_max}' and
-            fs.trading_interval >= '{date_min}'
-            {fueltech_filter}
+            fs.trading_interval <= :date_max and
+            fs.trading_interval >= :date_min
         group by 1, f.code, 2
     ) as t
     group by 1, 2
@@ -389,9 +386,7 @@ def power_network_fueltech_query(
     """
 
     network_region_query: str = ""
-    fueltech_filter: str = ""
     wem_apvi_case: str = ""
-    timezone: str = time_series.network.timezone_database
 
     fueltechs_excluded = ["exports", "imports", "interconnector"]
 
@@ -399,7 +394,7 @@ def power_network_fueltech_query(
         fueltechs_excluded.append("solar_rooftop")
 
     if network_region:
-        network_region_query = f"f.network_region='{network_region}' and "
+        network_region_query = "f.network_region = :network_region and "
 
     if NetworkWEM in networks_query:
         # silly single case we'll refactor out
@@ -407,39 +402,33 @@ def power_network_fueltech_query(
         # in country-wide totals
         wem_apvi_case = "or (f.network_id='APVI' and f.network_region='WEM')"
 
-    network_query = f"(f.network_id IN ({networks_to_in(networks_query)}) {wem_apvi_case}) and "
-
     # Get the data time range
     # use the new v2 feature if it has been provided otherwise use the old method
     time_series_range = time_series.get_range()
     date_max = time_series_range.end
     date_min = time_series_range.start
 
-    # If we have a fueltech filter, add it to the query
-    fueltechs_exclude = ", ".join(f"'{i}'" for i in fueltechs_excluded)
-
-    query = dedent(
-        __query.format(
-            network_query=network_query,
-            trunc=time_series.interval.interval_sql,
-            network_region_query=network_region_query,
-            timezone=timezone,
-            date_max=date_max,
-            date_min=date_min,
-            fueltech_filter=fueltech_filter,
-            wem_apvi_case=wem_apvi_case,
-            fueltechs_exclude=fueltechs_exclude,
-        )
+    query = __query.format(
+        trunc=time_series.interval.interval_sql,
+        network_region_query=network_region_query,
+        wem_apvi_case=wem_apvi_case,
     )
 
-    return query
+    return bind_query(
+        query,
+        network_ids=[i.code for i in networks_query],
+        network_region=network_region,
+        fueltechs_exclude=fueltechs_excluded,
+        date_max=date_max,
+        date_min=date_min,
+    )
 
 
 def power_network_rooftop_query(
     time_series: OpennemExportSeries,
     network_region: str | None = None,
     networks_query: list[NetworkSchema] | None = None,
-) -> str:
+) -> TextClause:
     """Query power stats"""
 
     if not networks_query:
@@ -465,10 +454,10 @@ def power_network_rooftop_query(
             where
                 {forecast_query}
                 f.fueltech_id = 'solar_rooftop' and
-                {network_query}
+                (f.network_id = any(:network_ids) {wem_apvi_case}) and
                 {network_region_query}
-                fs.trading_interval >= '{date_min}' and
-                fs.trading_interval < '{date_max}'
+                fs.trading_interval >= :date_min and
+                fs.trading_interval < :date_max
             group by 1, 2
         ) as t
         group by 1, 2
@@ -483,7 +472,7 @@ def power_network_rooftop_query(
     forecast_query = f"fs.is_forecast is {time_series.forecast} and"
 
     if network_region:
-        network_region_query = f"f.network_region='{network_region}' and "
+        network_region_query = "f.network_region = :network_region and "
 
     if NetworkWEM in networks_query:
         # silly single case we'll refactor out
@@ -497,8 +486,6 @@ def power_network_rooftop_query(
         if NetworkNEM not in networks_query:
             agg_func = "max"
 
-    network_query = f"(f.network_id IN ({networks_to_in(networks_query)}) {wem_apvi_case}) and "
-
     # Get the time range using either the old way or the new v4 way
     time_series_range = time_series.get_range()
     date_min = time_series_range.start
@@ -508,16 +495,20 @@ def power_network_rooftop_query(
         # @TODO move to purely in get_range()
         date_max = date_min + timedelta(hours=12)
 
-    return dedent(
-        __query.format(
-            network_query=network_query,
-            network_region_query=network_region_query,
-            timezone=timezone,
-            date_min=date_min,
-            date_max=date_max,
-            forecast_query=forecast_query,
-            agg_func=agg_func,
-        )
+    query = __query.format(
+        wem_apvi_case=wem_apvi_case,
+        network_region_query=network_region_query,
+        timezone=timezone,
+        forecast_query=forecast_query,
+        agg_func=agg_func,
+    )
+
+    return bind_query(
+        query,
+        network_ids=[i.code for i in networks_query],
+        network_region=network_region,
+        date_min=date_min,
+        date_max=date_max,
     )
 
 
@@ -527,7 +518,7 @@ def power_network_rooftop_query(
 def power_and_emissions_network_fueltech_query(
     time_series: OpennemExportSeries,
     network_region: str | None = None,
-) -> str:
+) -> TextClause:
     """Query emission stats for each network and fueltech"""
 
     __query = """
@@ -559,11 +550,10 @@ def power_and_emissions_network_fueltech_query(
             where
                 fs.is_forecast is False and
                 f.fueltech_id is not null and
-                {network_query}
+                f.network_id = :network_id and
                 {network_region_query}
-                fs.trading_interval <= '{date_max}' and
-                fs.trading_interval >= '{date_min}'
-                {fueltech_filter}
+                fs.trading_interval <= :date_max and
+                fs.trading_interval >= :date_min
             group by 1, f.code, 2
         ) as t
         group by 1, 2
@@ -571,45 +561,181 @@ def power_and_emissions_network_fueltech_query(
     """
 
     network_region_query: str = ""
-    fueltech_filter: str = ""
     timezone: str = time_series.network.timezone_database
 
-    fueltechs_excluded = ["exports", "imports", "interconnector", "solar_rooftop", "solar_utility", "wind"]
-
     if network_region:
-        network_region_query = f"f.network_region='{network_region}' and "
-
-    network_query = f"f.network_id ='{time_series.network.code}' and"
+        network_region_query = "f.network_region = :network_region and "
 
     # Get the time range using either the old way or the new v4 way
     time_series_range = time_series.get_range()
     date_max = time_series_range.end
     date_min = time_series_range.start
 
-    fueltechs_exclude = ", ".join(f"'{i}'" for i in fueltechs_excluded)
-
-    query = dedent(
-        __query.format(
-            network_query=network_query,
-            trunc=time_series.interval.interval_sql,
-            network_region_query=network_region_query,
-            timezone=timezone,
-            date_max=date_max,
-            date_min=date_min,
-            fueltech_filter=fueltech_filter,
-            fueltechs_exclude=fueltechs_exclude,
-            intervals_per_hour=time_series.network.intervals_per_hour,
-        )
+    query = __query.format(
+        trunc=time_series.interval.interval_sql,
+        network_region_query=network_region_query,
+        timezone=timezone,
+        intervals_per_hour=time_series.network.intervals_per_hour,
+    )
+
+    return bind_query(
+        query,
+        network_id=time_series.network.code,
+        network_region=network_region,
+        date_max=date_max,
+        date_min=date_min,
     )
 
-    return query
+
+def power_network_fueltech_intervals_query(
+    time_series: OpennemExportSeries,
+    network_region: str | None = None,
+    networks_query: list[NetworkSchema] | None = None,
+) -> TextClause:
+    """Query power stats from the at_network_fueltech_intervals aggregate
+
+    Returns the same rows as power_network_fueltech_query. At the interval the data is
+    reported at the values are the same - longer intervals average the fueltech totals
+    rather than each facility"""
+
+    if not networks_query:
+        networks_query = [time_series.network]
+
+    if time_series.network not in networks_query:
+        networks_query.append(time_series.network)
+
+    __query = """
+    select
+        time_bucket_gapfill('{trunc}', t.trading_interval, :date_min, :date_max) as trading_interval,
+        t.fueltech_id,
+        coalesce(avg(t.fueltech_power), 0)
+    from (
+        select
+            fi.trading_interval,
+            fi.fueltech_id,
+            sum(fi.power) as fueltech_power
+        from at_network_fueltech_intervals fi
+        where
+            fi.fueltech_id <> all(:fueltechs_exclude) and
+            (fi.network_id = any(:network_ids) {wem_apvi_case}) and
+            {network_region_query}
+            fi.trading_interval <= :date_max and
+            fi.trading_interval >= :date_min
+        group by 1, 2
+    ) as t
+    group by 1, 2
+    order by 1 desc
+    """
+
+    network_region_query: str = ""
+    wem_apvi_case: str = ""
+
+    fueltechs_excluded = ["exports", "imports", "interconnector"]
+
+    if NetworkNEM in networks_query or NetworkWEM in networks_query:
+        fueltechs_excluded.append("solar_rooftop")
+
+    if network_region:
+        network_region_query = "fi.network_region = :network_region and "
+
+    if NetworkWEM in networks_query:
+        # APVI network is used to provide rooftop for WEM
+        wem_apvi_case = "or (fi.network_id='APVI' and fi.network_region='WEM')"
+
+    time_series_range = time_series.get_range()
+
+    query = __query.format(
+        trunc=time_series.interval.interval_sql,
+        network_region_query=network_region_query,
+        wem_apvi_case=wem_apvi_case,
+    )
+
+    return bind_query(
+        query,
+        network_ids=[i.code for i in networks_query],
+        network_region=network_region,
+        fueltechs_exclude=fueltechs_excluded,
+        date_max=time_series_range.end,
+        date_min=time_series_range.start,
+    )
+
+
+def power_and_emissions_network_fueltech_intervals_query(
+    time_series: OpennemExportSeries,
+    network_region: str | None = None,
+) -> TextClause:
+    """Query power and emission stats for each fueltech from the at_network_fueltech_intervals
+    aggregate
+
+    Returns the same rows as power_and_emissions_network_fueltech_query. Longer intervals than
+    the data is reported at take the maximum of the fueltech total power"""
+
+    __query = """
+        select
+            g.trading_interval at time zone '{timezone}',
+            g.fueltech_id,
+            g.fueltech_power,
+            g.emissions,
+            case
+                when g.fueltech_power <= 0
+                    then 0
+                else
+                    g.emissions / g.fueltech_power * {intervals_per_hour}
+            end
+        from (
+            select
+                time_bucket_gapfill('{trunc}', t.trading_interval, :date_min, :date_max) as trading_interval,
+                t.fueltech_id,
+                coalesce(max(t.fueltech_power), 0) as fueltech_power,
+                coalesce(sum(t.emissions), 0) as emissions
+            from
+            (
+                select
+                    fi.trading_interval,
+                    fi.fueltech_id,
+                    sum(fi.power) as fueltech_power,
+                    sum(fi.emissions) as emissions
+                from at_network_fueltech_intervals fi
+                where
+                    fi.network_id = :network_id and
+                    {network_region_query}
+                    fi.trading_interval <= :date_max and
+                    fi.trading_interval >= :date_min
+                group by 1, 2
+            ) as t
+            group by 1, 2
+        ) as g
+        order by 1 desc;
+    """
+
+    network_region_query: str = ""
+
+    if network_region:
+        network_region_query = "fi.network_region = :network_region and "
+
+    time_series_range = time_series.get_range()
+
+    query = __query.format(
+        trunc=time_series.interval.interval_sql,
+        network_region_query=network_region_query,
+        timezone=time_series.network.timezone_database,
+        intervals_per_hour=time_series.network.intervals_per_hour,
+    )
+
+    return bind_query(
+        query,
+        network_id=time_series.network.code,
+        network_region=network_region,
+        date_max=time_series_range.end,
+        date_min=time_series_range.start,
+    )
 
 
 def power_network_interconnector_emissions_query(
     time_series: OpennemExportSeries,
     network_region: str | None = None,
     networks_query: list[NetworkSchema] | None = None,
-) -> str:
+) -> TextClause:
     """
     Get emissions for a network or network + region
     based on a year
@@ -653,9 +779,9 @@ def power_network_interconnector_emissions_query(
             coalesce(t.market_value_exports, 0) as market_value_exports
         from at_network_flows t
         where
-            t.trading_interval <= '{date_max}' and
-            t.trading_interval >= '{date_min}' and
-            t.network_id = '{network_id}' and
+            t.trading_interval <= :date_max and
+            t.trading_interval >= :date_min and
+            t.network_id = :network_id
             {network_region_query}
     ) as t
     group by 1
@@ -677,24 +803,23 @@ def power_network_interconnector_emissions_query(
     date_min = time_series_range.start
 
     if network_region:
-        network_region_query = f"""
-            t.network_region = '{network_region}'
-        """
+        network_region_query = "and t.network_region = :network_region"
 
-    query = dedent(
-        __query.format(
-            energy_scale=energy_scale,
-            emissions_scale=emissions_scale,
-            market_value_scale=market_value_scale,
-            timezone=timezone,
-            network_id=time_series.network.code,
-            date_min=date_min,
-            date_max=date_max,
-            network_region_query=network_region_query,
-        )
+    query = __query.format(
+        energy_scale=energy_scale,
+        emissions_scale=emissions_scale,
+        market_value_scale=market_value_scale,
+        timezone=timezone,
+        network_region_query=network_region_query,
     )
 
-    return query
+    return bind_query(
+        query,
+        network_id=time_series.network.code,
+        network_region=network_region,
+        date_min=date_min,
+        date_max=date_max,
+    )
 
 
 """
@@ -703,9 +828,13 @@ Demand queries
 
 
 def demand_network_region_query(
-    time_series: OpennemExportSeries, network_region: str | None, networks: list[NetworkSchema] | None = None
-) -> str:
-    """Get the network demand energy and market_value"""
+    time_series: OpennemExportSeries,
+    network_region: str | None,
+    networks: list[NetworkSchema] | None = None,
+    group_by_region: bool = False,
+) -> TextClause:
+    """Get the network demand energy and market_value. With group_by_region the results
+    for every region are returned in one query"""
 
     ___query = """
         select
@@ -716,21 +845,23 @@ def demand_network_region_query(
             round(sum(demand_market_value), 4)
         from at_network_demand
         where
-            {network_query}
+            network_id = any(:network_ids) and
             {network_region}
-            trading_day >= '{date_min}' and
-            trading_day <= '{date_max}'
+            trading_day >= :date_min and
+            trading_day <= :date_max
         group by 1,2 {group_by}
         order by
             1 asc
     """
 
     network_region_query = ""
-    network_region_select = f"'{time_series.network.code}' as network_region,"
+    network_region_select = "cast(:network_id as text) as network_region,"
     group_by = ""
 
     if network_region:
-        network_region_query = f"network_region='{network_region}' and"
+        network_region_query = "network_region = :network_region and"
+
+    if network_region or group_by_region:
         network_region_select = "network_region,"
         group_by = ",3"
 
@@ -739,21 +870,20 @@ def demand_network_region_query(
     date_max = time_series_range.end
     date_min = time_series_range.start
 
-    networks_list = networks_to_in(time_series.network.get_networks_query())
-
-    network_query = f"network_id IN ({networks_list}) and "
+    query = ___query.format(
+        trunc=time_series.interval.trunc,
+        network_region=network_region_query,
+        network_region_select=network_region_select,
+        group_by=group_by,
+    )
 
-    return dedent(
-        ___query.format(
-            trunc=time_series.interval.trunc,
-            date_min=date_min,
-            date_max=date_max,
-            network_id=time_series.network.code,
-            network_region=network_region_query,
-            network_region_select=network_region_select,
-            group_by=group_by,
-            network_query=network_query,
-        )
+    return bind_query(
+        query,
+        network_ids=[i.code for i in time_series.network.get_networks_query()],
+        network_id=time_series.network.code,
+        network_region=network_region,
+        date_min=date_min,
+        date_max=date_max,
     )
 
 
@@ -767,10 +897,14 @@ def energy_network_fueltech_query(
     network_region: str | None = None,
     networks_query: list[NetworkSchema] | None = None,
     coalesce_with: int | None = None,
-) -> str:
+    group_by_region: bool = False,
+) -> TextClause:
     """
     Get Energy for a network or network + region
     based on a year
+
+    With group_by_region the results for every region are returned in one query with
+    the network region as the last column
     """
 
     if not networks_query:
@@ -786,29 +920,37 @@ def energy_network_fueltech_query(
         sum(t.fueltech_energy),
         sum(t.fueltech_market_value),
         sum(t.fueltech_emissions)
+        {region_select}
     from
     (
         select
             time_bucket_gapfill('1d', t.trading_day) as trading_day,
             t.fueltech_id,
-            coalesce(sum(t.energy) / 1000, {coalesce_with}) as fueltech_energy,
-            coalesce(sum(t.market_value), {coalesce_with}) as fueltech_market_value,
-            coalesce(sum(t.emissions), {coalesce_with}) as fueltech_emissions
+            coalesce(sum(t.energy) / 1000, :coalesce_with) as fueltech_energy,
+            coalesce(sum(t.market_value), :coalesce_with) as fueltech_market_value,
+            coalesce(sum(t.emissions), :coalesce_with) as fueltech_emissions
+            {region_select}
         from at_facility_daily t
         where
-            t.trading_day <= '{date_max}'::date and
-            t.trading_day >= '{date_min}'::date and
+            t.trading_day <= cast(:date_max as date) and
+            t.trading_day >= cast(:date_min as date) and
             t.fueltech_id not in ('imports', 'exports', 'interconnector') and
-            {network_query}
+            (t.network_id = any(:network_ids) {network_apvi_wem}) and
             {network_region_query}
             1=1
-        group by 1, 2
+        group by 1, 2 {region_group_by}
     ) as t
-    group by 1, 2
+    group by 1, 2 {region_group_by}
     order by 1 desc;
     """
 
     network_region_query = ""
+    region_select = ""
+    region_group_by = ""
+
+    if group_by_region:
+        region_select = ", t.network_region"
+        region_group_by = ", 6"
 
     # Get the time range using either the old way or the new v4 way
     time_series_range = time_series.get_range()
@@ -818,7 +960,7 @@ def energy_network_fueltech_query(
     trunc = time_series_range.interval.trunc
 
     if network_region:
-        network_region_query = f"t.network_region='{network_region}' and"
+        network_region_query = "t.network_region = :network_region and"
 
     # @NOTE special case for WEM to only include APVI data for that network/region
     # and not double-count all of AU
@@ -830,19 +972,22 @@ def energy_network_fueltech_query(
         if NetworkAPVI in networks_query:
             networks_query.pop(networks_query.index(NetworkAPVI))
 
-    networks_list = networks_to_in(networks_query)
-
-    network_query = f"(t.network_id IN ({networks_list}) {network_apvi_wem}) and "
+    query = __query.format(
+        trunc=trunc,
+        network_apvi_wem=network_apvi_wem,
+        network_region_query=network_region_query,
+        region_select=region_select,
+        region_group_by=region_group_by,
+    )
 
-    return dedent(
-        __query.format(
-            trunc=trunc,
-            date_min=date_min,
-            date_max=date_max,
-            network_query=network_query,
-            network_region_query=network_region_query,
-            coalesce_with=coalesce_with or "NULL",
-        )
+    return bind_query(
+        query,
+        network_ids=[i.code for i in networks_query],
+        network_region=network_region,
+        coalesce_with=coalesce_with or None,
+        # bound as dates so the network day isn't shifted by the session time zone
+        date_min=date_min.date(),
+        date_max=date_max.date(),
     )
 
 
@@ -850,7 +995,7 @@ def energy_network_interconnector_emissions_query(
     time_series: OpennemExportSeries,
     network_region: str | None = None,
     networks_query: list[NetworkSchema] | None = None,
-) -> str:
+) -> TextClause:
     """
     Get emissions for a network or network + region
     based on a year
@@ -884,9 +1029,9 @@ def energy_network_interconnector_emissions_query(
             coalesce(t.market_value_exports, 0) as market_value_exports
         from at_network_flows t
         where
-            t.trading_interval <= '{date_max}' and
-            t.trading_interval >= '{date_min}' and
-            t.network_id = '{network_id}' and
+            t.trading_interval <= :date_max and
+            t.trading_interval >= :date_min and
+            t.network_id = :network_id
             {network_region_query}
     ) as t
     group by 1
@@ -904,17 +1049,18 @@ def energy_network_interconnector_emissions_query(
     date_min = time_series_range.start
 
     if network_region:
-        network_region_query = f"""
-            t.network_region = '{network_region}'
-        """
+        network_region_query = "and t.network_region = :network_region"
 
-    return dedent(
-        __query.format(
-            timezone=timezone,
-            trunc=interval_trunc,
-            network_id=time_series.network.code,
-            date_min=date_min,
-            date_max=date_max,
-            network_region_query=network_region_query,
-        )
+    query = __query.format(
+        timezone=timezone,
+        trunc=interval_trunc,
+        network_region_query=network_region_query,
+    )
+
+    return bind_query(
+        query,
+        network_id=time_series.network.code,
+        network_region=network_region,
+        date_min=date_min,
+        date_max=date_max,
     )
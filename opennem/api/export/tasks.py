@@ -12,6 +12,7 @@ require the API
 import contextlib
 import logging
 from datetime import datetime, timedelta
+from functools import partial
 
 from opennem import settings
 from opennem.api.export.controllers import (
@@ -26,8 +27,10 @@ from opennem.api.export.controllers import (
     power_week,
     weather_daily,
 )
+from opennem.api.export.live import get_tail_start, live_export_cache, merge_tail_stat_set
 from opennem.api.export.map import PriorityType, StatExport, StatType, get_export_map
-from opennem.api.export.utils import write_output
+from opennem.api.export.planner import RegionExport, build_region_stat_sets, plan_region_exports, run_region_exports
+from opennem.api.export.utils import flush_outputs, submit_output, write_output
 from opennem.api.stats.controllers import get_scada_range, get_scada_range_optimized
 from opennem.api.stats.schema import OpennemDataSet, ScadaDateRange
 from opennem.api.time import human_to_interval, human_to_period
@@ -55,6 +58,88 @@ from opennem.utils.version import get_version
 logger = logging.getLogger("opennem.export.tasks")
 
 
+def power_stat_set(power_stat: StatExport, time_series: OpennemExportSeries) -> OpennemDataSet | None:
+    """Build the power, demand, flows and weather set for a power stat export over a time series"""
+    stat_set = power_week(
+        time_series=time_series,
+        network_region_code=power_stat.network_region_query or power_stat.network_region or None,
+        networks_query=power_stat.networks,
+    )
+
+    if not stat_set:
+        return None
+
+    demand_set = demand_week(
+        time_series=time_series,
+        networks_query=power_stat.networks,
+        network_region_code=power_stat.network_region_query or power_stat.network_region,
+    )
+
+    stat_set.append_set(demand_set)
+
+    if power_stat.network_region:
+        # @NOTE feature flag on flows + emissions + mv from aggregate tables
+        if settings.opennem_power_flows:
+            if flow_set := power_flows_per_interval(time_series=time_series, network_region_code=power_stat.network_region):
+                stat_set.append_set(flow_set)
+        else:
+            if flow_set := power_flows_region_week(
+                time_series=time_series,
+                network_region_code=power_stat.network_region,
+            ):
+                stat_set.append_set(flow_set)
+
+    time_series_weather = time_series.copy()
+    time_series_weather.interval = human_to_interval("30m")
+
+    if power_stat.bom_station:
+        with contextlib.suppress(Exception):
+            weather_set = weather_daily(
+                time_series=time_series_weather,
+                station_code=power_stat.bom_station,
+                network_region=power_stat.network_region,
+                include_min_max=False,
+                unit_name="temperature",
+                network=power_stat.network,
+            )
+            stat_set.append_set(weather_set)
+
+    return stat_set
+
+
+def power_stat_set_tail(power_stat: StatExport, time_series: OpennemExportSeries) -> OpennemDataSet | None:
+    """Build a power stat export from the last published set by querying only the new
+    intervals. Returns None when the export needs a full rebuild"""
+    published = live_export_cache.get(power_stat.path)
+
+    if not published:
+        return None
+
+    tail_start = get_tail_start(published, interval=time_series.interval.get_timedelta())
+
+    if not tail_start:
+        return None
+
+    time_series_tail = OpennemExportSeries(
+        start=tail_start,
+        end=time_series.end,
+        network=time_series.network,
+        interval=time_series.interval,
+    )
+
+    tail_set = power_stat_set(power_stat, time_series_tail)
+
+    if not tail_set:
+        return None
+
+    return merge_tail_stat_set(published, tail_set, window_start=time_series.get_range().start)
+
+
+def is_live_tail_export(power_stat: StatExport) -> bool:
+    """Live tail only applies to rolling period exports"""
+    return bool(power_stat.period) and not power_stat.year and not power_stat.week
+
+
 @profile_task(
     send_slack=False,
     level=ProfilerLevel.NOISY,
@@ -64,10 +149,13 @@ def export_power(
     stats: list[StatExport] | None = None,
     priority: PriorityType | None = None,
     latest: bool | None = False,
+    incremental: bool | None = None,
 ) -> None:
     """
     Export power stats from the export map
 
+    With incremental set (defaults to settings.export_power_incremental) rolling
+    period exports are built from the last published set. See opennem.api.export.live
 
     """
 
@@ -80,9 +168,12 @@ def export_power(
 
         stats = export_map.resources
 
+    if incremental is None:
+        incremental = settings.export_power_incremental
+
     output_count: int = 0
 
-    logger.info(f"Running export_power {latest=} {priority} with {len(stats)} stats")
+    logger.info(f"Running export_power {latest=} {incremental=} {priority} with {len(stats)} stats")
 
     for power_stat in stats:
         if power_stat.stat_type != StatType.power:
@@ -114,51 +205,22 @@ def export_power(
             period=power_stat.period,
         )
 
-        stat_set = power_week(
-            time_series=time_series,
-            network_region_code=power_stat.network_region_query or power_stat.network_region or None,
-            networks_query=power_stat.networks,
-        )
+        live_tail = incremental and is_live_tail_export(power_stat)
+
+        stat_set = power_stat_set_tail(power_stat, time_series) if live_tail else None
+        rebuilt = stat_set is None
+
+        if not stat_set:
+            stat_set = power_stat_set(power_stat, time_series)
 
         if not stat_set:
             logger.info(f"No power stat set for {power_stat.period} {power_stat.networks} {power_stat.network_region}")
 
             continue
 
-        demand_set = demand_week(
-            time_series=time_series,
-            networks_query=power_stat.networks,
-            network_region_code=power_stat.network_region_query or power_stat.network_region,
-        )
-
-        stat_set.append_set(demand_set)
+        if live_tail:
+            live_export_cache.set(power_stat.path, stat_set, rebuilt=rebuilt)
 
-        if power_stat.network_region:
-            # @NOTE feature flag on flows + emissions + mv from aggregate tables
-            if settings.opennem_power_flows:
-                if flow_set := power_flows_per_interval(time_series=time_series, network_region_code=power_stat.network_region):
-                    stat_set.append_set(flow_set)
-            else:
-                if flow_set := power_flows_region_week(
-                    time_series=time_series,
-                    network_region_code=power_stat.network_region,
-                ):
-                    stat_set.append_set(flow_set)
-
-        time_series_weather = time_series.copy()
-        time_series_weather.interval = human_to_interval("30m")
-
-        if power_stat.bom_station:
-            with contextlib.suppress(Exception):
-                weather_set = weather_daily(
-                    time_series=time_series_weather,
-                    station_code=power_stat.bom_station,
-                    network_region=power_stat.network_region,
-                    include_min_max=False,
-                    unit_name="temperature",
-                    network=power_stat.network,
-                )
-                stat_set.append_set(weather_set)
         write_output(power_stat.path, stat_set)
         output_count += 1
 
@@ -272,7 +334,7 @@ def export_energy(
             else:
                 logger.info("Stat set has no bom station")
 
-            write_output(energy_stat.path, stat_set)
+            submit_output(energy_stat.path, stat_set)
 
         elif energy_stat.period and energy_stat.period.period_human == "all" and not latest:
             time_series.period = human_to_period("all")
@@ -315,7 +377,10 @@ def export_energy(
                 except Exception:
                     pass
 
-            write_output(energy_stat.path, stat_set)
+            submit_output(energy_stat.path, stat_set)
+
+    # yearly exports are uploaded in parallel and mostly unchanged day to day
+    flush_outputs()
 
 
 def export_all_monthly(networks: list[NetworkSchema] | None = None, network_region_code: str | None = None) -> None:
@@ -330,6 +395,8 @@ def export_all_monthly(networks: list[NetworkSchema] | None = None, network_regi
     if not networks:
         networks = [NetworkNEM, NetworkWEM]
 
+    region_exports: list[RegionExport] = []
+
     for network in networks:
         # 1. Setup network regions for each network
         network_regions_query = session.query(NetworkRegion).filter(NetworkRegion.network_id == network.code)
@@ -350,56 +417,51 @@ def export_all_monthly(networks: list[NetworkSchema] | None = None, network_regi
         #     networks += network.subnetworks
 
         # # @TODO replace this with NetworkSchema->subnetworks
-        networks = [NetworkNEM, NetworkAEMORooftop, NetworkAEMORooftopBackfill]
+        networks_query = [NetworkNEM, NetworkAEMORooftop, NetworkAEMORooftopBackfill]
 
         if network.code == "WEM":
-            networks = [NetworkWEM, NetworkAPVI]
+            networks_query = [NetworkWEM, NetworkAPVI]
 
         # @TODO replace with data_first_seen and current date
         scada_range = get_scada_range_optimized(network=network)
 
-        for network_region in network_regions:
-            logger.info(f"Running monthlies for {network.code} and {network_region.code}")
-
-            time_series = OpennemExportSeries(
-                start=scada_range.start,
-                end=scada_range.end,
-                network=network,
-                interval=get_interval("1M"),
-                period=human_to_period("all"),
-            )
+        time_series = OpennemExportSeries(
+            start=scada_range.start,
+            end=scada_range.end,
+            network=network,
+            interval=get_interval("1M"),
+            period=human_to_period("all"),
+        )
 
-            stat_set = energy_fueltech_daily(
-                time_series=time_series,
-                networks_query=networks,
-                network_region_code=network_region.code,
-            )
+        region_exports += [
+            RegionExport(network=network, network_region=i.code, networks_query=networks_query, time_series=time_series)
+            for i in network_regions
+        ]
 
-            if not stat_set:
-                logger.error(f"Could not get a monthly stat set for {network.code} and {network_region.code}")
-                continue
+    # 3. run the queries once for each group of regions and fan out to the regions
+    for export_group in plan_region_exports(region_exports):
+        network = export_group.network
+        time_series = export_group.time_series
 
-            demand_energy_and_value = demand_network_region_daily(
-                time_series=time_series, network_region_code=network_region.code, networks=networks
-            )
-            stat_set.append_set(demand_energy_and_value)
+        logger.info(f"Running monthlies for {network.code} and {', '.join(export_group.network_regions)}")
 
-            if network.has_interconnectors:
-                if settings.flows_and_emissions_v2:
-                    interconnector_flows = energy_interconnector_flows_and_emissions_v2(
-                        time_series=time_series,
-                        network_region_code=network_region.code,
-                    )
-                    stat_set.append_set(interconnector_flows)
+        stat_sets = build_region_stat_sets(
+            export_group, include_flows=bool(network.has_interconnectors and settings.flows_and_emissions_v2)
+        )
+
+        for network_region in export_group.network_regions:
+            if not (stat_set := stat_sets.get(network_region)):
+                logger.error(f"Could not get a monthly stat set for {network.code} and {network_region}")
+                continue
 
             all_monthly.append_set(stat_set)
 
-            if bom_station := get_network_region_weather_station(network_region.code):
+            if bom_station := get_network_region_weather_station(network_region):
                 with contextlib.suppress(Exception):
                     weather_stats = weather_daily(
                         time_series=time_series,
                         station_code=bom_station,
-                        network_region=network_region.code,
+                        network_region=network_region,
                         network=network,
                     )
                     all_monthly.append_set(weather_stats)
@@ -427,6 +489,8 @@ def export_all_daily(networks: list[NetworkSchema] | None = None, network_region
 
     cpi = gov_stats_cpi()
 
+    region_exports: list[RegionExport] = []
+
     for network in networks:
         network_regions_query = session.query(NetworkRegion).filter_by(export_set=True).filter_by(network_id=network.code)
 
@@ -435,63 +499,58 @@ def export_all_daily(networks: list[NetworkSchema] | None = None, network_region
 
         network_regions = network_regions_query.all()
 
-        for network_region in network_regions:
-            logging.info(f"Exporting for network {network.code} and region {network_region.code}")
-
-            networks = [NetworkNEM, NetworkAEMORooftop, NetworkOpenNEMRooftopBackfill]
-
-            if network_region.code == "WEM":
-                networks = [NetworkWEM, NetworkAPVI]
-
-            last_day = get_last_complete_day_for_network(network=network) - timedelta(days=1)
+        last_day = get_last_complete_day_for_network(network=network) - timedelta(days=1)
 
-            if not last_day or not network.data_first_seen:
-                logger.error(f"Could not get scada range for network {network} and energy True")
-                continue
+        if not last_day or not network.data_first_seen:
+            logger.error(f"Could not get scada range for network {network} and energy True")
+            continue
 
-            time_series = OpennemExportSeries(
-                start=network.data_first_seen,
-                end=last_day,
-                network=network,
-                interval=human_to_interval("1d"),
-                period=human_to_period("all"),
-            )
+        time_series = OpennemExportSeries(
+            start=network.data_first_seen,
+            end=last_day,
+            network=network,
+            interval=human_to_interval("1d"),
+            period=human_to_period("all"),
+        )
 
-            stat_set = energy_fueltech_daily(
-                time_series=time_series,
-                networks_query=networks,
-                network_region_code=network_region.code,
-            )
+        for network_region in network_regions:
+            networks_query = [NetworkNEM, NetworkAEMORooftop, NetworkOpenNEMRooftopBackfill]
 
-            if not stat_set:
-                continue
+            if network_region.code == "WEM":
+                networks_query = [NetworkWEM, NetworkAPVI]
 
-            demand_energy_and_value = demand_network_region_daily(
-                time_series=time_series, network_region_code=network_region.code, networks=networks
+            region_exports.append(
+                RegionExport(
+                    network=network,
+                    network_region=network_region.code,
+                    networks_query=networks_query,
+                    time_series=time_series,
+                )
             )
-            stat_set.append_set(demand_energy_and_value)
 
-            # Hard coded to NEM only atm but we'll put has_interconnectors
-            # in the metadata to automate all this
-            if network == NetworkNEM:
-                interconnector_flows = energy_interconnector_flows_and_emissions_v2(
+    def _export_region_daily(network_region: str, stat_set: OpennemDataSet, time_series: OpennemExportSeries) -> None:
+        if bom_station := get_network_region_weather_station(network_region):
+            with contextlib.suppress(Exception):
+                weather_stats = weather_daily(
                     time_series=time_series,
-                    network_region_code=network_region.code,
+                    station_code=bom_station,
+                    network_region=network_region,
                 )
-                stat_set.append_set(interconnector_flows)
+                stat_set.append_set(weather_stats)
+        if cpi:
+            stat_set.append_set(cpi)
 
-            if bom_station := get_network_region_weather_station(network_region.code):
-                with contextlib.suppress(Exception):
-                    weather_stats = weather_daily(
-                        time_series=time_series,
-                        station_code=bom_station,
-                        network_region=network_region.code,
-                    )
-                    stat_set.append_set(weather_stats)
-            if cpi:
-                stat_set.append_set(cpi)
+        write_output(f"v3/stats/au/{network_region}/daily.json", stat_set)
+
+    # run the queries once for each group of regions and write the regions in parallel
+    for export_group in plan_region_exports(region_exports):
+        logging.info(f"Exporting for network {export_group.network.code} and regions {', '.join(export_group.network_regions)}")
+
+        # Hard coded to NEM only atm but we'll put has_interconnectors
+        # in the metadata to automate all this
+        stat_sets = build_region_stat_sets(export_group, include_flows=export_group.network == NetworkNEM)
 
-            write_output(f"v3/stats/au/{network_region.code}/daily.json", stat_set)
+        run_region_exports(partial(_export_region_daily, time_series=export_group.time_series), stat_sets)
 
 
 @profile_task(
@@ -625,7 +684,8 @@ def export_metadata() -> bool:
     for r in _export_map_out.resources:
         r.file_path = r.path
 
-    wrote_bytes = write_output("metadata.json", _export_map_out)
+    # always written so the result is whether the write succeeded
+    wrote_bytes = write_output("metadata.json", _export_map_out, skip_unchanged=False)
 
     if wrote_bytes and wrote_bytes > 0:
         return True
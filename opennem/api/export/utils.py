@@ -4,13 +4,16 @@
 """
 import json
 import logging
+from concurrent.futures import Future
 
 from pydantic.main import BaseModel
 
 from opennem import settings
 from opennem.api.stats.schema import OpennemDataSet
-from opennem.exporter.aws import write_statset_to_s3, write_to_s3
+from opennem.exporter.aws import stat_set_hash_content, submit_to_s3, write_to_s3
+from opennem.exporter.encoders import iter_model_json, opennem_model_serialize
 from opennem.exporter.local import write_to_local
+from opennem.exporter.writer import get_export_writer
 
 logger = logging.getLogger(__name__)
 
@@ -21,18 +24,24 @@ def write_output(
     is_local: bool = False,
     exclude_unset: bool = True,
     exclude: set | None = None,
+    skip_unchanged: bool = True,
 ) -> int:
-    """Writes output of stat sets either locally or to s3"""
+    """Writes output of stat sets either locally or to s3. skip_unchanged=False writes to s3
+    even when the content hasn't changed"""
     if settings.export_local:
         is_local = True
 
-    if hasattr(stat_set, "json"):
-        indent = None
+    indent = None
 
-        if settings.debug:
-            indent = 4
+    if settings.debug:
+        indent = 4
 
-        write_content = stat_set.json(exclude_unset=exclude_unset, indent=indent, exclude=exclude)
+    # stream large stat sets to local files rather than serializing them in memory
+    if is_local and isinstance(stat_set, OpennemDataSet) and exclude_unset and not indent:
+        return write_to_local(path, iter_model_json(stat_set, exclude=exclude))
+
+    if isinstance(stat_set, BaseModel):
+        write_content = opennem_model_serialize(stat_set, exclude_unset=exclude_unset, exclude=exclude, indent=indent)
     else:
         write_content = json.dumps(stat_set)
 
@@ -41,12 +50,52 @@ def write_output(
     if is_local:
         byte_count = write_to_local(path, write_content)
     elif isinstance(stat_set, str):
-        byte_count = write_to_s3(stat_set, path)
+        byte_count = write_to_s3(stat_set, path, skip_unchanged=skip_unchanged)
     elif isinstance(stat_set, OpennemDataSet):
-        byte_count = write_statset_to_s3(stat_set, path, exclude_unset=exclude_unset, exclude=exclude)
+        byte_count = write_to_s3(
+            write_content, path, hash_content=stat_set_hash_content(write_content), skip_unchanged=skip_unchanged
+        )
     elif isinstance(stat_set, BaseModel):
-        byte_count = write_to_s3(write_content, path)
+        byte_count = write_to_s3(write_content, path, skip_unchanged=skip_unchanged)
     else:
         raise Exception("Do not know how to write content of this type to output")
 
     return byte_count
+
+
+def submit_output(
+    path: str,
+    stat_set: BaseModel,
+    is_local: bool = False,
+    exclude_unset: bool = True,
+    exclude: set | None = None,
+) -> Future:
+    """Queues the write of a stat set on the export writer upload pool rather than waiting
+    for it. Local writes are done straight away. Call flush_outputs to wait for the queued writes"""
+    if settings.export_local or is_local:
+        future: Future = Future()
+        future.set_result(write_output(path, stat_set, is_local=True, exclude_unset=exclude_unset, exclude=exclude))
+        return future
+
+    indent = None
+
+    if settings.debug:
+        indent = 4
+
+    write_content = opennem_model_serialize(stat_set, exclude_unset=exclude_unset, exclude=exclude, indent=indent)
+
+    return submit_to_s3(
+        write_content,
+        path,
+        hash_content=stat_set_hash_content(write_content) if isinstance(stat_set, OpennemDataSet) else None,
+    )
+
+
+def flush_outputs() -> None:
+    """Wait for queued output writes"""
+    if settings.export_local:
+        return None
+
+    stats = get_export_writer().flush()
+
+    logger.info(f"Export writer: {stats.written} written, {stats.skipped} unchanged and {stats.errors} errors")
@@ -0,0 +1,17 @@
+"""
+OpenNEM API responses
+
+JSON responses are rendered with the serializer backend in settings.json_serializer
+"""
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+from opennem.exporter.encoders import model_encoder, opennem_dumps
+
+
+class OpennemJSONResponse(JSONResponse):
+    """JSON response rendered with the opennem serializer backend"""
+
+    def render(self, content: Any) -> bytes:
+        return opennem_dumps(content, default=model_encoder)
@@ -1,5 +1,4 @@
 import logging
-from collections import OrderedDict
 from datetime import datetime, timedelta, timezone
 from textwrap import dedent
 from typing import Any
@@ -23,13 +22,13 @@ from opennem.utils.numbers import cast_trailing_nulls, trim_nulls
 from opennem.utils.timezone import is_aware, make_aware
 from opennem.utils.version import get_version
 
-from .schema import DataQueryResult, OpennemData, OpennemDataHistory, OpennemDataSet, ScadaDateRange
+from .schema import DataQueryColumns, DataQueryResult, OpennemData, OpennemDataHistory, OpennemDataSet, ScadaDateRange
 
 logger = logging.getLogger(__name__)
 
 
 def stats_factory(
-    stats: list[DataQueryResult],
+    stats: list[DataQueryResult] | DataQueryColumns,
     units: UnitDefinition,
     interval: TimeInterval,
     network: NetworkSchema | None = None,
@@ -45,7 +44,8 @@ def stats_factory(
     include_code: bool = True,
 ) -> OpennemDataSet:
     """
-    Takes a list of data query results and returns OpennemDataSets
+    Takes a list of data query results, or the same results as DataQueryColumns, and
+    returns OpennemDataSets
 
     @TODO optional groupby field
     @TODO multiple groupings / slight refactor
@@ -55,26 +55,27 @@ def stats_factory(
     if network:
         timezone = network.get_timezone()
 
-    group_codes = list({i.group_by for i in stats if i.group_by})
+    if not isinstance(stats, DataQueryColumns):
+        stats = DataQueryColumns.from_results(stats)
 
-    stats_grouped = []
+    # group in a single pass - the last result for an interval wins
+    stats_by_group: dict[str, dict[datetime, Any]] = {}
 
-    for group_code in group_codes:
-        data_grouped: dict[datetime, Any] = {}
+    for stat_interval, stat_result, stat_group in zip(stats.interval, stats.result, stats.group_by, strict=True):
+        if not stat_group:
+            continue
 
-        for stat in stats:
-            if stat.group_by != group_code:
-                continue
+        if stat_group not in stats_by_group:
+            stats_by_group[stat_group] = {}
 
-            if stat.interval not in data_grouped:
-                data_grouped[stat.interval] = None
+        stats_by_group[stat_group][stat_interval] = stat_result
 
-            # if stat.result:
-            data_grouped[stat.interval] = stat.result
+    stats_grouped = []
 
-        data_sorted = OrderedDict(sorted(data_grouped.items()))
+    for group_code, data_grouped in stats_by_group.items():
+        data_keys = sorted(data_grouped)
 
-        data_value = list(data_sorted.values())
+        data_value = [data_grouped[i] for i in data_keys]
 
         # Skip null series
         if not [i for i in data_value if i]:
@@ -89,7 +90,7 @@ def stats_factory(
         if (not units.name.startswith("temperature") or (units.cast_nulls is True)) and (cast_nulls is True):
             data_value = cast_trailing_nulls(data_value)
 
-        data_trimmed = dict(zip(data_sorted.keys(), data_value, strict=True))
+        data_trimmed = dict(zip(data_keys, data_value, strict=True))
 
         data_trimmed = trim_nulls(data_trimmed)
 
@@ -136,7 +137,7 @@ def stats_factory(
         # free
         dates = []
 
-        history = OpennemDataHistory(
+        history = OpennemDataHistory.from_series(
             start=start,
             last=end,
             interval=interval.interval_human,
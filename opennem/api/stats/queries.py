@@ -1,20 +1,22 @@
 """
     Queries for network data
 
-    @TODO use sqlalchemy text() compiled queries
+    Values are bound parameters - see opennem.queries.utils.bind_query
 """
 
 from datetime import datetime, timedelta
-from textwrap import dedent
+
+from sqlalchemy.sql.elements import TextClause
 
 from opennem.controllers.output.schema import OpennemExportSeries
-from opennem.queries.utils import duid_to_case
+from opennem.core.normalizers import normalize_duid
+from opennem.queries.utils import bind_query
 
 
 def power_facility_query(
     time_series: OpennemExportSeries,
     facility_codes: list[str],
-) -> str:
+) -> TextClause:
     __query = """
         select
             t.trading_interval at time zone '{timezone}',
@@ -30,9 +32,9 @@ def power_facility_query(
             from facility_scada fs
             join facility f on fs.facility_code = f.code
             where
-                fs.trading_interval <= '{date_max}' and
-                fs.trading_interval >= '{date_min}' and
-                fs.facility_code in ({facility_codes_parsed})
+                fs.trading_interval <= :date_max and
+                fs.trading_interval >= :date_min and
+                fs.facility_code = any(:facility_codes)
             group by 1, 3
         ) as t
         group by 1, 3
@@ -42,17 +44,19 @@ def power_facility_query(
     date_range = time_series.get_range()
 
     query = __query.format(
-        facility_codes_parsed=duid_to_case(facility_codes),
         trunc=time_series.interval.interval_sql,
         timezone=time_series.network.timezone_database,
+    )
+
+    return bind_query(
+        query,
+        facility_codes=[normalize_duid(i) for i in facility_codes],
         date_max=date_range.end,
         date_min=date_range.start,
     )
 
-    return query
 
-
-def energy_facility_query(time_series: OpennemExportSeries, facility_codes: list[str]) -> str:
+def energy_facility_query(time_series: OpennemExportSeries, facility_codes: list[str]) -> TextClause:
     """
     Get Energy for a list of facility codes
     """
@@ -66,9 +70,9 @@ def energy_facility_query(time_series: OpennemExportSeries, facility_codes: list
         coalesce(sum(t.emissions), 0) as fueltech_emissions
     from at_facility_daily t
     where
-        t.trading_day <= '{date_max}' and
-        t.trading_day >= '{date_min}' and
-        t.facility_code in ({facility_codes_parsed})
+        t.trading_day <= cast(:date_max as date) and
+        t.trading_day >= cast(:date_min as date) and
+        t.facility_code = any(:facility_codes)
     group by 1, 2
     order by
         trading_day desc;
@@ -84,9 +88,9 @@ def energy_facility_query(time_series: OpennemExportSeries, facility_codes: list
             sum(t.emissions) as fueltech_emissions
         from at_facility_daily t
         where
-            t.trading_day <= '{date_max}' and
-            t.trading_day >= '{date_min}' and
-            t.facility_code in ({facility_codes_parsed})
+            t.trading_day <= cast(:date_max as date) and
+            t.trading_day >= cast(:date_min as date) and
+            t.facility_code = any(:facility_codes)
         group by 1, 2
         order by
             trading_day desc;
@@ -94,19 +98,20 @@ def energy_facility_query(time_series: OpennemExportSeries, facility_codes: list
 
     date_range = time_series.get_range()
 
-    return dedent(
-        __query.format(
-            facility_codes_parsed=duid_to_case(facility_codes),
-            trunc=time_series.interval.trunc,
-            interval=time_series.interval.interval_human,
-            date_max=date_range.end.date(),
-            date_min=date_range.start.date(),
-            timezone=time_series.network.timezone_database,
-        )
+    query = __query.format(
+        trunc=time_series.interval.trunc,
+        interval=time_series.interval.interval_human,
     )
 
+    return bind_query(
+        query,
+        facility_codes=[normalize_duid(i) for i in facility_codes],
+        date_max=date_range.end.date(),
+        date_min=date_range.start.date(),
+    )
 
-def emission_factor_region_query(time_series: OpennemExportSeries, network_region_code: str | None = None) -> str:
+
+def emission_factor_region_query(time_series: OpennemExportSeries, network_region_code: str | None = None) -> TextClause:
     # @TODO replace this with query from agg tables.
     __query = """
         select
@@ -131,11 +136,11 @@ def emission_factor_region_query(time_series: OpennemExportSeries, network_regio
             where
                 fs.is_forecast is False and
                 f.interconnector = False and
-                f.network_id = '{network_id}' and
+                f.network_id = :network_id and
                 fs.generated > 0 and
                 {network_region_query}
-                fs.trading_interval >= '{date_min}' and
-                fs.trading_interval <= '{date_max}'
+                fs.trading_interval >= :date_min and
+                fs.trading_interval <= :date_max
             group by
                 1, f.code, 2
         ) as t
@@ -146,23 +151,26 @@ def emission_factor_region_query(time_series: OpennemExportSeries, network_regio
     network_region_query = ""
 
     if network_region_code:
-        network_region_query = f"f.network_region='{network_region_code}' and"
+        network_region_query = "f.network_region = :network_region and"
 
     date_range = time_series.get_range()
 
-    return dedent(
-        __query.format(
-            network_region_query=network_region_query,
-            network_id=time_series.network.code,
-            trunc=time_series.interval.interval_human,
-            date_max=date_range.end,
-            date_min=date_range.start,
-            timezone=time_series.network.timezone_database,
-        )
+    query = __query.format(
+        network_region_query=network_region_query,
+        trunc=time_series.interval.interval_human,
+        timezone=time_series.network.timezone_database,
+    )
+
+    return bind_query(
+        query,
+        network_id=time_series.network.code,
+        network_region=network_region_code,
+        date_max=date_range.end,
+        date_min=date_range.start,
     )
 
 
-def network_fueltech_demand_query(time_series: OpennemExportSeries) -> str:
+def network_fueltech_demand_query(time_series: OpennemExportSeries) -> TextClause:
     __query = """
         select
             fs.trading_interval at time zone '{tz}' as trading_interval,
@@ -174,9 +182,9 @@ def network_fueltech_demand_query(time_series: OpennemExportSeries) -> str:
         left join facility f on fs.facility_code = f.code
         join fueltech ft on f.fueltech_id = ft.code
         where
-            fs.trading_interval >= '{date_min}'
-            and fs.trading_interval < '{date_max}'
-            and fs.network_id = '{network_id}'
+            fs.trading_interval >= :date_min
+            and fs.trading_interval < :date_max
+            and fs.network_id = :network_id
             and f.dispatch_type = 'GENERATOR'
         group by 1, 2;
     """
@@ -185,18 +193,19 @@ def network_fueltech_demand_query(time_series: OpennemExportSeries) -> str:
 
     date_min: datetime = date_range.end - timedelta(days=1)
 
-    return dedent(
-        __query.format(
-            network_id=time_series.network.code,
-            trunc=time_series.interval.trunc,
-            date_max=date_range.end,
-            date_min=date_min,
-            tz=time_series.network.timezone_database,
-        )
+    query = __query.format(
+        tz=time_series.network.timezone_database,
+    )
+
+    return bind_query(
+        query,
+        network_id=time_series.network.code,
+        date_max=date_range.end,
+        date_min=date_min,
     )
 
 
-def network_region_price_query(time_series: OpennemExportSeries, network_region_code: str | None = None) -> str:
+def network_region_price_query(time_series: OpennemExportSeries, network_region_code: str | None = None) -> TextClause:
     __query = """
         select
             time_bucket('{trunc}', bs.trading_interval) as trading_interval,
@@ -205,9 +214,9 @@ def network_region_price_query(time_series: OpennemExportSeries, network_region_
             coalesce(avg(bs.price), avg(bs.price_dispatch)) as price
         from balancing_summary bs
         where
-            bs.trading_interval >= '{date_min}'
-            and bs.trading_interval <= '{date_max}'
-            and bs.network_id = '{network_id}'
+            bs.trading_interval >= :date_min
+            and bs.trading_interval <= :date_max
+            and bs.network_id = :network_id
             {network_regions_query}
         group by 1, 2, 3;
     """
@@ -219,14 +228,17 @@ def network_region_price_query(time_series: OpennemExportSeries, network_region_
     network_regions_query = ""
 
     if network_region_code:
-        network_regions_query = f"and bs.network_region = '{network_region_code.upper()}'"
-
-    return dedent(
-        __query.format(
-            network_id=time_series.network.code,
-            trunc=time_series.interval.interval_human,
-            date_max=date_range.end,
-            date_min=date_min,
-            network_regions_query=network_regions_query,
-        )
+        network_regions_query = "and bs.network_region = :network_region"
+
+    query = __query.format(
+        trunc=time_series.interval.interval_human,
+        network_regions_query=network_regions_query,
+    )
+
+    return bind_query(
+        query,
+        network_id=time_series.network.code,
+        network_region=network_region_code.upper() if network_region_code else None,
+        date_max=date_range.end,
+        date_min=date_min,
     )
@@ -3,12 +3,13 @@ from datetime import date, datetime, timedelta
 
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.responses import RedirectResponse
-from fastapi_cache.decorator import cache
+from sqlalchemy import select
 from sqlalchemy.engine.base import Engine
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
 from starlette import status
 
 from opennem import settings
+from opennem.api.cache import coalesced_cache
 from opennem.api.export.controllers import power_week
 from opennem.api.export.queries import interconnector_flow_network_regions_query
 from opennem.api.time import human_to_interval, human_to_period, valid_database_interval
@@ -16,7 +17,7 @@ from opennem.controllers.output.schema import OpennemExportSeries
 from opennem.core.flows import invert_flow_set
 from opennem.core.networks import network_from_network_code
 from opennem.core.units import get_unit
-from opennem.db import get_database_engine, get_database_session
+from opennem.db import get_database_engine, get_database_engine_async
 from opennem.db.models.opennem import Facility, Station
 from opennem.queries.emissions import get_emission_factor_region_query
 from opennem.queries.price import get_network_region_price_query
@@ -27,13 +28,31 @@ from opennem.utils.time import human_to_timedelta
 
 from .controllers import get_scada_range, get_scada_range_optimized, stats_factory
 from .queries import energy_facility_query, network_fueltech_demand_query, power_facility_query
-from .schema import DataQueryResult, OpennemDataSet
+from .schema import DataQueryColumns, DataQueryResult, OpennemDataSet
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
 
+async def get_station_for_network(
+    engine: AsyncEngine, station_code: str, network_code: str, approved_only: bool = False
+) -> Station | None:
+    """Get a station with its facilities on a network"""
+    query = (
+        select(Station).join(Station.facilities).filter(Station.code == station_code).filter(Facility.network_id == network_code)
+    )
+
+    if approved_only:
+        query = query.filter(Station.approved.is_(True))
+
+    async with AsyncSession(engine) as session:
+        result = await session.execute(query)
+
+        # facilities are joined eager loaded so stations are returned for each facility
+        return result.scalars().unique().one_or_none()
+
+
 @router.get(
     "/power/station/{network_code}/{station_code:path}",
     name="Power by Station",
@@ -41,7 +60,7 @@ router = APIRouter()
     response_model_exclude_unset=True,
     description="Get the power outputs for a station",
 )
-@cache(expire=60 * 5)
+@coalesced_cache(expire=60 * 5)
 async def power_station(
     station_code: str | None = None,
     network_code: str | None = None,
@@ -51,8 +70,7 @@ async def power_station(
     interval_human: str | None = None,
     period_human: str | None = None,
     period: str | None = None,  # type: ignore
-    session: Session = Depends(get_database_session),
-    engine: Engine = Depends(get_database_engine),  # type: ignore
+    engine: AsyncEngine = Depends(get_database_engine_async),
 ) -> OpennemDataSet:
     if not network_code:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No network code")
@@ -99,13 +117,8 @@ async def power_station(
     period_obj: TimePeriod = human_to_period(period_human)
     units = get_unit("power")
 
-    station: Station | None = (
-        session.query(Station)
-        .join(Facility)
-        .filter(Station.code == station_code)
-        .filter(Facility.network_id == network.code)
-        .filter(Station.approved.is_(True))
-        .one_or_none()
+    station = await get_station_for_network(
+        engine, station_code=station_code, network_code=network.code, approved_only=True  # type: ignore
     )
 
     if not station:
@@ -132,10 +145,10 @@ async def power_station(
 
     logger.debug(query)
 
-    with engine.connect() as c:
-        results = list(c.execute(query))
+    async with engine.connect() as c:
+        results = (await c.execute(query)).fetchall()
 
-    stats = [DataQueryResult(interval=i[0], result=i[1], group_by=i[2] if len(i) > 1 else None) for i in results]
+    stats = DataQueryColumns.from_rows(results, interval=0, result=1, group_by=2)
 
     if not stats:
         raise HTTPException(
@@ -172,10 +185,9 @@ async def power_station(
     response_model=OpennemDataSet,
     response_model_exclude_unset=True,
 )
-@cache(expire=60 * 60 * 12)
+@coalesced_cache(expire=60 * 60 * 12)
 async def energy_station(
-    engine: Engine = Depends(get_database_engine),  # type: ignore
-    session: Session = Depends(get_database_session),
+    engine: AsyncEngine = Depends(get_database_engine_async),
     date_min: datetime | None = None,
     date_max: datetime | None = None,
     network_code: str | None = None,
@@ -222,13 +234,7 @@ async def energy_station(
     period_obj = human_to_period(period)
     units = get_unit("energy")
 
-    station: Station | None = (
-        session.query(Station)
-        .join(Station.facilities)
-        .filter(Station.code == station_code)
-        .filter(Facility.network_id == network.code)
-        .one_or_none()
-    )
+    station = await get_station_for_network(engine, station_code=station_code, network_code=network.code)  # type: ignore
 
     if not station:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Station not found")
@@ -268,8 +274,8 @@ async def energy_station(
 
     logger.debug(query)
 
-    with engine.connect() as c:
-        row = list(c.execute(query))
+    async with engine.connect() as c:
+        row = (await c.execute(query)).fetchall()
 
     if len(row) < 1:
         raise HTTPException(
@@ -277,11 +283,11 @@ async def energy_station(
             detail="Station stats not found",
         )
 
-    results_energy = [DataQueryResult(interval=i[0], group_by=i[1], result=i[2] if len(i) > 1 else None) for i in row]
+    results_energy = DataQueryColumns.from_rows(row, interval=0, result=2, group_by=1)
 
-    results_market_value = [DataQueryResult(interval=i[0], group_by=i[1], result=i[3] if len(i) > 1 else None) for i in row]
+    results_market_value = DataQueryColumns.from_rows(row, interval=0, result=3, group_by=1)
 
-    results_emissions = [DataQueryResult(interval=i[0], group_by=i[1], result=i[4] if len(i) > 1 else None) for i in row]
+    results_emissions = DataQueryColumns.from_rows(row, interval=0, result=4, group_by=1)
 
     if len(results_energy) < 1:
         raise HTTPException(
@@ -349,7 +355,7 @@ Flows endpoints
     response_model=OpennemDataSet,
     response_model_exclude_unset=True,
 )
-@cache(expire=60 * 15)
+@coalesced_cache(expire=60 * 15)
 async def power_flows_network_week(
     network_code: str,
     network_region_code: str | None = None,
@@ -528,7 +534,7 @@ def power_network_region_fueltech(
     response_model=OpennemDataSet,
     response_model_exclude_unset=True,
 )
-@cache(expire=60 * 5)
+@coalesced_cache(expire=60 * 5)
 async def emission_factor_per_network(  # type: ignore
     network_code: str,
     interval: str = "5m",
@@ -723,12 +729,12 @@ def fueltech_demand_mix(
     response_model=OpennemDataSet,
     response_model_exclude_unset=True,
 )
-@cache(expire=60 * 5)
+@coalesced_cache(expire=60 * 5)
 async def price_network_endpoint(
     network_code: str,
     network_region_code: str | None = None,
     forecasts: bool = False,
-    engine: Engine = Depends(get_database_engine),
+    engine: AsyncEngine = Depends(get_database_engine_async),
 ) -> OpennemDataSet:
     """Returns network and network region price info for interval which defaults to network
     interval size
@@ -742,8 +748,6 @@ async def price_network_endpoint(
     Returns:
         OpennemData: data set
     """
-    engine = get_database_engine()
-
     try:
         network = network_from_network_code(network_code)
     except Exception:
@@ -792,9 +796,9 @@ async def price_network_endpoint(
         forecast=forecasts,
     )
 
-    with engine.begin() as c:
+    async with engine.connect() as c:
         logger.debug(query)
-        row = list(c.execute(query))
+        row = (await c.execute(query)).fetchall()
 
     if not row:
         raise HTTPException(
@@ -3,6 +3,8 @@ from __future__ import annotations
 import logging
 import math
 from collections import Counter
+from collections.abc import Iterable, Sequence
+from dataclasses import dataclass, field
 from datetime import date, datetime, timedelta
 from decimal import Decimal
 from pathlib import Path
@@ -25,7 +27,7 @@ from opennem.schema.response import ResponseStatus
 from opennem.schema.time import TimeIntervalAPI, TimePeriodAPI
 from opennem.utils.dates import chop_datetime_microseconds
 from opennem.utils.interval import get_human_interval
-from opennem.utils.numbers import sigfig_compact
+from opennem.utils.numbers import sigfig_compact, sigfig_compact_series
 
 ValidNumber = Union[float, int, None, Decimal]
 
@@ -137,6 +139,18 @@ class OpennemDataHistory(BaseConfig):
 
         return field_value
 
+    @classmethod
+    def from_series(cls, start: datetime, last: datetime, interval: str, data: Iterable[ValidNumber]) -> OpennemDataHistory:
+        """Build a history from a data series without per-value validation. The values are
+        formatted in one pass and the series is checked against the dates, so the model is the
+        same as the one the validators build"""
+        data_formatted = sigfig_compact_series(list(data))
+
+        if data_formatted and not validate_data_outputs(data_formatted, get_human_interval(interval), start, last):
+            raise ValueError("Data validation failed")
+
+        return cls.construct(start=start, last=last, interval=interval, data=data_formatted)
+
     def get_date(self, dt: date) -> float | Decimal | None:
         """Get value for a specific date"""
         _values = self.values()
@@ -308,6 +322,44 @@ class DataQueryResult(BaseConfig):
     group_by: str | None
 
 
+@dataclass
+class DataQueryColumns:
+    """Query results as columns rather than a DataQueryResult per row. Values are coerced
+    the same way the DataQueryResult fields are"""
+
+    interval: list[datetime] = field(default_factory=list)
+    result: list[float | None] = field(default_factory=list)
+    group_by: list[str | None] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.interval)
+
+    @classmethod
+    def from_rows(
+        cls, rows: Sequence[Sequence[Any]], interval: int = 0, result: int = 1, group_by: int | str = 2
+    ) -> DataQueryColumns:
+        """Build columns from query result rows by column index. group_by is either a column
+        index or a constant group code for every row (ie. "imports")"""
+        if not rows:
+            return cls()
+
+        group_by_values = [group_by] * len(rows) if isinstance(group_by, str) else [i[group_by] for i in rows]
+
+        return cls(
+            interval=[i[interval] for i in rows],
+            result=[None if i[result] is None else float(i[result]) for i in rows],
+            group_by=[None if i is None else str(i).strip() for i in group_by_values],
+        )
+
+    @classmethod
+    def from_results(cls, stats: list[DataQueryResult]) -> DataQueryColumns:
+        return cls(
+            interval=[i.interval for i in stats],
+            result=[i.result for i in stats],  # type: ignore
+            group_by=[i.group_by for i in stats],
+        )
+
+
 class ScadaDateRange(BaseConfig):
     start: datetime
     end: datetime
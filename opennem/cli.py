@@ -5,13 +5,18 @@ run with either the opennem entry point or:
 $ python -m opennem.cli
 """
 import logging
+from datetime import datetime
 
 import click
 
 from opennem import settings
+from opennem.aggregates.backfill import BACKFILL_AGGREGATES, run_backfill
 from opennem.api.export.map import PriorityType
 from opennem.api.export.tasks import export_all_monthly, export_energy, export_power
 from opennem.core.crawlers.cli import cmd_crawl_cli
+from opennem.core.networks import network_from_network_code
+from opennem.db import enable_query_instrumentation, engine
+from opennem.db.instrumentation import query_instrumentation
 from opennem.db.load_fixtures import load_bom_stations_json, load_fixtures, load_fueltechs
 from opennem.exporter.geojson import export_facility_geojson
 from opennem.exporter.historic import export_historic_intervals
@@ -28,8 +33,13 @@ logger = logging.getLogger("opennem.cli")
 
 
 @click.group()
-def main() -> None:
-    pass
+@click.option("--query-stats", "query_stats_limit", type=int, default=None, help="Print the top N queries by total time")
+@click.pass_context
+def main(ctx: click.Context, query_stats_limit: int | None) -> None:
+    if query_stats_limit:
+        # instrumentation is off by default so turn it on for this command
+        enable_query_instrumentation(engine)
+        ctx.call_on_close(lambda: click.echo(query_instrumentation.format_summary(limit=query_stats_limit)))
 
 
 @click.group()
@@ -152,14 +162,61 @@ def cmd_task_all() -> None:
 
 @click.command()
 @click.option("--weeks", required=False, type=int, default=None)
-def cmd_task_historic(weeks: int | None) -> None:
+@click.option("--workers", required=False, type=int, default=None)
+@click.option("--resume/--no-resume", default=True)
+def cmd_task_historic(weeks: int | None, workers: int | None, resume: bool) -> None:
     """
     Runs the historic exports for number of weeks
 
     Args:
         weeks (int | None): number of weeks to run
+        workers (int | None): number of worker processes
+        resume (bool): skip weeks that have already been exported
+    """
+    export_historic_intervals(limit=weeks, workers=workers, resume=resume)
+
+
+@click.command()
+@click.option("--aggregate", "aggregates", multiple=True, type=click.Choice(list(BACKFILL_AGGREGATES)))
+@click.option("--network", "network_code", required=False, type=str, default=None)
+@click.option("--region", "regions", multiple=True, type=str)
+@click.option("--year-min", required=False, type=int, default=None)
+@click.option("--year-max", required=False, type=int, default=None)
+@click.option("--workers", required=False, type=int, default=None)
+def cmd_task_backfill(
+    aggregates: tuple[str, ...],
+    network_code: str | None,
+    regions: tuple[str, ...],
+    year_min: int | None,
+    year_max: int | None,
+    workers: int | None,
+) -> None:
     """
-    export_historic_intervals(limit=weeks)
+    Backfills aggregates in parallel by network, region and month
+
+    Args:
+        aggregates (tuple[str, ...]): aggregates to run. Defaults to all
+        network_code (str | None): network to run for. Defaults to each aggregate's networks
+        regions (tuple[str, ...]): regions for the aggregates that run by region
+        year_min (int | None): first year to run. Defaults to when the network was first seen
+        year_max (int | None): last year to run. Defaults to the current year
+        workers (int | None): number of worker processes
+    """
+    network = network_from_network_code(network_code) if network_code else None
+
+    if network_code and not network:
+        raise click.BadParameter(f"Unknown network {network_code}")
+
+    result = run_backfill(
+        aggregate_names=list(aggregates) or None,
+        networks=[network] if network else None,
+        date_min=datetime(year_min, 1, 1) if year_min else None,
+        date_max=datetime(year_max + 1, 1, 1) if year_max else None,
+        network_regions=list(regions) or None,
+        workers=workers,
+    )
+
+    click.echo(f"Backfilled {len(result.completed)} partitions with {len(result.failed)} failed")
 
 
 main.add_command(cmd_data_cli, name="data")
@@ -191,6 +248,7 @@ cmd_task.add_command(cmd_task_energy, name="energy")
 cmd_task.add_command(cmd_task_daily, name="daily")
 cmd_task.add_command(cmd_task_all, name="all")
 cmd_task.add_command(cmd_task_historic, name="historic")
+cmd_task.add_command(cmd_task_backfill, name="backfill")
 
 if __name__ == "__main__":
     try:
@@ -7,10 +7,12 @@ import logging
 
 from sqlalchemy.dialects.postgresql import insert
 
+from opennem.aggregates.facility_daily import mark_facility_daily_dirty
 from opennem.clients.apvi import APVIForecastSet
 from opennem.controllers.schema import ControllerReturn
 from opennem.db import get_database_engine, get_scoped_session
 from opennem.db.models.opennem import Facility, FacilityScada
+from opennem.schema.network import NetworkAPVI
 
 logger = logging.getLogger(__name__)
 
@@ -49,6 +51,7 @@ def store_apvi_forecastset(forecast_set: APVIForecastSet) -> ControllerReturn:
         session.execute(stmt)
         session.commit()
         cr.inserted_records = len(records_to_store)
+        mark_facility_daily_dirty(NetworkAPVI, (i["trading_interval"] for i in records_to_store))
     except Exception as e:
         logger.error(f"Error: {e}")
         cr.errors = len(records_to_store)
@@ -4,23 +4,26 @@ Parses MMS tables into OpenNEM derived database
 """
 
 import logging
-from dataclasses import asdict
+from collections.abc import Iterable, Iterator
 from datetime import datetime
 from typing import Any
 
 import pandas as pd
 from sqlalchemy.dialects.postgresql import insert
 
+from opennem.aggregates.facility_daily import mark_facility_daily_dirty
 from opennem.controllers.schema import ControllerReturn
 from opennem.core.networks import NetworkNEM
 from opennem.core.normalizers import clean_float
-from opennem.core.parsers.aemo.mms import AEMOTableSchema, AEMOTableSet
+from opennem.core.parsers.aemo.mms import AEMOTableBatch, AEMOTableSchema, AEMOTableSet
+from opennem.core.profiler import profile_span, profile_span_add_rows
 from opennem.db import get_database_engine, get_scoped_session
 from opennem.db.bulk_insert_csv import bulkinsert_mms_items
 from opennem.db.models.opennem import BalancingSummary, FacilityScada
 from opennem.importer.rooftop import rooftop_remap_regionids
 from opennem.schema.aemo.mms import MMSBaseClass
 from opennem.schema.network import NetworkAEMORooftop, NetworkSchema
+from opennem.utils.cache import invalidate_scada_cache
 from opennem.utils.dates import parse_date
 from opennem.utils.numbers import float_to_str
 
@@ -53,9 +56,9 @@ def unit_scada_generate_facility_scada(
     is_forecast: bool = False,
     primary_key_track: bool = True,
 ) -> list[dict]:
-    """@NOTE method deprecated"""
+    """@NOTE method deprecated - use generate_facility_scada_frame for large sets"""
     created_at = datetime.now()
-    primary_keys = []
+    primary_keys: set[tuple] = set()
     return_records = []
 
     if not records:
@@ -66,7 +69,7 @@ def unit_scada_generate_facility_scada(
     first_record = records[0]
 
     if isinstance(first_record, MMSBaseClass):
-        first_record = asdict(first_record)  # type: ignore
+        first_record = vars(first_record)
 
     try:
         fields = ", ".join([f"'{i}'" for i in list(first_record.keys())])
@@ -75,9 +78,9 @@ def unit_scada_generate_facility_scada(
         pass
 
     for row in records:
-        # cast it all to dicts
+        # cast it all to dicts. @NOTE the schemas are flat so no need to deep copy with asdict
         if isinstance(row, MMSBaseClass):
-            row = asdict(row)  # type: ignore
+            row = vars(row)
 
         if interval_field not in row:
             raise Exception(f"No such field: '{interval_field}'. Fields: {fields}. Data: {row}")
@@ -113,7 +116,7 @@ def unit_scada_generate_facility_scada(
             if pk in primary_keys:
                 continue
 
-            primary_keys.append(pk)
+            primary_keys.add(pk)
 
         __rec = {
             "created_by": "opennem.controller",
@@ -194,6 +197,89 @@ def generate_facility_scada(
     return clean_records
 
 
+def generate_facility_scada_frame(
+    data: pd.DataFrame | dict[str, Any],
+    network: NetworkSchema = NetworkNEM,
+    interval_field: str = "settlementdate",
+    facility_code_field: str = "duid",
+    power_field: str = "scadavalue",
+    energy_field: str | None = None,
+    is_forecast: bool = False,
+    created_by: str = "opennem.controller",
+) -> pd.DataFrame:
+    """Columnar facility scada generator
+
+    Takes a dataframe or a dict of columns (ie. AEMOTableBatch.columns) and returns a frame of
+    facility scada with FACILITY_SCADA_COLUMN_NAMES. Duplicates on the primary key are dropped
+    keeping the last seen as generate_facility_scada does.
+    """
+    df = data if isinstance(data, pd.DataFrame) else pd.DataFrame(data)
+
+    if df.empty:
+        return pd.DataFrame(columns=FACILITY_SCADA_COLUMN_NAMES)
+
+    for field_name in [interval_field, facility_code_field, power_field] + ([energy_field] if energy_field else []):
+        if field_name not in df.columns:
+            raise Exception(f"No such field: '{field_name}'. Fields: {', '.join(df.columns)}")
+
+    df = df.reset_index(drop=True)
+
+    trading_interval = df[interval_field]
+
+    if not pd.api.types.is_datetime64_any_dtype(trading_interval):
+        trading_interval = pd.to_datetime(trading_interval)
+
+    df_scada = pd.DataFrame(
+        {
+            "trading_interval": trading_interval,
+            "facility_code": df[facility_code_field],
+            "generated": pd.to_numeric(df[power_field], errors="coerce"),
+        }
+    )
+
+    df_scada["eoi_quantity"] = pd.to_numeric(df[energy_field], errors="coerce") if energy_field else None
+    df_scada["created_by"] = created_by
+    df_scada["created_at"] = datetime.now()
+    df_scada["updated_at"] = None
+    df_scada["network_id"] = network.code
+    df_scada["is_forecast"] = is_forecast
+    df_scada["energy_quality_flag"] = 0
+
+    # fill in energies
+    if network.interval_size == 30:
+        df_scada["eoi_quantity"] = df_scada.generated / 2
+
+    elif network.interval_size == 15:
+        df_scada["eoi_quantity"] = df_scada.generated / 4
+
+    df_scada = df_scada[FACILITY_SCADA_COLUMN_NAMES]
+
+    return df_scada.drop_duplicates(subset=["trading_interval", "network_id", "facility_code"], keep="last")
+
+
+def iter_facility_scada_frames(
+    batches: Iterable[AEMOTableBatch],
+    network: NetworkSchema = NetworkNEM,
+    table_name: str = "dispatch_unit_scada",
+    **kwargs: Any,
+) -> Iterator[pd.DataFrame]:
+    """Generate facility scada frames from a stream of parsed table batches so memory stays
+    bounded by the batch size. Each frame is de-duplicated; duplicates across frames are left
+    to the ON CONFLICT of the bulk insert"""
+    for batch in batches:
+        if batch.full_name != table_name or not len(batch):
+            continue
+
+        yield generate_facility_scada_frame(batch.columns, network=network, **kwargs)
+
+
+def facility_scada_frame_to_records(df: pd.DataFrame) -> list[dict[str, Any]]:
+    """Convert a facility scada frame into records for bulk insert with nulls as None"""
+    df = df.astype(object).where(df.notna(), None)
+
+    return df.to_dict("records")
+
+
 def generate_balancing_summary(
     records: list[dict],
     interval_field: str = "SETTLEMENTDATE",
@@ -357,6 +443,9 @@ def process_nem_price(table: AEMOTableSchema) -> ControllerReturn:
         session.commit()
         cr.inserted_records = cr.processed_records
         cr.server_latest = max([i["trading_interval"] for i in records_to_store])
+        mark_facility_daily_dirty(NetworkNEM, (i["trading_interval"] for i in records_to_store))
+        # rooftop market_value is derived from the NEM price so its days are dirty too
+        mark_facility_daily_dirty(NetworkAEMORooftop, (i["trading_interval"] for i in records_to_store))
     except Exception as e:
         logger.error("Error inserting NEM price records")
         logger.error(e)
@@ -519,37 +608,35 @@ def process_trading_regionsum(table: AEMOTableSchema) -> ControllerReturn:
     return cr
 
 
+def has_energy_values(records: list[dict[str, Any]]) -> bool:
+    """Whether facility scada records set energy values, so stored records change the
+    energy ranges and not just power"""
+    return any(i.get("eoi_quantity") is not None for i in records)
+
+
 def process_unit_scada(table: AEMOTableSchema) -> ControllerReturn:
     cr = ControllerReturn(total_records=len(table.records))
 
-    records = unit_scada_generate_facility_scada(
-        table.records,  # type:ignore
+    df_scada = generate_facility_scada_frame(
+        pd.DataFrame.from_records(table.records),  # type:ignore
         interval_field="settlementdate",
         facility_code_field="duid",
         power_field="scadavalue",
     )
 
-    cr.processed_records = len(records)
-    cr.inserted_records = bulkinsert_mms_items(FacilityScada, records, ["generated"])  # type: ignore
-    cr.server_latest = max([i["trading_interval"] for i in records if i["trading_interval"]])
+    records = facility_scada_frame_to_records(df_scada)
 
-    return cr
-
-
-def process_unit_scada_optimized(table: AEMOTableSchema) -> ControllerReturn:
-    cr = ControllerReturn(total_records=len(table.records))
-
-    records = generate_facility_scada(
-        table.records,  # type:ignore
-        interval_field="settlementdate",
-        facility_code_field="duid",
-        power_field="scadavalue",
-    )
+    if not records:
+        return cr
 
     cr.processed_records = len(records)
     cr.inserted_records = bulkinsert_mms_items(FacilityScada, records, ["generated", "eoi_quantity"])  # type: ignore
     cr.server_latest = max([i["trading_interval"] for i in records if i["trading_interval"]])
 
+    if cr.inserted_records:
+        invalidate_scada_cache(NetworkNEM, energy=has_energy_values(records))
+        mark_facility_daily_dirty(NetworkNEM, (i["trading_interval"] for i in records))
+
     return cr
 
 
@@ -567,6 +654,10 @@ def process_unit_solution(table: AEMOTableSchema) -> ControllerReturn:
     cr.inserted_records = bulkinsert_mms_items(FacilityScada, records, ["generated"])
     cr.server_latest = max([i["trading_interval"] for i in records if i["trading_interval"]])
 
+    if cr.inserted_records:
+        invalidate_scada_cache(NetworkNEM, energy=has_energy_values(records))
+        mark_facility_daily_dirty(NetworkNEM, (i["trading_interval"] for i in records))
+
     return cr
 
 
@@ -584,6 +675,10 @@ def process_meter_data_gen_duid(table: AEMOTableSchema) -> ControllerReturn:
     cr.inserted_records = bulkinsert_mms_items(FacilityScada, records, ["generated"])
     cr.server_latest = max([i["trading_interval"] for i in records])
 
+    if cr.inserted_records:
+        invalidate_scada_cache(NetworkNEM, energy=has_energy_values(records))
+        mark_facility_daily_dirty(NetworkNEM, (i["trading_interval"] for i in records))
+
     return cr
 
 
@@ -605,6 +700,10 @@ def process_rooftop_actual(table: AEMOTableSchema) -> ControllerReturn:
     cr.inserted_records = bulkinsert_mms_items(FacilityScada, records, ["generated", "eoi_quantity"])
     cr.server_latest = max([i["trading_interval"] for i in records])
 
+    if cr.inserted_records:
+        invalidate_scada_cache(NetworkAEMORooftop)
+        mark_facility_daily_dirty(NetworkAEMORooftop, (i["trading_interval"] for i in records))
+
     return cr
 
 
@@ -627,12 +726,15 @@ def process_rooftop_forecast(table: AEMOTableSchema) -> ControllerReturn:
     cr.inserted_records = bulkinsert_mms_items(FacilityScada, records, ["generated"])  # type: ignore
     cr.server_latest = max([i["trading_interval"] for i in records])
 
+    if cr.inserted_records:
+        invalidate_scada_cache(NetworkAEMORooftop, energy=has_energy_values(records))
+
     return cr
 
 
 TABLE_PROCESSOR_MAP = {
     "dispatch_interconnectorres": "process_dispatch_interconnectorres",
-    "dispatch_unit_scada": "process_unit_scada_optimized",
+    "dispatch_unit_scada": "process_unit_scada",
     "dispatch_unit_solution": "process_unit_solution",
     "meter_data_gen_duid": "process_meter_data_gen_duid",
     "rooftop_actual": "process_rooftop_actual",
@@ -666,7 +768,10 @@ def store_aemo_tableset(tableset: AEMOTableSet) -> ControllerReturn:
         record_item = None
 
         try:
-            record_item = globals()[process_meth](table)
+            with profile_span(f"store {table.full_name}"):
+                record_item = globals()[process_meth](table)
+                profile_span_add_rows(record_item.inserted_records)
+
             logger.info(f"Stored {record_item.inserted_records} records for table {table.full_name}")
         except Exception as e:
             logger.error(f"Error processing {table.full_name}: {e}")
@@ -7,11 +7,14 @@ from datetime import datetime
 
 from sqlalchemy.dialects.postgresql import insert
 
+from opennem.aggregates.facility_daily import mark_facility_daily_dirty
 from opennem.clients.wem import WEMBalancingSummarySet, WEMFacilityIntervalSet
 from opennem.controllers.schema import ControllerReturn
 from opennem.db import get_database_engine, get_scoped_session
 from opennem.db.bulk_insert_csv import bulkinsert_mms_items
 from opennem.db.models.opennem import BalancingSummary, FacilityScada
+from opennem.schema.network import NetworkWEM
+from opennem.utils.cache import invalidate_scada_cache
 from opennem.utils.dates import get_today_nem
 
 logger = logging.getLogger(__name__)
@@ -80,6 +83,7 @@ def store_wem_balancingsummary_set(balancing_set: WEMBalancingSummarySet) -> Con
         session.execute(stmt)
         session.commit()
         cr.inserted_records = len(records_to_store)
+        mark_facility_daily_dirty(NetworkWEM, (i["trading_interval"] for i in records_to_store))
     except Exception as e:
         logger.error(f"Error: {e}")
         cr.errors = len(records_to_store)
@@ -188,6 +192,8 @@ def store_wem_facility_intervals(balancing_set: WEMFacilityIntervalSet) -> Contr
         session.execute(stmt)
         session.commit()
         cr.inserted_records = len(records_to_store)
+        invalidate_scada_cache(NetworkWEM)
+        mark_facility_daily_dirty(NetworkWEM, (i["trading_interval"] for i in records_to_store))
     except Exception as e:
         logger.error(f"Error: {e}")
         cr.errors = len(records_to_store)
@@ -242,6 +248,10 @@ def store_wem_facility_intervals_bulk(facility_interval_set: WEMFacilityInterval
     if len(records_to_store) < 1:
         return cr
 
-    bulkinsert_mms_items(FacilityScada, records_to_store, ["generated", "eoi_quantity"])  # type: ignore
+    cr.inserted_records = bulkinsert_mms_items(FacilityScada, records_to_store, ["generated", "eoi_quantity"])  # type: ignore
+
+    if cr.inserted_records:
+        invalidate_scada_cache(NetworkWEM)
+        mark_facility_daily_dirty(NetworkWEM, (i["trading_interval"] for i in records_to_store))
 
     return cr
@@ -5,6 +5,7 @@ from datetime import datetime
 from textwrap import dedent
 
 from datetime_truncate import truncate as date_trunc
+from sqlalchemy import func
 from sqlalchemy import text as sql
 from sqlalchemy.dialects.postgresql import insert
 
@@ -84,7 +85,8 @@ def set_crawler_history(crawler_name: str, histories: list[CrawlHistoryEntry]) -
     stmt = stmt.on_conflict_do_update(  # type: ignore
         index_elements=["source", "crawler_name", "network_id", "interval"],
         set_={
-            "inserted_records": stmt.excluded.inserted_records,  # type: ignore
+            # a check without records (ie. not modified) keeps the count from when it was stored
+            "inserted_records": func.coalesce(stmt.excluded.inserted_records, CrawlHistory.inserted_records),  # type: ignore
             "crawled_time": stmt.excluded.crawled_time,  # type: ignore
             "processed_time": stmt.excluded.processed_time,  # type: ignore
         },
@@ -3,7 +3,7 @@ from collections.abc import Callable
 from datetime import datetime
 from enum import Enum
 
-from pydantic import Field
+from pydantic import Field, root_validator
 
 from opennem.core.parsers.aemo.filenames import AEMODataBucketSize
 from opennem.schema.core import BaseConfig
@@ -46,6 +46,9 @@ class CrawlerDefinition(BaseConfig):
     network: NetworkSchema | None = None
     backfill_days: int | None = None
     bulk_insert: bool = Field(default=False)
+    # parse archive files in a process pool and store them as they're parsed. exclusive
+    # with bulk_insert
+    pipelined: bool = Field(default=False)
 
     priority: CrawlerPriority
     schedule: CrawlerSchedule | None = None
@@ -58,6 +61,14 @@ class CrawlerDefinition(BaseConfig):
 
     processor: Callable
 
+    # pylint: disable=no-self-argument
+    @root_validator(skip_on_failure=True)
+    def validate_ingest_mode(cls, values: dict) -> dict:
+        if values.get("bulk_insert") and values.get("pipelined"):
+            raise ValueError(f"Crawler {values.get('name')}: bulk_insert and pipelined are exclusive")
+
+        return values
+
 
 class CrawlerSet(BaseConfig):
     """Defines a set of crawlers"""
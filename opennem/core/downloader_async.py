@@ -0,0 +1,262 @@
+"""
+    Async concurrent downloader
+
+    Fetches many URLs at once over a single pooled keep-alive client with a cap on
+    in-flight requests per host. Validators (ETag and Last-Modified) from earlier
+    responses are sent back as conditional request headers, so files that haven't
+    changed come back as a 304 and are skipped.
+
+    usage:
+
+    from opennem.core.downloader_async import download_urls
+
+    for result in download_urls(urls):
+        if result.ok and not result.not_modified:
+            ...
+
+"""
+import asyncio
+import logging
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
+from io import BytesIO
+from urllib.parse import urlparse
+
+import httpx
+
+from opennem import settings
+from opennem.core.downloader import decode_content
+from opennem.utils.http import USER_AGENT
+
+logger = logging.getLogger("opennem.downloader_async")
+
+# status codes that are retried with backoff (see opennem.utils.http.retry_strategy)
+DOWNLOAD_RETRY_STATUS_CODES = [429, 500, 502, 503, 504]
+
+DOWNLOAD_BACKOFF_FACTOR = 0.5
+
+
+@dataclass
+class DownloadResult:
+    url: str
+    status_code: int | None = None
+    content: bytes | None = None
+    not_modified: bool = False
+    etag: str | None = None
+    last_modified: str | None = None
+    error: str | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+@dataclass
+class ConditionalCacheEntry:
+    etag: str | None = None
+    last_modified: str | None = None
+    content: bytes | None = None
+
+
+class ConditionalRequestCache:
+    """In-process LRU of response validators keyed by URL. Optionally keeps the content
+    so that a 304 can still return a body (ie. for directory listings)"""
+
+    def __init__(self, max_entries: int = 10_000) -> None:
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, ConditionalCacheEntry] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, url: str) -> ConditionalCacheEntry | None:
+        entry = self._entries.get(url)
+
+        if entry:
+            self._entries.move_to_end(url)
+
+        return entry
+
+    def request_headers(self, url: str) -> dict[str, str]:
+        """Conditional request headers for a URL"""
+        entry = self.get(url)
+
+        if not entry:
+            return {}
+
+        headers = {}
+
+        if entry.etag:
+            headers["If-None-Match"] = entry.etag
+
+        if entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+
+        return headers
+
+    def update(self, url: str, response: httpx.Response, content: bytes | None = None) -> None:
+        etag = response.headers.get("etag")
+        last_modified = response.headers.get("last-modified")
+
+        if not etag and not last_modified:
+            return None
+
+        self._entries[url] = ConditionalCacheEntry(etag=etag, last_modified=last_modified, content=content)
+        self._entries.move_to_end(url)
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, url: str) -> None:
+        """Forget a URL so the next request fetches it in full - ie. if processing it failed"""
+        self._entries.pop(url, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+conditional_request_cache = ConditionalRequestCache()
+
+
+async def _fetch_url(
+    client: httpx.AsyncClient,
+    url: str,
+    host_semaphore: asyncio.Semaphore,
+    cache: ConditionalRequestCache | None,
+    store_content: bool,
+    decode: bool,
+    retries: int,
+) -> DownloadResult:
+    """Fetch a single URL holding a slot for its host"""
+    request_headers = cache.request_headers(url) if cache is not None else {}
+
+    response: httpx.Response | None = None
+    error: str | None = None
+
+    async with host_semaphore:
+        for attempt in range(retries + 1):
+            if attempt:
+                await asyncio.sleep(DOWNLOAD_BACKOFF_FACTOR * 2 ** (attempt - 1))
+
+            try:
+                response = await client.get(url, headers=request_headers)
+            except httpx.HTTPError as e:
+                response = None
+                error = f"Could not fetch {url}: {e}"
+                continue
+
+            if response.status_code not in DOWNLOAD_RETRY_STATUS_CODES:
+                break
+
+    if response is None:
+        return DownloadResult(url=url, error=error)
+
+    result = DownloadResult(
+        url=url,
+        status_code=response.status_code,
+        etag=response.headers.get("etag"),
+        last_modified=response.headers.get("last-modified"),
+    )
+
+    if response.status_code == 304:
+        cache_entry = cache.get(url) if cache is not None else None
+
+        result.not_modified = True
+        result.content = cache_entry.content if cache_entry else None
+
+        logger.debug(f"Not modified: {url}")
+
+        return result
+
+    if not response.is_success:
+        result.error = f"Bad link returned {response.status_code}: {url}"
+        return result
+
+    try:
+        result.content = decode_content(BytesIO(response.content), url=url) if decode else response.content
+    except Exception as e:
+        result.error = f"Could not decode {url}: {e}"
+        return result
+
+    if cache is not None:
+        cache.update(url, response, content=result.content if store_content else None)
+
+    return result
+
+
+async def download_urls_async(
+    urls: list[str],
+    concurrency_per_host: int | None = None,
+    cache: ConditionalRequestCache | None = conditional_request_cache,
+    store_content: bool = False,
+    decode: bool = True,
+    retries: int | None = None,
+    transport: httpx.AsyncBaseTransport | None = None,
+) -> list[DownloadResult]:
+    """Download a list of URLs concurrently and return the results in the same order
+
+    Args:
+        urls: urls to fetch
+        concurrency_per_host: max in-flight requests per host. Defaults to settings.http_concurrency_per_host
+        cache: validator cache for conditional requests. Pass None to always fetch in full
+        store_content: keep the content in the cache so a 304 still returns it
+        decode: unpack zips etc. as opennem.core.downloader.url_downloader does
+        retries: retries for connection errors and retryable status codes. Defaults to settings.http_retries
+        transport: httpx transport override - used to run against a local stand-in
+    """
+    if not urls:
+        return []
+
+    if not concurrency_per_host:
+        concurrency_per_host = settings.http_concurrency_per_host
+
+    if retries is None:
+        retries = settings.http_retries
+
+    host_semaphores: dict[str, asyncio.Semaphore] = defaultdict(lambda: asyncio.Semaphore(concurrency_per_host))  # type: ignore
+
+    num_hosts = len({urlparse(url).netloc for url in urls})
+
+    limits = httpx.Limits(
+        max_connections=concurrency_per_host * num_hosts,
+        max_keepalive_connections=concurrency_per_host * num_hosts,
+    )
+
+    async with httpx.AsyncClient(
+        headers={"User-Agent": USER_AGENT},
+        timeout=settings.http_timeout,
+        verify=settings.http_verify_ssl,
+        limits=limits,
+        follow_redirects=True,
+        transport=transport,
+    ) as client:
+        results = await asyncio.gather(
+            *[
+                _fetch_url(
+                    client,
+                    url,
+                    host_semaphore=host_semaphores[urlparse(url).netloc],
+                    cache=cache,
+                    store_content=store_content,
+                    decode=decode,
+                    retries=retries,
+                )
+                for url in urls
+            ]
+        )
+
+    for result in results:
+        if result.error:
+            logger.error(result.error)
+
+    logger.debug(f"Downloaded {len(results)} urls from {num_hosts} hosts")
+
+    return list(results)
+
+
+def download_urls(urls: list[str], **kwargs) -> list[DownloadResult]:  # type: ignore
+    """Sync entry point for download_urls_async. See that method for args
+
+    @NOTE can't be called from inside a running event loop - await download_urls_async instead
+    """
+    return asyncio.run(download_urls_async(urls, **kwargs))
@@ -206,6 +206,75 @@ def _energy_aggregate_hours(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
+# weights for a trapezium integration over the seven 5 minute readings of a half hour
+TRAPEZIUM_WEIGHTS = np.array([1, 2, 2, 2, 2, 2, 1])
+
+
+def _energy_aggregate_hours_batched(df: pd.DataFrame, power_field: str = "generated") -> pd.DataFrame:
+    """Batched version of _energy_aggregate_hours
+
+    Pivots the readings into a (interval x facility) array once and integrates every
+    facility and half hour of every hour in the range in a single pass. Produces the
+    same rows in the same order with the same values as the per-duid query version.
+    Duplicate readings for a facility and interval keep the last one, where the per-duid
+    version fails on them. Expects a frame indexed by trading_interval on the 5 minute grid.
+    """
+    hours = list(get_hour_range(df))
+    columns = ["trading_interval", "network_id", "facility_code", "eoi_quantity"]
+
+    if not hours:
+        return pd.DataFrame([], columns=columns)
+
+    duids = sorted(df.facility_code.unique())
+    num_readings = len(TRAPEZIUM_WEIGHTS)
+
+    # start of each of the two half hours in each hour
+    window_starts = pd.DatetimeIndex(
+        [hour.replace(minute=5) + timedelta(minutes=30 * TI) for hour in hours for TI in range(2)]
+    ).tz_convert(NetworkNEM.get_timezone())
+
+    window_offsets = pd.to_timedelta(np.arange(num_readings) * 5, unit="min")
+    window_index = pd.DatetimeIndex((window_starts.values[:, None] + window_offsets.values[None, :]).ravel()).tz_localize("UTC")
+
+    df_readings = df.reset_index().drop_duplicates(subset=["trading_interval", "facility_code"], keep="last")
+
+    def _window_readings(values: str) -> np.ndarray:
+        """(window, facility, reading) array of a column"""
+        pivot = df_readings.pivot(index="trading_interval", columns="facility_code", values=values).reindex(columns=duids)
+        pivot.index = pd.DatetimeIndex(pivot.index).tz_convert("UTC")
+
+        readings = pivot.reindex(window_index).to_numpy(dtype=float)
+
+        return np.ascontiguousarray(readings.reshape(len(window_starts), num_readings, len(duids)).transpose(0, 2, 1))
+
+    power = _window_readings(power_field)
+
+    # missing readings are zero filled
+    energy = 0.5 * (np.nan_to_num(power, nan=0.0) * TRAPEZIUM_WEIGHTS).sum(axis=-1) / 12
+
+    # energy is at the second last reading of the half hour
+    interval_offsets = np.full(energy.shape, num_readings - 2)
+
+    # output is ordered by hour, then duid, then half hour
+    energy = energy.reshape(len(hours), 2, len(duids)).transpose(0, 2, 1).ravel()
+
+    trading_intervals = window_starts.values[:, None] + (interval_offsets * np.timedelta64(5, "m")).astype("timedelta64[ns]")
+    trading_intervals = trading_intervals.reshape(len(hours), 2, len(duids)).transpose(0, 2, 1).ravel()
+    trading_intervals = pd.DatetimeIndex(trading_intervals).tz_localize("UTC").tz_convert(window_starts.tz)
+
+    facility_codes = np.broadcast_to(np.array(duids, dtype=object)[None, :, None], (len(hours), len(duids), 2)).ravel()
+
+    return pd.DataFrame(
+        {
+            "trading_interval": trading_intervals,
+            "network_id": "NEM",
+            "facility_code": facility_codes,
+            "eoi_quantity": energy,
+        },
+        columns=columns,
+    )
+
+
 def _trapezium_integration_variable(d_ti: pd.Series) -> float | None:
     """Gapfill version of trap int - will fill out"""
     # Clear no numbers
@@ -308,6 +377,7 @@ def energy_sum(
     power_column: str = "generated",
     filter_no_energy_values: bool = True,
     hours: bool = True,
+    batched: bool = True,
 ) -> pd.DataFrame:
     """Takes the energy sum for a series of raw duid intervals
     and returns a fresh dataframe to be imported"""
@@ -321,7 +391,10 @@ def energy_sum(
             if len(list(get_hour_range(df))) == 0:
                 logger.warning(f"energy_sum error for network {network.code}: Got no hours from hour range")
 
-            df = _energy_aggregate_hours(df)
+            if batched:
+                df = _energy_aggregate_hours_batched(df, power_field=power_column)
+            else:
+                df = _energy_aggregate_hours(df)
         else:
             df = _energy_aggregate(df)
 
@@ -60,13 +60,14 @@ class NetworkRegionsDemandEmissions:
     def __init__(self, network: NetworkSchema, data: list[RegionDemandEmissions]):
         self.data = data
         self.network = network
+        self._region_map: dict[Region, RegionDemandEmissions] = {i.region_code: i for i in data}
 
     def __repr__(self) -> str:
         return f"<RegionNetEmissionsDemandForNetwork region_code={self.network.code} regions={len(self.data)}>"
 
     def get_region(self, region_code: Region) -> RegionDemandEmissions:
         """Get region by code"""
-        region_result = next(filter(lambda x: x.region_code == region_code, self.data))
+        region_result = self._region_map.get(region_code)
 
         if not region_result:
             raise FlowSolverException(f"Region {region_code} not found in network {self.network.code}")
@@ -93,13 +94,14 @@ class NetworkInterconnectorEnergyEmissions:
     def __init__(self, network: NetworkSchema, data: list[InterconnectorNetEmissionsEnergy]):
         self.data = data
         self.network = network
+        self._interconnector_map: dict[RegionFlow, InterconnectorNetEmissionsEnergy] = {i.region_flow: i for i in data}
 
-    def get_interconnector(self, region_flow: RegionFlow, default: int = 0) -> InterconnectorNetEmissionsEnergy:
+    def get_interconnector(self, region_flow: RegionFlow, default: float | None = None) -> InterconnectorNetEmissionsEnergy:
         """Get interconnector by region flow"""
-        interconnector_result = next(filter(lambda x: x.region_flow == region_flow, self.data))
+        interconnector_result = self._interconnector_map.get(region_flow)
 
         if not interconnector_result:
-            if default:
+            if default is not None:
                 return InterconnectorNetEmissionsEnergy(region_flow=region_flow, generated_mwh=default, emissions_t=default)
 
             raise FlowSolverException(f"Interconnector {region_flow} not found in network {self.network.code}")
@@ -116,11 +118,135 @@ class FlowSolverResult:
     emissions: float
 
 
+# Order of the regions in the emissions balance equations
+FLOW_SOLVER_BALANCE_REGIONS: list[Region] = [Region("SA1"), Region("QLD1"), Region("TAS1"), Region("NSW1"), Region("VIC1")]
+
+# Flows solved for and their variable index in the solution
+FLOW_SOLVER_SOLVED_FLOWS: list[tuple[RegionFlow, int]] = [
+    (RegionFlow("NSW1->QLD1"), 6),
+    (RegionFlow("VIC1->NSW1"), 5),
+    (RegionFlow("NSW1->VIC1"), 7),
+    (RegionFlow("VIC1->SA1"), 8),
+    (RegionFlow("VIC1->TAS1"), 9),
+]
+
+# Flows out of regions that don't have flow-through. Emissions for these are passed through as-is
+FLOW_SOLVER_PASSTHROUGH_FLOWS: list[RegionFlow] = [RegionFlow("QLD1->NSW1"), RegionFlow("TAS1->VIC1"), RegionFlow("SA1->VIC1")]
+
+# Emissions balance equations
+_FLOW_SOLVER_BALANCE = np.array(
+    [
+        [1, 0, 0, 0, 0, 0, 0, 0, -1, 0],
+        [0, 1, 0, 0, 0, 0, -1, 0, 0, 0],
+        [0, 0, 1, 0, 0, 0, 0, 0, 0, -1],
+        [0, 0, 0, 1, 0, -1, 1, 1, 0, 0],
+        [0, 0, 0, 0, 1, 1, 0, -1, 1, 1],
+    ],
+    dtype=float,
+)
+
+# (row, intensity column, unit column) of the emissions intensity equations
+# for flow-through regions
+_FLOW_SOLVER_INTENSITY_ROWS: dict[RegionFlow, tuple[int, int, int]] = {
+    RegionFlow("NSW1->QLD1"): (5, 3, 6),
+    RegionFlow("NSW1->VIC1"): (6, 3, 7),
+    RegionFlow("VIC1->TAS1"): (7, 3, 9),
+    RegionFlow("VIC1->SA1"): (8, 3, 8),
+    RegionFlow("VIC1->NSW1"): (9, 3, 4),
+}
+
+
+def solve_flow_emissions_for_intervals(
+    region_generated_mwh: dict[Region, np.ndarray],
+    region_emissions_t: dict[Region, np.ndarray],
+    interconnector_generated_mwh: dict[RegionFlow, np.ndarray],
+    interconnector_emissions_t: dict[RegionFlow, np.ndarray],
+) -> dict[RegionFlow, np.ndarray]:
+    """Batched flow solver. Solves the flow emissions for N intervals at once
+
+    Args:
+        region_generated_mwh: generated energy for each region as an array of length N
+        region_emissions_t: emissions for each region as an array of length N
+        interconnector_generated_mwh: energy for each flow-through interconnector direction
+        interconnector_emissions_t: emissions for each interconnector direction out of regions
+            without flow-through. Missing directions are taken as zero
+
+    Returns:
+        Emissions for each interconnector direction as an array of length N. Intervals that
+        can't be solved (ie. a region with no generation) are returned as nan
+    """
+    num_intervals: int | None = None
+
+    for values in region_generated_mwh.values():
+        num_intervals = len(values)
+        break
+
+    if num_intervals is None:
+        raise FlowSolverException("No region data to solve")
+
+    for region in FLOW_SOLVER_BALANCE_REGIONS:
+        if region not in region_generated_mwh or region not in region_emissions_t:
+            raise FlowSolverException(f"Region {region} not found in region data")
+
+    a = np.zeros((num_intervals, 10, 10))
+    a[:, :5, :] = _FLOW_SOLVER_BALANCE
+
+    for region_flow, (row, intensity_column, unit_column) in _FLOW_SOLVER_INTENSITY_ROWS.items():
+        if region_flow not in interconnector_generated_mwh:
+            raise FlowSolverException(f"Interconnector {region_flow} not found in interconnector data")
+
+        region_code = Region(region_flow.split("->")[0])
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            a[:, row, intensity_column] = -np.asarray(interconnector_generated_mwh[region_flow], dtype=float) / np.asarray(
+                region_generated_mwh[region_code], dtype=float
+            )
+
+        a[:, row, unit_column] = 1
+
+    # net emissions for each region (region emissions, minus exported, plus imported)
+    b = np.zeros((num_intervals, 10, 1))
+
+    for row, region_code in enumerate(FLOW_SOLVER_BALANCE_REGIONS):
+        b[:, row, 0] = np.asarray(region_emissions_t[region_code], dtype=float)
+
+    # cast nan to 0
+    b = np.nan_to_num(b)
+
+    flow_result = np.full((num_intervals, 10, 1), np.nan)
+
+    # skip systems that can't be solved so the rest of the batch can be
+    solvable = np.isfinite(a).all(axis=(1, 2))
+
+    try:
+        flow_result[solvable] = np.linalg.solve(a[solvable], b[solvable])
+    except np.linalg.LinAlgError:
+        # a singular system in the batch - fall back to solving individually
+        for interval_index in np.flatnonzero(solvable):
+            try:
+                flow_result[interval_index] = np.linalg.solve(a[interval_index], b[interval_index])
+            except np.linalg.LinAlgError:
+                solvable[interval_index] = False
+
+    if not solvable.all():
+        logger.warning(f"Could not solve flow emissions for {(~solvable).sum()} of {num_intervals} intervals")
+
+    results: dict[RegionFlow, np.ndarray] = {}
+
+    for region_flow, flow_column in FLOW_SOLVER_SOLVED_FLOWS:
+        results[region_flow] = flow_result[:, flow_column, 0]
+
+    for region_flow in FLOW_SOLVER_PASSTHROUGH_FLOWS:
+        results[region_flow] = np.asarray(interconnector_emissions_t.get(region_flow, np.zeros(num_intervals)), dtype=float)
+
+    return results
+
+
 def solve_flow_emissions_for_interval(
     interconnector_data: NetworkInterconnectorEnergyEmissions,
     region_data: NetworkRegionsDemandEmissions,
 ) -> list[FlowSolverResult]:
-    """_summary_
+    """Solves the flow emissions for a single interval
 
     Args:
         interconnector_data: for each network, contains a list of interconnectors and
@@ -146,137 +272,21 @@ def solve_flow_emissions_for_interval(
 
     [{region_flow: "NSW1->QLD1", emissions: 154.34}, {region_flow: "VIC1->NSW1", emissions: 0.0}, ...]
 
-
-    Emissions
     """
-    a = np.array(
-        [
-            # emissions balance equations
-            [1, 0, 0, 0, 0, 0, 0, 0, -1, 0],
-            [0, 1, 0, 0, 0, 0, -1, 0, 0, 0],
-            [0, 0, 1, 0, 0, 0, 0, 0, 0, -1],
-            [0, 0, 0, 1, 0, -1, 1, 1, 0, 0],
-            [0, 0, 0, 0, 1, 1, 0, -1, 1, 1],
-            # emissions intensity equations for flow-through regions
-            [
-                0,
-                0,
-                0,
-                -interconnector_data.get_interconnector(RegionFlow("NSW1->QLD1")).generated_mwh
-                / region_data.get_region(Region("NSW1")).generated_mwh,
-                0,
-                0,
-                1,
-                0,
-                0,
-                0,
-            ],
-            [
-                0,
-                0,
-                0,
-                -interconnector_data.get_interconnector(RegionFlow("NSW1->VIC1")).generated_mwh
-                / region_data.get_region(Region("NSW1")).generated_mwh,
-                0,
-                0,
-                0,
-                1,
-                0,
-                0,
-            ],
-            [
-                0,
-                0,
-                0,
-                -interconnector_data.get_interconnector(RegionFlow("VIC1->TAS1")).generated_mwh
-                / region_data.get_region(Region("VIC1")).generated_mwh,
-                0,
-                0,
-                0,
-                0,
-                0,
-                1,
-            ],
-            [
-                0,
-                0,
-                0,
-                -interconnector_data.get_interconnector(RegionFlow("VIC1->SA1")).generated_mwh
-                / region_data.get_region(Region("VIC1")).generated_mwh,
-                0,
-                0,
-                0,
-                0,
-                1,
-                0,
-            ],
-            [
-                0,
-                0,
-                0,
-                -interconnector_data.get_interconnector(RegionFlow("VIC1->NSW1")).generated_mwh
-                / region_data.get_region(Region("VIC1")).generated_mwh,
-                1,
-                0,
-                0,
-                0,
-                0,
-                0,
-            ],
-        ]
-    )
-
-    # net emissions for each region (region emissions )
-    region_emissions = np.array(
-        [
-            # net emissions for each region (region emissions, minus exported, plus imported)
-            [region_data.get_region(Region("SA1")).emissions_t],
-            [region_data.get_region(Region("QLD1")).emissions_t],
-            [region_data.get_region(Region("TAS1")).emissions_t],
-            [region_data.get_region(Region("NSW1")).emissions_t],
-            [region_data.get_region(Region("VIC1")).emissions_t],
-            [0],
-            [0],
-            [0],
-            [0],
-            [0],
-        ]
+    region_codes = FLOW_SOLVER_BALANCE_REGIONS
+
+    flow_results = solve_flow_emissions_for_intervals(
+        region_generated_mwh={i: np.array([region_data.get_region(i).generated_mwh]) for i in region_codes},
+        region_emissions_t={i: np.array([region_data.get_region(i).emissions_t]) for i in region_codes},
+        interconnector_generated_mwh={
+            i: np.array([interconnector_data.get_interconnector(i).generated_mwh]) for i in _FLOW_SOLVER_INTENSITY_ROWS
+        },
+        interconnector_emissions_t={
+            i: np.array([interconnector_data.get_interconnector(i, default=0).emissions_t]) for i in FLOW_SOLVER_PASSTHROUGH_FLOWS
+        },
     )
 
-    # cast nan to 0
-    region_emissions = np.nan_to_num(region_emissions)
-
-    # obtain solution
-    flow_result = np.linalg.solve(a, region_emissions)
-
-    results = []
-
-    # transform into emission flows
-    results.append(FlowSolverResult(region_flow=RegionFlow("NSW1->QLD1"), emissions=flow_result[6][0]))
-    results.append(FlowSolverResult(region_flow=RegionFlow("VIC1->NSW1"), emissions=flow_result[5][0]))
-    results.append(FlowSolverResult(region_flow=RegionFlow("NSW1->VIC1"), emissions=flow_result[7][0]))
-    results.append(FlowSolverResult(region_flow=RegionFlow("VIC1->SA1"), emissions=flow_result[8][0]))
-    results.append(FlowSolverResult(region_flow=RegionFlow("VIC1->TAS1"), emissions=flow_result[9][0]))
-    results.append(
-        FlowSolverResult(
-            region_flow=RegionFlow("QLD1->NSW1"),
-            emissions=interconnector_data.get_interconnector(RegionFlow("QLD1->NSW1"), default=0).emissions_t,
-        )
-    )
-    results.append(
-        FlowSolverResult(
-            region_flow=RegionFlow("TAS1->VIC1"),
-            emissions=interconnector_data.get_interconnector(RegionFlow("TAS1->VIC1"), default=0).emissions_t,
-        )
-    )
-    results.append(
-        FlowSolverResult(
-            region_flow=RegionFlow("SA1->VIC1"),
-            emissions=interconnector_data.get_interconnector(RegionFlow("SA1->VIC1"), default=0).emissions_t,
-        )
-    )
-
-    return results
+    return [FlowSolverResult(region_flow=region_flow, emissions=values[0]) for region_flow, values in flow_results.items()]
 
 
 # debugger entry point
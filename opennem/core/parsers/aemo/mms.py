@@ -4,10 +4,13 @@ Parse AEMO MMS CSV format which can have multiple tables and definitions per CSV
 """
 
 import csv
+import io
 import logging
+from collections.abc import Generator, Iterable
+from dataclasses import dataclass, field
 from datetime import datetime
 from pathlib import Path
-from typing import Any
+from typing import IO, Any
 
 from pydantic import BaseModel, Field, validator
 from pydantic.error_wrappers import ValidationError
@@ -18,6 +21,7 @@ from opennem.core.normalizers import normalize_duid
 from opennem.schema.aemo.mms import MMSBaseClass, get_mms_schema_for_table
 from opennem.schema.core import BaseConfig
 from opennem.schema.network import NetworkNEM
+from opennem.utils.archive import iter_zip_members
 from opennem.utils.dates import parse_date
 from opennem.utils.version import get_version
 
@@ -249,9 +253,15 @@ MMS_DATE_FIELDS = ["settlementdate", "tradinginterval", "lastchanged", "interval
 
 MMS_DUID_FIELDS = ["duid"]
 
+# the date format used across all MMS tables
+MMS_DATE_FORMAT = "%Y/%m/%d %H:%M:%S"
+
+# default number of rows per column batch in the streaming parser
+MMS_STREAM_BATCH_SIZE = 100_000
+
 
 def parse_aemo_mms_csv(
-    content: str,
+    content: str | Iterable[str],
     table_set: AEMOTableSet | None = None,
     namespace_filter: list[str] | None = None,
     parse_table_schemas: bool = False,
@@ -262,13 +272,16 @@ def parse_aemo_mms_csv(
     """
     Parse AEMO CSV's into schemas and return a table set
 
+    Content is either the CSV as a string or an iterable of lines such as an open
+    text stream, which is parsed without reading it all into memory
+
     Exception raised on error and logs malformed CSVs
     """
 
     if not table_set:
         table_set = AEMOTableSet()
 
-    content_split = content.splitlines()
+    content_split = content.splitlines() if isinstance(content, str) else content
 
     # @NOTE more efficient csv parsing
     datacsv = csv.reader(content_split)
@@ -339,14 +352,14 @@ def parse_aemo_mms_csv(
 
                 record = dict(zip(table_current.fieldnames, values, strict=True))
 
-                for field, fieldvalue in record.items():
-                    if field in MMS_DATE_FIELDS:
+                for fieldname, fieldvalue in record.items():
+                    if fieldname in MMS_DATE_FIELDS:
                         fieldvalue_parsed = parse_date(fieldvalue, network=NetworkNEM)
-                        record[field] = fieldvalue_parsed
+                        record[fieldname] = fieldvalue_parsed
 
-                    if field in MMS_DUID_FIELDS:
+                    if fieldname in MMS_DUID_FIELDS:
                         fieldvalue_parsed = normalize_duid(fieldvalue)
-                        record[field] = fieldvalue_parsed
+                        record[fieldname] = fieldvalue_parsed
 
                 table_current.add_record(record, values_only=values_only)
 
@@ -356,6 +369,213 @@ def parse_aemo_mms_csv(
     return table_set
 
 
+@dataclass
+class AEMOTableBatch:
+    """A batch of records for a single MMS table held as columns rather than rows
+
+    Columns are numpy arrays (or tz-aware pandas DatetimeIndex for date fields)
+    keyed by lower-cased field name
+    """
+
+    namespace: str
+    name: str
+    fieldnames: list[str]
+    columns: dict[str, Any] = field(default_factory=dict)
+    url_source: str | None = None
+
+    @property
+    def full_name(self) -> str:
+        return f"{self.namespace}_{self.name}"
+
+    def __len__(self) -> int:
+        if not self.columns:
+            return 0
+
+        return len(next(iter(self.columns.values())))
+
+    def to_frame(self) -> Any:
+        """Return a pandas dataframe for the batch"""
+        if not _HAVE_PANDAS:
+            return None
+
+        return pd.DataFrame(self.columns, columns=self.fieldnames)
+
+
+def _normalize_duid_column(values: list[str]) -> Any:
+    """Vectorised version of opennem.core.normalizers.normalize_duid"""
+    series = pd.Series(values, dtype=object)
+
+    normalized = (
+        series.str.encode("ascii", "ignore")
+        .str.decode("utf-8")
+        .str.replace(r"\W\_\-\#+", "", regex=True)
+        .str.replace(r"\_[xX][0-9A-F]{4}\_", "", regex=True)
+        .str.strip()
+        .str.upper()
+    )
+
+    normalized[normalized == "-"] = ""
+    normalized[series == ""] = None
+
+    return normalized.to_numpy(dtype=object)
+
+
+def _parse_date_column(values: list[str]) -> Any:
+    """Vectorised MMS date parsing into network (NEM) time"""
+    series = pd.Series(values, dtype=object)
+
+    parsed = pd.to_datetime(series, format=MMS_DATE_FORMAT, errors="coerce")
+
+    # fall back to the slow parser for anything that isn't in the standard format
+    unparsed = parsed.isna() & (series != "")
+
+    if unparsed.any():
+        parsed[unparsed] = [parse_date(i).replace(tzinfo=None) for i in series[unparsed]]  # type: ignore
+
+    return pd.DatetimeIndex(parsed).tz_localize(NetworkNEM.get_fixed_offset())
+
+
+def _parse_value_column(values: list[str]) -> Any:
+    """Cast a column to float if every value is numeric otherwise keep it as strings"""
+    series = pd.Series(values, dtype=object)
+
+    try:
+        return pd.to_numeric(series.mask(series == "")).to_numpy()
+    except (ValueError, TypeError):
+        return series.to_numpy(dtype=object)
+
+
+def _build_table_batch(
+    namespace: str, name: str, fieldnames: list[str], rows: list[list[str]], url: str | None = None
+) -> AEMOTableBatch:
+    """Transpose a set of raw rows into a columnar table batch"""
+    batch = AEMOTableBatch(namespace=namespace.lower(), name=name.lower(), fieldnames=fieldnames, url_source=url)
+
+    for fieldname, column_values in zip(fieldnames, zip(*rows, strict=True), strict=True):
+        column_values = list(column_values)
+
+        if fieldname in MMS_DATE_FIELDS:
+            batch.columns[fieldname] = _parse_date_column(column_values)
+        elif fieldname in MMS_DUID_FIELDS:
+            batch.columns[fieldname] = _normalize_duid_column(column_values)
+        else:
+            batch.columns[fieldname] = _parse_value_column(column_values)
+
+    return batch
+
+
+def iter_aemo_mms_batches(
+    stream: IO[bytes] | IO[str],
+    namespace_filter: list[str] | None = None,
+    batch_size: int = MMS_STREAM_BATCH_SIZE,
+    url: str | None = None,
+) -> Generator[AEMOTableBatch, None, None]:
+    """
+    Streaming version of parse_aemo_mms_csv
+
+    Reads the CSV line by line from a file or stream and yields per-table column
+    batches of at most batch_size rows. Only a single batch of raw rows is held in
+    memory at any time and no per-row dicts are created.
+    """
+    if not _HAVE_PANDAS:
+        raise AEMOParserException("Streaming MMS parser requires pandas")
+
+    if batch_size < 1:
+        raise AEMOParserException("Streaming MMS parser requires a batch_size of at least 1")
+
+    if isinstance(stream, io.TextIOBase):
+        text_stream: IO[str] = stream  # type: ignore
+    else:
+        text_stream = io.TextIOWrapper(stream, encoding="utf-8", newline="")  # type: ignore
+
+    table_namespace: str | None = None
+    table_name: str | None = None
+    table_fields: list[str] = []
+    rows: list[list[str]] = []
+
+    for row in csv.reader(text_stream):
+        if not row:
+            continue
+
+        record_type = row[0].strip().upper()
+
+        if record_type not in AEMO_ROW_HEADER_TYPES:
+            logger.info(f"Skipping row, invalid type: {record_type}")
+            continue
+
+        match record_type:
+            case "C" | "I":
+                if table_name and table_namespace and rows:
+                    yield _build_table_batch(table_namespace, table_name, table_fields, rows, url=url)
+
+                rows = []
+                table_name = None
+
+                if record_type == "C":
+                    continue
+
+                if namespace_filter and row[1].lower() not in namespace_filter:
+                    continue
+
+                table_namespace = row[1].strip()
+                table_name = row[2].strip()
+                table_fields = [i.lower() for i in row[4:]]
+
+            case "D":
+                if not table_name:
+                    continue
+
+                values = row[4:]
+
+                if len(values) != len(table_fields):
+                    logger.error("Malformed AEMO csv - length mismatch between records and fields")
+                    continue
+
+                rows.append(values)
+
+                if len(rows) >= batch_size:
+                    yield _build_table_batch(table_namespace, table_name, table_fields, rows, url=url)  # type: ignore
+                    rows = []
+
+    if table_name and table_namespace and rows:
+        yield _build_table_batch(table_namespace, table_name, table_fields, rows, url=url)
+
+
+def iter_aemo_file_batches(
+    file: str | Path, namespace_filter: list[str] | None = None, batch_size: int = MMS_STREAM_BATCH_SIZE
+) -> Generator[AEMOTableBatch, None, None]:
+    """Streams column batches out of a local AEMO CSV or zip of CSVs without reading it into memory"""
+    file_path = Path(file)
+
+    if not file_path.is_file():
+        raise AEMOParserException(f"Not a file {file_path}")
+
+    if file_path.suffix.lower() == ".zip":
+        with file_path.open("rb") as zip_fh:
+            for _, fh in iter_zip_members(zip_fh):
+                yield from iter_aemo_mms_batches(fh, namespace_filter=namespace_filter, batch_size=batch_size)
+
+        return
+
+    with file_path.open("rb") as fh:
+        yield from iter_aemo_mms_batches(fh, namespace_filter=namespace_filter, batch_size=batch_size)
+
+
+def parse_aemo_mms_frames(
+    batches: Generator[AEMOTableBatch, None, None] | list[AEMOTableBatch],
+) -> dict[str, Any]:
+    """Consume a stream of column batches into a single dataframe per table keyed by table full name"""
+    if not _HAVE_PANDAS:
+        raise AEMOParserException("Streaming MMS parser requires pandas")
+
+    table_frames: dict[str, list[Any]] = {}
+
+    for batch in batches:
+        table_frames.setdefault(batch.full_name, []).append(batch.to_frame())
+
+    return {table_name: pd.concat(frames, ignore_index=True) for table_name, frames in table_frames.items()}
+
+
 def parse_aemo_url(
     url: str, table_set: AEMOTableSet | None = None, skip_records: bool = False, values_only: bool = False
 ) -> AEMOTableSet:
@@ -417,12 +637,20 @@ def parse_aemo_file(file: str, table_set: AEMOTableSet | None = None, values_onl
     if file_path.suffix.lower() not in [".csv"]:
         raise Exception(f"Not a CSV file {file_path}")
 
-    with file_path.open() as fh:
-        table_set = parse_aemo_mms_csv(fh.read(), table_set=table_set, values_only=values_only)
+    with file_path.open(newline="") as fh:
+        table_set = parse_aemo_mms_csv(fh, table_set=table_set, values_only=values_only)
 
     return table_set
 
 
+def parse_aemo_stream(
+    stream: IO[bytes], table_set: AEMOTableSet | None = None, url: str | None = None, values_only: bool = False
+) -> AEMOTableSet:
+    """Parses an AEMO CSV from a binary stream such as a zip member without reading it into memory"""
+    with io.TextIOWrapper(stream, encoding="utf-8", newline="") as fh:
+        return parse_aemo_mms_csv(fh, table_set=table_set, url=url, values_only=values_only)
+
+
 def parse_aemo_directory(directory_path: str) -> AEMOTableSet | None:
     """Parse an entire AEMO directory"""
     return None
@@ -1,45 +1,65 @@
 """ NEMWeb optimized parsers """
 
+import functools
 import logging
+import multiprocessing
 import os
+import shutil
+from collections.abc import Callable
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
 from pathlib import Path
 
+from opennem import settings
 from opennem.controllers.nem import store_aemo_tableset
 from opennem.controllers.schema import ControllerReturn
-from opennem.core.parsers.aemo.mms import AEMOTableSet, parse_aemo_file
-from opennem.utils.archive import download_and_unzip
+from opennem.core.parsers.aemo.mms import AEMOTableSet, parse_aemo_file, parse_aemo_stream
+from opennem.core.profiler import profile_span
+from opennem.utils.archive import download_and_unzip, iter_url_zip_members
+from opennem.utils.process import can_start_process_pool
 
 logger = logging.getLogger("opennem.core.parsers.aemo.nemweb")
 
 
+def _merge_controller_returns(cr: ControllerReturn, controller_returns: ControllerReturn) -> ControllerReturn:
+    """Adds the counts of a controller return to a running total"""
+    cr.processed_records += controller_returns.processed_records
+    cr.total_records += controller_returns.total_records
+    cr.inserted_records += controller_returns.inserted_records
+    cr.errors += controller_returns.errors
+    cr.error_detail += controller_returns.error_detail
+
+    if controller_returns.last_modified and (not cr.last_modified or cr.last_modified < controller_returns.last_modified):
+        cr.last_modified = controller_returns.last_modified
+
+    if controller_returns.server_latest and (not cr.server_latest or cr.server_latest < controller_returns.server_latest):
+        cr.server_latest = controller_returns.server_latest
+
+    return cr
+
+
 def parse_aemo_url_optimized(
     url: str, table_set: AEMOTableSet | None = None, persist_to_db: bool = True, values_only: bool = False
 ) -> ControllerReturn | AEMOTableSet:
-    """Optimized version of aemo url parser that stores the files locally in tmp
-    and parses them individually to resolve memory pressure"""
-    d = download_and_unzip(url)
+    """Optimized version of aemo url parser that streams each CSV out of the archive
+    (including nested zips) and parses them individually to resolve memory pressure"""
     cr = ControllerReturn()
 
-    onlyfiles = [Path(d) / f for f in os.listdir(d) if (Path(d) / f).is_file()]
-    logger.debug(f"Got {len(onlyfiles)} files")
-
     if not table_set:
         table_set = AEMOTableSet()
 
-    for f in onlyfiles:
-        logger.info(f"parsing {f}")
-
-        if f.suffix.lower() not in [".csv"]:
-            continue
-
-        table_set = parse_aemo_file(str(f), table_set=table_set, values_only=values_only)
+    for member_name, member_stream in iter_url_zip_members(url):
+        logger.info(f"parsing {member_name}")
 
+        # when persisting parse each file into its own table set so that tables
+        # from earlier files aren't stored again
         if persist_to_db:
-            controller_returns = store_aemo_tableset(table_set)
-            cr.inserted_records += controller_returns.inserted_records
+            with profile_span("parse"):
+                file_table_set = parse_aemo_stream(member_stream, table_set=AEMOTableSet(), url=url, values_only=values_only)
 
-            if cr.last_modified and controller_returns.last_modified and cr.last_modified < controller_returns.last_modified:
-                cr.last_modified = controller_returns.last_modified
+            with profile_span("store"):
+                _merge_controller_returns(cr, store_aemo_tableset(file_table_set))
+        else:
+            table_set = parse_aemo_stream(member_stream, table_set=table_set, url=url, values_only=values_only)
 
     if not persist_to_db:
         return table_set
@@ -47,31 +67,152 @@ def parse_aemo_url_optimized(
     return cr
 
 
+def _parse_aemo_file_worker(file_path: str, values_only: bool = False) -> AEMOTableSet:
+    """Process pool worker - parses a single file into its own table set"""
+    return parse_aemo_file(file_path, table_set=AEMOTableSet(), values_only=values_only)
+
+
+def _store_parsed_file(cr: ControllerReturn, file_path: Path, parse: Callable[[], AEMOTableSet]) -> None:
+    """Stores the tables of a parsed file into cr. Parse errors are recorded on cr and the
+    file is removed once it's handled to keep the tmp dir small"""
+    try:
+        table_set = parse()
+    except Exception as e:
+        logger.error(f"Error parsing {file_path}: {e}")
+        cr.errors += 1
+        cr.error_detail.append(f"{file_path.name}: {e}")
+        return None
+    finally:
+        file_path.unlink(missing_ok=True)
+
+    if not table_set.tables:
+        logger.debug(f"No tables in {file_path}")
+        return None
+
+    _merge_controller_returns(cr, store_aemo_tableset(table_set))
+
+
+def _parse_aemo_dir_pipelined(
+    d: str, url: str, cr: ControllerReturn, workers: int, max_inflight_bytes: int, values_only: bool = False
+) -> None:
+    """Parses the extracted files of an archive in a process pool and stores them into cr.
+    Files are parsed in this process with a single worker or where a process pool can't be
+    started"""
+    files_to_parse = sorted(
+        [Path(d) / f for f in os.listdir(d) if (Path(d) / f).is_file() and (Path(d) / f).suffix.lower() == ".csv"]
+    )
+
+    if workers <= 1 or not can_start_process_pool():
+        logger.info(f"Serial parse of {len(files_to_parse)} files from {url}")
+
+        for file_path in files_to_parse:
+            _store_parsed_file(cr, file_path, functools.partial(_parse_aemo_file_worker, str(file_path), values_only))
+
+        return None
+
+    logger.info(f"Pipelined parse of {len(files_to_parse)} files from {url} with {workers} workers")
+
+    inflight: dict[Future, tuple[Path, int]] = {}
+    inflight_bytes = 0
+
+    def _store_completed(block: bool) -> None:
+        nonlocal inflight_bytes
+
+        if not inflight:
+            return
+
+        done, _ = wait(inflight.keys(), timeout=None if block else 0, return_when=FIRST_COMPLETED)
+
+        for future in done:
+            file_path, file_size = inflight.pop(future)
+            inflight_bytes -= file_size
+
+            _store_parsed_file(cr, file_path, future.result)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for file_path in files_to_parse:
+            file_size = file_path.stat().st_size
+
+            # wait for the consumer to catch up if we're at the ceiling
+            while inflight and (inflight_bytes + file_size > max_inflight_bytes or len(inflight) >= workers * 2):
+                _store_completed(block=True)
+
+            inflight[pool.submit(_parse_aemo_file_worker, str(file_path), values_only)] = (file_path, file_size)
+            inflight_bytes += file_size
+
+            _store_completed(block=False)
+
+        while inflight:
+            _store_completed(block=True)
+
+
+def parse_aemo_url_pipelined(
+    url: str,
+    workers: int | None = None,
+    max_inflight_mb: int | None = None,
+    values_only: bool = False,
+) -> ControllerReturn:
+    """Pipelined version of parse_aemo_url_optimized for large archives
+
+    A pool of worker processes parses the extracted files while this process
+    stores each file's tables as soon as they are parsed. Each file is stored
+    exactly once. With a single worker, or in a daemon process such as a huey
+    worker where a pool can't be started, the files are parsed in this process.
+
+    @NOTE the archive is extracted to disk here rather than streamed since the
+    worker processes open the files by path. Each file is removed once it's handled
+    and the extracted directory is removed when the parse finishes or fails
+
+    Args:
+        url: url of the archive
+        workers: number of parser processes. Defaults to settings.nemweb_ingest_workers
+            or the number of cpus
+        max_inflight_mb: ceiling on the size of files being parsed or waiting to be stored
+            at any one time. Defaults to settings.nemweb_ingest_max_inflight_mb
+    """
+    if not workers:
+        workers = settings.nemweb_ingest_workers or multiprocessing.cpu_count()
+
+    if not max_inflight_mb:
+        max_inflight_mb = settings.nemweb_ingest_max_inflight_mb
+
+    max_inflight_bytes = max_inflight_mb * 1024 * 1024
+
+    d = download_and_unzip(url)
+    cr = ControllerReturn()
+
+    try:
+        _parse_aemo_dir_pipelined(
+            d, url=url, cr=cr, workers=workers, max_inflight_bytes=max_inflight_bytes, values_only=values_only
+        )
+    finally:
+        shutil.rmtree(d, ignore_errors=True)
+
+    logger.info(f"Pipelined parse of {url} stored {cr.inserted_records} records with {cr.errors} errors")
+
+    return cr
+
+
 def parse_aemo_url_optimized_bulk(
     url: str, table_set: AEMOTableSet | None = None, persist_to_db: bool = True
 ) -> ControllerReturn | AEMOTableSet:
-    """Optimized version of aemo url parser that stores the files locally in tmp
-    and parses them individually to resolve memory pressure"""
-    d = download_and_unzip(url)
+    """Optimized version of aemo url parser that streams each CSV out of the archive
+    and stores all the tables at once"""
     cr = ControllerReturn()
 
-    onlyfiles = [Path(d) / f for f in os.listdir(d) if (Path(d) / f).is_file()]
-    logger.debug(f"Got {len(onlyfiles)} files")
-
     ts = AEMOTableSet()
 
-    for f in onlyfiles:
-        logger.info(f"parsing {f}")
-
-        if f.suffix.lower() not in [".csv"]:
-            continue
+    for member_name, member_stream in iter_url_zip_members(url):
+        logger.info(f"parsing {member_name}")
 
-        ts = parse_aemo_file(str(f), table_set=ts)
+        with profile_span("parse"):
+            ts = parse_aemo_stream(member_stream, table_set=ts, url=url)
 
         if not persist_to_db:
             return ts
 
-    controller_returns = store_aemo_tableset(ts)
+    with profile_span("store"):
+        controller_returns = store_aemo_tableset(ts)
     cr.inserted_records += controller_returns.inserted_records
 
     if cr.last_modified and controller_returns.last_modified and cr.last_modified < controller_returns.last_modified:
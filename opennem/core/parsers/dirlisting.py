@@ -25,6 +25,7 @@ from pydantic import ValidationError, validator
 from pyquery import PyQuery as pq
 
 from opennem.core.downloader import url_downloader
+from opennem.core.downloader_async import download_urls
 from opennem.core.normalizers import is_number, strip_double_spaces
 from opennem.core.parsers.aemo.filenames import parse_aemo_filename
 from opennem.schema.core import BaseConfig
@@ -212,6 +213,26 @@ def get_dirlisting(url: str, timezone: str | None = None) -> DirectoryListing:
     """Parse a directory listng into a list of DirlistingEntry models"""
     dirlisting_content = url_downloader(url)
 
+    return parse_dirlisting(dirlisting_content, url=url, timezone=timezone)
+
+
+def get_dirlistings(urls: list[str], timezone: str | None = None) -> dict[str, DirectoryListing]:
+    """Fetch and parse a set of directory listings concurrently. Listings are kept in the
+    conditional request cache so an unchanged listing is a 304 and isn't re-downloaded"""
+    dirlistings: dict[str, DirectoryListing] = {}
+
+    for result in download_urls(urls, store_content=True):
+        if not result.ok or not result.content:
+            logger.error(f"Could not fetch directory listing: {result.url}. {result.error}")
+            continue
+
+        dirlistings[result.url] = parse_dirlisting(result.content, url=result.url, timezone=timezone)
+
+    return dirlistings
+
+
+def parse_dirlisting(dirlisting_content: bytes, url: str, timezone: str | None = None) -> DirectoryListing:
+    """Parse directory listing content into a list of DirlistingEntry models"""
     resp = pq(dirlisting_content.decode("utf-8"))
 
     _dirlisting_models: list[DirlistingEntry] = []
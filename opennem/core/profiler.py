@@ -3,26 +3,43 @@
 This will track the tasks that are run and their status and output
 as well as the time taken to run them.
 
-Optionally log to the database or another data persistance option
+Tasks can be broken down into nested spans (ie. crawl -> parse -> store) with
+profile_span. Each span records wall and CPU time, database time, rows processed
+and peak memory. Task profiles and spans are buffered and written to the database
+in batches from a background thread.
 """
 
+import atexit
 import enum
 import functools
 import inspect
 import logging
+import os
+import random
+import resource
+import sys
+import threading
+import time
 import uuid
-from collections.abc import Callable
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta
+from multiprocessing.util import Finalize
 from types import FrameType
 from typing import Any, cast
 from zoneinfo import ZoneInfo
 
+from sqlalchemy import event
 from sqlalchemy import text as sql_text
+from sqlalchemy.engine import Engine
 
 from opennem import settings
 from opennem.clients.slack import slack_message
 from opennem.db import get_database_engine
-from opennem.db.models.opennem import NetworkRegion
+from opennem.db.instrumentation import set_task_name_resolver
+from opennem.db.models.opennem import NetworkRegion, TaskProfile, TaskProfileSpan
 from opennem.schema.network import NetworkSchema
 
 # from opennem.utils.timedelta import timedelta_to_string
@@ -54,10 +71,13 @@ def profiler_level_string_to_enum(level: str) -> ProfilerLevel:
     if level.upper() == "NOISY":
         return ProfilerLevel.NOISY
 
-    if level.upper == "INFO":
+    if level.upper() == "DEBUG":
+        return ProfilerLevel.DEBUG
+
+    if level.upper() == "INFO":
         return ProfilerLevel.INFO
 
-    if level.upper == "ESSENTIAL":
+    if level.upper() == "ESSENTIAL":
         return ProfilerLevel.ESSENTIAL
 
     raise Exception("Invalid profiler level")
@@ -91,18 +111,20 @@ def chop_delta_microseconds(delta: timedelta) -> timedelta:
 
 
 def cleanup_database_task_profiles_basedon_retention() -> None:
-    """This will clean up the database tasks based on their retention period"""
+    """This will clean up the database tasks and their spans based on their retention period"""
     engine = get_database_engine()
 
-    query = """
-        delete from task_profile where
-            (retention_period = 'day' and now() - interval '1 day' < time_start) or
-            (retention_period = 'week' and now() - interval '7 days' < time_start) or
-            (retention_period = 'month' and now() - interval '30 days' < time_start)
+    expired = """
+        (retention_period = 'day' and time_start < now() - interval '1 day') or
+        (retention_period = 'week' and time_start < now() - interval '7 days') or
+        (retention_period = 'month' and time_start < now() - interval '30 days')
     """
 
-    with engine.connect() as conn:
-        conn.execute(sql_text(query))
+    with engine.begin() as conn:
+        conn.execute(
+            sql_text(f"delete from task_profile_span where task_profile_id in (select id from task_profile where {expired})")
+        )
+        conn.execute(sql_text(f"delete from task_profile where {expired}"))
 
 
 def parse_kwargs_value(value: Any) -> str:
@@ -184,6 +206,308 @@ def log_task_profile_to_database(
     return id
 
 
+# spans
+@dataclass
+class ProfileSpan:
+    """A timed section of a profiled task. Database time and query counts include the
+    spans nested within it, rows are only those added to this span"""
+
+    name: str
+    task_name: str
+    task_profile_id: uuid.UUID
+    parent_id: uuid.UUID | None = None
+    id: uuid.UUID = field(default_factory=uuid.uuid4)
+    time_start: datetime = field(default_factory=get_now)
+    wall_ms: float = 0.0
+    cpu_ms: float = 0.0
+    db_ms: float = 0.0
+    db_queries: int = 0
+    rows: int = 0
+    memory_peak_kb: int | None = None
+    errors: int = 0
+    sampled: bool = True
+
+    def as_record(self) -> dict[str, Any]:
+        return {
+            "id": self.id,
+            "task_profile_id": self.task_profile_id,
+            "parent_id": self.parent_id,
+            "task_name": self.task_name,
+            "name": self.name,
+            "time_start": self.time_start,
+            "wall_ms": round(self.wall_ms, 3),
+            "cpu_ms": round(self.cpu_ms, 3),
+            "db_ms": round(self.db_ms, 3),
+            "db_queries": self.db_queries,
+            "rows": self.rows,
+            "memory_peak_kb": self.memory_peak_kb,
+            "errors": self.errors,
+        }
+
+
+_current_span: ContextVar[ProfileSpan | None] = ContextVar("opennem_profile_span", default=None)
+
+
+def get_current_span() -> ProfileSpan | None:
+    """The span being recorded in this context, if any"""
+    span = _current_span.get()
+
+    return span if span and span.sampled else None
+
+
+def get_memory_peak_kb() -> int:
+    """Peak resident memory of this process in kb"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+@contextmanager
+def _record_span(span: ProfileSpan) -> Iterator[ProfileSpan]:
+    token = _current_span.set(span)
+    wall_start = time.perf_counter()
+    cpu_start = time.thread_time()
+
+    try:
+        yield span
+    except Exception:
+        span.errors += 1
+        raise
+    finally:
+        span.wall_ms = (time.perf_counter() - wall_start) * 1000
+        span.cpu_ms = (time.thread_time() - cpu_start) * 1000
+        _current_span.reset(token)
+
+        if span.sampled:
+            span.memory_peak_kb = get_memory_peak_kb()
+            profile_buffer.add_span(span)
+
+
+@contextmanager
+def profile_span(name: str) -> Iterator[ProfileSpan | None]:
+    """Records a span nested in the current profiled task. Outside of a recorded task
+    this does nothing
+
+    with profile_span("parse") as span:
+        records = parse(content)
+        profile_span_add_rows(len(records))
+    """
+    parent = get_current_span()
+
+    if not parent:
+        yield None
+        return
+
+    span = ProfileSpan(name=name, task_name=parent.task_name, task_profile_id=parent.task_profile_id, parent_id=parent.id)
+
+    try:
+        with _record_span(span):
+            yield span
+    finally:
+        parent.db_ms += span.db_ms
+        parent.db_queries += span.db_queries
+
+
+def get_current_task_name() -> str | None:
+    """Name of the profiled task running in this context, if any"""
+    span = _current_span.get()
+
+    return span.task_name if span else None
+
+
+# attribute queries to the task that runs them - see opennem.db.instrumentation
+set_task_name_resolver(get_current_task_name)
+
+
+def profile_span_add_rows(rows: int) -> None:
+    """Adds to the rows processed by the current span"""
+    span = get_current_span()
+
+    if span:
+        span.rows += rows
+
+
+def profile_span_add_db_time(seconds: float, queries: int = 1) -> None:
+    """Adds database time the engine events don't see (ie. COPY on a raw connection) to
+    the current span"""
+    span = get_current_span()
+
+    if span:
+        span.db_ms += seconds * 1000
+        span.db_queries += queries
+
+
+# database time for the current span from the engine events - applies to every engine
+@event.listens_for(Engine, "before_cursor_execute")
+def _profile_before_cursor_execute(
+    conn: Any, cursor: Any, statement: str, parameters: Any, context: Any, executemany: bool
+) -> None:
+    if get_current_span():
+        conn.info.setdefault("profiler_query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _profile_after_cursor_execute(
+    conn: Any, cursor: Any, statement: str, parameters: Any, context: Any, executemany: bool
+) -> None:
+    query_starts = conn.info.get("profiler_query_start")
+    span = get_current_span()
+
+    if not query_starts:
+        return None
+
+    query_start = query_starts.pop()
+
+    if span:
+        span.db_ms += (time.perf_counter() - query_start) * 1000
+        span.db_queries += 1
+
+
+@event.listens_for(Engine, "handle_error")
+def _profile_handle_error(exception_context: Any) -> None:
+    """Drop the start time of a query that failed so it isn't paired with the next one"""
+    conn = exception_context.connection
+
+    if conn is not None and conn.info.get("profiler_query_start"):
+        conn.info["profiler_query_start"].pop()
+
+
+# buffered persistence
+class ProfileRecordBuffer:
+    """Buffers task profiles and spans and writes them in batches. A background thread
+    flushes the buffer on an interval or once it reaches the flush size"""
+
+    def __init__(self, flush_size: int, flush_interval: float) -> None:
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._flush_wanted = threading.Event()
+        self._task_profiles: list[dict[str, Any]] = []
+        self._spans: list[dict[str, Any]] = []
+        self._pid: int | None = None
+
+    def _start(self) -> None:
+        """Starts the flush thread in this process"""
+        if self._pid == os.getpid():
+            return None
+
+        with self._lock:
+            if self._pid == os.getpid():
+                return None
+
+            self._pid = os.getpid()
+
+        threading.Thread(target=self._run, name="opennem-profiler-flush", daemon=True).start()
+
+    def _reset_after_fork(self) -> None:
+        """The lock can be held by another thread at a fork and the flush thread doesn't
+        survive it, so a forked process starts over. Records buffered by the parent before
+        the fork are the parent's to write"""
+        self._lock = threading.Lock()
+        self._flush_wanted = threading.Event()
+        self._task_profiles = []
+        self._spans = []
+        self._pid = None
+
+    def _run(self) -> None:
+        while True:
+            self._flush_wanted.wait(self.flush_interval)
+            self._flush_wanted.clear()
+            self.flush()
+
+    def _add(self, task_profile: dict[str, Any] | None = None, span: dict[str, Any] | None = None) -> None:
+        self._start()
+
+        with self._lock:
+            if task_profile:
+                self._task_profiles.append(task_profile)
+
+            if span:
+                self._spans.append(span)
+
+            buffered = len(self._task_profiles) + len(self._spans)
+
+        if buffered >= self.flush_size:
+            self._flush_wanted.set()
+
+    def add_task_profile(self, record: dict[str, Any]) -> None:
+        self._add(task_profile=record)
+
+    def add_span(self, span: ProfileSpan) -> None:
+        self._add(span=span.as_record())
+
+    def flush(self) -> int:
+        """Writes the buffered records. Returns the number of records written"""
+        with self._lock:
+            task_profiles, self._task_profiles = self._task_profiles, []
+            spans, self._spans = self._spans, []
+
+        if not task_profiles and not spans:
+            return 0
+
+        try:
+            with get_database_engine().begin() as conn:
+                if task_profiles:
+                    conn.execute(TaskProfile.__table__.insert(), task_profiles)
+
+                if spans:
+                    conn.execute(TaskProfileSpan.__table__.insert(), spans)
+        except Exception as e:
+            logger.error(f"Error writing {len(task_profiles)} task profiles and {len(spans)} spans: {e}")
+            return 0
+
+        return len(task_profiles) + len(spans)
+
+
+profile_buffer = ProfileRecordBuffer(flush_size=settings.profiler_flush_size, flush_interval=settings.profiler_flush_interval_sec)
+
+atexit.register(profile_buffer.flush)
+os.register_at_fork(after_in_child=profile_buffer._reset_after_fork)
+
+
+def flush_profiles_at_worker_exit() -> None:
+    """Process pool workers exit without running atexit handlers. Called from a pool
+    initializer to write what the worker has buffered when it exits"""
+    Finalize(None, profile_buffer.flush, exitpriority=10)
+
+
+def is_profile_sampled(level: ProfilerLevel) -> bool:
+    """NOISY tasks are recorded at the sample rate, the others always"""
+    if level != ProfilerLevel.NOISY:
+        return True
+
+    return random.random() < settings.profiler_noisy_sample_rate
+
+
+def get_task_profile_span_stats(task_name: str, days: int = 14) -> list[dict[str, Any]]:
+    """Daily timings for each span of a task to spot regressions"""
+    engine = get_database_engine()
+
+    query = """
+        select
+            date_trunc('day', time_start) as day,
+            name,
+            count(*) as runs,
+            percentile_cont(0.5) within group (order by wall_ms) as wall_ms_p50,
+            percentile_cont(0.95) within group (order by wall_ms) as wall_ms_p95,
+            avg(cpu_ms) as cpu_ms_avg,
+            avg(db_ms) as db_ms_avg,
+            avg(db_queries) as db_queries_avg,
+            avg(rows) as rows_avg,
+            max(memory_peak_kb) as memory_peak_kb,
+            sum(errors) as errors
+        from task_profile_span
+        where
+            task_name = :task_name and
+            time_start > now() - make_interval(days => :days)
+        group by 1, 2
+        order by 1 desc, 2
+    """
+
+    with engine.connect() as conn:
+        results = conn.execute(sql_text(query), task_name=task_name, days=days)
+
+        return [dict(i) for i in results]
+
+
 def profile_task(
     send_slack: bool = False,
     message_fmt: str | None = None,
@@ -204,25 +528,46 @@ def profile_task(
             """Wrapper for the task"""
             logger.info(f"Running task: {task.__name__}")
 
-            # get the method that invoked this method for logging purposes
-            invokee_method_name: str = ""
+            if level and level.value < PROFILE_LEVEL.value:
+                logger.debug(f"Task {task.__name__} running without profile since not level")
+                return task(*args, **kwargs)
 
-            try:
-                invokee_method_name = profile_retrieve_caller_name()
-                logger.info(f"Invoked by: {invokee_method_name}")
-            except Exception as e:
-                logger.error(e)
+            # the method that invoked this task for logging purposes
+            invokee_method_name: str = sys._getframe(1).f_code.co_name
 
-            # time_start = time.perf_counter()
-            dtime_start = get_now()
+            id = uuid.uuid4()
+            parent = get_current_span()
 
-            run_task_output = task(*args, **kwargs)
+            task_span = ProfileSpan(
+                id=id,
+                name=task.__name__,
+                task_name=task.__name__,
+                task_profile_id=id,
+                parent_id=parent.id if parent else None,
+                sampled=is_profile_sampled(level),
+            )
 
-            dtime_end = get_now()
+            dtime_start = task_span.time_start
 
-            if level and level.value < PROFILE_LEVEL.value:
-                logger.debug(f"Task {task.__name__} complete and returning since not level")
-                return run_task_output
+            try:
+                with _record_span(task_span):
+                    run_task_output = task(*args, **kwargs)
+            finally:
+                dtime_end = get_now()
+
+                if task_span.sampled:
+                    profile_buffer.add_task_profile(
+                        {
+                            "id": id,
+                            "task_name": task.__name__,
+                            "time_start": dtime_start,
+                            "time_end": dtime_end,
+                            "errors": task_span.errors,
+                            "retention_period": retention_period.value if retention_period else "",
+                            "level": level.name.lower() if level else "",
+                            "invokee_name": invokee_method_name.lower(),
+                        }
+                    )
 
             # calculate wall clock time
             wall_clock_time = chop_delta_microseconds(dtime_end - dtime_start)
@@ -236,14 +581,6 @@ def profile_task(
 
             wall_clock_human = f"{wall_clock_time_seconds}s"
 
-            id = log_task_profile_to_database(
-                task_name=task.__name__,
-                time_start=dtime_start,
-                time_end=dtime_end,
-                retention_period=retention_period,
-                level=level,
-            )
-
             combined_arg_and_env_dict = {**locals(), **kwargs}
 
             # default message format
@@ -6,10 +6,12 @@ import logging
 from pydantic import ValidationError
 
 from opennem import settings
+from opennem.api.export.live import invalidate_live_exports
 from opennem.controllers.schema import ControllerReturn
 from opennem.core.crawlers.meta import CrawlStatTypes, crawler_set_meta, crawlers_get_all_meta
 from opennem.core.crawlers.schema import CrawlerDefinition, CrawlerSchedule, CrawlerSet
 from opennem.core.parsers.aemo.nemweb import parse_aemo_url_optimized
+from opennem.core.profiler import profile_span, profile_span_add_rows
 from opennem.crawlers.apvi import (
     APVIRooftopAllCrawler,
     APVIRooftopLatestCrawler,
@@ -146,9 +148,13 @@ def run_crawl(
     crawler_set_meta(crawler.name, CrawlStatTypes.version, crawler.version)
     crawler_set_meta(crawler.name, CrawlStatTypes.last_crawled, now_opennem_time)
 
-    cr: ControllerReturn | None = crawler.processor(
-        crawler=crawler, last_crawled=last_crawled, limit=crawler.limit, latest=latest
-    )
+    with profile_span(f"crawl {crawler.name}"):
+        cr: ControllerReturn | None = crawler.processor(
+            crawler=crawler, last_crawled=last_crawled, limit=crawler.limit, latest=latest
+        )
+
+        if cr:
+            profile_span_add_rows(cr.inserted_records)
 
     if not cr:
         return None
@@ -172,6 +178,10 @@ def run_crawl(
 
         logger.info(f"Set last_processed to {crawler.last_processed} and server_latest to {cr.server_latest}")
 
+    # backfills can land inside the live export windows so rebuild them in full
+    if not latest and cr.inserted_records:
+        invalidate_live_exports()
+
     return cr
 
 
@@ -2,11 +2,10 @@
 import logging
 from datetime import datetime
 
-from opennem.controllers.nem import ControllerReturn, store_aemo_tableset
+from opennem.controllers.nem import ControllerReturn
 from opennem.core.crawlers.history import CrawlHistoryEntry, set_crawler_history
 from opennem.core.crawlers.schema import CrawlerDefinition, CrawlerPriority, CrawlerSchedule
 from opennem.core.parsers.aemo.filenames import AEMODataBucketSize
-from opennem.core.parsers.aemo.mms import parse_aemo_url
 from opennem.core.parsers.aemo.nemweb import parse_aemo_url_optimized, parse_aemo_url_optimized_bulk
 from opennem.core.parsers.dirlisting import DirlistingEntry, get_dirlisting
 
@@ -100,15 +99,12 @@ def process_mms_url(crawler: CrawlerDefinition) -> ControllerReturn | None:
 
     for entry in entries_to_fetch:
         try:
-            # @NOTE optimization - if we're dealing with a large file unzip
-            # to disk and parse rather than in-memory. 100,000kb
+            # @NOTE monthly MMS archives are streamed out of the zip a member
+            # at a time rather than extracted to disk or read into memory
             if crawler.bulk_insert:
                 controller_returns = parse_aemo_url_optimized_bulk(entry.link, persist_to_db=True)
-            elif entry.file_size and entry.file_size > 100_000:
-                controller_returns = parse_aemo_url_optimized(entry.link)
             else:
-                ts = parse_aemo_url(entry.link)
-                controller_returns = store_aemo_tableset(ts)
+                controller_returns = parse_aemo_url_optimized(entry.link)
 
             max_date = max(i.modified_date for i in entries_to_fetch if i.modified_date)
 
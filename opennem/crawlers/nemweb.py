@@ -1,13 +1,20 @@
 """ Nemweb crawlers """
 import logging
 
+from opennem import settings
 from opennem.controllers.nem import ControllerReturn, store_aemo_tableset
 from opennem.core.crawlers.history import CrawlHistoryEntry, get_crawler_missing_intervals, set_crawler_history
 from opennem.core.crawlers.schema import CrawlerDefinition, CrawlerPriority, CrawlerSchedule
+from opennem.core.downloader_async import DownloadResult, conditional_request_cache, download_urls
 from opennem.core.parsers.aemo.filenames import AEMODataBucketSize
-from opennem.core.parsers.aemo.mms import parse_aemo_url
-from opennem.core.parsers.aemo.nemweb import parse_aemo_url_optimized, parse_aemo_url_optimized_bulk
-from opennem.core.parsers.dirlisting import DirlistingEntry, get_dirlisting
+from opennem.core.parsers.aemo.mms import parse_aemo_mms_csv
+from opennem.core.parsers.aemo.nemweb import (
+    parse_aemo_url_optimized,
+    parse_aemo_url_optimized_bulk,
+    parse_aemo_url_pipelined,
+)
+from opennem.core.parsers.dirlisting import DirlistingEntry, get_dirlistings
+from opennem.core.profiler import profile_span
 from opennem.core.time import get_interval, get_interval_by_size
 from opennem.schema.network import NetworkAEMORooftop, NetworkNEM
 from opennem.schema.time import TimeInterval
@@ -72,7 +79,7 @@ def run_nemweb_aemo_crawl(
         raise Exception("Require a URL to run AEMO MMS crawlers")
 
     try:
-        dirlisting = get_dirlisting(crawler.url, timezone="Australia/Brisbane")
+        dirlisting = get_dirlistings([crawler.url], timezone="Australia/Brisbane")[crawler.url]
     except Exception as e:
         logger.error(f"Could not fetch directory listing: {crawler.url}. {e}")
         return None
@@ -114,32 +121,68 @@ def run_nemweb_aemo_crawl(
 
     controller_returns: ControllerReturn | None = None
 
-    for entry in entries_to_fetch:
-        try:
-            # @NOTE optimization - if we're dealing with a large file unzip
-            # to disk and parse rather than in-memory. 100,000kb
-            if crawler.bulk_insert:
-                controller_returns = parse_aemo_url_optimized_bulk(entry.link, persist_to_db=True)
-            elif entry.file_size and entry.file_size > 100_000:
-                controller_returns = parse_aemo_url_optimized(entry.link)
-            else:
-                ts = parse_aemo_url(entry.link)
-                controller_returns = store_aemo_tableset(ts)
+    # small interval files are downloaded concurrently a window at a time
+    # so catching up on a backlog of intervals isn't bound by one request at a time
+    prefetch_window = settings.http_concurrency_per_host * 4
+
+    for window_start in range(0, len(entries_to_fetch), prefetch_window):
+        entries_window = entries_to_fetch[window_start : window_start + prefetch_window]
+
+        prefetched: dict[str, DownloadResult] = {}
+
+        if not crawler.pipelined and not crawler.bulk_insert:
+            prefetch_urls = [i.link for i in entries_window if not i.file_size or i.file_size <= 100_000]
+            prefetched = {i.url: i for i in download_urls(prefetch_urls)}
+
+        for entry in entries_window:
+            try:
+                # @NOTE optimization - if we're dealing with a large file unzip
+                # to disk and parse rather than in-memory. 100,000kb
+                if crawler.pipelined:
+                    controller_returns = parse_aemo_url_pipelined(entry.link)
+                elif crawler.bulk_insert:
+                    controller_returns = parse_aemo_url_optimized_bulk(entry.link, persist_to_db=True)
+                elif entry.file_size and entry.file_size > 100_000:
+                    controller_returns = parse_aemo_url_optimized(entry.link)
+                else:
+                    download = prefetched[entry.link]
+
+                    if download.not_modified:
+                        logger.info(f"Not modified since last crawl: {entry.link}")
 
-            if not isinstance(controller_returns, ControllerReturn):
-                raise Exception("Controller returns not a ControllerReturn")
+                        # record the check so the interval isn't reported missing and fetched again
+                        if entry.aemo_interval_date:
+                            set_crawler_history(
+                                crawler_name=crawler.name, histories=[CrawlHistoryEntry(interval=entry.aemo_interval_date)]
+                            )
 
-            max_date = max([i.modified_date for i in entries_to_fetch if i.modified_date])
+                        continue
 
-            if not controller_returns.last_modified or max_date > controller_returns.last_modified:
-                controller_returns.last_modified = max_date
+                    if not download.ok or not download.content:
+                        raise Exception(f"Could not fetch AEMO url {entry.link}: {download.error}")
 
-            if entry.aemo_interval_date:
-                ch = CrawlHistoryEntry(interval=entry.aemo_interval_date, records=controller_returns.processed_records)
-                set_crawler_history(crawler_name=crawler.name, histories=[ch])
+                    with profile_span("parse"):
+                        ts = parse_aemo_mms_csv(download.content.decode("utf-8"), url=entry.link)
 
-        except Exception as e:
-            logger.error(f"Processing error: {e}")
+                    with profile_span("store"):
+                        controller_returns = store_aemo_tableset(ts)
+
+                if not isinstance(controller_returns, ControllerReturn):
+                    raise Exception("Controller returns not a ControllerReturn")
+
+                max_date = max([i.modified_date for i in entries_to_fetch if i.modified_date])
+
+                if not controller_returns.last_modified or max_date > controller_returns.last_modified:
+                    controller_returns.last_modified = max_date
+
+                if entry.aemo_interval_date:
+                    ch = CrawlHistoryEntry(interval=entry.aemo_interval_date, records=controller_returns.processed_records)
+                    set_crawler_history(crawler_name=crawler.name, histories=[ch])
+
+            except Exception as e:
+                # fetch it in full next time rather than a 304
+                conditional_request_cache.invalidate(entry.link)
+                logger.error(f"Processing error: {e}")
 
     return controller_returns
 
@@ -227,7 +270,7 @@ AEMONemwebDispatchISArchive = CrawlerDefinition(
     url="http://nemweb.com.au/Reports/ARCHIVE/DispatchIS_Reports/",
     network=NetworkNEM,
     processor=run_nemweb_aemo_crawl,
-    bulk_insert=True,
+    pipelined=True,
 )
 
 AEMONNemwebDispatchScadaArchive = CrawlerDefinition(
@@ -237,6 +280,7 @@ AEMONNemwebDispatchScadaArchive = CrawlerDefinition(
     url="http://www.nemweb.com.au/Reports/ARCHIVE/Dispatch_SCADA/",
     network=NetworkNEM,
     processor=run_nemweb_aemo_crawl,
+    pipelined=True,
 )
 
 
@@ -7,20 +7,29 @@ project
 
 """
 import logging
-from collections.abc import Generator
+from collections.abc import AsyncGenerator, Generator
 
 from sqlalchemy import create_engine
 from sqlalchemy.engine.base import Engine
+from sqlalchemy.engine.url import URL, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import Session, scoped_session, sessionmaker
 
 from opennem import settings
+from opennem.db.instrumentation import register_query_instrumentation
+from opennem.db.prepared import register_prepared_statements, unregister_prepared_statements
 from opennem.exporter.encoders import opennem_deserialize, opennem_serialize
 
 DeclarativeBase = declarative_base()
 
 logger = logging.getLogger("opennem.db")
 
+# connection pool for each process - parallel workers size themselves to stay within it
+# see opennem.aggregates.backfill
+DB_POOL_SIZE = 30
+DB_MAX_OVERFLOW = 20
+
 
 def db_connect(db_conn_str: str | None = None, debug: bool = False, timeout: int = 10) -> Engine:
     """
@@ -51,14 +60,14 @@ def db_connect(db_conn_str: str | None = None, debug: bool = False, timeout: int
     }
 
     try:
-        return create_engine(
+        engine = create_engine(
             db_conn_str,
             json_serializer=opennem_serialize,
             json_deserializer=opennem_deserialize,
             query_cache_size=1200,
             echo=debug,
-            pool_size=30,
-            max_overflow=20,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
             pool_recycle=100,
             pool_timeout=timeout,
             pool_pre_ping=True,
@@ -72,10 +81,72 @@ def db_connect(db_conn_str: str | None = None, debug: bool = False, timeout: int
         logger.error("Could not connect to database: %s", exc)
         raise exc
 
+    if settings.db_query_instrumentation:
+        register_query_instrumentation(engine)
+
+    if settings.db_prepared_statements:
+        register_prepared_statements(engine)
+
+    return engine
+
+
+def enable_query_instrumentation(engine: Engine) -> None:
+    """Turns on query instrumentation for an engine created with it off. The prepared statement
+    hooks are registered again after it so that statements are recorded as built"""
+    unregister_prepared_statements(engine)
+    register_query_instrumentation(engine)
+
+    if settings.db_prepared_statements:
+        register_prepared_statements(engine)
+
 
 engine = db_connect()
 
 
+def get_async_db_url(db_conn_str: str) -> URL:
+    """The asyncpg URL for a database connection string"""
+    return make_url(db_conn_str).set(drivername="postgresql+asyncpg")
+
+
+def db_connect_async(db_conn_str: str | None = None, debug: bool = False, timeout: int = 10) -> AsyncEngine:
+    """
+    Async engine using asyncpg for the API. asyncpg uses prepared statements which are cached
+    per connection so queries with bound parameters are only planned once
+
+    :param db_conn_str: Database connection string
+    :param debug: Debug mode will render queries and info to terminal
+    :param timeout: Database connection timeout
+    """
+    if not db_conn_str:
+        db_conn_str = settings.db_url
+
+    if settings.db_debug:
+        debug = True
+
+    async_engine = create_async_engine(
+        get_async_db_url(db_conn_str),
+        json_serializer=opennem_serialize,
+        json_deserializer=opennem_deserialize,
+        query_cache_size=1200,
+        echo=debug,
+        pool_size=settings.db_async_pool_size,
+        max_overflow=settings.db_async_pool_size,
+        pool_recycle=100,
+        pool_timeout=timeout,
+        pool_pre_ping=True,
+        pool_use_lifo=True,
+        connect_args={"timeout": timeout},
+    )
+
+    if settings.db_query_instrumentation:
+        register_query_instrumentation(async_engine.sync_engine)
+
+    return async_engine
+
+
+_async_engine: AsyncEngine | None = None
+
+
 def get_database_engine() -> Engine:
     """
     Gets a database engine connection
@@ -90,6 +161,19 @@ def get_database_engine() -> Engine:
 SessionLocal = scoped_session(sessionmaker(autocommit=False, autoflush=False, bind=engine))
 
 
+def get_database_engine_async() -> AsyncEngine:
+    """
+    Gets the async database engine. This is created on first use so that processes
+    that don't use it don't require asyncpg
+    """
+    global _async_engine
+
+    if not _async_engine:
+        _async_engine = db_connect_async()
+
+    return _async_engine
+
+
 def get_scoped_session() -> Session:
     return scoped_session(sessionmaker(autocommit=False, autoflush=False, bind=engine))()
 
@@ -109,3 +193,12 @@ def get_database_session() -> Generator[Session, None, None]:
     finally:
         if s:
             s.close()
+
+
+async def get_database_session_async() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Gets an async database session
+
+    """
+    async with AsyncSession(get_database_engine_async(), expire_on_commit=False) as s:
+        yield s
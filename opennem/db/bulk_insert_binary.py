@@ -0,0 +1,447 @@
+"""
+OpenNEM Bulk Insert Pipeline - Binary COPY
+
+Bulk inserts records by streaming the PostgreSQL binary COPY format built directly
+from the record columns into a staging table, then upserting from the staging table
+into the target. Each column is encoded as a whole - records are split into column
+arrays once and frames (ie. generate_facility_scada_frame) are encoded as they are.
+
+The staging table is created once per call and reused across chunks so huge archive
+imports can be committed in pieces. Staging table names are unique per call so
+concurrent workers don't collide.
+
+See:
+
+    https://www.postgresql.org/docs/current/sql-copy.html#id-1.9.3.55.9.4
+
+"""
+import functools
+import logging
+import struct
+import time
+from collections.abc import Callable, Mapping, Sequence
+from dataclasses import dataclass, field
+from datetime import UTC, date, datetime, tzinfo
+from decimal import Decimal
+from io import BytesIO
+from typing import Any
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import BigInteger, Boolean, Date, DateTime, Enum, Integer, Numeric, SmallInteger, String
+from sqlalchemy.sql.schema import Column
+
+from opennem import settings
+from opennem.core.networks import network_from_network_code
+from opennem.db import get_database_engine
+from opennem.db.bulk_insert_csv import ORMTableType, build_on_conflict, get_table_schema, get_tmp_table_name
+
+logger = logging.getLogger("opennem.db.bulk_insert_binary")
+
+PGCOPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+PGCOPY_TRAILER = struct.pack(">h", -1)
+PGCOPY_NULL = struct.pack(">i", -1)
+
+# postgres binary timestamps and dates are relative to 2000-01-01
+PG_EPOCH = datetime(2000, 1, 1)
+PG_EPOCH_UTC = datetime(2000, 1, 1, tzinfo=UTC)
+PG_EPOCH_DATE = date(2000, 1, 1)
+
+BULK_INSERT_BINARY_STAGE_QUERY = """
+    CREATE TEMP TABLE {tmp_table_name} ({column_defs}) ON COMMIT DELETE ROWS
+"""
+
+BULK_INSERT_BINARY_COPY_QUERY = """
+    COPY {tmp_table_name} ({column_names}) FROM STDIN WITH (FORMAT BINARY)
+"""
+
+BULK_INSERT_BINARY_INSERT_QUERY = """
+    INSERT INTO {table_schema}{table_name} ({column_names})
+        SELECT {column_names}
+        FROM {tmp_table_name}
+    ON CONFLICT {on_conflict}
+"""
+
+
+class BulkInsertBinaryException(Exception):
+    pass
+
+
+@dataclass
+class BulkInsertResult:
+    """Row counts and timings for a binary bulk insert"""
+
+    table: str
+    # records stored, as the CSV loader counts them
+    rows_inserted: int = 0
+    # rows the upsert inserted or updated - conflicts that do nothing aren't counted
+    rows_changed: int = 0
+    chunks: int = 0
+    errors: int = 0
+    encode_seconds: float = 0.0
+    copy_seconds: float = 0.0
+    insert_seconds: float = 0.0
+    total_seconds: float = 0.0
+    error_messages: list[str] = field(default_factory=list)
+
+
+ColumnEncoder = Callable[[Sequence[Any]], list[bytes]]
+
+ColumnValues = Sequence[Any] | np.ndarray | pd.Series
+
+
+def _encode_cached(values: list[Any], encode_value: Callable[[Any], bytes]) -> list[bytes]:
+    """Encode values with a per column cache since most columns repeat heavily
+    (network, facility codes, intervals)"""
+    cache: dict[Any, bytes] = {None: PGCOPY_NULL}
+    encoded = []
+
+    for value in values:
+        try:
+            encoded.append(cache[value])
+        except KeyError:
+            cache[value] = encode_value(value)
+            encoded.append(cache[value])
+
+    return encoded
+
+
+def _encode_text_value(value: Any) -> bytes:
+    value_bytes = str(value).encode("utf-8")
+    return struct.pack(">i", len(value_bytes)) + value_bytes
+
+
+def _encode_bool_value(value: Any) -> bytes:
+    return b"\x00\x00\x00\x01\x01" if value else b"\x00\x00\x00\x01\x00"
+
+
+def _encode_int4_value(value: Any) -> bytes:
+    return struct.pack(">ii", 4, int(value))
+
+
+def _encode_int8_value(value: Any) -> bytes:
+    return struct.pack(">iq", 8, int(value))
+
+
+def _encode_date_value(value: Any) -> bytes:
+    if isinstance(value, datetime):
+        value = value.date()
+
+    return struct.pack(">ii", 4, (value - PG_EPOCH_DATE).days)
+
+
+@functools.lru_cache
+def get_naive_tzinfo(network_code: str | None) -> tzinfo:
+    """Zone for naive datetimes in a record - network time for records with a network
+    and UTC otherwise"""
+    network = network_from_network_code(network_code) if network_code else None
+
+    return network.get_fixed_offset() if network else UTC
+
+
+def _encode_timestamptz_value(value: Any) -> bytes:
+    # naive values have their zone attached from the record before encoding
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=UTC)
+
+    delta = value - PG_EPOCH_UTC
+
+    return struct.pack(">iq", 8, (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds)
+
+
+def _encode_timestamp_value(value: Any) -> bytes:
+    if value.tzinfo is not None:
+        value = value.replace(tzinfo=None)
+
+    delta = value - PG_EPOCH
+
+    return struct.pack(">iq", 8, (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds)
+
+
+def encode_float8_column(values: ColumnValues) -> list[bytes]:
+    """Vectorised float8 encoder - packs the length prefix and big endian double for
+    every row in one go and only patches up the nulls. Nulls are None in lists and
+    NaN in arrays"""
+    if isinstance(values, list):
+        nulls = [i for i, v in enumerate(values) if v is None]
+        floats = np.array([0.0 if v is None else float(v) for v in values], dtype=np.float64)
+    else:
+        floats = pd.to_numeric(pd.Series(values), errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+        nulls = np.flatnonzero(np.isnan(floats)).tolist()
+
+    packed = np.empty(len(floats), dtype=[("length", ">i4"), ("value", ">f8")])
+    packed["length"] = 8
+    packed["value"] = floats
+
+    encoded: list[bytes] = packed.view("V12").tolist()
+
+    for i in nulls:
+        encoded[i] = PGCOPY_NULL
+
+    return encoded
+
+
+def _cached_encoder(encode_value: Callable[[Any], bytes]) -> ColumnEncoder:
+    return lambda values: _encode_cached(values, encode_value)
+
+
+def get_column_encoder(column: Column) -> tuple[str, ColumnEncoder] | None:
+    """Returns the staging column type and encoder for a table column or None if
+    the binary loader doesn't support the column type"""
+    column_type = column.type
+
+    # native enums won't cast from text on insert
+    if isinstance(column_type, Enum):
+        return None
+
+    if isinstance(column_type, Boolean):
+        return "boolean", _cached_encoder(_encode_bool_value)
+
+    if isinstance(column_type, DateTime):
+        if column_type.timezone:
+            return "timestamptz", _cached_encoder(_encode_timestamptz_value)
+        return "timestamp", _cached_encoder(_encode_timestamp_value)
+
+    if isinstance(column_type, Date):
+        return "date", _cached_encoder(_encode_date_value)
+
+    if isinstance(column_type, BigInteger):
+        return "bigint", _cached_encoder(_encode_int8_value)
+
+    if isinstance(column_type, Integer | SmallInteger):
+        return "integer", _cached_encoder(_encode_int4_value)
+
+    # @NOTE numeric values are staged as float8 and cast to numeric by the server on insert
+    if isinstance(column_type, Numeric):
+        return "float8", encode_float8_column
+
+    if isinstance(column_type, String):
+        return "text", _cached_encoder(_encode_text_value)
+
+    return None
+
+
+def supports_binary_copy(table: ORMTableType, column_names: list[str]) -> bool:
+    """Check that every column being inserted can be encoded by the binary loader"""
+    table_columns = table.__table__.columns  # type: ignore
+
+    for column_name in column_names:
+        if column_name not in table_columns:
+            return False
+
+        if not get_column_encoder(table_columns[column_name]):
+            return False
+
+    return True
+
+
+def records_to_columns(records: list[dict], column_names: list[str] | None = None) -> dict[str, list[Any]]:
+    """Split dict records into a list of values per column"""
+    if not column_names:
+        column_names = list(records[0].keys())
+
+    try:
+        return {column_name: [i.get(column_name) for i in records] for column_name in column_names}
+    except AttributeError as e:
+        raise BulkInsertBinaryException("Records must all be dicts") from e
+
+
+def _column_to_list(values: ColumnValues) -> list[Any]:
+    """Column values as a list with nulls as None"""
+    if isinstance(values, list):
+        return values
+
+    series = pd.Series(values)
+
+    return series.astype(object).where(series.notna(), None).tolist()
+
+
+def generate_bulkinsert_binary_from_columns(table: ORMTableType, columns: Mapping[str, ColumnValues]) -> BytesIO:
+    """
+    Take column arrays keyed by column name (a dict of lists or a data frame) and a table
+    schema and generate a binary COPY buffer
+    """
+    column_names = list(columns)
+
+    if not column_names or not len(columns[column_names[0]]):
+        raise BulkInsertBinaryException("No records")
+
+    table_columns = table.__table__.columns  # type: ignore
+
+    network_ids: list[Any] | None = None
+    encoded_columns = []
+
+    for column_name in column_names:
+        if column_name not in table_columns:
+            raise BulkInsertBinaryException(f"Column name from records not found in table: {column_name}")
+
+        column_encoder = get_column_encoder(table_columns[column_name])
+
+        if not column_encoder:
+            raise BulkInsertBinaryException(
+                f"Unsupported column type for binary copy: {column_name} {table_columns[column_name].type}"
+            )
+
+        staging_type, encoder = column_encoder
+
+        if staging_type == "float8":
+            encoded_columns.append(encoder(columns[column_name]))
+            continue
+
+        column_values = [_decimal_to_float(i) for i in _column_to_list(columns[column_name])]
+
+        # naive datetimes are network time (or UTC) rather than the host's zone
+        if staging_type == "timestamptz":
+            if network_ids is None:
+                network_ids = _column_to_list(columns["network_id"]) if "network_id" in columns else []
+
+            column_values = [
+                v.replace(tzinfo=get_naive_tzinfo(network_ids[i] if network_ids else None))
+                if isinstance(v, datetime) and not v.tzinfo
+                else v
+                for i, v in enumerate(column_values)
+            ]
+
+        encoded_columns.append(encoder(column_values))
+
+    buffer = BytesIO()
+    buffer.write(PGCOPY_HEADER)
+
+    tuple_header = struct.pack(">h", len(column_names))
+
+    buffer.write(b"".join(tuple_header + b"".join(row) for row in zip(*encoded_columns, strict=True)))
+    buffer.write(PGCOPY_TRAILER)
+
+    buffer.seek(0)
+
+    return buffer
+
+
+def generate_bulkinsert_binary_from_records(
+    table: ORMTableType,
+    records: list[dict],
+    column_names: list[str] | None = None,
+) -> BytesIO:
+    """
+    Take a list of dict records and a table schema and generate a binary COPY buffer
+    """
+    if len(records) < 1:
+        raise BulkInsertBinaryException("No records")
+
+    return generate_bulkinsert_binary_from_columns(table, records_to_columns(records, column_names))
+
+
+def _decimal_to_float(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+def bulkinsert_binary(
+    table: ORMTableType,
+    records: list[dict] | pd.DataFrame,
+    update_fields: list[str | Column[Any]] | None = None,
+    chunk_size: int | None = None,
+) -> BulkInsertResult:
+    """Bulk insert records into table using binary COPY into a staging table
+    with a commit per chunk of records. Records are either dicts or a data frame"""
+    table_name = table.__table__.name  # type: ignore
+    result = BulkInsertResult(table=table_name)
+
+    if not len(records):
+        return result
+
+    time_start = time.perf_counter()
+
+    if not chunk_size:
+        chunk_size = settings.bulk_insert_chunk_size
+
+    encode_start = time.perf_counter()
+    columns: Mapping[str, ColumnValues] = (
+        {c: records[c].to_numpy() for c in records.columns} if isinstance(records, pd.DataFrame) else records_to_columns(records)
+    )
+    result.encode_seconds += time.perf_counter() - encode_start
+
+    num_records = len(records)
+    column_names = list(columns)
+    table_columns = table.__table__.columns  # type: ignore
+
+    table_schema = get_table_schema(table)
+    table_schema = f"{table_schema}." if table_schema else ""
+
+    tmp_table_name = f"__tmp_{table_name}_{get_tmp_table_name(table)}"
+
+    column_defs = ", ".join([f"{c} {get_column_encoder(table_columns[c])[0]}" for c in column_names])  # type: ignore
+
+    stage_query = BULK_INSERT_BINARY_STAGE_QUERY.format(tmp_table_name=tmp_table_name, column_defs=column_defs)
+    copy_query = BULK_INSERT_BINARY_COPY_QUERY.format(tmp_table_name=tmp_table_name, column_names=", ".join(column_names))
+    insert_query = BULK_INSERT_BINARY_INSERT_QUERY.format(
+        table_schema=table_schema,
+        table_name=table_name,
+        column_names=", ".join(column_names),
+        tmp_table_name=tmp_table_name,
+        on_conflict=build_on_conflict(table, update_fields),  # type: ignore
+    )
+
+    logger.debug(insert_query)
+
+    engine = get_database_engine()
+    conn = engine.raw_connection()
+
+    try:
+        cursor = conn.cursor()
+        cursor.execute(stage_query)
+        conn.commit()
+
+        for chunk_start in range(0, num_records, chunk_size):
+            chunk_end = min(chunk_start + chunk_size, num_records)
+            result.chunks += 1
+
+            try:
+                encode_start = time.perf_counter()
+                chunk = {c: columns[c][chunk_start:chunk_end] for c in column_names}
+                copy_buffer = generate_bulkinsert_binary_from_columns(table, chunk)
+                result.encode_seconds += time.perf_counter() - encode_start
+
+                copy_start = time.perf_counter()
+                cursor.copy_expert(copy_query, copy_buffer)
+                result.copy_seconds += time.perf_counter() - copy_start
+
+                insert_start = time.perf_counter()
+                cursor.execute(insert_query)
+                rows_changed = max(cursor.rowcount, 0)
+                conn.commit()
+                result.insert_seconds += time.perf_counter() - insert_start
+
+                result.rows_inserted += chunk_end - chunk_start
+                result.rows_changed += rows_changed
+            except Exception as generic_error:
+                conn.rollback()
+
+                if hasattr(generic_error, "hide_parameters"):
+                    generic_error.hide_parameters = True  # type: ignore
+
+                result.errors += chunk_end - chunk_start
+                result.error_messages.append(str(generic_error))
+                logger.error(f"Error in binary bulk insert chunk {result.chunks} for {table_name}: {generic_error}")
+
+        cursor.execute(f"DROP TABLE IF EXISTS {tmp_table_name}")
+        conn.commit()
+    except Exception as generic_error:
+        if hasattr(generic_error, "hide_parameters"):
+            generic_error.hide_parameters = True  # type: ignore
+        result.error_messages.append(str(generic_error))
+        logger.error(generic_error)
+    finally:
+        engine.dispose()
+        conn.close()
+
+    result.total_seconds = time.perf_counter() - time_start
+
+    logger.info(
+        f"Bulk inserted {result.rows_inserted} records ({result.rows_changed} changed) into {table_name} in {result.chunks} chunks "
+        f"(encode {result.encode_seconds:.2f}s copy {result.copy_seconds:.2f}s "
+        f"insert {result.insert_seconds:.2f}s total {result.total_seconds:.2f}s)"
+    )
+
+    return result
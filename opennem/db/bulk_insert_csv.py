@@ -7,12 +7,16 @@ Bulk inserts records using temporary tables and CSV imports with copy_from
 """
 import csv
 import logging
+import time
 from datetime import datetime
 from io import StringIO
 from typing import Any, TypeVar
+from uuid import uuid4
 
 from sqlalchemy.sql.schema import Column, Table
 
+from opennem import settings
+from opennem.core.profiler import profile_span, profile_span_add_db_time, profile_span_add_rows
 from opennem.db import get_database_engine
 from opennem.db.models.opennem import BalancingSummary, FacilityScada
 
@@ -39,21 +43,37 @@ BULK_INSERT_CONFLICT_UPDATE = """
 """
 
 
-def build_insert_query(
-    table: Table,
-    update_cols: list[str | Column] = None,
-) -> str:
-    """
-    Builds the bulk insert query
-    """
-    on_conflict = "DO NOTHING"
+def get_column_name(column: str | Column) -> str:
+    if isinstance(column, Column) and hasattr(column, "name"):
+        return column.name
+    if isinstance(column, str):
+        return column.strip()
+    return ""
+
 
-    def get_column_name(column: str | Column) -> str:
-        if isinstance(column, Column) and hasattr(column, "name"):
-            return column.name
-        if isinstance(column, str):
-            return column.strip()
-        return ""
+def get_table_schema(table: Table) -> str:
+    """Get the schema name for a table if it defines one"""
+    _ts: str = ""
+
+    if hasattr(table, "__table_args__"):
+        if isinstance(table.__table_args__, dict) and "schema" in table.__table_args__:  # type: ignore
+            _ts = table.__table_args__["schema"]  # type: ignore
+
+        # for table args that are a list of args find the schema def
+        if isinstance(table.__table_args__, tuple):  # type: ignore
+            for i in table.__table_args__:  # type: ignore
+                if isinstance(i, dict) and "schema" in i:  # type: ignore
+                    _ts = i["schema"]  # type: ignore
+
+        if not _ts:
+            logger.warning(f"Table schema not found for table: {table.__table__.name}")  # type: ignore
+
+    return _ts
+
+
+def build_on_conflict(table: Table, update_cols: list[str | Column] | None = None) -> str:
+    """Builds the on conflict clause for the bulk insert query"""
+    on_conflict = "DO NOTHING"
 
     update_col_names = []
 
@@ -70,32 +90,39 @@ def build_insert_query(
             update_values=", ".join([f"{n} = EXCLUDED.{n}" for n in update_col_names]),
         )
 
-    # Table schema
-    table_schema: str = ""
-    _ts: str = ""
+    return on_conflict
 
-    if hasattr(table, "__table_args__"):
-        if isinstance(table.__table_args__, dict) and "schema" in table.__table_args__:  # type: ignore
-            _ts = table.__table_args__["schema"]  # type: ignore
 
-        # for table args that are a list of args find the schema def
-        if isinstance(table.__table_args__, tuple):  # type: ignore
-            for i in table.__table_args__:  # type: ignore
-                if isinstance(i, dict) and "schema" in i:  # type: ignore
-                    _ts = i["schema"]  # type: ignore
+def get_tmp_table_name(table: Table) -> str:
+    """Staging table name that won't collide between concurrent workers or calls"""
+    _ts = get_table_schema(table)
 
-        if not _ts:
-            logger.warning(f"Table schema not found for table: {table.__table__.name}")  # type: ignore
-        else:
-            table_schema = f"{_ts}."
+    tmp_table_name = "{}_{}".format(datetime.strftime(datetime.now(), "%Y%m%d%H%M%S"), uuid4().hex[:12])
 
-    # Temporary table name uniq
-    tmp_table_name: str = ""
+    if _ts:
+        tmp_table_name = f"{_ts}_{tmp_table_name}"
+
+    return tmp_table_name
 
-    tmp_table_name = datetime.strftime(datetime.now(), "%Y%m%d%H%M%S")
+
+def build_insert_query(
+    table: Table,
+    update_cols: list[str | Column] = None,
+) -> str:
+    """
+    Builds the bulk insert query
+    """
+    on_conflict = build_on_conflict(table, update_cols)
+
+    # Table schema
+    table_schema: str = ""
+    _ts = get_table_schema(table)
 
     if _ts:
-        tmp_table_name = f"{_ts}_{tmp_table_name}"
+        table_schema = f"{_ts}."
+
+    # Temporary table name uniq
+    tmp_table_name = get_tmp_table_name(table)
 
     query = BULK_INSERT_QUERY.format(
         table_name=table.__table__.name,  # type: ignore
@@ -177,12 +204,40 @@ def bulkinsert_mms_items(
     table: ORMTableType,
     records: list[dict],
     update_fields: list[str | Column[Any]] | None = None,
+    use_binary: bool | None = None,
 ) -> int:
     num_records = 0
 
     if not records:
         return 0
 
+    if use_binary is None:
+        use_binary = settings.bulk_insert_binary
+
+    with profile_span(f"bulk_insert {table.__table__.name}"):
+        num_records = _bulkinsert_mms_items(table, records, update_fields, use_binary)
+        profile_span_add_rows(num_records)
+
+    return num_records
+
+
+def _bulkinsert_mms_items(
+    table: ORMTableType,
+    records: list[dict],
+    update_fields: list[str | Column[Any]] | None,
+    use_binary: bool,
+) -> int:
+    num_records = 0
+
+    if use_binary:
+        # @NOTE imported here since the binary loader builds on this module
+        from opennem.db.bulk_insert_binary import bulkinsert_binary, supports_binary_copy
+
+        if supports_binary_copy(table, list(records[0].keys())):
+            result = bulkinsert_binary(table, records, update_fields)
+            profile_span_add_db_time(result.copy_seconds + result.insert_seconds, queries=result.chunks * 2)
+            return result.rows_inserted
+
     sql_query = build_insert_query(table, update_fields)
     csv_content = generate_bulkinsert_csv_from_records(table, records, column_names=list(records[0].keys()))
 
@@ -192,8 +247,10 @@ def bulkinsert_mms_items(
 
     try:
         cursor = conn.cursor()
+        copy_start = time.perf_counter()
         cursor.copy_expert(sql_query, csv_content)
         conn.commit()
+        profile_span_add_db_time(time.perf_counter() - copy_start)
         num_records = len(records)
         logger.info(f"Bulk inserted {len(records)} records")
     except Exception as generic_error:
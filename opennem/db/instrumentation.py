@@ -0,0 +1,372 @@
+"""
+Query instrumentation for the SQLAlchemy engines
+
+With settings.db_query_instrumentation on (it's off by default), every statement run
+through an engine is timed and recorded against its fingerprint - the statement with its
+literals and parameters replaced and whitespace collapsed, so that the same query built with
+different values is counted together. Each fingerprint keeps its calls, total and max time,
+rows and the functions and tasks that called it. Looking up the calling function walks the
+stack so it's only done for one in settings.db_query_caller_sample statements and for every
+slow one - the caller counts are of the sampled statements.
+
+Statements slower than settings.db_slow_query_ms are logged to opennem.db.slow_query. The
+first slow run of each fingerprint also logs its EXPLAIN plan, which is run on a background
+thread so that it doesn't hold up the connection that ran the statement.
+
+The stats are kept per process. The CLI prints the top queries by total time with
+`opennem --query-stats N ...` and the API serves them at /admin/db/query/stats.
+"""
+import contextlib
+import functools
+import hashlib
+import itertools
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter, deque
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from opennem import settings
+
+logger = logging.getLogger("opennem.db.instrumentation")
+
+slow_query_logger = logging.getLogger("opennem.db.slow_query")
+
+_QUERY_INFO_KEY = "opennem_query_start"
+
+# statements that can be explained without running them
+_EXPLAINABLE = ("select", "with", "insert", "update", "delete")
+
+# modules skipped when looking for the function that ran a statement
+_CALLER_SKIP_MODULES = ("sqlalchemy.", "contextlib", "opennem.db.instrumentation", "opennem.queries.utils")
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"(?<![\w$.])-?\d+(?:\.\d+)?\b")
+_PARAMETER = re.compile(r"%\(\w+\)s|%s|(?<!:):\w+|\$\d+|\?")
+_VALUE_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_ROW_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)(?:\s*,\s*\(\s*\?(?:\s*,\s*\?)*\s*\))+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_statement(statement: str) -> str:
+    """Statement with literals and parameters replaced by ? and whitespace collapsed"""
+    normalized = _STRING_LITERAL.sub("?", statement)
+    normalized = _PARAMETER.sub("?", normalized)
+    normalized = _NUMBER_LITERAL.sub("?", normalized)
+    normalized = _ROW_LIST.sub("(?...)", normalized)
+    normalized = _VALUE_LIST.sub("(?...)", normalized)
+
+    return _WHITESPACE.sub(" ", normalized).strip().lower()
+
+
+def fingerprint_statement(statement: str) -> str:
+    return hashlib.sha1(normalize_statement(statement).encode("utf-8")).hexdigest()[:12]
+
+
+@dataclass
+class QueryStats:
+    fingerprint: str
+    statement: str
+    calls: int = 0
+    total_ms: float = 0.0
+    max_ms: float = 0.0
+    rows: int = 0
+    slow_calls: int = 0
+    callers: Counter = field(default_factory=Counter)
+    tasks: Counter = field(default_factory=Counter)
+
+    @property
+    def mean_ms(self) -> float:
+        return self.total_ms / self.calls if self.calls else 0.0
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "fingerprint": self.fingerprint,
+            "statement": self.statement,
+            "calls": self.calls,
+            "total_ms": round(self.total_ms, 3),
+            "mean_ms": round(self.mean_ms, 3),
+            "max_ms": round(self.max_ms, 3),
+            "rows": self.rows,
+            "slow_calls": self.slow_calls,
+            "callers": dict(self.callers.most_common(5)),
+            "tasks": dict(self.tasks.most_common(5)),
+        }
+
+
+@dataclass
+class SlowQuery:
+    fingerprint: str
+    statement: str
+    duration_ms: float
+    rows: int
+    caller: str | None
+    task_name: str | None
+    time: datetime
+    explain: str | None = None
+
+
+class QueryInstrumentation:
+    """Per fingerprint query stats and the most recent slow queries for this process"""
+
+    def __init__(self, max_slow_queries: int = 100) -> None:
+        self.stats: dict[str, QueryStats] = {}
+        self.slow_queries: deque[SlowQuery] = deque(maxlen=max_slow_queries)
+        self._explained: set[str] = set()
+        self._explain_executor: ThreadPoolExecutor | None = None
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        statement: str,
+        duration_ms: float,
+        rows: int,
+        caller: str | None = None,
+        task_name: str | None = None,
+        explain: Callable[[], str | None] | None = None,
+    ) -> QueryStats:
+        normalized = normalize_statement(statement)
+        fingerprint = hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:12]
+        is_slow = duration_ms >= settings.db_slow_query_ms
+
+        with self._lock:
+            stats = self.stats.get(fingerprint)
+
+            if not stats:
+                stats = self.stats[fingerprint] = QueryStats(fingerprint=fingerprint, statement=normalized)
+
+            stats.calls += 1
+            stats.total_ms += duration_ms
+            stats.max_ms = max(stats.max_ms, duration_ms)
+            stats.rows += rows
+
+            if caller:
+                stats.callers[caller] += 1
+
+            if task_name:
+                stats.tasks[task_name] += 1
+
+            run_explain = False
+
+            if is_slow:
+                stats.slow_calls += 1
+                run_explain = bool(explain) and fingerprint not in self._explained
+                self._explained.add(fingerprint)
+
+        if is_slow:
+            slow_query = SlowQuery(
+                fingerprint=fingerprint,
+                statement=normalized,
+                duration_ms=duration_ms,
+                rows=rows,
+                caller=caller,
+                task_name=task_name,
+                time=datetime.now(),
+            )
+
+            self.slow_queries.append(slow_query)
+
+            slow_query_logger.warning(
+                f"Slow query {fingerprint} {duration_ms:.0f}ms {rows} rows from {caller} in task {task_name}: "
+                f"{normalized[:500]}"
+            )
+
+            if run_explain and explain:
+                self._submit_explain(slow_query, explain)
+
+        return stats
+
+    def _submit_explain(self, slow_query: SlowQuery, explain: Callable[[], str | None]) -> None:
+        with self._lock:
+            if not self._explain_executor:
+                self._explain_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="opennem-explain")
+
+            executor = self._explain_executor
+
+        executor.submit(self._explain_slow_query, slow_query, explain)
+
+    def _explain_slow_query(self, slow_query: SlowQuery, explain: Callable[[], str | None]) -> None:
+        try:
+            slow_query.explain = explain()
+        except Exception as e:
+            logger.debug(f"Could not explain slow query {slow_query.fingerprint}: {e}")
+            return None
+
+        if slow_query.explain:
+            slow_query_logger.warning(f"Slow query {slow_query.fingerprint} plan:\n{slow_query.explain}")
+
+    def wait_for_explains(self) -> None:
+        """Blocks until the queued EXPLAIN plans have run"""
+        with self._lock:
+            executor, self._explain_executor = self._explain_executor, None
+
+        if executor:
+            executor.shutdown(wait=True)
+
+    def _reset_after_fork(self) -> None:
+        # the lock could be held and the explain thread doesn't exist in a forked child
+        self._lock = threading.Lock()
+        self._explain_executor = None
+
+    def top(self, limit: int = 20) -> list[QueryStats]:
+        """Queries with the most total time"""
+        with self._lock:
+            return sorted(self.stats.values(), key=lambda i: i.total_ms, reverse=True)[:limit]
+
+    def reset(self) -> None:
+        with self._lock:
+            self.stats = {}
+            self.slow_queries.clear()
+            self._explained = set()
+
+    def format_summary(self, limit: int = 20) -> str:
+        """Text table of the top queries by total time"""
+        lines = [f"{'fingerprint':<12} {'calls':>8} {'total ms':>12} {'mean ms':>10} {'max ms':>10} {'rows':>10}  caller / query"]
+
+        for stats in self.top(limit):
+            caller = stats.callers.most_common(1)[0][0] if stats.callers else ""
+            lines.append(
+                f"{stats.fingerprint:<12} {stats.calls:>8} {stats.total_ms:>12.1f} {stats.mean_ms:>10.1f} "
+                f"{stats.max_ms:>10.1f} {stats.rows:>10}  {caller}"
+            )
+            lines.append(f"{'':<12} {stats.statement[:200]}")
+
+        return "\n".join(lines)
+
+
+query_instrumentation = QueryInstrumentation()
+
+os.register_at_fork(after_in_child=query_instrumentation._reset_after_fork)
+
+# counts statements so the caller is looked up for one in settings.db_query_caller_sample
+_caller_sample_counter = itertools.count()
+
+# returns the name of the task running in this context - set by opennem.core.profiler
+_task_name_resolver: Callable[[], str | None] | None = None
+
+
+def set_task_name_resolver(resolver: Callable[[], str | None]) -> None:
+    global _task_name_resolver
+    _task_name_resolver = resolver
+
+
+def get_query_caller() -> str | None:
+    """The first function outside of SQLAlchemy and this module on the stack"""
+    frame = sys._getframe(1)
+
+    while frame:
+        module_name = frame.f_globals.get("__name__", "")
+
+        if not module_name.startswith(_CALLER_SKIP_MODULES):
+            return f"{module_name}.{frame.f_code.co_name}:{frame.f_lineno}"
+
+        frame = frame.f_back  # type: ignore
+
+    return None
+
+
+def explain_statement(engine: Engine, statement: str, parameters: Any) -> str | None:
+    """EXPLAIN plan for a statement on a separate connection so that an error doesn't abort
+    the transaction the statement ran in. Returns None on any error, including not being
+    able to check out a connection"""
+    if engine.dialect.driver != "psycopg2" or not statement.lstrip().lower().startswith(_EXPLAINABLE):
+        return None
+
+    raw_connection = None
+
+    try:
+        raw_connection = engine.raw_connection()
+        cursor = raw_connection.cursor()
+        cursor.execute(f"EXPLAIN {statement}", parameters)
+        return "\n".join(i[0] for i in cursor.fetchall())
+    except Exception as e:
+        logger.debug(f"Could not explain statement: {e}")
+        return None
+    finally:
+        if raw_connection is not None:
+            with contextlib.suppress(Exception):
+                raw_connection.rollback()
+            with contextlib.suppress(Exception):
+                raw_connection.close()
+
+
+def _before_cursor_execute(conn: Any, cursor: Any, statement: str, parameters: Any, context: Any, executemany: bool) -> None:
+    # the statement as built, before it's rewritten as a prepared statement
+    conn.info.setdefault(_QUERY_INFO_KEY, []).append((time.perf_counter(), statement, parameters))
+
+
+def _after_cursor_execute(conn: Any, cursor: Any, statement: str, parameters: Any, context: Any, executemany: bool) -> None:
+    # instrumentation must never fail the statement it's recording
+    try:
+        _record_cursor_execute(conn, cursor, executemany)
+    except Exception as e:
+        logger.warning(f"Could not record query: {e}")
+
+
+def _record_cursor_execute(conn: Any, cursor: Any, executemany: bool) -> None:
+    query_starts = conn.info.get(_QUERY_INFO_KEY)
+
+    if not query_starts:
+        return None
+
+    query_start, statement, parameters = query_starts.pop()
+    duration_ms = (time.perf_counter() - query_start) * 1000
+
+    caller = None
+
+    if duration_ms >= settings.db_slow_query_ms or next(_caller_sample_counter) % settings.db_query_caller_sample == 0:
+        caller = get_query_caller()
+
+    explain = None
+
+    if settings.db_slow_query_explain and not executemany:
+        explain = functools.partial(explain_statement, conn.engine, statement, parameters)
+
+    query_instrumentation.record(
+        statement,
+        duration_ms=duration_ms,
+        rows=max(cursor.rowcount, 0),
+        caller=caller,
+        task_name=_task_name_resolver() if _task_name_resolver else None,
+        explain=explain,
+    )
+
+
+def _handle_error(exception_context: Any) -> None:
+    """Drop the start of a statement that failed so it isn't paired with the next one"""
+    conn = exception_context.connection
+
+    with contextlib.suppress(Exception):
+        if conn is not None and conn.info.get(_QUERY_INFO_KEY):
+            conn.info[_QUERY_INFO_KEY].pop()
+
+
+def register_query_instrumentation(engine: Engine) -> None:
+    """Record the timings of every statement run through the engine. Register this before the
+    prepared statement hooks so the statements are recorded as built"""
+    if event.contains(engine, "after_cursor_execute", _after_cursor_execute):
+        return None
+
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+def get_query_stats(limit: int = 20) -> list[dict[str, Any]]:
+    """Top queries by total time in this process"""
+    return [i.as_dict() for i in query_instrumentation.top(limit)]
+
+
+def get_slow_queries() -> list[SlowQuery]:
+    """The most recent slow queries in this process"""
+    return list(query_instrumentation.slow_queries)
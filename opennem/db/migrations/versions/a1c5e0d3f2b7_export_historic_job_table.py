@@ -0,0 +1,42 @@
+# pylint: disable=no-member
+"""
+export historic job table
+
+Revision ID: a1c5e0d3f2b7
+Revises: f933ff8f3510
+Create Date: 2023-06-05 10:12:41.518203
+
+"""
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+revision = "a1c5e0d3f2b7"
+down_revision = "f933ff8f3510"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "export_historic_job",
+        sa.Column("network_id", sa.Text(), nullable=False),
+        sa.Column("network_region", sa.Text(), nullable=False),
+        sa.Column("week_start", postgresql.TIMESTAMP(timezone=True), nullable=False),
+        sa.Column("week_end", postgresql.TIMESTAMP(timezone=True), nullable=False),
+        sa.Column("completed", sa.Boolean(), nullable=False),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("error", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=True),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(
+            ["network_id"],
+            ["network.code"],
+            name="fk_export_historic_job_network_code",
+        ),
+        sa.PrimaryKeyConstraint("network_id", "network_region", "week_start"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("export_historic_job")
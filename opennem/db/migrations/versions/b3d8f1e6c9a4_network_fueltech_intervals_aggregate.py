@@ -0,0 +1,57 @@
+# pylint: disable=no-member
+"""
+network fueltech intervals aggregate
+
+Revision ID: b3d8f1e6c9a4
+Revises: a1c5e0d3f2b7
+Create Date: 2023-06-07 09:41:12.361720
+
+"""
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+revision = "b3d8f1e6c9a4"
+down_revision = "a1c5e0d3f2b7"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "at_network_fueltech_intervals",
+        sa.Column("trading_interval", postgresql.TIMESTAMP(timezone=True), nullable=False),
+        sa.Column("network_id", sa.Text(), nullable=False),
+        sa.Column("network_region", sa.Text(), nullable=False),
+        sa.Column("fueltech_id", sa.Text(), nullable=False),
+        sa.Column("power", sa.Numeric(), nullable=True),
+        sa.Column("emissions", sa.Numeric(), nullable=True),
+        sa.Column("market_value", sa.Numeric(), nullable=True),
+        sa.ForeignKeyConstraint(
+            ["network_id"],
+            ["network.code"],
+            name="fk_at_network_fueltech_intervals_network_code",
+        ),
+        sa.PrimaryKeyConstraint("trading_interval", "network_id", "network_region", "fueltech_id"),
+    )
+    op.create_index(
+        "idx_at_network_fueltech_intervals_network_id_trading_interval",
+        "at_network_fueltech_intervals",
+        ["network_id", sa.text("trading_interval DESC")],
+        unique=False,
+    )
+    op.create_index(
+        "idx_at_network_fueltech_intervals_network_region_trading_interval",
+        "at_network_fueltech_intervals",
+        ["network_id", "network_region", sa.text("trading_interval DESC")],
+        unique=False,
+    )
+    op.execute(
+        "SELECT create_hypertable('at_network_fueltech_intervals','trading_interval', if_not_exists => TRUE, migrate_data=>TRUE);"
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("idx_at_network_fueltech_intervals_network_region_trading_interval", table_name="at_network_fueltech_intervals")
+    op.drop_index("idx_at_network_fueltech_intervals_network_id_trading_interval", table_name="at_network_fueltech_intervals")
+    op.drop_table("at_network_fueltech_intervals")
@@ -0,0 +1,50 @@
+# pylint: disable=no-member
+"""
+facility daily dirty days and watermark
+
+Revision ID: c7e2a9d4b1f5
+Revises: b3d8f1e6c9a4
+Create Date: 2023-06-09 11:02:37.184512
+
+"""
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+revision = "c7e2a9d4b1f5"
+down_revision = "b3d8f1e6c9a4"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "at_facility_daily_dirty",
+        sa.Column("network_id", sa.Text(), nullable=False),
+        sa.Column("trading_day", sa.Date(), nullable=False),
+        sa.Column("marked_at", sa.DateTime(timezone=True), server_default=sa.text("clock_timestamp()"), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["network_id"],
+            ["network.code"],
+            name="fk_at_facility_daily_dirty_network_code",
+        ),
+        sa.PrimaryKeyConstraint("network_id", "trading_day"),
+    )
+
+    op.create_table(
+        "at_facility_daily_watermark",
+        sa.Column("network_id", sa.Text(), nullable=False),
+        sa.Column("trading_interval", postgresql.TIMESTAMP(timezone=True), nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=True),
+        sa.ForeignKeyConstraint(
+            ["network_id"],
+            ["network.code"],
+            name="fk_at_facility_daily_watermark_network_code",
+        ),
+        sa.PrimaryKeyConstraint("network_id"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("at_facility_daily_watermark")
+    op.drop_table("at_facility_daily_dirty")
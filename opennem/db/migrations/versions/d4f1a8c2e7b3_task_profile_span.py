@@ -0,0 +1,55 @@
+# pylint: disable=no-member
+"""
+task profile spans
+
+Revision ID: d4f1a8c2e7b3
+Revises: c7e2a9d4b1f5
+Create Date: 2023-06-13 09:41:12.305817
+
+"""
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+revision = "d4f1a8c2e7b3"
+down_revision = "c7e2a9d4b1f5"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "task_profile_span",
+        sa.Column("id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("task_profile_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("parent_id", postgresql.UUID(as_uuid=True), nullable=True),
+        sa.Column("task_name", sa.Text(), nullable=False),
+        sa.Column("name", sa.Text(), nullable=False),
+        sa.Column("time_start", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("wall_ms", sa.Float(), nullable=False),
+        sa.Column("cpu_ms", sa.Float(), nullable=False),
+        sa.Column("db_ms", sa.Float(), nullable=False),
+        sa.Column("db_queries", sa.Integer(), nullable=False),
+        sa.Column("rows", sa.Integer(), nullable=False),
+        sa.Column("memory_peak_kb", sa.Integer(), nullable=True),
+        sa.Column("errors", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_task_profile_span_task_profile_id",
+        "task_profile_span",
+        ["task_profile_id"],
+        unique=False,
+    )
+    op.create_index(
+        "idx_task_profile_span_task_name_time_start",
+        "task_profile_span",
+        ["task_name", "time_start"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("idx_task_profile_span_task_name_time_start", table_name="task_profile_span")
+    op.drop_index("ix_task_profile_span_task_profile_id", table_name="task_profile_span")
+    op.drop_table("task_profile_span")
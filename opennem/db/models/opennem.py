@@ -14,7 +14,7 @@ from decimal import Decimal
 
 from geoalchemy2 import Geometry
 from shapely import wkb
-from sqlalchemy import Boolean, Column, Date, DateTime, Enum, ForeignKey, Index, Integer, LargeBinary, Numeric, Text, func
+from sqlalchemy import Boolean, Column, Date, DateTime, Enum, Float, ForeignKey, Index, Integer, LargeBinary, Numeric, Text, func
 from sqlalchemy.dialects.postgresql import JSONB, TIMESTAMP, UUID
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.ext.hybrid import hybrid_property
@@ -144,6 +144,55 @@ class TaskProfile(Base):
     invokee_name = Column(Text, nullable=True, index=True)
 
 
+class TaskProfileSpan(Base):
+    """Timed span within a profiled task - nested spans point to their parent. See
+    opennem.core.profiler"""
+
+    __tablename__ = "task_profile_span"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    task_profile_id = Column(UUID(as_uuid=True), nullable=False, index=True)
+    parent_id = Column(UUID(as_uuid=True), nullable=True)
+    task_name = Column(Text, nullable=False)
+    name = Column(Text, nullable=False)
+    time_start = Column(DateTime(timezone=True), nullable=False)
+    wall_ms = Column(Float, nullable=False)
+    cpu_ms = Column(Float, nullable=False)
+    db_ms = Column(Float, nullable=False, default=0)
+    db_queries = Column(Integer, nullable=False, default=0)
+    rows = Column(Integer, nullable=False, default=0)
+    memory_peak_kb = Column(Integer, nullable=True)
+    errors = Column(Integer, default=0, nullable=False)
+
+    __table_args__ = (Index("idx_task_profile_span_task_name_time_start", "task_name", "time_start"),)
+
+
+class ExportHistoricJob(Base):
+    """Checkpoints for the historic weekly interval exports so that reruns skip the weeks that
+    are done. See opennem.exporter.historic"""
+
+    __tablename__ = "export_historic_job"
+
+    network_id = Column(
+        Text,
+        ForeignKey("network.code", name="fk_export_historic_job_network_code"),
+        primary_key=True,
+        nullable=False,
+    )
+    network_region = Column(Text, primary_key=True, nullable=False)
+    week_start = Column(TIMESTAMP(timezone=True), primary_key=True, nullable=False)
+
+    # the last day exported - weeks are exported again until they are complete
+    week_end = Column(TIMESTAMP(timezone=True), nullable=False)
+
+    completed = Column(Boolean, nullable=False, default=False)
+    attempts = Column(Integer, nullable=False, default=0)
+    error = Column(Text, nullable=True)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+
 class FuelTechGroup(Base, BaseModel):
     __tablename__ = "fueltech_group"
 
@@ -901,6 +950,40 @@ class AggregateFacilityDaily(Base):
     )
 
 
+class AggregateFacilityDailyDirty(Base):
+    """Trading days that have received new or changed facility scada or price rows since
+    at_facility_daily was last aggregated. See opennem.aggregates.facility_daily"""
+
+    __tablename__ = "at_facility_daily_dirty"
+
+    network_id = Column(
+        Text,
+        ForeignKey("network.code", name="fk_at_facility_daily_dirty_network_code"),
+        primary_key=True,
+        nullable=False,
+    )
+    trading_day = Column(Date, primary_key=True, nullable=False)
+
+    # moved on each time the day is marked so rows marked during a run are kept
+    marked_at = Column(DateTime(timezone=True), server_default=func.clock_timestamp(), nullable=False)
+
+
+class AggregateFacilityDailyWatermark(Base):
+    """The latest interval at_facility_daily has been aggregated up to for each network"""
+
+    __tablename__ = "at_facility_daily_watermark"
+
+    network_id = Column(
+        Text,
+        ForeignKey("network.code", name="fk_at_facility_daily_watermark_network_code"),
+        primary_key=True,
+        nullable=False,
+    )
+    trading_interval = Column(TIMESTAMP(timezone=True), nullable=False)
+
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
 class AggregateNetworkFlows(Base, BaseModel):
     """
     Network Flows Aggregate Table
@@ -947,6 +1030,51 @@ class AggregateNetworkFlows(Base, BaseModel):
     )
 
 
+class AggregateNetworkFueltechIntervals(Base):
+    """
+    Network region and fueltech power, emissions and market value per interval
+
+    See opennem.aggregates.network_fueltech_intervals
+    """
+
+    __tablename__ = "at_network_fueltech_intervals"
+
+    trading_interval = Column(TIMESTAMP(timezone=True), primary_key=True, nullable=False)
+
+    network_id = Column(
+        Text,
+        ForeignKey("network.code", name="fk_at_network_fueltech_intervals_network_code"),
+        primary_key=True,
+        nullable=False,
+    )
+    network = relationship("Network")
+
+    network_region = Column(Text, primary_key=True, nullable=False)
+    fueltech_id = Column(Text, primary_key=True, nullable=False)
+
+    # MW
+    power = Column(Numeric, nullable=True)
+
+    # tCO2-e
+    emissions = Column(Numeric, nullable=True)
+
+    market_value = Column(Numeric, nullable=True)
+
+    __table_args__ = (
+        Index(
+            "idx_at_network_fueltech_intervals_network_id_trading_interval",
+            network_id,
+            trading_interval.desc(),
+        ),
+        Index(
+            "idx_at_network_fueltech_intervals_network_region_trading_interval",
+            network_id,
+            network_region,
+            trading_interval.desc(),
+        ),
+    )
+
+
 class AggregateNetworkDemand(Base):
     """
     Network demand aggregates for energy and price
@@ -0,0 +1,134 @@
+"""
+Server-side prepared statements for psycopg2
+
+psycopg2 sends every query as text, so PostgreSQL parses and plans it on every call even
+when the SQL is the same. With settings.db_prepared_statements on, statements that are
+executed with the "prepared" execution option (see opennem.queries.utils.bind_query) are
+run as PREPARE once per connection and then EXECUTE with the bound values, so that the
+plan can be reused.
+
+PREPARE is given the type of each parameter from its value since the server can't infer
+every type from the statement, ie. the start and finish of time_bucket_gapfill which is
+overloaded for timestamps, timestamptz and dates. The same statement run with values of other
+types is prepared again under another name.
+
+Prepared statements last for the database session so they are tracked on the pooled
+connection record and go away with it when the connection is recycled.
+"""
+import hashlib
+import logging
+import re
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Any
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger("opennem.db.prepared")
+
+PREPARED_EXECUTION_OPTION = "prepared"
+
+_PREPARED_INFO_KEY = "opennem_prepared_statements"
+
+_PYFORMAT_PARAM = re.compile(r"%\((\w+)\)s")
+
+
+def prepared_statement_name(statement: str, param_types: list[str] | None = None) -> str:
+    """Stable name for a statement and its parameter types so each connection prepares it once"""
+    if param_types:
+        statement = f"({', '.join(param_types)}) {statement}"
+
+    return "opennem_" + hashlib.sha1(statement.encode("utf-8")).hexdigest()[:16]
+
+
+def get_parameter_type(value: Any) -> str:
+    """PostgreSQL type for a parameter value. Lists are arrays of the type of their first
+    value. None and strings are left for the server to infer as they are when psycopg2 sends
+    them as literals, so that strings still compare to dates, enums etc."""
+    if value is None or isinstance(value, str):
+        return "unknown"
+
+    # bool before int since it's a subclass
+    if isinstance(value, bool):
+        return "boolean"
+
+    if isinstance(value, int):
+        return "bigint"
+
+    if isinstance(value, float):
+        return "double precision"
+
+    if isinstance(value, Decimal):
+        return "numeric"
+
+    if isinstance(value, datetime):
+        return "timestamptz" if value.tzinfo else "timestamp"
+
+    if isinstance(value, date):
+        return "date"
+
+    if isinstance(value, timedelta):
+        return "interval"
+
+    if isinstance(value, list | tuple):
+        element_type = next((get_parameter_type(i) for i in value if i is not None), "unknown")
+        return "text[]" if element_type == "unknown" else f"{element_type}[]"
+
+    return "unknown"
+
+
+def to_prepared_statement(statement: str) -> tuple[str, list[str]]:
+    """Converts a pyformat statement to PostgreSQL $n placeholders. Returns the statement and
+    the parameter names in placeholder order"""
+    param_names: list[str] = []
+
+    def _placeholder(match: re.Match) -> str:
+        param_name = match.group(1)
+
+        if param_name not in param_names:
+            param_names.append(param_name)
+
+        return f"${param_names.index(param_name) + 1}"
+
+    prepared = _PYFORMAT_PARAM.sub(_placeholder, statement)
+
+    # psycopg2 escapes literal percents which PREPARE receives as is
+    return prepared.replace("%%", "%"), param_names
+
+
+def _prepare_before_cursor_execute(
+    conn: Any, cursor: Any, statement: str, parameters: Any, context: Any, executemany: bool
+) -> tuple[str, Any]:
+    if executemany or context is None or not context.execution_options.get(PREPARED_EXECUTION_OPTION):
+        return statement, parameters
+
+    if context.dialect.paramstyle != "pyformat" or not isinstance(parameters, dict):
+        return statement, parameters
+
+    prepared_statement, param_names = to_prepared_statement(statement)
+    param_types = [get_parameter_type(parameters.get(i)) for i in param_names]
+    statement_name = prepared_statement_name(prepared_statement, param_types)
+
+    prepared = conn.connection.info.setdefault(_PREPARED_INFO_KEY, set())
+
+    if statement_name not in prepared:
+        logger.debug(f"Preparing {statement_name}")
+        param_types_sql = f" ({', '.join(param_types)})" if param_types else ""
+        cursor.execute(f"PREPARE {statement_name}{param_types_sql} AS {prepared_statement}")
+        prepared.add(statement_name)
+
+    if not param_names:
+        return f"EXECUTE {statement_name}", parameters
+
+    return f"EXECUTE {statement_name} ({', '.join(f'%({i})s' for i in param_names)})", parameters
+
+
+def register_prepared_statements(engine: Engine) -> None:
+    """Run statements with the prepared execution option as server-side prepared statements"""
+    event.listen(engine, "before_cursor_execute", _prepare_before_cursor_execute, retval=True)
+
+
+def unregister_prepared_statements(engine: Engine) -> None:
+    if event.contains(engine, "before_cursor_execute", _prepare_before_cursor_execute):
+        event.remove(engine, "before_cursor_execute", _prepare_before_cursor_execute)
@@ -1,10 +1,13 @@
 """
 OpenNEM S3 Bucket Module
 
-Writes OpennemDataSet's to AWS S3 buckets
+Writes OpennemDataSet's to AWS S3 buckets through the export writer in
+opennem.exporter.writer
 """
 import json
 import logging
+import re
+from concurrent.futures import Future
 from typing import Any
 
 import boto3
@@ -12,10 +15,14 @@ from botocore.exceptions import ClientError
 
 from opennem import settings
 from opennem.api.stats.schema import OpennemDataSet
+from opennem.exporter.encoders import opennem_model_serialize
+from opennem.exporter.writer import get_export_writer
 from opennem.utils.url import urljoin
 
 logger = logging.getLogger(__name__)
 
+_STAT_SET_CREATED_AT_RE = re.compile(r'"created_at": ?"[^"]*"')
+
 
 class OpennemDataSetSerializeS3:
     bucket_name: str
@@ -41,7 +48,7 @@ class OpennemDataSetSerializeS3:
         if settings.debug:
             indent = 4
 
-        stat_set_content = stat_set.json(exclude_unset=self.exclude_unset, indent=indent, exclude=exclude)
+        stat_set_content = opennem_model_serialize(stat_set, exclude_unset=self.exclude_unset, exclude=exclude, indent=indent)
 
         obj = self.bucket.Object(key=key)
         _write_response = obj.put(Body=stat_set_content, ContentType="application/json")
@@ -59,79 +66,51 @@ class OpennemDataSetSerializeS3:
         return _write_response
 
 
-def write_statset_to_s3(stat_set: OpennemDataSet, file_path: str, exclude: set = None, exclude_unset: bool = False) -> int:
-    """
-    Write an Opennem data set to an s3 bucket using boto
-    """
-    s3_save_path = urljoin(f"https://{settings.s3_bucket_path}", file_path)
+def stat_set_hash_content(stat_set_content: str) -> str:
+    """Content to compare a serialized stat set on to skip unchanged writes - everything
+    but the created_at date which changes on every export"""
+    return _STAT_SET_CREATED_AT_RE.sub("", stat_set_content, count=1)
 
-    if file_path.startswith("/"):
-        file_path = file_path[1:]
 
+def submit_to_s3(
+    content: str | bytes,
+    file_path: str,
+    content_type: str = "application/json",
+    hash_content: str | bytes | None = None,
+    skip_unchanged: bool = True,
+) -> Future:
+    """
+    Queue a write to s3 on the export writer. The future resolves to the bytes written
+    """
     if not settings.s3_bucket_path:
         raise Exception("Require an S3 bucket to write to")
 
-    s3bucket = OpennemDataSetSerializeS3(settings.s3_bucket_path, exclude_unset=exclude_unset)
-    write_response = None
-
-    try:
-        write_response = s3bucket.dump(file_path, stat_set, exclude=exclude)
-    except ClientError as e:
-        logging.error(e)
-        return 0
-
-    if "ResponseMetadata" not in write_response:
-        raise Exception(f"Error writing stat set to {file_path} invalid write response")
+    return get_export_writer().submit(
+        file_path, content, content_type=content_type, hash_content=hash_content, skip_unchanged=skip_unchanged
+    )
 
-    if "HTTPStatusCode" not in write_response["ResponseMetadata"]:
-        raise Exception(f"Error writing stat set to {file_path} invalid write response")
 
-    if write_response["ResponseMetadata"]["HTTPStatusCode"] != 200:
-        raise Exception(
-            "Error writing stat set to {} - response code {}".format(
-                file_path, write_response["ResponseMetadata"]["HTTPStatusCode"]
-            )
-        )
-
-    logger.info("Wrote {} to {}".format(write_response["length"], s3_save_path))
-
-    return write_response["length"]
-
-
-def write_to_s3(content: str, file_path: str, content_type: str = "application/json") -> int:
+def write_to_s3(
+    content: str | bytes,
+    file_path: str,
+    content_type: str = "application/json",
+    hash_content: str | bytes | None = None,
+    skip_unchanged: bool = True,
+) -> int:
     """
     Write a string to s3
     """
     s3_save_path = urljoin(f"https://{settings.s3_bucket_path}", file_path)
 
-    if file_path.startswith("/"):
-        file_path = file_path[1:]
-
-    if not settings.s3_bucket_path:
-        raise Exception("Require an S3 bucket to write to")
-
-    s3bucket = OpennemDataSetSerializeS3(settings.s3_bucket_path)
-    write_response = None
-
     try:
-        write_response = s3bucket.write(file_path, content, content_type=content_type)
+        bytes_written = submit_to_s3(
+            content, file_path, content_type=content_type, hash_content=hash_content, skip_unchanged=skip_unchanged
+        ).result()
     except ClientError as e:
         logging.error(e)
         return 0
 
-    if "ResponseMetadata" not in write_response:
-        raise Exception(f"Error writing stat set to {file_path} invalid write response")
-
-    if "HTTPStatusCode" not in write_response["ResponseMetadata"]:
-        raise Exception(f"Error writing stat set to {file_path} invalid write response")
-
-    if write_response["ResponseMetadata"]["HTTPStatusCode"] != 200:
-        raise Exception(
-            "Error writing stat set to {} - response code {}".format(
-                file_path, write_response["ResponseMetadata"]["HTTPStatusCode"]
-            )
-        )
-
-    logger.info("Wrote {} to {}".format(write_response["length"], s3_save_path))
+    if bytes_written:
+        logger.info(f"Wrote {bytes_written} to {s3_save_path}")
 
-    return write_response["length"]
+    return bytes_written
@@ -4,17 +4,48 @@ OpenNEM custom JSON encoders and decoders.
 Supporting both regular JSON and extended GeoJSON. This is used by SQLAlchemy to serialize objects
 in the data store as well
 
+Serialization goes through the backend in settings.json_serializer - either the stdlib json
+module with the encoders below (the default) or orjson, which handles datetimes, dataclasses,
+enums and numpy types natively. Both write the same documents except that orjson output is
+compact, only indents by two spaces and writes NaN and Infinity as null, so published output
+is only byte-identical with the json backend.
+
 :see_also: opennem/db/__init__.py
 """
 import dataclasses
 import decimal
+import enum
 import json
+import logging
+from collections.abc import Callable, Iterator
 from datetime import date, datetime
 from typing import Any
 
+import numpy as np
 from geojson import GeoJSONEncoder
+from pydantic import BaseModel
+from pydantic.json import pydantic_encoder
 
+from opennem import settings
 from opennem.core.dispatch_type import DispatchType, dispatch_type_string
+from opennem.settings_schema import SUPPORTED_JSON_SERIALIZERS
+
+_HAVE_ORJSON = False
+
+try:
+    import orjson
+
+    _HAVE_ORJSON = True
+except ImportError:
+    pass
+
+logger = logging.getLogger("opennem.exporter.encoders")
+
+JSON_SERIALIZER_BACKENDS = SUPPORTED_JSON_SERIALIZERS
+
+
+class JSONSerializerException(Exception):
+    pass
 
 
 class OpenNEMJSONEncoder(json.JSONEncoder):
@@ -31,6 +62,10 @@ class OpenNEMJSONEncoder(json.JSONEncoder):
             return str(o)
         if isinstance(o, DispatchType):
             return dispatch_type_string(o)
+        if isinstance(o, np.generic):
+            return o.item()
+        if isinstance(o, np.ndarray):
+            return o.tolist()
         return super().default(o)
 
 
@@ -44,9 +79,59 @@ class OpenNEMGeoJSONEncoder(GeoJSONEncoder, OpenNEMJSONEncoder):
             return o.isoformat()
         if isinstance(o, DispatchType):
             return dispatch_type_string(o)
+        if isinstance(o, np.generic):
+            return o.item()
+        if isinstance(o, np.ndarray):
+            return o.tolist()
         return super().default(o)
 
 
+_GEOJSON_ENCODER = OpenNEMGeoJSONEncoder()
+
+
+def model_encoder(o: Any) -> Any:
+    """Default hook for pydantic models - pydantic_encoder plus numpy types"""
+    if isinstance(o, np.generic):
+        return o.item()
+    if isinstance(o, np.ndarray):
+        return o.tolist()
+    return pydantic_encoder(o)
+
+
+def get_json_serializer(backend: str | None = None) -> str:
+    """The serializer backend to use - settings.json_serializer by default. Falls back to
+    the stdlib json module if orjson isn't installed"""
+    backend = backend or settings.json_serializer
+
+    if backend not in JSON_SERIALIZER_BACKENDS:
+        raise JSONSerializerException(f"Unknown JSON serializer {backend}: must be one of {JSON_SERIALIZER_BACKENDS}")
+
+    if backend == "orjson" and not _HAVE_ORJSON:
+        logger.debug("orjson is not installed - serializing with json")
+        return "json"
+
+    return backend
+
+
+def opennem_dumps(
+    obj: Any, indent: int | None = None, default: Callable[[Any], Any] | None = None, backend: str | None = None
+) -> bytes:
+    """Serialize to UTF-8 JSON bytes with the serializer backend. default is called for types
+    the backend doesn't know and defaults to the GeoJSON encoder"""
+    if get_json_serializer(backend) == "orjson":
+        option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+        if indent:
+            option |= orjson.OPT_INDENT_2
+
+        return orjson.dumps(obj, default=default or _GEOJSON_ENCODER.default, option=option)
+
+    if default:
+        return json.dumps(obj, default=default, indent=indent).encode("utf-8")
+
+    return json.dumps(obj, cls=OpenNEMGeoJSONEncoder, indent=indent).encode("utf-8")
+
+
 def opennem_deserialize(serialized: str) -> Any:
     """Use custom OpenNEM deserializer which supports custom types and GeoJSON
 
@@ -62,9 +147,76 @@ def opennem_deserialize(serialized: str) -> Any:
 
 def opennem_serialize(obj: Any, indent: int | None = None) -> str:
     """Use custom OpenNEM serializer which supports custom types and GeoJSON"""
-    obj_deserialized = None
+    return opennem_dumps(obj, indent=indent).decode("utf-8")
+
+
+def pydantic_json_dumps(obj: Any, *, default: Callable[[Any], Any] | None = None, **dumps_kwargs: Any) -> str:
+    """json_dumps for pydantic model configs so that model.json() goes through the serializer
+    backend. Any json.dumps arguments other than indent are passed to the stdlib"""
+    indent = dumps_kwargs.pop("indent", None)
+
+    if dumps_kwargs:
+        return json.dumps(obj, default=default, indent=indent, **dumps_kwargs)
+
+    return opennem_dumps(obj, indent=indent, default=default or model_encoder).decode("utf-8")
+
+
+def _model_value(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        return model_dict(value)
+
+    if isinstance(value, list | tuple):
+        # lists are either models or values - data series are passed through as is
+        if value and isinstance(value[0], BaseModel | list | dict):
+            return [_model_value(i) for i in value]
+
+        return value
+
+    if isinstance(value, dict):
+        return {k: _model_value(v) for k, v in value.items()}
+
+    if isinstance(value, enum.Enum):
+        return value.value
+
+    return value
+
+
+def model_dict(model: BaseModel, exclude: set[str] | None = None) -> dict[str, Any]:
+    """The fields that were set on a model as a dict - the same as model.dict(exclude_unset=True)
+    without the per field overhead of pydantic. Used to serialize large stat sets"""
+    return {
+        field_name: _model_value(value)
+        for field_name, value in model.__dict__.items()
+        if field_name in model.__fields_set__ and not (exclude and field_name in exclude)
+    }
+
+
+def opennem_model_serialize(
+    model: BaseModel, exclude_unset: bool = True, exclude: set[str] | None = None, indent: int | None = None
+) -> str:
+    """Serialize a model with the serializer backend. The fast path is for exclude_unset
+    as the exports and API use"""
+    if not exclude_unset:
+        return model.json(exclude_unset=False, exclude=exclude, indent=indent)
+
+    return opennem_dumps(model_dict(model, exclude=exclude), indent=indent, default=model_encoder).decode("utf-8")
+
+
+def iter_model_json(model: BaseModel, stream_field: str = "data", exclude: set[str] | None = None) -> Iterator[bytes]:
+    """Serialize a model with exclude_unset in chunks - the other fields and then the items of
+    stream_field (ie. the series in a stat set) one at a time so that the whole document is
+    never held in memory. The stream field is written last"""
+    exclude = exclude or set()
+
+    header = opennem_dumps(model_dict(model, exclude=exclude | {stream_field}), default=model_encoder)
+
+    if stream_field in exclude or stream_field not in model.__fields_set__:
+        yield header
+        return None
+
+    yield header[:-1] + (b"," if len(header) > 2 else b"") + opennem_dumps(stream_field) + b":["
 
-    if not obj_deserialized:
-        obj_deserialized = json.dumps(obj, cls=OpenNEMGeoJSONEncoder, indent=indent)
+    for item_num, item in enumerate(getattr(model, stream_field) or []):
+        yield (b"," if item_num else b"") + opennem_dumps(_model_value(item), default=model_encoder)
 
-    return obj_deserialized
+    yield b"]}"
@@ -6,11 +6,22 @@ For each network, this exports:
  - 5min (or network.interval_size) data in weekly buckets
 
 This is called from the scheduler in opennem.workers.scheduler to run every morning
+
+Each network region and week is a job. Jobs are run over a process pool and recorded in the
+export_historic_job checkpoint table so that a rerun of a full export skips the weeks that are
+done. Weeks are exported again until they are complete. With a single worker, or from a daemonic
+process like a huey worker, jobs are run in process.
 """
 
 import logging
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta
 
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+
 from opennem import settings
 from opennem.api.export.controllers import (
     demand_week,
@@ -23,9 +34,10 @@ from opennem.api.export.utils import write_output
 from opennem.api.time import human_to_interval, human_to_period
 from opennem.controllers.output.schema import OpennemExportSeries
 from opennem.core.network_region_bom_station_map import get_network_region_weather_station
-from opennem.core.profiler import profile_task
-from opennem.db import get_scoped_session
-from opennem.db.models.opennem import NetworkRegion
+from opennem.core.networks import network_from_network_code
+from opennem.core.profiler import flush_profiles_at_worker_exit, profile_task
+from opennem.db import get_database_engine, get_scoped_session
+from opennem.db.models.opennem import ExportHistoricJob, NetworkRegion
 from opennem.schema.network import NetworkNEM, NetworkSchema, NetworkWEM
 from opennem.utils.dates import (
     get_last_complete_day_for_network,
@@ -33,9 +45,13 @@ from opennem.utils.dates import (
     get_week_start_from_week_num,
     week_series_datetimes,
 )
+from opennem.utils.process import can_start_process_pool
 
 logger = logging.getLogger("opennem.export.historic")
 
+# database connections a job holds at once - the session and a query connection
+HISTORIC_JOB_DB_CONNECTIONS = 2
+
 
 class ExporterHistoricException(Exception):
     """Specific exception for this worker"""
@@ -140,24 +156,245 @@ def export_network_intervals_for_week(
     return write_output(save_path, stat_set)
 
 
+@dataclass
+class HistoricExportJob:
+    """A network region and week to export"""
+
+    network_code: str
+    network_region_code: str
+    week_start: datetime
+    week_end: datetime
+
+
+@dataclass
+class HistoricExportResult:
+    completed: list[HistoricExportJob] = field(default_factory=list)
+    failed: list[HistoricExportJob] = field(default_factory=list)
+
+
+def get_historic_checkpoints(
+    network: NetworkSchema, network_region_code: str | None = None
+) -> dict[tuple[str, datetime], datetime]:
+    """The last day exported for each completed network region and week start"""
+    session = get_scoped_session()
+
+    query = session.query(ExportHistoricJob).filter(
+        ExportHistoricJob.network_id == network.code, ExportHistoricJob.completed.is_(True)
+    )
+
+    if network_region_code:
+        query = query.filter(ExportHistoricJob.network_region == network_region_code)
+
+    checkpoints = {(i.network_region, i.week_start): i.week_end for i in query.all()}
+
+    session.close()
+
+    return checkpoints
+
+
+def record_historic_job(job: HistoricExportJob, completed: bool, error: str | None = None) -> None:
+    """Record the outcome of a job in the checkpoint table"""
+    engine = get_database_engine()
+
+    stmt = insert(ExportHistoricJob).values(
+        network_id=job.network_code,
+        network_region=job.network_region_code,
+        week_start=job.week_start,
+        week_end=job.week_end,
+        completed=completed,
+        attempts=1,
+        error=error,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["network_id", "network_region", "week_start"],
+        set_={
+            "week_end": stmt.excluded.week_end,
+            "completed": stmt.excluded.completed,
+            "attempts": ExportHistoricJob.attempts + 1,
+            "error": stmt.excluded.error,
+            "updated_at": func.now(),
+        },
+    )
+
+    with engine.begin() as c:
+        c.execute(stmt)
+
+
+def plan_historic_export_jobs(
+    network: NetworkSchema,
+    network_region_codes: list[str],
+    limit: int | None = None,
+    checkpoints: dict[tuple[str, datetime], datetime] | None = None,
+) -> list[HistoricExportJob]:
+    """Jobs for each network region and week from the last completed week back to when the
+    network was first seen. Weeks in checkpoints that were exported up to the same day are skipped"""
+    if not network.data_first_seen:
+        raise ExporterHistoricException(f"Network {network.code} has no data first seen")
+
+    # get the last complete day for the network
+    network_last_complete_day = get_last_complete_day_for_network(network)
+    network_last_completed_week_start = network_last_complete_day - timedelta(days=network_last_complete_day.weekday())
+
+    jobs = []
+    skipped = 0
+
+    for network_region_code in network_region_codes:
+        for week_start, week_end in week_series_datetimes(
+            start=network_last_completed_week_start, end=network.data_first_seen, length=limit
+        ):
+            if week_end > network_last_complete_day:
+                week_end = network_last_complete_day
+
+            checkpoint_week_end = checkpoints.get((network_region_code, week_start)) if checkpoints else None
+
+            if checkpoint_week_end and checkpoint_week_end >= week_end:
+                skipped += 1
+                continue
+
+            jobs.append(
+                HistoricExportJob(
+                    network_code=network.code,
+                    network_region_code=network_region_code,
+                    week_start=week_start,
+                    week_end=week_end,
+                )
+            )
+
+    logger.info(f"Planned {len(jobs)} historic export jobs for {network.code} and skipped {skipped} completed")
+
+    return jobs
+
+
+def _historic_worker_init() -> None:
+    """Process pool initializer - drop the database connections inherited from the parent
+    without closing them from under it and write the worker's task profiles when it exits"""
+    get_database_engine().dispose(close=False)
+    flush_profiles_at_worker_exit()
+
+
+def run_historic_export_job(job: HistoricExportJob) -> int | None:
+    """Process pool worker - export a single network region and week"""
+    network = network_from_network_code(job.network_code)
+
+    session = get_scoped_session()
+
+    network_region = (
+        session.query(NetworkRegion)
+        .filter(NetworkRegion.network_id == job.network_code)
+        .filter(NetworkRegion.code == job.network_region_code)
+        .one()
+    )
+
+    session.close()
+
+    return export_network_intervals_for_week(
+        week_start=job.week_start, week_end=job.week_end, network=network, network_region=network_region
+    )
+
+
+def _iter_historic_export_jobs(
+    jobs: list[HistoricExportJob], workers: int
+) -> Iterator[tuple[HistoricExportJob, int | None, Exception | None]]:
+    """Runs jobs and yields each with the bytes it wrote or its error as it completes. Jobs
+    are run in this process with a single worker or where a process pool can't be started"""
+    if workers <= 1 or not can_start_process_pool():
+        for job in jobs:
+            try:
+                yield job, run_historic_export_job(job), None
+            except Exception as e:
+                yield job, None, e
+
+        return None
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_historic_worker_init) as pool:
+        futures = {pool.submit(run_historic_export_job, job): job for job in jobs}
+
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result(), None
+            except Exception as e:
+                yield futures[future], None, e
+
+
+def run_historic_export_jobs(
+    jobs: list[HistoricExportJob], workers: int | None = None, retries: int | None = None
+) -> HistoricExportResult:
+    """Run export jobs over a process pool and record each in the checkpoint table. Failed jobs
+    are retried after the rest have run rather than stopping the export
+
+    The pool is sized so that the workers stay within settings.export_historic_db_connections
+    """
+    if retries is None:
+        retries = settings.export_historic_retries
+
+    workers = min(
+        workers or settings.export_historic_workers,
+        max(1, settings.export_historic_db_connections // HISTORIC_JOB_DB_CONNECTIONS),
+    )
+
+    result = HistoricExportResult()
+    pending = jobs
+
+    for attempt in range(retries + 1):
+        if not pending:
+            break
+
+        if attempt:
+            logger.info(f"Retrying {len(pending)} failed historic export jobs (attempt {attempt + 1})")
+
+        failed = []
+
+        for job, bytes_written, error in _iter_historic_export_jobs(pending, workers=workers):
+            if error:
+                logger.error(
+                    f"Error exporting historic {job.network_code} {job.network_region_code} week {job.week_start}: {error}"
+                )
+                record_historic_job(job, completed=False, error=str(error))
+                failed.append(job)
+                continue
+
+            # no data for the week isn't retried but will be picked up by the next run
+            if bytes_written is None:
+                record_historic_job(job, completed=False, error="No data")
+            else:
+                record_historic_job(job, completed=True)
+
+            result.completed.append(job)
+
+        pending = failed
+
+    result.failed = pending
+
+    if result.failed:
+        logger.error(f"{len(result.failed)} historic export jobs failed after {retries + 1} attempts")
+
+    return result
+
+
 @profile_task(send_slack=False)
 def export_historic_intervals(
-    limit: int | None = None, networks: list[NetworkSchema] | None = None, network_region_code: str | None = None
-) -> None:
-    """ """
+    limit: int | None = None,
+    networks: list[NetworkSchema] | None = None,
+    network_region_code: str | None = None,
+    resume: bool = True,
+    workers: int | None = None,
+) -> HistoricExportResult:
+    """Export the historic weekly intervals for each network region
+
+    Args:
+        limit: number of weeks back from the last complete week. Defaults to all weeks since
+            the network was first seen
+        resume: skip weeks that the checkpoint table has as completed
+        workers: number of worker processes. Defaults to settings.export_historic_workers
+    """
     if networks is None:
         networks = [NetworkNEM, NetworkWEM]
 
     session = get_scoped_session()
 
-    for network in networks:
-        if not network.data_first_seen:
-            raise ExporterHistoricException(f"Network {network.code} has no data first seen")
-
-        # get the last complete day for the network
-        network_last_complete_day = get_last_complete_day_for_network(network)
-        network_last_completed_week_start = network_last_complete_day - timedelta(days=network_last_complete_day.weekday())
+    jobs: list[HistoricExportJob] = []
 
+    for network in networks:
         # query out the regions and filter
         query = session.query(NetworkRegion).filter(NetworkRegion.network_id == network.code)
 
@@ -166,20 +403,15 @@ def export_historic_intervals(
 
         network_regions: list[NetworkRegion] = query.all()
 
-        # loop through the networks
-        for network_region in network_regions:
-            for week_start, week_end in week_series_datetimes(
-                start=network_last_completed_week_start, end=network.data_first_seen, length=limit
-            ):
-                if week_end > network_last_complete_day:
-                    week_end = network_last_complete_day
-
-                try:
-                    export_network_intervals_for_week(
-                        week_start=week_start, week_end=week_end, network=network, network_region=network_region
-                    )
-                except Exception as e:
-                    raise ExporterHistoricException(f"export_historic_intervals error: {e}") from None
+        checkpoints = get_historic_checkpoints(network, network_region_code=network_region_code) if resume else None
+
+        jobs += plan_historic_export_jobs(
+            network, network_region_codes=[i.code for i in network_regions], limit=limit, checkpoints=checkpoints
+        )
+
+    session.close()
+
+    return run_historic_export_jobs(jobs, workers=workers)
 
 
 @profile_task(send_slack=False)
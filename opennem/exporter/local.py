@@ -1,4 +1,5 @@
 import logging
+from collections.abc import Iterator
 from io import BytesIO, StringIO
 from os import makedirs
 from pathlib import Path
@@ -9,7 +10,7 @@ from opennem.utils.mime import decode_bytes
 logger = logging.getLogger(__name__)
 
 
-def write_to_local(file_path: str, data: StringIO | bytes | BytesIO | str) -> int:
+def write_to_local(file_path: str, data: StringIO | bytes | BytesIO | str | Iterator[bytes]) -> int:
     save_folder = settings.static_folder_path
 
     save_file_path = Path(save_folder) / file_path.lstrip("/")
@@ -19,6 +20,9 @@ def write_to_local(file_path: str, data: StringIO | bytes | BytesIO | str) -> in
     if not dir_path.is_dir():
         makedirs(dir_path)
 
+    if isinstance(data, Iterator):
+        return _write_chunks_to_local(save_file_path, data)
+
     write_data: str | None = None
 
     if isinstance(data, StringIO):
@@ -42,3 +46,16 @@ def write_to_local(file_path: str, data: StringIO | bytes | BytesIO | str) -> in
     logger.info(f"Wrote {bytes_written} to {save_file_path}")
 
     return bytes_written
+
+
+def _write_chunks_to_local(save_file_path: Path, chunks: Iterator[bytes]) -> int:
+    """Write a stream of chunks (ie. from iter_model_json) to a local file"""
+    bytes_written = 0
+
+    with open(save_file_path, "wb") as fh:
+        for chunk in chunks:
+            bytes_written += fh.write(chunk)
+
+    logger.info(f"Wrote {bytes_written} to {save_file_path}")
+
+    return bytes_written
@@ -0,0 +1,313 @@
+"""
+OpenNEM export writer
+
+Writes export content to a backend (an S3 bucket or a local folder) from a pool of
+upload threads with optional gzip or brotli Content-Encoding. Each object is written
+with the hash of its content in its metadata so that content that hasn't changed since
+it was last written is skipped.
+
+usage:
+
+    from opennem.exporter.writer import get_export_writer
+
+    writer = get_export_writer()
+
+    for key, content in exports:
+        writer.submit(key, content)
+
+    writer.flush()
+
+@NOTE the hash is read from the object itself (a HEAD request on S3) so skips are right
+whichever host or process last wrote the key.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any
+
+import boto3
+from botocore.exceptions import ClientError
+
+from opennem import settings
+
+logger = logging.getLogger("opennem.exporter.writer")
+
+EXPORT_COMPRESSION_TYPES = ["gzip", "br"]
+
+# object metadata key holding the content hash. S3 returns metadata keys lower case
+EXPORT_CONTENT_HASH_METADATA = "content-hash"
+
+
+class ExportWriterException(Exception):
+    pass
+
+
+@dataclass
+class ExportWriterStats:
+    written: int = 0
+    skipped: int = 0
+    bytes_written: int = 0
+    errors: int = 0
+
+
+def compress_content(content: bytes, compression: str | None) -> bytes:
+    """Compress content for a Content-Encoding"""
+    if not compression:
+        return content
+
+    if compression == "gzip":
+        # fixed mtime so the same content always compresses the same
+        return gzip.compress(content, mtime=0)
+
+    if compression == "br":
+        try:
+            import brotli
+        except ImportError:
+            raise ExportWriterException("brotli compression requires the brotli library") from None
+
+        return brotli.compress(content)
+
+    raise ExportWriterException(f"Unknown compression type {compression}: must be one of {EXPORT_COMPRESSION_TYPES}")
+
+
+class S3Backend:
+    """Writes objects to an S3 bucket"""
+
+    def __init__(self, bucket_name: str) -> None:
+        self.bucket_name = bucket_name
+        # clients are thread safe where resources are not
+        self.client = boto3.client("s3")
+
+    def get_content_hash(self, key: str) -> str | None:
+        """The content hash the object was written with or None if it doesn't exist"""
+        try:
+            head_response = self.client.head_object(Bucket=self.bucket_name, Key=key)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+
+        return head_response.get("Metadata", {}).get(EXPORT_CONTENT_HASH_METADATA)
+
+    def put(
+        self, key: str, body: bytes, content_type: str, content_encoding: str | None = None, content_hash: str | None = None
+    ) -> None:
+        put_args: dict[str, Any] = {"Bucket": self.bucket_name, "Key": key, "Body": body, "ContentType": content_type}
+
+        if content_encoding:
+            put_args["ContentEncoding"] = content_encoding
+
+        if content_hash:
+            put_args["Metadata"] = {EXPORT_CONTENT_HASH_METADATA: content_hash}
+
+        write_response = self.client.put_object(**put_args)
+
+        status_code = write_response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+
+        if status_code != 200:
+            raise ExportWriterException(f"Error writing {key} - response code {status_code}")
+
+
+class LocalBackend:
+    """Writes objects to a local folder with the object metadata in a .meta.json alongside.
+    Used for development and as a stand-in for S3 in tests"""
+
+    def __init__(self, root_path: str | Path) -> None:
+        self.root_path = Path(root_path)
+
+    def get_path(self, key: str) -> Path:
+        return self.root_path / key.lstrip("/")
+
+    def get_meta_path(self, key: str) -> Path:
+        save_path = self.get_path(key)
+        return save_path.with_name(f"{save_path.name}.meta.json")
+
+    def get_content_hash(self, key: str) -> str | None:
+        """The content hash the object was written with or None if it doesn't exist"""
+        meta_path = self.get_meta_path(key)
+
+        if not meta_path.is_file():
+            return None
+
+        return json.loads(meta_path.read_text()).get("content_hash")
+
+    def put(
+        self, key: str, body: bytes, content_type: str, content_encoding: str | None = None, content_hash: str | None = None
+    ) -> None:
+        save_path = self.get_path(key)
+        save_path.parent.mkdir(parents=True, exist_ok=True)
+
+        save_path.write_bytes(body)
+        self.get_meta_path(key).write_text(
+            json.dumps({"content_type": content_type, "content_encoding": content_encoding, "content_hash": content_hash})
+        )
+
+
+class ExportWriter:
+    """Writes export content from a pool of upload threads skipping unchanged content"""
+
+    def __init__(
+        self,
+        backend: S3Backend | LocalBackend,
+        compression: str | None = None,
+        skip_unchanged: bool = False,
+        max_workers: int | None = None,
+    ) -> None:
+        if compression and compression not in EXPORT_COMPRESSION_TYPES:
+            raise ExportWriterException(f"Unknown compression type {compression}: must be one of {EXPORT_COMPRESSION_TYPES}")
+
+        self.backend = backend
+        self.compression = compression
+        self.skip_unchanged = skip_unchanged
+        self.stats = ExportWriterStats()
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or settings.export_workers)
+        self._pending: set[Future] = set()
+        self._lock = threading.Lock()
+
+    def _content_hash(self, content: bytes, content_type: str) -> str:
+        content_hash = hashlib.sha256(content)
+        content_hash.update(f"{content_type}:{self.compression or ''}".encode())
+
+        return content_hash.hexdigest()
+
+    def _is_current(self, key: str, content_hash: str) -> bool:
+        try:
+            return self.backend.get_content_hash(key) == content_hash
+        except Exception as e:
+            # write it anyway
+            logger.warning(f"Could not get content hash of {key}: {e}")
+
+        return False
+
+    def _write(
+        self, key: str, content: bytes, content_type: str, hash_content: bytes | None = None, skip_unchanged: bool = True
+    ) -> int:
+        content_hash = self._content_hash(hash_content or content, content_type)
+
+        if self.skip_unchanged and skip_unchanged and self._is_current(key, content_hash):
+            with self._lock:
+                self.stats.skipped += 1
+
+            logger.debug(f"Skipping unchanged {key}")
+            return 0
+
+        body = compress_content(content, self.compression)
+
+        try:
+            self.backend.put(key, body, content_type=content_type, content_encoding=self.compression, content_hash=content_hash)
+        except Exception as e:
+            # the future holds the error but submit() callers don't check it
+            logger.error(f"Error writing {key}: {e}")
+
+            with self._lock:
+                self.stats.errors += 1
+            raise
+
+        with self._lock:
+            self.stats.written += 1
+            self.stats.bytes_written += len(body)
+
+        logger.debug(f"Wrote {len(body)} to {key}")
+
+        return len(body)
+
+    def submit(
+        self,
+        key: str,
+        content: str | bytes,
+        content_type: str = "application/json",
+        hash_content: str | bytes | None = None,
+        skip_unchanged: bool = True,
+    ) -> Future:
+        """Queue a write. The future resolves to the bytes written or 0 if it was unchanged
+
+        hash_content is hashed in place of the content - ie. the content without the fields
+        that change on every export. skip_unchanged=False always writes the content"""
+        if isinstance(content, str):
+            content = content.encode("utf-8")
+
+        if isinstance(hash_content, str):
+            hash_content = hash_content.encode("utf-8")
+
+        future = self._executor.submit(self._write, key.lstrip("/"), content, content_type, hash_content, skip_unchanged)
+
+        with self._lock:
+            self._pending.add(future)
+
+        future.add_done_callback(self._done)
+
+        return future
+
+    def _done(self, future: Future) -> None:
+        with self._lock:
+            self._pending.discard(future)
+
+    def write(
+        self,
+        key: str,
+        content: str | bytes,
+        content_type: str = "application/json",
+        hash_content: str | bytes | None = None,
+        skip_unchanged: bool = True,
+    ) -> int:
+        """Write and wait for the result"""
+        return self.submit(
+            key, content, content_type=content_type, hash_content=hash_content, skip_unchanged=skip_unchanged
+        ).result()
+
+    def flush(self) -> ExportWriterStats:
+        """Wait for all queued writes. Returns the stats since the last flush so that each
+        export run reports its own"""
+        with self._lock:
+            pending = list(self._pending)
+
+        wait(pending)
+
+        with self._lock:
+            stats, self.stats = self.stats, ExportWriterStats()
+
+        return stats
+
+    def get_stats(self) -> dict[str, int]:
+        return asdict(self.stats)
+
+
+_EXPORT_WRITER: ExportWriter | None = None
+_EXPORT_WRITER_LOCK = threading.Lock()
+
+
+def get_export_writer() -> ExportWriter:
+    """The shared S3 export writer for settings.s3_bucket_path"""
+    global _EXPORT_WRITER
+
+    with _EXPORT_WRITER_LOCK:
+        if not _EXPORT_WRITER:
+            if not settings.s3_bucket_path:
+                raise ExportWriterException("Require an S3 bucket to write to")
+
+            _EXPORT_WRITER = ExportWriter(
+                backend=S3Backend(settings.s3_bucket_path),
+                compression=settings.export_compression,
+                skip_unchanged=settings.export_skip_unchanged,
+            )
+
+    return _EXPORT_WRITER
+
+
+def _reset_export_writer() -> None:
+    """Upload threads don't survive a fork so forked processes (ie. the historic export
+    workers) start their own writer"""
+    global _EXPORT_WRITER, _EXPORT_WRITER_LOCK
+
+    _EXPORT_WRITER = None
+    _EXPORT_WRITER_LOCK = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_export_writer)
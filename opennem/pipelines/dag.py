@@ -0,0 +1,175 @@
+""" OpenNEM pipeline DAG
+
+Chains the processing steps that follow a crawl by their dependencies rather than by
+independent crontab schedules. A source (a crawl) that returns new data triggers the steps
+that depend on it and each step triggers its own dependents only when it reports that it
+changed something.
+
+Steps are scheduled through the scheduler set on the DAG - in the worker this enqueues a
+huey task per step (see opennem.workers.scheduler) and otherwise the steps run inline. The
+last interval each step has processed is kept in the DAG store so that repeated or late
+events for an interval are only processed once.
+"""
+import logging
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Protocol
+
+from opennem.controllers.schema import ControllerReturn
+from opennem.schema.network import NetworkSchema
+
+logger = logging.getLogger("opennem.pipelines.dag")
+
+
+class PipelineDAGException(Exception):
+    """Raised on an invalid pipeline DAG"""
+
+    pass
+
+
+@dataclass(frozen=True)
+class PipelineEvent:
+    """New data for an interval on a network from a source"""
+
+    source: str
+    network_code: str
+    interval: datetime
+    inserted_records: int = 0
+
+    @classmethod
+    def from_controller_return(
+        cls, source: str, controller_return: ControllerReturn | None, network: NetworkSchema
+    ) -> "PipelineEvent | None":
+        """Event for a crawl result, or None if the crawl has no new data"""
+        if not controller_return or not controller_return.inserted_records or not controller_return.server_latest:
+            return None
+
+        return cls(
+            source=source,
+            network_code=network.code,
+            interval=controller_return.server_latest,
+            inserted_records=controller_return.inserted_records,
+        )
+
+
+@dataclass
+class PipelineStep:
+    """A step that runs for an event. run returns whether it changed anything, which is
+    what triggers the steps that depend on it"""
+
+    name: str
+    run: Callable[[PipelineEvent], bool]
+    depends_on: list[str]
+    priority: int = 50
+
+
+class PipelineStore(Protocol):
+    def get(self, key: str) -> Any:
+        ...
+
+    def put(self, key: str, value: Any) -> None:
+        ...
+
+
+@dataclass
+class LocalPipelineStore:
+    values: dict[str, Any] = field(default_factory=dict)
+
+    def get(self, key: str) -> Any:
+        return self.values.get(key)
+
+    def put(self, key: str, value: Any) -> None:
+        self.values[key] = value
+
+
+class PipelineDAG:
+    def __init__(self, name: str, sources: list[str]) -> None:
+        self.name = name
+        self.sources = sources
+        self.steps: dict[str, PipelineStep] = {}
+        self.store: PipelineStore = LocalPipelineStore()
+        self.scheduler: Callable[[str, PipelineEvent], Any] = self.run_step
+
+    def step(self, name: str, depends_on: list[str], priority: int = 50) -> Callable:
+        """Decorator that registers a step"""
+
+        def _register(run: Callable[[PipelineEvent], bool]) -> Callable[[PipelineEvent], bool]:
+            if name in self.steps or name in self.sources:
+                raise PipelineDAGException(f"{self.name}: step {name} already registered")
+
+            self.steps[name] = PipelineStep(name=name, run=run, depends_on=depends_on, priority=priority)
+
+            return run
+
+        return _register
+
+    def downstream(self, name: str) -> list[PipelineStep]:
+        """Steps that depend directly on a source or step"""
+        return [i for i in self.steps.values() if name in i.depends_on]
+
+    def validate(self) -> list[str]:
+        """Checks that every dependency exists and that there are no cycles. Returns the
+        steps in the order they run"""
+        for step in self.steps.values():
+            for dependency in step.depends_on:
+                if dependency not in self.steps and dependency not in self.sources:
+                    raise PipelineDAGException(f"{self.name}: step {step.name} depends on unknown {dependency}")
+
+        order: list[str] = []
+        resolved = set(self.sources)
+        remaining = dict(self.steps)
+
+        while remaining:
+            ready = [i.name for i in remaining.values() if set(i.depends_on) <= resolved]
+
+            if not ready:
+                raise PipelineDAGException(f"{self.name}: cycle in steps {', '.join(remaining)}")
+
+            for step_name in ready:
+                order.append(step_name)
+                resolved.add(step_name)
+                remaining.pop(step_name)
+
+        return order
+
+    def trigger(self, name: str, event: PipelineEvent | None) -> list[str]:
+        """Schedules the steps that depend on a source or step. Returns the scheduled steps"""
+        if not event:
+            logger.debug(f"{self.name}: no new data from {name}")
+            return []
+
+        scheduled = []
+
+        for step in self.downstream(name):
+            logger.info(f"{self.name}: {name} scheduling {step.name} for {event.network_code} {event.interval}")
+            self.scheduler(step.name, event)
+            scheduled.append(step.name)
+
+        return scheduled
+
+    def _watermark_key(self, name: str, event: PipelineEvent) -> str:
+        return f"pipeline:{self.name}:{name}:{event.source}:{event.network_code}"
+
+    def run_step(self, name: str, event: PipelineEvent) -> bool:
+        """Runs a step for an event and triggers its dependents if it changed anything"""
+        if name not in self.steps:
+            raise PipelineDAGException(f"{self.name}: unknown step {name}")
+
+        watermark_key = self._watermark_key(name, event)
+        watermark: datetime | None = self.store.get(watermark_key)
+
+        if watermark and event.interval <= watermark:
+            logger.info(f"{self.name}: {name} already ran for {event.network_code} {event.interval} from {event.source}")
+            return False
+
+        changed = self.steps[name].run(event)
+
+        self.store.put(watermark_key, event.interval)
+
+        if changed:
+            self.trigger(name, event)
+        else:
+            logger.info(f"{self.name}: {name} made no changes for {event.network_code} {event.interval}")
+
+        return bool(changed)
@@ -4,12 +4,14 @@
 All the processing pipelines for the NEM network
 """
 import logging
+from datetime import timedelta
 
 from huey.exceptions import RetryTask
 
 from opennem import settings
 from opennem.aggregates.network_flows import run_flow_update_for_interval
 from opennem.aggregates.network_flows_v3 import run_aggregate_flow_for_interval_v3
+from opennem.aggregates.network_fueltech_intervals import run_aggregate_network_fueltech_intervals_for_interval
 from opennem.api.export.tasks import export_all_daily, export_all_monthly
 from opennem.controllers.schema import ControllerReturn
 from opennem.core.profiler import profile_task
@@ -24,9 +26,11 @@ from opennem.crawlers.nemweb import (
     AEMONNemwebDispatchScada,
 )
 from opennem.exporter.historic import export_historic_intervals
+from opennem.pipelines.dag import PipelineDAG, PipelineEvent
 from opennem.pipelines.export import run_export_all, run_export_current_year, run_export_power_latest_for_network
 from opennem.schema.network import NetworkAU, NetworkNEM, NetworkWEM
 from opennem.workers.daily import daily_runner
+from opennem.workers.energy import run_energy_calc
 
 logger = logging.getLogger("opennem.pipelines.nem")
 
@@ -37,6 +41,45 @@ class NemPipelineNoNewData(Exception):
     pass
 
 
+# per interval processing after the crawls. each step runs once the step before it
+# reports new data - see opennem.pipelines.dag
+nem_pipeline = PipelineDAG("nem", sources=["nem_dispatch_scada_crawl", "nem_rooftop_crawl"])
+
+# energy is recalculated for this many minutes before the new interval to pick up
+# facilities that report late
+NEM_PIPELINE_ENERGY_LOOKBACK_MINUTES = 30
+
+
+@nem_pipeline.step("nem_flows", depends_on=["nem_dispatch_scada_crawl"], priority=50)
+def nem_flows_for_interval(event: PipelineEvent) -> bool:
+    """Flows and the network fueltech interval aggregate for a new interval"""
+    if settings.flows_and_emissions_v3:
+        run_aggregate_flow_for_interval_v3(interval=event.interval, network=NetworkNEM)
+    else:
+        run_flow_update_for_interval(interval=event.interval, network=NetworkNEM)
+
+    run_aggregate_network_fueltech_intervals_for_interval(interval=event.interval, network=NetworkNEM)
+
+    return True
+
+
+@nem_pipeline.step("nem_energy", depends_on=["nem_flows"], priority=40)
+def nem_energy_for_interval(event: PipelineEvent) -> bool:
+    """Energy for the intervals up to a new interval"""
+    date_min = event.interval - timedelta(minutes=NEM_PIPELINE_ENERGY_LOOKBACK_MINUTES)
+
+    return run_energy_calc(date_min, event.interval, network=NetworkNEM) > 0
+
+
+@nem_pipeline.step("nem_export_power", depends_on=["nem_energy", "nem_rooftop_crawl"], priority=40)
+def nem_export_power_latest(event: PipelineEvent) -> bool:
+    """Live power exports for NEM and AU"""
+    run_export_power_latest_for_network(network=NetworkNEM)
+    run_export_power_latest_for_network(network=NetworkAU)
+
+    return True
+
+
 # Crawler tasks
 def nem_dispatch_is_crawl() -> None:
     """Runs the dispatch_is crawl"""
@@ -68,6 +111,13 @@ def nem_dispatch_scada_crawl() -> ControllerReturn:
     if not dispatch_scada or not dispatch_scada.inserted_records:
         raise RetryTask("No new dispatch scada data")
 
+    if settings.pipeline_dag:
+        nem_pipeline.trigger(
+            "nem_dispatch_scada_crawl",
+            PipelineEvent.from_controller_return("nem_dispatch_scada_crawl", dispatch_scada, network=NetworkNEM),
+        )
+        return dispatch_scada
+
     if dispatch_scada.server_latest:
         if settings.flows_and_emissions_v3:
             run_aggregate_flow_for_interval_v3(interval=dispatch_scada.server_latest, network=NetworkNEM)
@@ -75,6 +125,8 @@ def nem_dispatch_scada_crawl() -> ControllerReturn:
             # run old flows
             run_flow_update_for_interval(interval=dispatch_scada.server_latest, network=NetworkNEM)
 
+        run_aggregate_network_fueltech_intervals_for_interval(interval=dispatch_scada.server_latest, network=NetworkNEM)
+
     run_export_power_latest_for_network(network=NetworkNEM)
     run_export_power_latest_for_network(network=NetworkAU)
 
@@ -89,6 +141,12 @@ def nem_rooftop_crawl() -> None:
     if not rooftop or not rooftop.inserted_records:
         raise RetryTask("No new rooftop data")
 
+    if settings.pipeline_dag:
+        nem_pipeline.trigger(
+            "nem_rooftop_crawl", PipelineEvent.from_controller_return("nem_rooftop_crawl", rooftop, network=NetworkNEM)
+        )
+        return None
+
     run_export_power_latest_for_network(network=NetworkNEM)
     run_export_power_latest_for_network(network=NetworkAU)
 
@@ -124,7 +182,8 @@ def nem_per_day_check() -> ControllerReturn:
 
             # export historic intervals
             for network in [NetworkNEM, NetworkWEM]:
-                export_historic_intervals(limit=2, networks=[network])
+                # in process since huey's process workers can't start a pool
+                export_historic_intervals(limit=2, networks=[network], resume=False, workers=1)
 
         return ControllerReturn(
             server_latest=dispatch_actuals.server_latest,
@@ -1,6 +1,10 @@
 """ WEM pipelines """
 import logging
 
+from opennem.aggregates.network_fueltech_intervals import (
+    run_aggregate_network_fueltech_intervals_for_interval,
+    run_network_fueltech_intervals_for_latest_interval,
+)
 from opennem.controllers.schema import ControllerReturn
 from opennem.core.profiler import profile_task
 from opennem.crawl import run_crawl
@@ -8,7 +12,7 @@ from opennem.crawlers.apvi import APVIRooftopTodayCrawler
 from opennem.crawlers.wem import WEMBalancing, WEMBalancingLive, WEMFacilityScada, WEMFacilityScadaLive
 from opennem.pipelines.export import run_export_power_latest_for_network
 from opennem.pipelines.nem import NemPipelineNoNewData
-from opennem.schema.network import NetworkWEM
+from opennem.schema.network import NetworkAPVI, NetworkWEM
 
 logger = logging.getLogger("opennem.pipelines.wem")
 
@@ -33,6 +37,11 @@ def wem_per_interval_check() -> ControllerReturn:
     if not wem_scada or not wem_scada.inserted_records:
         raise NemPipelineNoNewData("No WEM pipeline data")
 
+    if wem_scada.server_latest:
+        run_aggregate_network_fueltech_intervals_for_interval(interval=wem_scada.server_latest, network=NetworkWEM)
+
+    run_network_fueltech_intervals_for_latest_interval(network=NetworkAPVI)
+
     run_export_power_latest_for_network(network=NetworkWEM)
 
     return wem_scada
@@ -171,7 +171,8 @@ def get_network_flows_emissions_market_value_query(
         order by 1 desc, 2 asc
     """
 
-    network_region_query = ""
+    # all regions when no region is passed
+    network_region_query = "1=1"
 
     if network_region_code:
         network_region_query = f"""
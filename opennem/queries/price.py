@@ -1,10 +1,9 @@
 """ OpenNEM Price Queries """
 from datetime import datetime
-from textwrap import dedent
 
-from sqlalchemy import text as sql
 from sqlalchemy.sql.expression import TextClause
 
+from opennem.queries.utils import bind_query
 from opennem.schema.network import NetworkSchema
 from opennem.schema.time import TimeInterval
 from opennem.utils.dates import num_intervals_between_datetimes
@@ -30,9 +29,9 @@ def get_network_region_price_query(
             coalesce(avg(bs.price), avg(bs.price_dispatch)) as price
         from balancing_summary bs
         where
-            bs.trading_interval >= '{date_min}'
-            and bs.trading_interval <= '{date_max}'
-            and bs.network_id = '{network_id}'
+            bs.trading_interval >= :date_min
+            and bs.trading_interval <= :date_max
+            and bs.network_id = :network_id
             {forecast_clause}
             {network_regions_query}
         group by 1, 2, 3;
@@ -42,7 +41,7 @@ def get_network_region_price_query(
     network_regions_query = ""
 
     if network_region_code:
-        network_regions_query = f"and bs.network_region = '{network_region_code.upper()}'"
+        network_regions_query = "and bs.network_region = :network_region"
 
     # forecast clause
     forecast_clause = ""
@@ -55,15 +54,16 @@ def get_network_region_price_query(
     if num_intervals > 1000:
         raise TooManyIntervals("Too many intervals: {num_intervals}. Try reducing date range or interval size")
 
-    return sql(
-        dedent(
-            __query.format(
-                network_id=network.code,
-                trunc=interval.interval_human,
-                date_max=date_max,
-                date_min=date_min,
-                network_regions_query=network_regions_query,
-                forecast_clause=forecast_clause,
-            )
-        )
+    query = __query.format(
+        trunc=interval.interval_human,
+        network_regions_query=network_regions_query,
+        forecast_clause=forecast_clause,
+    )
+
+    return bind_query(
+        query,
+        network_id=network.code,
+        network_region=network_region_code.upper() if network_region_code else None,
+        date_max=date_max,
+        date_min=date_min,
     )
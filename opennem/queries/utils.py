@@ -1,8 +1,37 @@
 """ Query utilities """
+import functools
+from textwrap import dedent
+from typing import Any
+
+from sqlalchemy import sql
+from sqlalchemy.sql.elements import TextClause
+
 from opennem.core.normalizers import normalize_duid
+from opennem.db.prepared import PREPARED_EXECUTION_OPTION
 from opennem.schema.network import NetworkSchema
 
 
+@functools.lru_cache(maxsize=512)
+def get_query_param_names(query: str) -> frozenset[str]:
+    """Names of the bound parameters in a text() query"""
+    return frozenset(sql.text(query).compile().params)
+
+
+def bind_query(query: str, **params: Any) -> TextClause:
+    """Builds a text() query with bound parameters so that the SQL text is the same for any
+    values and the compiled and prepared statements are reused. Lists bind as arrays for use
+    with = any(:param). Parameters the query doesn't use are ignored so that optional clauses
+    can be left out"""
+    query = dedent(query)
+    param_names = get_query_param_names(query)
+
+    return (
+        sql.text(query)
+        .bindparams(**{k: v for k, v in params.items() if k in param_names})
+        .execution_options(**{PREPARED_EXECUTION_OPTION: True})
+    )
+
+
 def duid_to_case(facility_codes: list[str]) -> str:
     """Converts and normalizes list of facilities to in statement"""
     return ",".join([f"'{i}'" for i in map(normalize_duid, facility_codes)])
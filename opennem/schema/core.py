@@ -1,5 +1,7 @@
 from pydantic import BaseModel
 
+from opennem.exporter.encoders import pydantic_json_dumps
+
 
 class PropertyBaseModel(BaseModel):
     """
@@ -25,3 +27,6 @@ class BaseConfig(PropertyBaseModel):
 
         arbitrary_types_allowed = True
         validate_assignment = True
+
+        # model.json() through the serializer backend in settings.json_serializer
+        json_dumps = pydantic_json_dumps
@@ -12,6 +12,8 @@ from pydantic.class_validators import validator
 
 SUPPORTED_LOG_LEVEL_NAMES = ["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"]
 
+SUPPORTED_JSON_SERIALIZERS = ["json", "orjson"]
+
 
 class SettingsException(Exception):
     pass
@@ -59,6 +61,34 @@ class OpennemSettings(BaseSettings):
 
     export_local: bool = False
 
+    # threads used to build and write per-region exports and to upload exports
+    # see opennem.api.export.planner and opennem.exporter.writer
+    export_workers: int = 8
+
+    # Content-Encoding for exports written to S3 - gzip, br or None
+    export_compression: str | None = None
+
+    # skip writing exports whose content hash matches the one stored on the object
+    export_skip_unchanged: bool = True
+
+    # historic weekly interval exports - worker processes, the database connections they can
+    # hold between them and retries of failed weeks. see opennem.exporter.historic
+    export_historic_workers: int = 4
+    export_historic_db_connections: int = 8
+    export_historic_retries: int = 2
+
+    # aggregate backfills - worker processes and retries of failed partitions. workers are
+    # capped so that they hold at most backfill_db_connections on the database server in total.
+    # see opennem.aggregates.backfill
+    backfill_workers: int = 8
+    backfill_retries: int = 2
+    backfill_db_connections: int = 16
+
+    # JSON serializer backend for exports and API responses - json (stdlib) or orjson. orjson
+    # is faster but its output isn't byte-identical to json so it is opt-in.
+    # see opennem.exporter.encoders
+    json_serializer: str = "json"
+
     s3_bucket_path: str = "s3://data.opennem.org.au/"
     backup_bucket_path: str = "backups.opennem.org.au"
     photos_bucket_path: str = "s3://photos.opennem.org.au/"
@@ -71,9 +101,61 @@ class OpennemSettings(BaseSettings):
     # show database debug
     db_debug: bool = False
 
+    # run the export and stats queries as server-side prepared statements
+    # see opennem.db.prepared
+    db_prepared_statements: bool = False
+
+    # time every statement run on the engines and keep per query stats for this process
+    # see opennem.db.instrumentation
+    db_query_instrumentation: bool = False
+
+    # look up the function that ran a statement for one in this many statements
+    db_query_caller_sample: int = 10
+
+    # statements slower than this are logged to opennem.db.slow_query with their plan, which
+    # is explained on a background thread
+    db_slow_query_ms: int = 1000
+    db_slow_query_explain: bool = True
+
+    # connections in the async (asyncpg) pool used by the API - see opennem.db
+    db_async_pool_size: int = 10
+
     # cache scada values for
     cache_scada_values_ttl_sec: int = 60 * 5
 
+    # share cached scada values between processes in redis at cache_url
+    # see opennem.utils.cache
+    cache_scada_shared: bool = True
+
+    # coalesce API cache misses across workers with a lock in redis at cache_url
+    # see opennem.api.cache
+    api_cache_shared: bool = True
+
+    # serve expired API cache entries for this long while one request refreshes them
+    api_cache_stale_sec: int = 60
+
+    # how long a request can hold the refresh lock on an API cache key
+    api_cache_lock_timeout_sec: int = 30
+
+    # how long a request waits for another worker to fill an API cache key before
+    # computing it itself
+    api_cache_wait_timeout_sec: float = 10.0
+
+    # ingest marks the trading days it changes and the daily runner aggregates at_facility_daily
+    # for those days only rather than the whole year. see opennem.aggregates.facility_daily
+    aggregate_facility_daily_incremental: bool = True
+
+    # live power exports append new intervals to the last published set rather than
+    # rebuilding the whole week. see opennem.api.export.live
+    export_power_incremental: bool = True
+
+    # how often live power exports are rebuilt in full
+    export_power_full_rebuild_sec: int = 60 * 60
+
+    # intervals before the last published interval that the incremental export re-reads
+    # to pick up late updates
+    export_power_tail_intervals: int = 6
+
     # asgi server settings
     server_host: str = "0.0.0.0"
     server_port: int = 8000
@@ -90,6 +172,10 @@ class OpennemSettings(BaseSettings):
     # cache http requests locally
     http_cache_local: bool = False
     http_verify_ssl: bool = True
+
+    # max in-flight requests per host for concurrent downloads
+    # see opennem.core.downloader_async
+    http_concurrency_per_host: int = 8
     https_proxy_url: str | None = None  # @note don't let it confict with env HTTP_PROXY
 
     _static_folder_path: str = "opennem/static/"
@@ -126,6 +212,16 @@ class OpennemSettings(BaseSettings):
 
     tmp_file_prefix: str | None = "opennem_"
 
+    # pipelined nemweb archive ingestion
+    # see opennem.core.parsers.aemo.nemweb.parse_aemo_url_pipelined
+    nemweb_ingest_workers: int | None = None  # defaults to cpu count
+    nemweb_ingest_max_inflight_mb: int = 1024
+
+    # bulk inserts use binary COPY where the table supports it
+    # see opennem.db.bulk_insert_binary
+    bulk_insert_binary: bool = True
+    bulk_insert_chunk_size: int = 250_000
+
     slack_admin_alert: list[str] | None = ["nik"]
 
     # alert threshold level in minutes for interval delay monitoring
@@ -139,6 +235,15 @@ class OpennemSettings(BaseSettings):
     opennem_flows_v3: bool = False  # use aggregate in opennem.aggregates.network_flows_v3 per-interval
     redirect_api_static: bool = True  # redirect api endpoints to statics where applicable
     per_interval_aggregate_processing: bool = False  # process per interval aggregates
+    power_fueltech_intervals: bool = False  # power and emissions from the at_network_fueltech_intervals aggregate
+
+    # intervals of late facility data picked up when updating at_network_fueltech_intervals
+    # see opennem.aggregates.network_fueltech_intervals
+    aggregate_fueltech_intervals_lookback_minutes: int = 30
+
+    # schedule the per interval processing (flows, energy, live exports) as a crawl brings in new
+    # data rather than on fixed crontabs. see opennem.pipelines.dag
+    pipeline_dag: bool = True
 
     # send daily fueltech summary
     send_daily_fueltech_summary: bool = True
@@ -146,6 +251,14 @@ class OpennemSettings(BaseSettings):
     # profiler options
     profiler_level: str = "NOISY"
 
+    # fraction of NOISY task runs whose profile and spans are recorded
+    profiler_noisy_sample_rate: float = 1.0
+
+    # task profiles and spans are written in batches of this size, or on this interval, from a
+    # background thread. see opennem.core.profiler
+    profiler_flush_size: int = 200
+    profiler_flush_interval_sec: float = 10.0
+
     # feedback
     feedback_send_to_github: bool = False
     feedback_send_to_slack: bool = True
@@ -167,6 +280,22 @@ class OpennemSettings(BaseSettings):
 
         return _log_value
 
+    @validator("json_serializer")
+    def validate_json_serializer(cls, serializer_value: str) -> str:
+        _serializer_value = serializer_value.lower().strip()
+
+        if _serializer_value not in SUPPORTED_JSON_SERIALIZERS:
+            raise SettingsException(f"Invalid JSON serializer: {_serializer_value}")
+
+        return _serializer_value
+
+    @validator("db_query_caller_sample")
+    def validate_db_query_caller_sample(cls, sample_value: int) -> int:
+        if sample_value < 1:
+            raise SettingsException(f"Invalid query caller sample: {sample_value}")
+
+        return sample_value
+
     @property
     def static_folder_path(self) -> str:
         static_path: Path = Path(self._static_folder_path)
@@ -5,11 +5,11 @@ Module to handle zip files and nested zip files.
 import io
 import os
 from asyncio.log import logger
-from io import BytesIO
+from collections.abc import Iterator
 from pathlib import Path
-from tempfile import mkdtemp
+from tempfile import SpooledTemporaryFile, mkdtemp
 from typing import IO, Any
-from zipfile import ZipFile
+from zipfile import BadZipFile, ZipFile
 
 from opennem import settings
 from opennem.utils.url import get_filename_from_url
@@ -20,6 +20,14 @@ from .http import http
 # 0 means all
 ZIP_LIMIT = 0
 
+# downloaded archives are held in memory up to this size and then spooled to a temporary file
+ARCHIVE_SPOOL_MAX = 1024 * 1024
+
+ARCHIVE_DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+# end of central directory record signature
+ZIP_END_OF_CENTRAL_DIRECTORY = b"\x50\x4b\x05\x06"
+
 
 def chain_streams(streams: Any, buffer_size: int = io.DEFAULT_BUFFER_SIZE) -> io.BufferedReader:
     """
@@ -99,22 +107,46 @@ def _handle_zip(file_obj: Any, mode: str) -> io.BufferedReader | IO[bytes]:
         return chain_streams(c)
 
 
-def fix_central_directory(zfile: BytesIO) -> BytesIO:
+def _rfind_in_file(file_obj: IO[bytes], pattern: bytes, chunk_size: int | None = None) -> int:
+    """Reverse find of pattern in a seekable file reading a chunk at a time from the end"""
+    chunk_size = chunk_size or ARCHIVE_DOWNLOAD_CHUNK_SIZE
+    file_obj.seek(0, io.SEEK_END)
+    file_size = file_obj.tell()
+    chunk_end = file_size
+
+    while chunk_end > 0:
+        chunk_start = max(0, chunk_end - chunk_size)
+
+        # overlap the next chunk so a match across chunks is found
+        file_obj.seek(chunk_start)
+        chunk = file_obj.read(min(chunk_end + len(pattern) - 1, file_size) - chunk_start)
+
+        pos = chunk.rfind(pattern)
+
+        if pos >= 0:
+            return chunk_start + pos
+
+        chunk_end = chunk_start
+
+    return -1
+
+
+def fix_central_directory(zfile: IO[bytes]) -> IO[bytes]:
     """
     Fixes the central directory on bad zip files
     """
     # @NOTE See http://bugs.python.org/issue10694
-    content = zfile.read()
 
     # reverse find: this string of bytes is the end of
     #  the zip's central directory.
-    pos = content.rfind(b"\x50\x4b\x05\x06")
+    pos = _rfind_in_file(zfile, ZIP_END_OF_CENTRAL_DIRECTORY)
 
     if pos > 0:
         zfile.seek(pos + 20)
-        zfile.truncate()
+        zfile.truncate(pos + 20)
         zfile.write(b"\x00\x00")  # Zip file comment length: 0 byte length;
-        zfile.seek(0)
+
+    zfile.seek(0)
 
     return zfile
 
@@ -171,6 +203,83 @@ def stream_zip_contents(file_obj: IO[bytes], mode: str = "w"):  # type: ignore
         return chain_streams(c)
 
 
+def iter_zip_members(
+    file_obj: IO[bytes], suffixes: tuple[str, ...] | None = (".csv",), _depth: int = 0
+) -> Iterator[tuple[str, IO[bytes]]]:
+    """
+    Lazily iterate the members of a zip handling embedded zips. Yields the member name
+    and an open stream for one member at a time which is closed when iteration moves on,
+    so nothing is extracted to disk or read entirely into memory. Embedded zips are read
+    as streams through the parent zip.
+
+    Args:
+        file_obj: seekable zip file object
+        suffixes: only yield members with these (lower case) suffixes. None for all
+    """
+    with ZipFile(file_obj) as zf:
+        stream_count = 0
+
+        for member in zf.infolist():
+            if member.is_dir():
+                continue
+
+            member_name = member.filename.lower()
+
+            if member_name.endswith(".zip"):
+                if ZIP_LIMIT > 0 and _depth == 0 and stream_count >= ZIP_LIMIT:
+                    continue
+
+                stream_count += 1
+
+                with zf.open(member) as nested_zip:
+                    yield from iter_zip_members(nested_zip, suffixes=suffixes, _depth=_depth + 1)
+
+                continue
+
+            if suffixes and not member_name.endswith(suffixes):
+                continue
+
+            with zf.open(member) as member_stream:
+                yield member.filename, member_stream
+
+
+def download_archive(url: str) -> IO[bytes]:
+    """Download an archive fixing the central directory on bad zips. The download is
+    streamed into memory up to ARCHIVE_SPOOL_MAX and then into a temporary file"""
+    archive: IO[bytes] = SpooledTemporaryFile(max_size=ARCHIVE_SPOOL_MAX)  # type: ignore
+
+    try:
+        with http.get(url, verify=settings.http_verify_ssl, stream=True) as response:
+            if not response.ok:
+                raise Exception(f"Bad link returned {response.status_code}: {url}")
+
+            for chunk in response.iter_content(chunk_size=ARCHIVE_DOWNLOAD_CHUNK_SIZE):
+                archive.write(chunk)
+    except Exception:
+        archive.close()
+        raise
+
+    archive.seek(0)
+
+    try:
+        ZipFile(archive).close()
+    except BadZipFile:
+        logger.info(f"Fixing central directory for {url}")
+        archive = fix_central_directory(archive)
+
+    archive.seek(0)
+
+    return archive
+
+
+def iter_url_zip_members(url: str, suffixes: tuple[str, ...] | None = (".csv",)) -> Iterator[tuple[str, IO[bytes]]]:
+    """Stream the members of a remote zip archive. See iter_zip_members"""
+    logger.info(f"Streaming archive {url}")
+
+    with download_archive(url) as archive:
+        yield from iter_zip_members(archive, suffixes=suffixes)
+
+
 def download_and_unzip(url: str) -> str:
     """Download and unzip a multi-zip file"""
 
@@ -1,10 +1,21 @@
 """
 OpenNEM cache utilities
 
+The scada range cache is two tiers - an in-process LRU in front of the shared redis
+at settings.cache_url so that API and worker processes share results. Ingest
+invalidates the cache by bumping a generation counter in redis that every key
+includes, and local tiers drop their entries when they see the generation move.
+
+Keys can also be set with scopes, each with its own generation, so that ingest only
+invalidates the scada ranges for the network and stat (power or energy) it wrote.
+
 """
 import logging
+import time
 from collections.abc import Callable
+from dataclasses import asdict, dataclass
 from functools import wraps
+from typing import Any
 
 from cachetools import TTLCache
 
@@ -16,12 +27,254 @@ logger = logging.getLogger(__name__)
 
 CACHE_AGE = settings.cache_scada_values_ttl_sec
 
-scada_cache: TTLCache = TTLCache(maxsize=100, ttl=CACHE_AGE)
+SCADA_CACHE_PREFIX = "opennem:scada_range"
+
+# how often the local tier checks the shared generation for invalidations
+CACHE_GENERATION_CHECK_SEC = 1.0
+
+# how long to stop using the shared tier after a redis error
+CACHE_SHARED_RETRY_SEC = 30.0
+
+# scope for keys that don't belong to a network (ie. facility ranges) which every
+# scoped invalidation also moves on
+CACHE_SCOPE_ANY = "*"
+
+
+@dataclass
+class CacheStats:
+    hits_local: int = 0
+    hits_shared: int = 0
+    misses: int = 0
+    invalidations: int = 0
+    shared_errors: int = 0
+
+
+class TwoTierCache:
+    """In-process LRU in front of a shared redis cache
+
+    Values are strings. If redis isn't configured or is unavailable the cache
+    falls back to the local tier only.
+    """
+
+    def __init__(
+        self,
+        prefix: str,
+        ttl: int,
+        maxsize: int = 100,
+        redis_url: str | None = None,
+        shared_client: Any = None,
+    ) -> None:
+        self.prefix = prefix
+        self.ttl = ttl
+        self.local: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.stats = CacheStats()
+
+        self._redis_url = redis_url
+        self._shared_client = shared_client
+        self._shared_disabled_until = 0.0
+
+        self._generation = 0
+        self._generation_checked = 0.0
+        self._scope_generations: dict[str, int] = {}
+
+    @property
+    def generation_key(self) -> str:
+        return f"{self.prefix}:generation"
+
+    def scope_generation_key(self, scope: str) -> str:
+        return f"{self.prefix}:generation:{scope}"
+
+    def _get_shared(self) -> Any:
+        """Lazily connect to redis"""
+        if self._shared_client:
+            return self._shared_client if time.monotonic() >= self._shared_disabled_until else None
+
+        if not self._redis_url or time.monotonic() < self._shared_disabled_until:
+            return None
+
+        try:
+            import redis
+        except ImportError:
+            logger.error("Shared cache requires redis library")
+            self._redis_url = None
+            return None
+
+        self._shared_client = redis.Redis.from_url(self._redis_url, decode_responses=True, socket_timeout=1)
+
+        return self._shared_client
+
+    def _shared_error(self, error: Exception) -> None:
+        self.stats.shared_errors += 1
+        self._shared_disabled_until = time.monotonic() + CACHE_SHARED_RETRY_SEC
+        logger.warning(f"Shared cache unavailable, using local cache only for {CACHE_SHARED_RETRY_SEC}s: {error}")
+
+    def _check_generation(self, force: bool = False, scopes: tuple[str, ...] = ()) -> int:
+        """Read the shared generations at most every CACHE_GENERATION_CHECK_SEC, or when
+        there is a scope we haven't read yet, and drop the local tier when the cache wide
+        generation has moved on"""
+        now = time.monotonic()
+        new_scopes = [i for i in scopes if i not in self._scope_generations]
+
+        if not force and not new_scopes and now - self._generation_checked < CACHE_GENERATION_CHECK_SEC:
+            return self._generation
+
+        self._generation_checked = now
+
+        shared = self._get_shared()
+
+        if not shared:
+            for scope in new_scopes:
+                self._scope_generations[scope] = 0
+
+            return self._generation
+
+        try:
+            generation = int(shared.get(self.generation_key) or 0)
+            scope_generations = {
+                i: int(shared.get(self.scope_generation_key(i)) or 0) for i in [*self._scope_generations, *new_scopes]
+            }
+        except Exception as e:
+            self._shared_error(e)
+
+            for scope in new_scopes:
+                self._scope_generations[scope] = 0
+
+            return self._generation
+
+        if generation != self._generation:
+            self.local.clear()
+            self._generation = generation
+
+        self._scope_generations.update(scope_generations)
+
+        return generation
+
+    def _get_token(self, scopes: tuple[str, ...]) -> str:
+        """The generation a key is cached at - the cache wide generation and that of each
+        of its scopes"""
+        generation = self._check_generation(scopes=scopes)
+
+        return ".".join([str(generation), *(str(self._scope_generations[i]) for i in scopes)])
+
+    def _shared_key(self, key: str, token: str) -> str:
+        return f"{self.prefix}:{token}:{key}"
+
+    def get(self, key: str, scopes: tuple[str, ...] = ()) -> str | None:
+        token = self._get_token(scopes)
+
+        local_value = self.local.get(key)
+
+        # local entries from before a scope was invalidated are stale
+        if local_value is not None and local_value[0] == token:
+            self.stats.hits_local += 1
+            return local_value[1]
+
+        value = None
+        shared = self._get_shared()
+
+        if shared:
+            try:
+                value = shared.get(self._shared_key(key, token))
+            except Exception as e:
+                self._shared_error(e)
+
+        if value is not None:
+            self.stats.hits_shared += 1
+            self.local[key] = (token, value)
+            return value
+
+        self.stats.misses += 1
+
+        return None
+
+    def set(self, key: str, value: str, scopes: tuple[str, ...] = ()) -> None:
+        token = self._get_token(scopes)
+
+        self.local[key] = (token, value)
+
+        shared = self._get_shared()
+
+        if not shared:
+            return None
+
+        try:
+            shared.set(self._shared_key(key, token), value, ex=self.ttl)
+        except Exception as e:
+            self._shared_error(e)
+
+    def invalidate(self, scopes: list[str] | None = None) -> None:
+        """Invalidate the cache for every process sharing it. With scopes only the keys
+        set with one of those scopes, or with CACHE_SCOPE_ANY, are invalidated"""
+        self.stats.invalidations += 1
+
+        if scopes:
+            scopes = [*scopes, CACHE_SCOPE_ANY]
+        else:
+            self.local.clear()
+
+        shared = self._get_shared()
+
+        if not shared:
+            for scope in scopes or []:
+                self._scope_generations[scope] = self._scope_generations.get(scope, 0) + 1
+
+            return None
+
+        try:
+            if not scopes:
+                self._generation = int(shared.incr(self.generation_key))
+
+            for scope in scopes or []:
+                self._scope_generations[scope] = int(shared.incr(self.scope_generation_key(scope)))
+        except Exception as e:
+            self._shared_error(e)
+
+            # at least this process stops using the invalidated keys
+            for scope in scopes or []:
+                self._scope_generations[scope] = self._scope_generations.get(scope, 0) + 1
+
+    def get_generation(self) -> int:
+        """The current generation. Moves on when any process sharing the cache invalidates it"""
+        return self._check_generation()
+
+    def get_stats(self) -> dict[str, int]:
+        return {**asdict(self.stats), "local_size": len(self.local), "generation": self._generation}
+
+
+scada_cache = TwoTierCache(
+    prefix=SCADA_CACHE_PREFIX,
+    ttl=CACHE_AGE,
+    redis_url=settings.cache_url if settings.cache_scada_shared else None,
+)
+
+
+def get_scada_cache_scope(network_code: str, energy: bool = False) -> str:
+    return f"{network_code}:{'energy' if energy else 'power'}"
+
+
+def invalidate_scada_cache(network: NetworkSchema | None = None, energy: bool = True) -> None:
+    """Called by ingest when new scada has been stored. Invalidates the power ranges for
+    the network and the energy ranges if energy values were written. Without a network
+    every range is invalidated"""
+    if not network:
+        scada_cache.invalidate()
+        return None
+
+    scopes = [get_scada_cache_scope(network.code)]
+
+    if energy:
+        scopes.append(get_scada_cache_scope(network.code, energy=True))
+
+    scada_cache.invalidate(scopes=scopes)
+
+
+def get_scada_cache_stats() -> dict[str, int]:
+    return scada_cache.get_stats()
 
 
 def cache_scada_result(func: Callable) -> Callable:
     """
-    Caches the scada_range results in memory since they're called so often
+    Caches the scada_range results since they're called so often
     by wrapping the function.
     """
 
@@ -44,25 +297,27 @@ def cache_scada_result(func: Callable) -> Callable:
         if facilities:
             key_list += facilities
 
-        key_list.append(str(energy))
+        key = ",".join(sorted(set(key_list)))
+        key = f"{key}:{network_region or ''}:{energy}"
+
+        network_codes = sorted({n.code for n in [network, *(networks or [])] if n})
+        scopes = tuple(get_scada_cache_scope(i, energy=energy) for i in network_codes) or (CACHE_SCOPE_ANY,)
 
-        key = frozenset(key_list)
         ret: ScadaDateRange | None = None
 
-        try:
-            _val: dict = scada_cache[key]
-            ret = ScadaDateRange(**_val)
+        _val = scada_cache.get(key, scopes=scopes)
 
+        if _val is not None:
             logger.debug(f"scada range HIT at key: {key}")
+            return ScadaDateRange.parse_raw(_val)
+
+        ret = func(network, networks, network_region, facilities, energy)
 
-            return ret
-        except KeyError:
-            ret = func(network, networks, network_region, facilities, energy)
+        logger.debug(f"scada range MISS at key: {key}")
 
-            logger.debug(f"scada range MISS at key: {key}")
+        if ret:
+            scada_cache.set(key, ret.json(), scopes=scopes)
 
-            if ret:
-                scada_cache[key] = ret.dict()
-            return ret
+        return ret
 
     return _cache_scada_wrapper
@@ -6,6 +6,8 @@ from datetime import datetime
 from math import floor, log, pow  # noqa: no-name-module
 from typing import Any
 
+import numpy as np
+
 from opennem import settings
 
 logger = logging.getLogger("opennem.utils.numbers")
@@ -76,6 +78,50 @@ def sigfig_compact(n: float | int, precision: int = DEFAULT_PRECISION) -> float
     return n
 
 
+# powers of ten as computed by math.pow so the vectorised version matches sigfig_compact exactly
+_POW10_OFFSET = 330
+_POW10 = np.array([pow(10, k) for k in range(-_POW10_OFFSET, 309)])
+
+
+def sigfig_compact_series(values: list[float | None], precision: int = DEFAULT_PRECISION) -> list[float | None]:
+    """
+    Vectorised sigfig_compact over a series of values with the null and zero handling
+    of the data series output. Values are returned as floats and the results are
+    identical to calling sigfig_compact on each value.
+    """
+    if not values:
+        return []
+
+    series = np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+
+    nulls = np.isnan(series)
+    zeros = series == 0
+
+    n_abs = np.abs(series)
+    n_abs[nulls | zeros] = 1.0
+
+    # floor(log(n) / log(10)) - recompute with math.log where np.log could land either side of an integer
+    exponents_exact = np.log(n_abs) / __log10
+    exponents = np.floor(exponents_exact)
+
+    for i in np.flatnonzero(np.abs(exponents_exact - np.rint(exponents_exact)) < 1e-6):
+        exponents[i] = floor(log(n_abs[i]) / __log10)
+
+    pow_index = (precision - exponents - 1).astype(np.int64) + _POW10_OFFSET
+
+    # defer to the scalar version for infinities and the overflow errors it raises
+    if np.isinf(series).any() or pow_index.min() < 0 or pow_index.max() >= len(_POW10):
+        return [None if v is None or v != v else 0.0 if v == 0 else float(sigfig_compact(v, precision)) for v in values]
+
+    multi = _POW10[pow_index]
+
+    compact = np.where(n_abs >= pow(10, precision), np.floor(n_abs), np.rint(n_abs * multi) / multi)
+    compact = np.where(series < 0, -compact, compact)
+    compact[zeros] = 0.0
+
+    return [None if is_null else v for v, is_null in zip(compact.tolist(), nulls.tolist(), strict=True)]
+
+
 def human2bytes(s: str) -> int | None:
     """
     >>> human2bytes('1M')
@@ -0,0 +1,9 @@
+""" Utilities for running work over process pools """
+import multiprocessing
+
+
+def can_start_process_pool() -> bool:
+    """Whether this process can start worker processes. Daemonic processes (ie. the huey
+    consumer's process workers) aren't allowed to have children so work run from them has
+    to run in process"""
+    return not multiprocessing.current_process().daemon
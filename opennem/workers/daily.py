@@ -7,19 +7,17 @@ import logging
 from datetime import datetime, timedelta
 
 from opennem import settings
-from opennem.aggregates.facility_daily import run_aggregate_facility_all_by_year, run_aggregates_facility_year
+from opennem.aggregates.backfill import run_backfill
+from opennem.aggregates.facility_daily import run_aggregates_facility_daily_incremental, run_aggregates_facility_year
 from opennem.aggregates.network_demand import run_aggregates_demand_network
-from opennem.aggregates.network_flows import (
-    run_emission_update_day,
-    run_flow_updates_all_for_network,
-    run_flow_updates_all_per_year,
-)
+from opennem.aggregates.network_flows import run_emission_update_day, run_flow_updates_all_per_year
+from opennem.aggregates.network_fueltech_intervals import run_aggregates_network_fueltech_intervals_days
 from opennem.api.export.map import PriorityType, StatType, get_export_map
 from opennem.api.export.tasks import export_all_daily, export_all_monthly, export_energy, export_power
 from opennem.clients.slack import slack_message
 from opennem.core.profiler import profile_task
 from opennem.exporter.historic import export_historic_intervals
-from opennem.schema.network import NetworkAEMORooftop, NetworkAPVI, NetworkNEM, NetworkOpenNEMRooftopBackfill, NetworkWEM
+from opennem.schema.network import NetworkAEMORooftop, NetworkAPVI, NetworkNEM, NetworkWEM
 from opennem.utils.dates import get_last_completed_interval_for_network
 from opennem.workers.energy import run_energy_calc
 from opennem.workers.gap_fill.energy import run_energy_gapfill_for_network
@@ -78,17 +76,23 @@ def daily_runner(days: int = 2) -> None:
     # 1. flows
     run_flow_updates_all_per_year(CURRENT_YEAR, 1)
 
-    # 2. facilities
+    # 2. facilities - the days that have changed or the whole year
     for network in [NetworkNEM, NetworkWEM, NetworkAEMORooftop, NetworkAPVI]:
-        run_aggregates_facility_year(year=CURRENT_YEAR, network=network)
+        if settings.aggregate_facility_daily_incremental:
+            run_aggregates_facility_daily_incremental(network=network, days=days)
+        else:
+            run_aggregates_facility_year(year=CURRENT_YEAR, network=network)
 
     # 3. network demand
     run_aggregates_demand_network()
 
+    # 4. network fueltech intervals for late data
+    run_aggregates_network_fueltech_intervals_days(days=days)
+
     #  flows and flow emissions
     run_emission_update_day(days=days)
 
-    # 4. Run Exports
+    # 5. Run Exports
     #  run exports for latest year
     export_energy(latest=True)
 
@@ -105,7 +109,8 @@ def daily_runner(days: int = 2) -> None:
 
     # export historic intervals
     for network in [NetworkNEM, NetworkWEM]:
-        export_historic_intervals(limit=2, networks=[network])
+        # in process since huey's process workers can't start a pool
+        export_historic_intervals(limit=2, networks=[network], resume=False, workers=1)
 
 
 def all_runner() -> None:
@@ -113,10 +118,7 @@ def all_runner() -> None:
     run_energy_gapfill_for_network(network=NetworkNEM)
 
     # populates the aggregate tables
-    run_flow_updates_all_for_network(network=NetworkNEM)
-
-    for network in [NetworkNEM, NetworkAEMORooftop, NetworkAPVI, NetworkWEM, NetworkOpenNEMRooftopBackfill]:
-        run_aggregate_facility_all_by_year(network=network)
+    run_backfill(aggregate_names=["flows", "facility_daily"])
 
     # run the exports for all
     export_power(latest=False)
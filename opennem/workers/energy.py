@@ -4,6 +4,7 @@ from itertools import groupby
 from textwrap import dedent
 
 from opennem import settings
+from opennem.aggregates.facility_daily import mark_facility_daily_dirty
 from opennem.api.stats.controllers import get_scada_range_optimized
 from opennem.api.time import human_to_interval, human_to_period
 from opennem.controllers.output.schema import ExportDatetimeRange, OpennemExportSeries
@@ -199,9 +200,9 @@ def get_flows(
     return results
 
 
-def insert_energies(results: list[dict], network: NetworkSchema) -> int:
+def insert_energies(results: list[dict], network: NetworkSchema, raise_errors: bool = False) -> int:
     """Takes a list of generation values and calculates energies and bulk-inserts
-    into the database"""
+    into the database. Insert errors are logged unless raise_errors is set"""
 
     # Get the energy sums as a dataframe
     esdf = energy_sum(results, network=network)
@@ -270,10 +271,17 @@ def insert_energies(results: list[dict], network: NetworkSchema) -> int:
         conn.commit()
     except Exception as e:
         logger.error(f"Error inserting records: {e}")
+
+        if raise_errors:
+            raise
+
         return 0
 
     logger.info(f"Inserted {len(records_to_store)} records")
 
+    # energies change the daily facility aggregates
+    mark_facility_daily_dirty(network, (i["trading_interval"] for i in records_to_store))
+
     return len(records_to_store)
 
 
@@ -298,8 +306,10 @@ def run_energy_calc(
     region: str | None = None,
     fueltech_id: str | None = None,
     facility_codes: list[str] | None = None,
+    raise_errors: bool = False,
 ) -> int:
-    """Runs the actual energy calc - believe it or not"""
+    """Runs the actual energy calc - believe it or not. Errors inserting energies are logged
+    unless raise_errors is set"""
 
     logger.info(
         f"Running energy calc for {network.code} region {region} fueltech {fueltech_id} and range {date_min} => {date_max}"
@@ -337,10 +347,13 @@ def run_energy_calc(
 
         generated_frame = shape_energy_dataframe(generated_results, network=network)
 
-        num_records = insert_energies(generated_frame, network=network)
+        num_records = insert_energies(generated_frame, network=network, raise_errors=raise_errors)
 
         logger.info(f"Done {region} for {date_min} => {date_max}")
     except Exception as e:
+        if raise_errors:
+            raise
+
         error_traceback = e.with_traceback()
 
         if error_traceback:
@@ -351,6 +364,23 @@ def run_energy_calc(
     return num_records
 
 
+EXCLUDED_FUELTECHS_FROM_ENERGY = ["imports", "exports", "interconnector", "nuclear"]
+
+
+def get_energy_fueltechs(network: NetworkSchema, fueltech: str | None = None) -> list[str]:
+    """List of fueltech codes to run energy for on a network"""
+    fueltechs: list[str] = []
+
+    if fueltech:
+        fueltechs = [fueltech]
+    elif network.fueltechs:
+        fueltechs = list(network.fueltechs)
+    else:
+        fueltechs = list(ALL_FUELTECH_CODES)
+
+    return [i for i in fueltechs if i not in EXCLUDED_FUELTECHS_FROM_ENERGY]
+
+
 def run_energy_update_archive(
     year: int | None = None,
     months: list[int] | None = None,
@@ -378,23 +408,7 @@ def run_energy_update_archive(
     if network == NetworkAPVI:
         regions = ["WEM"]
 
-    # list of fueltech codes to run
-    fueltechs: list[str] = []
-
-    if fueltech:
-        fueltechs = [fueltech]
-    elif network.fueltechs:
-        fueltechs = network.fueltechs
-    else:
-        fueltechs = ALL_FUELTECH_CODES
-
-    EXCLUDED_FUELTECHS_FROM_ENERGY = ["imports", "exports", "interconnector", "nuclear"]
-
-    for excluded_fueltech_id in EXCLUDED_FUELTECHS_FROM_ENERGY:
-        try:
-            fueltechs.remove(excluded_fueltech_id)
-        except ValueError:
-            pass
+    fueltechs = get_energy_fueltechs(network=network, fueltech=fueltech)
 
     for y in years:
         for month in months:
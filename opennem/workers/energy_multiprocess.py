@@ -1,77 +1,20 @@
 """
 Multiprocessor for energy workers
 
+Runs the energy backfill by region and month over the aggregate backfill worker pool. See
+opennem.aggregates.backfill
 """
 import logging
-import multiprocessing
 import sys
 from datetime import datetime
 
 import click
 
-from opennem.core.facility.fueltechs import load_fueltechs
-from opennem.diff.versions import CUR_YEAR, get_network_regions
-from opennem.schema.network import NetworkNEM
-from opennem.workers.energy import run_energy_update_archive
+from opennem.aggregates.backfill import run_backfill
 
 logger = logging.getLogger("opennem.worker.energy_multi")
 
-CPU_COUNT = multiprocessing.cpu_count()
-WORKER_COUNT = 2
 YEAR_EARLIEST = 2020
-CUR_MONTH = datetime.now().month
-
-
-def _build_args_list(
-    year: int | None, region: str | None, fueltech: str | None
-) -> list[tuple[int | None, int, str | None, str | None]]:
-    args_list = []
-
-    network = NetworkNEM
-
-    regions = [region]
-
-    if not region:
-        regions = [i.code for i in get_network_regions(network)]
-
-    fueltechs = [fueltech]
-
-    if not fueltech:
-        fueltechs = list(load_fueltechs().keys())
-
-    years = [year]
-
-    if not year:
-        years = list(range(CUR_YEAR, YEAR_EARLIEST - 1, -1))
-
-    for year in years:
-        for month in range(12, 0, -1):
-            if year == CUR_YEAR and month > CUR_MONTH:
-                continue
-
-            for region in regions:
-                if year == CUR_YEAR and month > CUR_MONTH:
-                    continue
-
-                for ft in fueltechs:
-                    args_list.append((year, month, region, ft))
-
-    return args_list
-
-
-def _worker_wrap(year: int | None, months: int, region: str, fueltech_id: str | None) -> None:
-    """Map to named args"""
-    return run_energy_update_archive(year=year, months=[months], regions=[region], fueltech=fueltech_id)
-
-
-def energy_process(args_list: list, worker_count: int | None) -> None:
-    logger.debug(f"Starting with {WORKER_COUNT} workers")
-
-    if not worker_count:
-        worker_count = WORKER_COUNT
-
-    with multiprocessing.Pool(processes=worker_count) as pool:
-        pool.starmap(_worker_wrap, args_list)
 
 
 @click.command()
@@ -85,9 +28,19 @@ def cli(
     region: str | None = None,
     workers: int | None = None,
 ) -> None:
-    args_list = _build_args_list(year=year, region=region, fueltech=fueltech)
-    click.echo(f"Running {len(args_list)} items")
-    energy_process(args_list, worker_count=workers)
+    date_min = datetime(year or YEAR_EARLIEST, 1, 1)
+    date_max = datetime(year + 1, 1, 1) if year else None
+
+    result = run_backfill(
+        aggregate_names=["energy"],
+        date_min=date_min,
+        date_max=date_max,
+        network_regions=[region] if region else None,
+        fueltech_ids=[fueltech] if fueltech else None,
+        workers=workers,
+    )
+
+    click.echo(f"Ran {len(result.completed)} items with {len(result.failed)} failed")
 
 
 if __name__ == "__main__":
@@ -10,8 +10,10 @@ Primary scheduler runs:
 
 """
 import logging
+from typing import Any
 
 from huey import PriorityRedisHuey, crontab
+from huey.exceptions import TaskLockedException
 
 from opennem import settings
 from opennem.aggregates.facility_daily import run_facility_aggregates_for_latest_interval
@@ -27,10 +29,12 @@ from opennem.monitors.emissions import alert_missing_emission_factors
 from opennem.monitors.facility_seen import facility_first_seen_check
 from opennem.monitors.opennem import check_opennem_interval_delays
 from opennem.pipelines.crontab import network_interval_crontab
+from opennem.pipelines.dag import PipelineEvent
 from opennem.pipelines.nem import (
     nem_dispatch_is_crawl,
     nem_dispatch_scada_crawl,
     nem_per_day_check,
+    nem_pipeline,
     nem_rooftop_crawl,
     nem_trading_is_crawl,
 )
@@ -51,6 +55,54 @@ logger = logging.getLogger("openenm.scheduler")
 worker_startup_alert()
 
 
+class HueyPipelineStore:
+    """Keeps the pipeline step watermarks in the huey storage so they're shared by the workers"""
+
+    def get(self, key: str) -> Any:
+        return huey.get(key, peek=True)
+
+    def put(self, key: str, value: Any) -> None:
+        huey.put(key, value)
+
+
+# a step already running for another event is run again after this many seconds, up to
+# PIPELINE_STEP_LOCKED_MAX times
+PIPELINE_STEP_LOCKED_DELAY = 5
+PIPELINE_STEP_LOCKED_MAX = 60
+
+
+@huey.task(retries=3, retry_delay=10)
+def run_pipeline_step(step_name: str, event: PipelineEvent, locked_count: int = 0) -> None:
+    """Runs a step of the per interval pipeline. Steps that depend on it are enqueued
+    when it changes something. A step that is already running for another event (ie.
+    nem_export_power from both the scada and price crawls) is queued to run after it"""
+    try:
+        with huey.lock_task(f"pipeline_{step_name}"):
+            nem_pipeline.run_step(step_name, event)
+    except TaskLockedException:
+        if locked_count >= PIPELINE_STEP_LOCKED_MAX:
+            logger.error(f"Pipeline step {step_name} locked for {event.network_code} {event.interval} from {event.source}")
+            return None
+
+        logger.info(f"Pipeline step {step_name} is running: queued {event.network_code} {event.interval} from {event.source}")
+
+        run_pipeline_step.schedule(
+            (step_name, event),
+            {"locked_count": locked_count + 1},
+            delay=PIPELINE_STEP_LOCKED_DELAY,
+            priority=nem_pipeline.steps[step_name].priority,
+        )
+
+
+def schedule_pipeline_step(step_name: str, event: PipelineEvent) -> None:
+    run_pipeline_step(step_name, event, priority=nem_pipeline.steps[step_name].priority)
+
+
+nem_pipeline.validate()
+nem_pipeline.store = HueyPipelineStore()
+nem_pipeline.scheduler = schedule_pipeline_step
+
+
 # crawler tasks live per interval for each network
 @huey.periodic_task(network_interval_crontab(network=NetworkNEM), priority=50, retries=5, retry_delay=10)
 @huey.lock_task("crawler_run_nem_dispatch_scada_crawl")
@@ -98,6 +150,7 @@ def crawler_run_bom_capitals() -> None:
 @huey.lock_task("run_hourly_task_runner")
 def run_hourly_task_runner() -> None:
     if settings.per_interval_aggregate_processing:
+        # also a backstop for the pipeline's NEM energy step
         energy_runner_hours(hours=1)
 
         for network in [NetworkNEM, NetworkWEM]:
@@ -197,6 +250,7 @@ def run_run_network_data_range_update() -> None:
 @huey.periodic_task(crontab(hour="*/1", minute="10"))
 @huey.lock_task("run_energy_runner_hours")
 def run_energy_runner_hours() -> None:
+    # also a backstop for the pipeline's NEM energy step which only runs when there's new data
     energy_runner_hours(hours=1)
 
 
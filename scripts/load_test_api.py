@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+"""
+Load test the API stats endpoints
+
+Runs each endpoint at increasing concurrency for a fixed duration and reports requests/sec
+and latency percentiles at each level, and the highest requests/sec where the p95 latency
+stays under the target. Run it against a server before and after a change to compare:
+
+    python scripts/load_test_api.py --base-url http://localhost:8000 --target-latency 500
+
+Responses are cached by the API so pass --no-cache to send Cache-Control: no-store with
+each request
+"""
+import asyncio
+import statistics
+import time
+from dataclasses import dataclass, field
+
+import click
+import httpx
+
+DEFAULT_ENDPOINTS = [
+    "/stats/power/station/NEM/BAYSWATER",
+    "/stats/energy/station/NEM/BAYSWATER",
+    "/stats/price/NEM/NSW1",
+]
+
+DEFAULT_CONCURRENCY = [1, 2, 4, 8, 16, 32]
+
+
+@dataclass
+class LoadTestResult:
+    url: str
+    concurrency: int
+    duration: float
+    latencies: list[float] = field(default_factory=list)
+    errors: int = 0
+
+    @property
+    def requests(self) -> int:
+        return len(self.latencies)
+
+    @property
+    def requests_per_second(self) -> float:
+        return self.requests / self.duration if self.duration else 0.0
+
+    def latency_percentile(self, percentile: int) -> float:
+        """Latency percentile in milliseconds"""
+        if len(self.latencies) < 2:
+            return self.latencies[0] * 1000 if self.latencies else 0.0
+
+        return statistics.quantiles(self.latencies, n=100)[percentile - 1] * 1000
+
+
+async def _worker(client: httpx.AsyncClient, result: LoadTestResult, time_end: float, no_cache: bool) -> None:
+    headers = {"Cache-Control": "no-store"} if no_cache else None
+
+    while time.perf_counter() < time_end:
+        time_start = time.perf_counter()
+
+        try:
+            response = await client.get(result.url, headers=headers)
+            response.raise_for_status()
+        except httpx.HTTPError:
+            result.errors += 1
+            continue
+
+        result.latencies.append(time.perf_counter() - time_start)
+
+
+async def run_load_test(
+    client: httpx.AsyncClient, url: str, concurrency: int, duration: float, no_cache: bool = False
+) -> LoadTestResult:
+    """Request url from concurrency workers for duration seconds"""
+    result = LoadTestResult(url=url, concurrency=concurrency, duration=duration)
+    time_end = time.perf_counter() + duration
+
+    await asyncio.gather(*[_worker(client, result, time_end, no_cache) for _ in range(concurrency)])
+
+    return result
+
+
+def max_requests_per_second(results: list[LoadTestResult], target_latency: float) -> LoadTestResult | None:
+    """The result with the most requests/sec where the p95 latency is under target_latency ms"""
+    within_target = [i for i in results if i.requests and not i.errors and i.latency_percentile(95) <= target_latency]
+
+    if not within_target:
+        return None
+
+    return max(within_target, key=lambda i: i.requests_per_second)
+
+
+async def load_test_endpoints(
+    base_url: str,
+    endpoints: list[str],
+    concurrency_levels: list[int],
+    duration: float,
+    target_latency: float,
+    no_cache: bool = False,
+) -> None:
+    limits = httpx.Limits(max_connections=max(concurrency_levels))
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        for url in endpoints:
+            results = []
+
+            for concurrency in concurrency_levels:
+                result = await run_load_test(client, url, concurrency=concurrency, duration=duration, no_cache=no_cache)
+                results.append(result)
+
+                click.echo(
+                    f"{url} c={concurrency:<3} {result.requests_per_second:8.1f} req/s "
+                    f"p50={result.latency_percentile(50):7.1f}ms p95={result.latency_percentile(95):7.1f}ms "
+                    f"errors={result.errors}"
+                )
+
+            best = max_requests_per_second(results, target_latency)
+
+            if best:
+                click.echo(
+                    f"{url}: {best.requests_per_second:.1f} req/s at p95 <= {target_latency}ms (concurrency {best.concurrency})"
+                )
+            else:
+                click.echo(f"{url}: no concurrency level with p95 <= {target_latency}ms")
+
+
+@click.command()
+@click.option("--base-url", default="http://localhost:8000", help="API base url")
+@click.option("--endpoint", "endpoints", multiple=True, help="Endpoint path to test. Can be repeated")
+@click.option("--concurrency", "concurrency_levels", multiple=True, type=int, help="Concurrency level. Can be repeated")
+@click.option("--duration", default=10.0, help="Seconds to run each concurrency level")
+@click.option("--target-latency", default=500.0, help="Target p95 latency in milliseconds")
+@click.option("--no-cache", is_flag=True, default=False, help="Bypass the API cache")
+def main(
+    base_url: str,
+    endpoints: tuple[str],
+    concurrency_levels: tuple[int],
+    duration: float,
+    target_latency: float,
+    no_cache: bool,
+) -> None:
+    asyncio.run(
+        load_test_endpoints(
+            base_url,
+            endpoints=list(endpoints) or DEFAULT_ENDPOINTS,
+            concurrency_levels=list(concurrency_levels) or DEFAULT_CONCURRENCY,
+            duration=duration,
+            target_latency=target_latency,
+            no_cache=no_cache,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
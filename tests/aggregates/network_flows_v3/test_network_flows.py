@@ -0,0 +1,171 @@
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytest
+
+from opennem.aggregates.network_flows_v3 import (
+    calculate_flow_emissions_for_intervals,
+    calculate_region_imports_and_exports_for_intervals,
+)
+from opennem.core.flow_solver import (
+    FLOW_SOLVER_BALANCE_REGIONS,
+    FLOW_SOLVER_PASSTHROUGH_FLOWS,
+    InterconnectorNetEmissionsEnergy,
+    NetworkInterconnectorEnergyEmissions,
+    NetworkRegionsDemandEmissions,
+    Region,
+    RegionDemandEmissions,
+    RegionFlow,
+    solve_flow_emissions_for_interval,
+)
+from opennem.schema.network import NetworkNEM
+from tests.core.flow_solver import (
+    flow_solver_test_output_spreadsheet,
+    load_energy_and_emissions_spreadsheet,
+    load_interconnector_interval_spreadsheet,
+)
+
+INTERVALS = [datetime.fromisoformat("2023-01-01T00:05:00+10:00") + timedelta(minutes=5 * i) for i in range(6)]
+
+
+def test_calculate_flow_emissions_for_intervals() -> None:
+    intervals = [datetime.fromisoformat("2023-01-01T00:05:00+10:00") + timedelta(minutes=5 * i) for i in range(3)]
+
+    energy_and_emissions = pd.concat([load_energy_and_emissions_spreadsheet(interval=i) for i in intervals])
+    interconnector_data = pd.concat([load_interconnector_interval_spreadsheet(interval=i) for i in intervals])
+
+    flows = calculate_flow_emissions_for_intervals(
+        energy_and_emissions=energy_and_emissions, interconnector_data=interconnector_data
+    )
+
+    assert flows.trading_interval.nunique() == 3, "Has every interval"
+    assert len(flows) == 3 * 8, "Has every interconnector direction for every interval"
+
+    flows = flows.set_index(["trading_interval", "interconnector_region_from", "interconnector_region_to"])
+
+    for interval in intervals:
+        assert flows.loc[(interval, "QLD1", "NSW1")].energy == pytest.approx(55), "Reverse flow energy"
+        assert flows.loc[(interval, "QLD1", "NSW1")].emissions == pytest.approx(35.75), "Reverse flow emissions"
+        assert flows.loc[(interval, "TAS1", "VIC1")].emissions == pytest.approx(0.55), "Passthrough emissions"
+        assert flows.loc[(interval, "NSW1", "QLD1")].energy == 0, "No forward flow"
+
+    # every interval has the same inputs so should have the same solution
+    assert flows.groupby(level=[1, 2]).emissions.nunique().max() == 1, "Batched solution is consistent"
+
+
+def _varying_interval_fixtures() -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Spreadsheet fixtures scaled differently for each interval with the NSW1 - QLD1 flow
+    changing direction part way through"""
+    energy_and_emissions = []
+    interconnector_data = []
+
+    for interval_index, interval in enumerate(INTERVALS):
+        region_values = load_energy_and_emissions_spreadsheet(interval=interval)
+        region_values["energy"] *= 1 + 0.1 * interval_index
+        region_values["emissions"] *= 1 + 0.25 * interval_index
+        energy_and_emissions.append(region_values)
+
+        interconnector_values = load_interconnector_interval_spreadsheet(interval=interval)
+        interconnector_values["energy"] *= 1 + 0.3 * interval_index
+        interconnector_values.loc[interconnector_values.interconnector_region_to == "QLD1", "energy"] *= (
+            -1 if interval_index % 2 else 1
+        )
+        interconnector_data.append(interconnector_values)
+
+    return pd.concat(energy_and_emissions), pd.concat(interconnector_data)
+
+
+def _solve_interval(energy_and_emissions: pd.DataFrame, interconnector_data: pd.DataFrame) -> dict[str, float]:
+    """Solve a single interval with the per-interval solver"""
+    region_values = energy_and_emissions.set_index("network_region")
+
+    region_data = NetworkRegionsDemandEmissions(
+        network=NetworkNEM,
+        data=[
+            RegionDemandEmissions(
+                region_code=region, generated_mwh=region_values.energy[region], emissions_t=region_values.emissions[region]
+            )
+            for region in FLOW_SOLVER_BALANCE_REGIONS
+        ],
+    )
+
+    flow_energy: dict[str, float] = {}
+
+    for _, row in interconnector_data.iterrows():
+        flow_energy[f"{row.interconnector_region_from}->{row.interconnector_region_to}"] = max(row.energy, 0)
+        flow_energy[f"{row.interconnector_region_to}->{row.interconnector_region_from}"] = max(-row.energy, 0)
+
+    interconnector_emissions = {
+        i: flow_energy[i] * region_values.emissions[i.split("->")[0]] / region_values.energy[i.split("->")[0]]
+        for i in FLOW_SOLVER_PASSTHROUGH_FLOWS
+    }
+
+    interconnector = NetworkInterconnectorEnergyEmissions(
+        network=NetworkNEM,
+        data=[
+            InterconnectorNetEmissionsEnergy(
+                region_flow=RegionFlow(region_flow),
+                generated_mwh=energy,
+                emissions_t=interconnector_emissions.get(region_flow, 0),
+            )
+            for region_flow, energy in flow_energy.items()
+        ],
+    )
+
+    return {
+        i.region_flow: i.emissions
+        for i in solve_flow_emissions_for_interval(interconnector_data=interconnector, region_data=region_data)
+    }
+
+
+def test_calculate_flow_emissions_for_intervals_matches_per_interval_solver() -> None:
+    energy_and_emissions, interconnector_data = _varying_interval_fixtures()
+
+    flows = calculate_flow_emissions_for_intervals(
+        energy_and_emissions=energy_and_emissions, interconnector_data=interconnector_data
+    ).set_index(["trading_interval", "interconnector_region_from", "interconnector_region_to"])
+
+    assert flows.emissions.nunique() > 8, "Intervals have different solutions"
+
+    for interval in INTERVALS:
+        expected = _solve_interval(
+            energy_and_emissions[energy_and_emissions.trading_interval == interval],
+            interconnector_data[interconnector_data.trading_interval == interval],
+        )
+
+        for region_flow, emissions in expected.items():
+            region_from, region_to = region_flow.split("->")
+
+            assert flows.loc[(interval, region_from, region_to)].emissions == pytest.approx(
+                emissions
+            ), f"{interval} {region_flow}"
+
+
+def test_calculate_region_imports_and_exports_for_intervals() -> None:
+    energy_and_emissions = pd.concat([load_energy_and_emissions_spreadsheet(interval=i) for i in INTERVALS])
+    interconnector_data = pd.concat([load_interconnector_interval_spreadsheet(interval=i) for i in INTERVALS])
+
+    flows = calculate_flow_emissions_for_intervals(
+        energy_and_emissions=energy_and_emissions, interconnector_data=interconnector_data
+    )
+
+    region_flows = calculate_region_imports_and_exports_for_intervals(flows, network=NetworkNEM)
+
+    assert len(region_flows) == len(INTERVALS) * 5, "Has every region for every interval"
+    assert (region_flows.network_id == "NEM").all()
+
+    expected = flow_solver_test_output_spreadsheet().set_index("network_region")
+    flows = flows.set_index("trading_interval")
+
+    for _, row in region_flows.iterrows():
+        region = expected.loc[Region(row.network_region)]
+        interval_flows = flows.loc[row.trading_interval]
+
+        assert row.energy_imports == pytest.approx(region.energy_imported)
+        assert row.energy_exports == pytest.approx(region.energy_exported)
+        assert row.emissions_imports == pytest.approx(
+            interval_flows[interval_flows.interconnector_region_to == row.network_region].emissions.sum()
+        )
+        assert row.emissions_exports == pytest.approx(
+            interval_flows[interval_flows.interconnector_region_from == row.network_region].emissions.sum()
+        )
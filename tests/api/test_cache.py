@@ -0,0 +1,216 @@
+"""
+Tests for the coalescing API response cache
+"""
+import asyncio
+import json
+from typing import Any
+
+import httpx
+import pytest
+from fastapi import Depends, FastAPI, HTTPException
+
+from opennem.api import cache
+from opennem.api.cache import CoalescingCache, LocalCacheStore, coalesced_cache
+
+COMPUTE_DELAY = 0.1
+
+
+class _Counter:
+    def __init__(self, fail: bool = False) -> None:
+        self.calls = 0
+        self.fail = fail
+
+    async def __call__(self) -> dict[str, Any]:
+        self.calls += 1
+        await asyncio.sleep(COMPUTE_DELAY)
+
+        if self.fail:
+            raise HTTPException(status_code=404, detail="No results")
+
+        return {"version": self.calls}
+
+
+class _DownStore:
+    async def get(self, key: str) -> None:
+        raise ConnectionError("redis down")
+
+
+@pytest.fixture(autouse=True)
+def _fast_poll(monkeypatch) -> None:
+    monkeypatch.setattr(cache, "CACHE_POLL_SEC", 0.01)
+
+
+def test_concurrent_misses_compute_once() -> None:
+    api_cache = CoalescingCache()
+    compute = _Counter()
+
+    async def _run() -> list[cache.CacheResult]:
+        return await asyncio.gather(*[api_cache.get_or_compute("/power", "key", compute, expire=60) for _ in range(10)])
+
+    results = asyncio.run(_run())
+
+    assert compute.calls == 1
+    assert [json.loads(i.body) for i in results] == [{"version": 1}] * 10
+    assert sorted(i.status for i in results) == ["COALESCED"] * 9 + ["MISS"]
+    assert api_cache.get_stats()["/power"]["coalesced_local"] == 9
+
+
+def test_concurrent_misses_across_workers_compute_once() -> None:
+    shared = LocalCacheStore()
+    workers = [CoalescingCache(shared_client=shared) for _ in range(3)]
+    compute = _Counter()
+
+    async def _run() -> list[cache.CacheResult]:
+        return await asyncio.gather(*[i.get_or_compute("/power", "key", compute, expire=60) for i in workers])
+
+    results = asyncio.run(_run())
+
+    assert compute.calls == 1
+    assert sorted(i.status for i in results) == ["COALESCED", "COALESCED", "MISS"]
+    assert sum(i.get_stats()["/power"]["coalesced_remote"] for i in workers) == 2
+    assert not [k for k in shared.values if k.endswith(":lock")], "Lock is released"
+
+
+def test_stale_entry_served_while_refreshing() -> None:
+    api_cache = CoalescingCache(stale=60)
+    compute = _Counter()
+
+    async def _run() -> tuple[cache.CacheResult, ...]:
+        first = await api_cache.get_or_compute("/power", "key", compute, expire=0)
+        await asyncio.sleep(0.01)
+        stale = await asyncio.gather(*[api_cache.get_or_compute("/power", "key", compute, expire=60) for _ in range(5)])
+
+        await asyncio.sleep(COMPUTE_DELAY * 2)
+
+        refreshed = await api_cache.get_or_compute("/power", "key", compute, expire=60)
+
+        return first, *stale, refreshed
+
+    (first, *stale, refreshed) = asyncio.run(_run())
+
+    assert first.status == "MISS"
+    assert [i.status for i in stale] == ["STALE"] * 5
+    assert {i.body for i in stale} == {first.body}
+    assert refreshed.status == "HIT"
+    assert json.loads(refreshed.body) == {"version": 2}
+    assert compute.calls == 2, "Only one request refreshes"
+    assert api_cache.get_stats()["/power"]["refreshes"] == 1
+
+
+def test_errors_are_not_cached() -> None:
+    api_cache = CoalescingCache()
+    compute = _Counter(fail=True)
+
+    async def _run() -> None:
+        for _ in range(2):
+            with pytest.raises(HTTPException):
+                await api_cache.get_or_compute("/power", "key", compute, expire=60)
+
+    asyncio.run(_run())
+
+    assert compute.calls == 2
+    assert not api_cache.local.values
+
+
+def test_shared_store_unavailable() -> None:
+    api_cache = CoalescingCache(shared_client=_DownStore())
+    compute = _Counter()
+
+    result = asyncio.run(api_cache.get_or_compute("/power", "key", compute, expire=60))
+
+    assert result.status == "MISS"
+    assert api_cache.get_stats()["/power"]["shared_errors"] == 1
+
+
+def test_release_only_held_lock() -> None:
+    store = LocalCacheStore()
+
+    async def _run() -> tuple[int, int]:
+        await store.set("key:lock", b"other", px=1000, nx=True)
+        not_held = await store.eval(cache.RELEASE_LOCK_SCRIPT, 1, "key:lock", "token")
+
+        await store.set("key:lock", b"token", px=1000)
+        held = await store.eval(cache.RELEASE_LOCK_SCRIPT, 1, "key:lock", "token")
+
+        return not_held, held
+
+    assert asyncio.run(_run()) == (0, 1)
+    assert not store.values
+
+
+class _LockOnlyStore(LocalCacheStore):
+    """Shared store that goes down for reads once a lock has been taken in it"""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.released: list[str] = []
+
+    async def get(self, key: str) -> bytes | None:
+        if [k for k in self.values if k.endswith(":lock")]:
+            raise ConnectionError("redis down")
+
+        return await super().get(key)
+
+    async def eval(self, script: str, numkeys: int, *keys_and_args: Any) -> int:
+        (key, token) = keys_and_args
+        self.released.append(key)
+
+        return 1 if self.values.pop(key, (None,))[0] == token.encode() else 0
+
+
+def test_lock_released_in_store_it_was_taken() -> None:
+    shared = _LockOnlyStore()
+    api_cache = CoalescingCache(shared_client=shared)
+    compute = _Counter()
+
+    result = asyncio.run(api_cache.get_or_compute("/power", "key", compute, expire=60))
+
+    assert result.status == "MISS"
+    assert shared.released == [f"{cache.API_CACHE_PREFIX}:key:lock"]
+    assert not shared.values, "Lock taken in the shared store is released there"
+    assert not [k for k in api_cache.local.values if k.endswith(":lock")]
+
+
+def _get_engine() -> object:
+    return object()
+
+
+@pytest.fixture
+def cached_app(monkeypatch) -> tuple[FastAPI, _Counter]:
+    monkeypatch.setattr(cache, "api_cache", CoalescingCache())
+    compute = _Counter()
+
+    app = FastAPI()
+
+    @app.get("/power/{network_code}")
+    @coalesced_cache(expire=60)
+    async def power(network_code: str, engine: object = Depends(_get_engine)) -> dict[str, Any]:
+        return {"network": network_code, **(await compute())}
+
+    return app, compute
+
+
+async def _get(app: FastAPI, urls: list[str], headers: dict | None = None) -> list[httpx.Response]:
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        return await asyncio.gather(*[client.get(i, headers=headers) for i in urls])
+
+
+def test_coalesced_cache_endpoint(cached_app: tuple[FastAPI, _Counter]) -> None:
+    (app, compute) = cached_app
+
+    responses = asyncio.run(_get(app, ["/power/NEM"] * 5 + ["/power/WEM"]))
+    responses += asyncio.run(_get(app, ["/power/NEM"]))
+
+    assert [i.json()["network"] for i in responses] == ["NEM"] * 5 + ["WEM", "NEM"]
+    assert compute.calls == 2, "Dependencies are not part of the key"
+    assert responses[-1].headers["X-Cache"] == "HIT"
+    assert cache.get_coalesce_stats()["/power/{network_code}"]["hits"] == 1
+
+
+def test_coalesced_cache_no_store(cached_app: tuple[FastAPI, _Counter]) -> None:
+    (app, compute) = cached_app
+
+    responses = asyncio.run(_get(app, ["/power/NEM"] * 2, headers={"Cache-Control": "no-store"}))
+
+    assert compute.calls == 2
+    assert "X-Cache" not in responses[0].headers
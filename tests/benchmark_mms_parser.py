@@ -4,7 +4,7 @@ from typing import Any
 import pytest
 
 from opennem.core.downloader import file_opener
-from opennem.core.parsers.aemo.mms import parse_aemo_mms_csv
+from opennem.core.parsers.aemo.mms import iter_aemo_file_batches, parse_aemo_mms_csv, parse_aemo_mms_frames
 
 NEM_FILE_PATH = Path("data/NEM_FACILITY_SCADA_DAY.zip")
 
@@ -26,3 +26,15 @@ def load_nem_scada_records() -> dict[str, Any]:
 )
 def test_benchmark_generate_facility_scada_base(benchmark) -> None:
     benchmark(load_nem_scada_records)
+
+
+def load_nem_scada_frame() -> Any:
+    return parse_aemo_mms_frames(iter_aemo_file_batches(NEM_FILE_PATH))["dispatch_unit_scada"]
+
+
+@pytest.mark.benchmark(
+    group="load_nem_scada_records",
+    min_rounds=1,
+)
+def test_benchmark_generate_facility_scada_streaming(benchmark) -> None:
+    benchmark(load_nem_scada_frame)
@@ -0,0 +1,209 @@
+"""Benchmark the vectorised flows kernel in merge_interconnector_and_energy_data against
+the original row-wise apply version
+
+Uses a recorded year of loader output from data/flows if present, which can be recorded with:
+
+    python -m tests.benchmark_network_flows 2022
+
+otherwise falls back to a generated year of data with the same shape
+"""
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from opennem.aggregates.network_flows import merge_interconnector_and_energy_data
+from opennem.schema.network import NetworkNEM
+
+RECORDED_PATH = Path("data/flows")
+RECORDED_INTERCONNECTORS = RECORDED_PATH / "interconnector_intervals.csv"
+RECORDED_ENERGY = RECORDED_PATH / "energy_emission_mv_intervals.csv"
+
+NEM_INTERCONNECTORS = [("NSW1", "QLD1"), ("VIC1", "NSW1"), ("TAS1", "VIC1"), ("VIC1", "SA1")]
+NEM_REGIONS = ["NSW1", "QLD1", "SA1", "TAS1", "VIC1"]
+
+
+def _merge_interconnector_and_energy_data_apply(df_energy: pd.DataFrame, df_inter: pd.DataFrame, scale: int) -> pd.DataFrame:
+    """The original row-wise version of merge_interconnector_and_energy_data to compare against"""
+    region_from = pd.merge(
+        df_inter,
+        df_energy,
+        how="left",
+        left_on=["trading_interval", "interconnector_region_from"],
+        right_on=["trading_interval", "network_region"],
+        suffixes=("", "_from"),
+    )
+
+    df_merged = pd.merge(
+        region_from,
+        df_energy,
+        how="left",
+        left_on=["trading_interval", "interconnector_region_to"],
+        right_on=["trading_interval", "network_region"],
+        suffixes=("", "_to"),
+    )
+
+    df_merged_inverted = df_merged.rename(
+        columns={
+            "interconnector_region_from": "interconnector_region_to",
+            "interconnector_region_to": "interconnector_region_from",
+        }
+    )
+
+    df_merged_inverted["generated"] *= -1
+
+    f = pd.concat([df_merged, df_merged_inverted])
+
+    f["energy_exports"] = f.apply(lambda x: x.generated if x.generated and x.generated >= 0 else 0, axis=1)
+    f["energy_imports"] = f.apply(lambda x: x.generated if x.generated and x.generated <= 0 else 0, axis=1)
+
+    f["emission_exports"] = f.apply(
+        lambda x: x.energy_exports * x.emission_factor
+        if x.generated and x.generated >= 0 and x.network_region == "TAS1"
+        else x.energy_imports * x.emission_factor_to,
+        axis=1,
+    )
+    f["emission_imports"] = f.apply(
+        lambda x: x.energy_imports * x.emission_factor_to
+        if x.generated and x.generated <= 0 and x.network_region == "TAS1"
+        else x.energy_imports * x.emission_factor,
+        axis=1,
+    )
+
+    f["market_value_exports"] = f.apply(lambda x: x.generated * x.price_to if x.generated and x.generated >= 0 else 0, axis=1)
+    f["market_value_imports"] = f.apply(lambda x: x.generated * x.price if x.generated and x.generated <= 0 else 0, axis=1)
+
+    energy_flows = pd.DataFrame(
+        {
+            "energy_imports": f.groupby(["trading_interval", "interconnector_region_from"]).energy_imports.sum() / scale,
+            "energy_exports": f.groupby(["trading_interval", "interconnector_region_from"]).energy_exports.sum() / scale,
+            "emissions_imports": f.groupby(["trading_interval", "interconnector_region_from"]).emission_imports.sum() / scale,
+            "emissions_exports": f.groupby(["trading_interval", "interconnector_region_from"]).emission_exports.sum() / scale,
+            "market_value_imports": f.groupby(["trading_interval", "interconnector_region_from"]).market_value_imports.sum()
+            / scale,
+            "market_value_exports": f.groupby(["trading_interval", "interconnector_region_from"]).market_value_exports.sum()
+            / scale,
+        }
+    )
+
+    energy_flows["emission_factor_imports"] = energy_flows["emissions_imports"] / energy_flows["energy_imports"]
+    energy_flows["emission_factor_exports"] = energy_flows["emissions_exports"] / energy_flows["energy_exports"]
+
+    energy_flows["network_id"] = "NEM"
+
+    energy_flows.reset_index(inplace=True)
+    energy_flows.rename(columns={"interconnector_region_from": "network_region"}, inplace=True)
+    energy_flows.set_index(["trading_interval", "network_id", "network_region"], inplace=True)
+
+    return energy_flows
+
+
+def generate_flow_inputs(days: int = 365, seed: int = 0) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Generate interconnector and region energy frames in the shape of the flow loaders"""
+    rng = np.random.default_rng(seed)
+
+    intervals = pd.date_range(
+        start=datetime(2022, 1, 1), periods=days * 288, freq="5min", tz=NetworkNEM.get_fixed_offset(), name="trading_interval"
+    )
+
+    df_inter = pd.concat(
+        [
+            pd.DataFrame(
+                {
+                    "interconnector_region_from": region_from,
+                    "interconnector_region_to": region_to,
+                    # include zero flows which are neither imports or exports
+                    "generated": np.round(rng.normal(0, 400, len(intervals)), 0),
+                },
+                index=intervals,
+            )
+            for region_from, region_to in NEM_INTERCONNECTORS
+        ]
+    ).sort_index()
+
+    df_energy = pd.concat(
+        [
+            pd.DataFrame(
+                {
+                    "network_region": region,
+                    "generated": rng.uniform(100, 10000, len(intervals)),
+                    "market_value": rng.uniform(0, 1000000, len(intervals)),
+                    "emissions": rng.uniform(0, 8000, len(intervals)),
+                },
+                index=intervals,
+            )
+            for region in NEM_REGIONS
+        ]
+    ).sort_index()
+
+    df_energy["price"] = df_energy["market_value"] / df_energy["generated"]
+    df_energy["emission_factor"] = df_energy["emissions"] / df_energy["generated"]
+
+    return df_energy, df_inter
+
+
+def load_flow_inputs() -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Load a recorded year of flow inputs if it exists otherwise generate one"""
+    if not RECORDED_INTERCONNECTORS.is_file() or not RECORDED_ENERGY.is_file():
+        return generate_flow_inputs()
+
+    df_inter = pd.read_csv(RECORDED_INTERCONNECTORS, index_col="trading_interval", parse_dates=["trading_interval"])
+    df_energy = pd.read_csv(RECORDED_ENERGY, index_col="trading_interval", parse_dates=["trading_interval"])
+
+    return df_energy, df_inter
+
+
+def record_flow_inputs(year: int) -> None:
+    """Record a year of flow loader output to data/flows"""
+    from opennem.aggregates.network_flows import load_energy_emission_mv_intervals, load_interconnector_intervals
+
+    date_start = datetime.fromisoformat(f"{year}-01-01T00:00:00+10:00")
+    date_end = datetime.fromisoformat(f"{year + 1}-01-01T00:00:00+10:00")
+
+    RECORDED_PATH.mkdir(parents=True, exist_ok=True)
+
+    load_interconnector_intervals(date_start=date_start, date_end=date_end, network=NetworkNEM).to_csv(RECORDED_INTERCONNECTORS)
+    load_energy_emission_mv_intervals(date_start=date_start, date_end=date_end, network=NetworkNEM).to_csv(RECORDED_ENERGY)
+
+
+def test_merge_interconnector_and_energy_data_matches_apply() -> None:
+    df_energy, df_inter = generate_flow_inputs(days=2)
+
+    # include some intervals with no matching region energy
+    df_energy = df_energy.drop(df_energy.index[:12])
+
+    flows_apply = _merge_interconnector_and_energy_data_apply(df_energy, df_inter, scale=12)
+    flows_vectorised = merge_interconnector_and_energy_data(df_energy, df_inter, scale=12)
+
+    pd.testing.assert_frame_equal(flows_apply, flows_vectorised, check_exact=True)
+
+
+flow_inputs_year = load_flow_inputs()
+
+
+@pytest.mark.benchmark(
+    group="network_flows_merge",
+    min_rounds=1,
+)
+@pytest.mark.parametrize("merge_method", [_merge_interconnector_and_energy_data_apply, merge_interconnector_and_energy_data])
+def test_benchmark_merge_interconnector_and_energy_data(benchmark, merge_method) -> None:
+    df_energy, df_inter = flow_inputs_year
+
+    benchmark(merge_method, df_energy, df_inter, scale=12)
+
+
+def test_merge_interconnector_and_energy_data_matches_apply_year() -> None:
+    df_energy, df_inter = flow_inputs_year
+
+    pd.testing.assert_frame_equal(
+        _merge_interconnector_and_energy_data_apply(df_energy, df_inter, scale=12),
+        merge_interconnector_and_energy_data(df_energy, df_inter, scale=12),
+        check_exact=True,
+    )
+
+
+if __name__ == "__main__":
+    record_flow_inputs(int(sys.argv[1]))
@@ -0,0 +1,171 @@
+"""Benchmark the bound parameter export queries on the live export loop
+
+The live export loop runs the power query for each NEM region every interval. With the values
+formatted into the SQL every statement is new to the SQLAlchemy compiled cache and to
+PostgreSQL, with bound parameters the statement is compiled once per query shape.
+
+The compile benchmarks run without a database. The planning benchmarks run the loop against
+the database in settings.db_url with and without server-side prepared statements and are
+skipped if it can't be reached.
+"""
+from collections.abc import Callable
+from datetime import datetime, timedelta
+from itertools import count
+from textwrap import dedent
+
+import pytest
+from sqlalchemy import sql
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.sql.elements import TextClause
+from sqlalchemy.util import LRUCache
+
+from opennem.api.export.queries import power_network_fueltech_query
+from opennem.api.time import human_to_interval, human_to_period
+from opennem.controllers.output.schema import OpennemExportSeries
+from opennem.db import db_connect
+from opennem.db.prepared import register_prepared_statements
+from opennem.schema.network import NetworkNEM
+
+NEM_REGIONS = ["NSW1", "QLD1", "SA1", "TAS1", "VIC1"]
+
+LIVE_LOOP_INTERVALS = 12
+
+_DIALECT = postgresql.psycopg2.dialect()  # type: ignore
+
+# power_network_fueltech_query as it was with the values formatted into the query
+_FORMAT_QUERY = """
+    select
+        t.trading_interval,
+        t.fueltech_code,
+        sum(t.fueltech_power)
+    from (
+        select
+            time_bucket_gapfill('{trunc}', fs.trading_interval) AS trading_interval,
+            ft.code as fueltech_code,
+            coalesce(avg(fs.generated), 0) as fueltech_power
+        from facility_scada fs
+        join facility f on fs.facility_code = f.code
+        join fueltech ft on f.fueltech_id = ft.code
+        where
+            fs.is_forecast is False and
+            f.fueltech_id is not null and
+            f.fueltech_id not in ('exports', 'imports', 'interconnector', 'solar_rooftop') and
+            (f.network_id IN ('NEM')) and
+            f.network_region='{network_region}' and
+            fs.trading_interval <= '{date_max}' and
+            fs.trading_interval >= '{date_min}'
+        group by 1, f.code, 2
+    ) as t
+    group by 1, 2
+    order by 1 desc
+"""
+
+
+def _live_time_series(interval_num: int) -> OpennemExportSeries:
+    return OpennemExportSeries(
+        start=datetime(2023, 1, 1) + timedelta(minutes=5 * interval_num),
+        end=datetime(2023, 1, 8) + timedelta(minutes=5 * interval_num),
+        network=NetworkNEM,
+        interval=human_to_interval("5m"),
+        period=human_to_period("7d"),
+    )
+
+
+def format_queries(loop_num: int = 0) -> list[TextClause]:
+    queries = []
+
+    for interval_num in range(loop_num * LIVE_LOOP_INTERVALS, (loop_num + 1) * LIVE_LOOP_INTERVALS):
+        time_series_range = _live_time_series(interval_num).get_range()
+
+        for network_region in NEM_REGIONS:
+            query = _FORMAT_QUERY.format(
+                trunc="5 minutes",
+                network_region=network_region,
+                date_max=time_series_range.end,
+                date_min=time_series_range.start,
+            )
+            queries.append(sql.text(dedent(query)))
+
+    return queries
+
+
+def bound_queries(loop_num: int = 0) -> list[TextClause]:
+    return [
+        power_network_fueltech_query(_live_time_series(interval_num), network_region=network_region)
+        for interval_num in range(loop_num * LIVE_LOOP_INTERVALS, (loop_num + 1) * LIVE_LOOP_INTERVALS)
+        for network_region in NEM_REGIONS
+    ]
+
+
+def compile_live_loop(queries: list[TextClause], compiled_cache: LRUCache) -> None:
+    for query in queries:
+        query._compile_w_cache(_DIALECT, compiled_cache=compiled_cache, column_keys=[])
+
+
+def _benchmark_live_loop(benchmark, build_queries: Callable[[int], list[TextClause]]) -> None:  # type: ignore
+    """Each round is the next loop of intervals against the same compiled cache"""
+    compiled_cache = LRUCache(1200)
+    loop_nums = count()
+
+    def _setup() -> tuple[tuple, dict]:
+        return (build_queries(next(loop_nums)), compiled_cache), {}
+
+    benchmark.pedantic(compile_live_loop, setup=_setup, rounds=20)
+
+
+def test_live_loop_statement_count() -> None:
+    assert len({str(i) for i in format_queries()}) == LIVE_LOOP_INTERVALS * len(NEM_REGIONS)
+    assert len({str(i) for i in bound_queries()}) == 1
+
+
+@pytest.mark.benchmark(
+    group="compile_live_loop",
+)
+def test_benchmark_compile_format_queries(benchmark) -> None:  # type: ignore
+    _benchmark_live_loop(benchmark, format_queries)
+
+
+@pytest.mark.benchmark(
+    group="compile_live_loop",
+)
+def test_benchmark_compile_bound_queries(benchmark) -> None:  # type: ignore
+    _benchmark_live_loop(benchmark, bound_queries)
+
+
+def _run_live_loop(engine, queries: list[TextClause]) -> None:  # type: ignore
+    with engine.connect() as c:
+        for query in queries:
+            c.execute(query).fetchall()
+
+
+@pytest.fixture(scope="module")
+def db_engine():  # type: ignore
+    engine = db_connect(timeout=2)
+
+    try:
+        with engine.connect() as c:
+            c.execute("select 1")
+    except OperationalError:
+        pytest.skip("Requires a database")
+
+    return engine
+
+
+@pytest.mark.benchmark(
+    group="plan_live_loop",
+    min_rounds=3,
+)
+def test_benchmark_plan_format_queries(benchmark, db_engine) -> None:  # type: ignore
+    queries = format_queries()
+    benchmark(_run_live_loop, db_engine, queries)
+
+
+@pytest.mark.benchmark(
+    group="plan_live_loop",
+    min_rounds=3,
+)
+def test_benchmark_plan_prepared_queries(benchmark, db_engine) -> None:  # type: ignore
+    register_prepared_statements(db_engine)
+    queries = bound_queries()
+    benchmark(_run_live_loop, db_engine, queries)
@@ -0,0 +1,67 @@
+"""Benchmark serializing export stat sets
+
+Compares pydantic .json() with the stdlib encoder against the model_dict fast path with the
+json and orjson serializer backends on the fixture exports
+"""
+from pathlib import Path
+
+import pytest
+
+from opennem import settings
+from opennem.api.stats.schema import OpennemDataSet, load_opennem_dataset_from_file
+from opennem.exporter.encoders import iter_model_json, opennem_model_serialize
+
+stat_set_fixture = load_opennem_dataset_from_file(Path(__file__).parent / "fixtures" / "nem_nsw1_week.json")
+
+
+def serialize_pydantic(stat_set: OpennemDataSet) -> str:
+    return stat_set.json(exclude_unset=True)
+
+
+def serialize_stream(stat_set: OpennemDataSet) -> int:
+    return sum(len(i) for i in iter_model_json(stat_set))
+
+
+@pytest.mark.benchmark(
+    group="serialize_stat_set",
+    min_rounds=5,
+)
+def test_benchmark_serialize_pydantic_json(benchmark, monkeypatch) -> None:
+    monkeypatch.setattr(settings, "json_serializer", "json")
+    benchmark(serialize_pydantic, stat_set_fixture)
+
+
+@pytest.mark.benchmark(
+    group="serialize_stat_set",
+    min_rounds=5,
+)
+def test_benchmark_serialize_pydantic_orjson(benchmark, monkeypatch) -> None:
+    monkeypatch.setattr(settings, "json_serializer", "orjson")
+    benchmark(serialize_pydantic, stat_set_fixture)
+
+
+@pytest.mark.benchmark(
+    group="serialize_stat_set",
+    min_rounds=5,
+)
+def test_benchmark_serialize_fast_json(benchmark, monkeypatch) -> None:
+    monkeypatch.setattr(settings, "json_serializer", "json")
+    benchmark(opennem_model_serialize, stat_set_fixture)
+
+
+@pytest.mark.benchmark(
+    group="serialize_stat_set",
+    min_rounds=5,
+)
+def test_benchmark_serialize_fast_orjson(benchmark, monkeypatch) -> None:
+    monkeypatch.setattr(settings, "json_serializer", "orjson")
+    benchmark(opennem_model_serialize, stat_set_fixture)
+
+
+@pytest.mark.benchmark(
+    group="serialize_stat_set",
+    min_rounds=5,
+)
+def test_benchmark_serialize_stream_orjson(benchmark, monkeypatch) -> None:
+    monkeypatch.setattr(settings, "json_serializer", "orjson")
+    benchmark(serialize_stream, stat_set_fixture)
@@ -0,0 +1,114 @@
+"""Benchmark stats_factory building a power week for a network from query rows
+
+Compares building a DataQueryResult per row against passing the rows as DataQueryColumns
+"""
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from opennem.api.stats.controllers import stats_factory
+from opennem.api.stats.schema import DataQueryColumns, DataQueryResult
+from opennem.api.time import human_to_interval
+from opennem.core.networks import network_from_network_code
+from opennem.core.units import get_unit
+
+POWER_WEEK_INTERVALS = 7 * 288
+POWER_WEEK_FUELTECHS = [
+    "battery_charging",
+    "battery_discharging",
+    "bioenergy_biomass",
+    "coal_black",
+    "coal_brown",
+    "distillate",
+    "gas_ccgt",
+    "gas_ocgt",
+    "gas_recip",
+    "gas_steam",
+    "hydro",
+    "pumps",
+    "solar_rooftop",
+    "solar_utility",
+    "wind",
+]
+
+
+def generate_power_week_rows(
+    num_intervals: int = POWER_WEEK_INTERVALS, fueltechs: list[str] = POWER_WEEK_FUELTECHS, seed: int = 0
+) -> list[tuple[datetime, str, float | None]]:
+    """Rows in the shape of power_network_fueltech_query - interval, fueltech, power - with some
+    nulls and the trailing intervals missing for one fueltech"""
+    rng = random.Random(seed)
+    network = network_from_network_code("NEM")
+    interval_start = datetime(2021, 1, 15, 10, 0, tzinfo=network.get_fixed_offset())
+
+    rows = []
+
+    for i in range(num_intervals):
+        interval = interval_start + timedelta(minutes=5 * i)
+
+        for fueltech in fueltechs:
+            if fueltech == "solar_rooftop" and i > num_intervals - 6:
+                continue
+
+            value = None if rng.random() < 0.01 else rng.uniform(-50, 8000)
+
+            rows.append((interval, fueltech, value))
+
+    # rows are returned ordered by interval desc
+    rows.reverse()
+
+    return rows
+
+
+def power_week_stats_factory(stats: list[DataQueryResult] | DataQueryColumns) -> str:
+    network = network_from_network_code("NEM")
+
+    result = stats_factory(
+        stats,
+        network=network,
+        interval=human_to_interval("5m"),
+        units=get_unit("power"),
+        region="NSW1",
+        fueltech_group=True,
+        include_code=True,
+    )
+
+    result.created_at = None
+
+    return result.json()
+
+
+def power_week_from_results(rows: list[tuple]) -> str:
+    stats = [DataQueryResult(interval=i[0], result=i[2], group_by=i[1] if len(i) > 1 else None) for i in rows]
+
+    return power_week_stats_factory(stats)
+
+
+def power_week_from_columns(rows: list[tuple]) -> str:
+    return power_week_stats_factory(DataQueryColumns.from_rows(rows, interval=0, result=2, group_by=1))
+
+
+def test_power_week_columns_matches_results() -> None:
+    rows = generate_power_week_rows(num_intervals=288)
+
+    assert power_week_from_columns(rows) == power_week_from_results(rows)
+
+
+power_week_fixture = generate_power_week_rows()
+
+
+@pytest.mark.benchmark(
+    group="stats_factory_power_week",
+    min_rounds=3,
+)
+def test_benchmark_stats_factory_results(benchmark) -> None:
+    benchmark(power_week_from_results, power_week_fixture)
+
+
+@pytest.mark.benchmark(
+    group="stats_factory_power_week",
+    min_rounds=3,
+)
+def test_benchmark_stats_factory_columns(benchmark) -> None:
+    benchmark(power_week_from_columns, power_week_fixture)
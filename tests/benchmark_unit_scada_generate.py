@@ -0,0 +1,133 @@
+"""Regression benchmark for facility scada generation from a 1M row DISPATCH_UNIT_SCADA table
+
+Compares the record based unit_scada_generate_facility_scada against the columnar
+generate_facility_scada_frame fed from streamed table batches. The fixture is generated
+in the MMS CSV format so it goes through the same parser path as a NEMWeb archive.
+"""
+import functools
+import io
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from opennem.controllers.nem import (
+    facility_scada_frame_to_records,
+    generate_facility_scada,
+    generate_facility_scada_frame,
+    iter_facility_scada_frames,
+    unit_scada_generate_facility_scada,
+)
+from opennem.core.parsers.aemo.mms import MMS_DATE_FORMAT, iter_aemo_mms_batches, parse_aemo_mms_frames
+
+UNIT_SCADA_FIXTURE_ROWS = 1_000_000
+UNIT_SCADA_FIXTURE_DUIDS = 500
+
+
+def generate_unit_scada_csv(
+    num_rows: int, num_duids: int = UNIT_SCADA_FIXTURE_DUIDS, duplicates: int = 0, seed: int = 0
+) -> bytes:
+    """Generate a DISPATCH_UNIT_SCADA MMS file with num_rows rows and optionally some
+    repeated rows at the end"""
+    rng = np.random.default_rng(seed)
+
+    interval_start = datetime(2022, 1, 1, 0, 5)
+    num_intervals = num_rows // num_duids + 1
+
+    intervals = [(interval_start + timedelta(minutes=5 * i)).strftime(MMS_DATE_FORMAT) for i in range(num_intervals)]
+    duids = [f"UNIT{i:04d}" for i in range(num_duids)]
+    values = np.round(rng.uniform(-10, 700, num_rows), 5)
+
+    rows = [f'D,DISPATCH,UNIT_SCADA,1,"{intervals[i // num_duids]}",{duids[i % num_duids]},{values[i]}' for i in range(num_rows)]
+
+    rows += rows[:duplicates]
+
+    csv_content = "\n".join(
+        [
+            "C,NEMP.WORLD,DISPATCHSCADA,AEMO,PUBLIC,2022/01/01,00:05:00,0000000348376188,DISPATCHSCADA,0000000348376182",
+            "I,DISPATCH,UNIT_SCADA,1,SETTLEMENTDATE,DUID,SCADAVALUE",
+            *rows,
+            f'C,"END OF REPORT",{len(rows) + 3}',
+        ]
+    )
+
+    return csv_content.encode("utf-8")
+
+
+def load_unit_scada_records(csv_content: bytes) -> list[dict]:
+    frame = parse_aemo_mms_frames(iter_aemo_mms_batches(io.BytesIO(csv_content)))["dispatch_unit_scada"]
+
+    return frame.to_dict("records")
+
+
+@functools.cache
+def get_unit_scada_fixture() -> bytes:
+    return generate_unit_scada_csv(UNIT_SCADA_FIXTURE_ROWS, duplicates=UNIT_SCADA_FIXTURE_DUIDS)
+
+
+@functools.cache
+def get_unit_scada_fixture_records() -> list[dict]:
+    return load_unit_scada_records(get_unit_scada_fixture())
+
+
+def generate_facility_scada_streaming(csv_content: bytes) -> int:
+    num_records = 0
+
+    for df_scada in iter_facility_scada_frames(iter_aemo_mms_batches(io.BytesIO(csv_content))):
+        num_records += len(df_scada)
+
+    return num_records
+
+
+def test_generate_facility_scada_frame_matches_records() -> None:
+    records = load_unit_scada_records(generate_unit_scada_csv(5_000, duplicates=250))
+
+    # a later duplicate with a different value replaces the earlier one
+    records.append({**records[0], "scadavalue": 1.5})
+
+    records_generated = generate_facility_scada(records)
+    frame_generated = facility_scada_frame_to_records(generate_facility_scada_frame(pd.DataFrame.from_records(records)))
+
+    assert len(records_generated) == 5_000, "Duplicates are removed"
+    assert len(frame_generated) == len(records_generated)
+    assert frame_generated[-1]["generated"] == 1.5, "Keeps the last duplicate"
+
+    ignore_fields = ["created_at", "created_by"]
+
+    for record, frame_record in zip(records_generated, frame_generated, strict=True):
+        assert {k: v for k, v in record.items() if k not in ignore_fields} == {
+            k: v for k, v in frame_record.items() if k not in ignore_fields
+        }
+
+
+def test_generate_facility_scada_streaming_batches() -> None:
+    assert generate_facility_scada_streaming(generate_unit_scada_csv(5_000)) == 5_000
+
+
+@pytest.mark.benchmark(
+    group="unit_scada_generate_facility_scada",
+    min_rounds=1,
+)
+def test_benchmark_unit_scada_generate_facility_scada(benchmark) -> None:
+    records = benchmark(unit_scada_generate_facility_scada, get_unit_scada_fixture_records())
+
+    assert len(records) == UNIT_SCADA_FIXTURE_ROWS
+
+
+@pytest.mark.benchmark(
+    group="unit_scada_generate_facility_scada",
+    min_rounds=1,
+)
+def test_benchmark_generate_facility_scada_frame(benchmark) -> None:
+    df_scada = benchmark(generate_facility_scada_frame, pd.DataFrame.from_records(get_unit_scada_fixture_records()))
+
+    assert len(df_scada) == UNIT_SCADA_FIXTURE_ROWS
+
+
+@pytest.mark.benchmark(
+    group="unit_scada_generate_facility_scada",
+    min_rounds=1,
+)
+def test_benchmark_generate_facility_scada_streaming(benchmark) -> None:
+    benchmark(generate_facility_scada_streaming, get_unit_scada_fixture())
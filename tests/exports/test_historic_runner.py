@@ -0,0 +1,97 @@
+"""
+Tests for the parallel historic export runner in opennem.exporter.historic
+
+
+"""
+import os
+from datetime import timedelta
+from pathlib import Path
+
+from opennem.exporter import historic
+from opennem.exporter.historic import HistoricExportJob, plan_historic_export_jobs, run_historic_export_jobs
+from opennem.schema.network import NetworkNEM
+
+
+def test_plan_historic_export_jobs_skips_completed() -> None:
+    jobs = plan_historic_export_jobs(NetworkNEM, network_region_codes=["NSW1", "QLD1"], limit=4)
+
+    assert len(jobs) == 8
+
+    (current_week, last_week) = jobs[:2]
+
+    checkpoints = {
+        # a complete week exported in full
+        ("NSW1", last_week.week_start): last_week.week_end,
+        # the current week exported a day ago
+        ("NSW1", current_week.week_start): current_week.week_end - timedelta(days=1),
+    }
+
+    resumed_jobs = plan_historic_export_jobs(NetworkNEM, network_region_codes=["NSW1", "QLD1"], limit=4, checkpoints=checkpoints)
+
+    assert len(resumed_jobs) == 7
+    assert last_week not in resumed_jobs
+    assert current_week in resumed_jobs, "Incomplete weeks are exported again"
+
+
+def _fake_historic_export_job(job: HistoricExportJob) -> int | None:
+    """Fails FAIL1 every time and RETRY1 the first time"""
+    marker_path = Path(os.environ["HISTORIC_TEST_MARKER_PATH"])
+
+    if job.network_region_code == "FAIL1":
+        raise Exception("Export failed")
+
+    if job.network_region_code == "RETRY1" and not marker_path.is_file():
+        marker_path.touch()
+        raise Exception("Export failed first time")
+
+    if job.network_region_code == "EMPTY1":
+        return None
+
+    return 100
+
+
+def test_run_historic_export_jobs_retries(monkeypatch, tmp_path) -> None:
+    monkeypatch.setenv("HISTORIC_TEST_MARKER_PATH", str(tmp_path / "retried"))
+    monkeypatch.setattr(historic, "run_historic_export_job", _fake_historic_export_job)
+
+    recorded = []
+
+    def _record_historic_job(job: HistoricExportJob, completed: bool, error: str | None = None) -> None:
+        recorded.append((job.network_region_code, completed, error))
+
+    monkeypatch.setattr(historic, "record_historic_job", _record_historic_job)
+
+    jobs = plan_historic_export_jobs(NetworkNEM, network_region_codes=["NSW1", "FAIL1", "RETRY1", "EMPTY1"], limit=2)
+
+    result = run_historic_export_jobs(jobs, workers=2, retries=2)
+
+    assert {i.network_region_code for i in result.failed} == {"FAIL1"}
+    assert len(result.failed) == 2, "A failed job doesn't stop the rest"
+    assert len(result.completed) == 6
+
+    assert recorded.count(("FAIL1", False, "Export failed")) == 6, "Failed jobs are retried"
+    assert recorded.count(("RETRY1", True, None)) == 2
+    assert recorded.count(("EMPTY1", False, "No data")) == 2
+
+
+def test_run_historic_export_jobs_in_process(monkeypatch, tmp_path) -> None:
+    monkeypatch.setenv("HISTORIC_TEST_MARKER_PATH", str(tmp_path / "retried"))
+    monkeypatch.setattr(historic, "record_historic_job", lambda job, completed, error=None: None)
+    # ie. a huey process worker
+    monkeypatch.setattr(historic, "can_start_process_pool", lambda: False)
+
+    pids = set()
+
+    def _export_job(job: HistoricExportJob) -> int | None:
+        pids.add(os.getpid())
+        return _fake_historic_export_job(job)
+
+    monkeypatch.setattr(historic, "run_historic_export_job", _export_job)
+
+    jobs = plan_historic_export_jobs(NetworkNEM, network_region_codes=["NSW1", "RETRY1"], limit=2)
+
+    result = run_historic_export_jobs(jobs, workers=4, retries=1)
+
+    assert pids == {os.getpid()}
+    assert len(result.completed) == 4
+    assert not result.failed
@@ -0,0 +1,102 @@
+"""
+Tests for the shared query export planner in opennem.api.export.planner
+
+
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy.sql.elements import TextClause
+
+from opennem.api.export import planner
+from opennem.api.export.controllers import demand_network_region_daily_from_rows, energy_fueltech_daily_from_rows
+from opennem.api.export.planner import RegionExport, build_region_stat_sets, plan_region_exports
+from opennem.api.time import human_to_interval, human_to_period
+from opennem.controllers.output.schema import OpennemExportSeries
+from opennem.schema.network import NetworkAEMORooftop, NetworkAPVI, NetworkNEM, NetworkWEM
+
+NEM_REGIONS = ["NSW1", "QLD1", "SA1", "TAS1", "VIC1"]
+
+
+def _time_series(network, end: datetime = datetime(2023, 1, 31)) -> OpennemExportSeries:  # type: ignore
+    return OpennemExportSeries(
+        start=datetime(2023, 1, 1),
+        end=end,
+        network=network,
+        interval=human_to_interval("1d"),
+        period=human_to_period("all"),
+    )
+
+
+def _region_exports() -> list[RegionExport]:
+    nem_time_series = _time_series(NetworkNEM)
+
+    region_exports = [
+        RegionExport(
+            network=NetworkNEM,
+            network_region=i,
+            networks_query=[NetworkNEM, NetworkAEMORooftop],
+            time_series=nem_time_series,
+        )
+        for i in NEM_REGIONS
+    ]
+
+    region_exports.append(
+        RegionExport(
+            network=NetworkWEM,
+            network_region="WEM",
+            networks_query=[NetworkWEM, NetworkAPVI],
+            time_series=_time_series(NetworkWEM),
+        )
+    )
+
+    return region_exports
+
+
+def test_plan_region_exports_groups() -> None:
+    groups = plan_region_exports(_region_exports())
+
+    assert len(groups) == 2, "One group per network"
+    assert groups[0].network_regions == NEM_REGIONS
+    assert groups[0].network_region_query is None, "Group queries cover all regions"
+    assert groups[1].network_region_query == "WEM", "Single region groups filter to the region"
+
+
+def test_plan_region_exports_splits_date_ranges() -> None:
+    region_exports = _region_exports()
+    region_exports[0].time_series = _time_series(NetworkNEM, end=datetime(2023, 1, 30))
+
+    assert len(plan_region_exports(region_exports)) == 3
+
+
+def test_build_region_stat_sets_fans_out(monkeypatch) -> None:
+    (group, _) = plan_region_exports(_region_exports())
+
+    days = [datetime(2023, 1, 1) + timedelta(days=i) for i in range(30)]
+
+    energy_rows = {
+        region: [(day, fueltech, 10.0 + n, 1000.0 + n, 5.0 + n, region) for day in days for fueltech in ["coal_black", "wind"]]
+        for n, region in enumerate(NEM_REGIONS)
+    }
+    demand_rows = {region: [(day, "NEM", region, 20.0 + n, 2000.0 + n) for day in days] for n, region in enumerate(NEM_REGIONS)}
+
+    queries = []
+
+    def _get_rows_by_region(query: TextClause, region_column: int) -> dict:
+        queries.append(str(query))
+        return energy_rows if "at_facility_daily" in str(query) else demand_rows
+
+    monkeypatch.setattr(planner, "get_rows_by_region", _get_rows_by_region)
+
+    stat_sets = build_region_stat_sets(group)
+
+    assert len(queries) == 2, "One query each for energy and demand"
+    assert "network_region =" not in queries[0], "Not filtered by region"
+    assert list(stat_sets) == NEM_REGIONS
+
+    for region in NEM_REGIONS:
+        expected = energy_fueltech_daily_from_rows(energy_rows[region], time_series=group.time_series, network_region_code=region)
+        expected.append_set(  # type: ignore
+            demand_network_region_daily_from_rows(demand_rows[region], time_series=group.time_series, network_region_code=region)
+        )
+
+        assert stat_sets[region].json(exclude={"created_at"}) == expected.json(exclude={"created_at"})  # type: ignore
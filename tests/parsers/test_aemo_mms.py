@@ -1,4 +1,8 @@
-from opennem.core.parsers.aemo.mms import parse_aemo_mms_csv
+import io
+from zipfile import ZipFile
+
+from opennem.core.parsers.aemo.mms import iter_aemo_mms_batches, parse_aemo_mms_csv, parse_aemo_mms_frames, parse_aemo_stream
+from opennem.utils.archive import iter_zip_members
 
 
 def test_parse_aemo_mms_dispatch_scada(aemo_nemweb_dispatch_scada: str) -> None:
@@ -24,3 +28,54 @@ def test_parse_aemo_mms_dispatch_scada(aemo_nemweb_dispatch_scada: str) -> None:
         raise Exception("Invalid record")
 
     # assert record.settlementdate, "Record has settlement date"  # type: ignore
+
+
+MMS_UNIT_SCADA_CSV = """C,NEMP.WORLD,DISPATCHSCADA,AEMO,PUBLIC,2021/09/02,12:50:14,0000000348376188,DISPATCHSCADA,0000000348376182
+I,DISPATCH,UNIT_SCADA,1,SETTLEMENTDATE,DUID,SCADAVALUE
+D,DISPATCH,UNIT_SCADA,1,"2021/09/02 12:55:00",ADPBA1G,0
+D,DISPATCH,UNIT_SCADA,1,"2021/09/02 12:55:00",adppv1 ,15.5
+D,DISPATCH,UNIT_SCADA,1,"2021/09/02 12:55:00",BALBG1,-0.25
+C,"END OF REPORT",5
+"""
+
+
+def test_iter_aemo_mms_batches_matches_parser() -> None:
+    records = parse_aemo_mms_csv(MMS_UNIT_SCADA_CSV).get_table("unit_scada").records  # type: ignore
+
+    batches = list(iter_aemo_mms_batches(io.BytesIO(MMS_UNIT_SCADA_CSV.encode("utf-8")), batch_size=2))
+
+    assert [len(i) for i in batches] == [2, 1], "Batches are bounded by batch size"
+    assert all(i.full_name == "dispatch_unit_scada" for i in batches), "Batches have table name"
+
+    frames = parse_aemo_mms_frames(batches)
+
+    assert list(frames.keys()) == ["dispatch_unit_scada"], "Has a single table"
+
+    df = frames["dispatch_unit_scada"]
+
+    assert len(df) == len(records), "Same number of records"
+    assert df.duid.tolist() == [i["duid"] for i in records], "DUIDs normalized the same"
+    assert df.settlementdate.tolist() == [i["settlementdate"] for i in records], "Dates parsed the same"
+    assert df.scadavalue.tolist() == [float(i["scadavalue"]) for i in records], "Values cast to float"
+
+
+def test_parse_aemo_stream_nested_zip() -> None:
+    nested_zip = io.BytesIO()
+
+    with ZipFile(nested_zip, "w") as zf:
+        zf.writestr("PUBLIC_DISPATCHSCADA_202109021255.CSV", MMS_UNIT_SCADA_CSV)
+
+    archive = io.BytesIO()
+
+    with ZipFile(archive, "w") as zf:
+        zf.writestr("PUBLIC_DISPATCHSCADA_202109021255.zip", nested_zip.getvalue())
+
+    archive.seek(0)
+
+    members = [(name, parse_aemo_stream(stream)) for name, stream in iter_zip_members(archive)]
+
+    assert [name for name, _ in members] == ["PUBLIC_DISPATCHSCADA_202109021255.CSV"], "Nested member found"
+
+    records = members[0][1].get_table("unit_scada").records  # type: ignore
+
+    assert records == parse_aemo_mms_csv(MMS_UNIT_SCADA_CSV).get_table("unit_scada").records  # type: ignore
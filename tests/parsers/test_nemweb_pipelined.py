@@ -0,0 +1,84 @@
+from pathlib import Path
+
+import pytest
+
+from opennem.controllers.schema import ControllerReturn
+from opennem.core.crawlers.schema import CrawlerDefinition, CrawlerPriority
+from opennem.core.parsers.aemo import nemweb
+from opennem.core.parsers.aemo.nemweb import parse_aemo_url_pipelined
+
+UNIT_SCADA_CSV = "\n".join(
+    [
+        "C,NEMP.WORLD,DISPATCHSCADA,AEMO,PUBLIC,2022/01/01,00:05:00,0000000348376188,DISPATCHSCADA,0000000348376182",
+        "I,DISPATCH,UNIT_SCADA,1,SETTLEMENTDATE,DUID,SCADAVALUE",
+        'D,DISPATCH,UNIT_SCADA,1,"2022/01/01 00:05:00",BAYSW1,512.5',
+        'D,DISPATCH,UNIT_SCADA,1,"2022/01/01 00:05:00",ERARING1,600',
+        'C,"END OF REPORT",5',
+    ]
+)
+
+
+@pytest.fixture
+def archive_dir(tmp_path: Path, monkeypatch) -> Path:
+    """Stands in for an extracted archive with a good, an empty and an invalid file"""
+    archive_path = tmp_path / "archive"
+    archive_path.mkdir()
+
+    (archive_path / "PUBLIC_DISPATCHSCADA_1.CSV").write_text(UNIT_SCADA_CSV)
+    (archive_path / "PUBLIC_DISPATCHSCADA_2.CSV").write_text("")
+    (archive_path / "PUBLIC_DISPATCHSCADA_3.CSV").write_bytes(b"\xff\xfe\x00")
+
+    monkeypatch.setattr(nemweb, "download_and_unzip", lambda url: str(archive_path))
+
+    return archive_path
+
+
+def test_parse_aemo_url_pipelined_removes_files(archive_dir: Path, monkeypatch) -> None:
+    stored: list[str] = []
+
+    def _store(table_set) -> ControllerReturn:
+        stored.extend(i.full_name for i in table_set.tables)
+        return ControllerReturn(inserted_records=sum(len(i.records) for i in table_set.tables))
+
+    monkeypatch.setattr(nemweb, "store_aemo_tableset", _store)
+
+    cr = parse_aemo_url_pipelined("https://nemweb.com.au/archive.zip", workers=2)
+
+    assert stored == ["dispatch_unit_scada"]
+    assert cr.inserted_records == 2
+    assert not archive_dir.exists(), "Extracted files are removed"
+
+
+def test_parse_aemo_url_pipelined_removes_files_on_error(archive_dir: Path, monkeypatch) -> None:
+    def _store(table_set) -> ControllerReturn:
+        raise Exception("database down")
+
+    monkeypatch.setattr(nemweb, "store_aemo_tableset", _store)
+
+    with pytest.raises(Exception, match="database down"):
+        parse_aemo_url_pipelined("https://nemweb.com.au/archive.zip", workers=1)
+
+    assert not archive_dir.exists(), "Extracted files are removed when the parse fails"
+
+
+@pytest.mark.parametrize(["workers", "can_start_pool"], [(1, True), (4, False)])
+def test_parse_aemo_url_pipelined_serial(archive_dir: Path, monkeypatch, workers: int, can_start_pool: bool) -> None:
+    def _pool(*args, **kwargs) -> None:
+        raise AssertionError("Process pool started")
+
+    monkeypatch.setattr(nemweb, "ProcessPoolExecutor", _pool)
+    monkeypatch.setattr(nemweb, "can_start_process_pool", lambda: can_start_pool)
+    monkeypatch.setattr(
+        nemweb, "store_aemo_tableset", lambda table_set: ControllerReturn(inserted_records=len(table_set.tables[0].records))
+    )
+
+    cr = parse_aemo_url_pipelined("https://nemweb.com.au/archive.zip", workers=workers)
+
+    assert cr.inserted_records == 2
+    assert cr.errors == 1, "The invalid file is recorded as an error"
+    assert not archive_dir.exists()
+
+
+def test_crawler_ingest_modes_exclusive() -> None:
+    with pytest.raises(ValueError):
+        CrawlerDefinition(name="test", priority=CrawlerPriority.high, processor=print, bulk_insert=True, pipelined=True)
@@ -0,0 +1,87 @@
+import os
+from collections.abc import Iterator
+from io import BytesIO
+from typing import Any
+from zipfile import ZipFile
+
+import pytest
+
+from opennem.utils import archive
+from opennem.utils.archive import download_archive, fix_central_directory, iter_zip_members
+
+
+def _build_zip(members: dict[str, bytes]) -> bytes:
+    zip_buffer = BytesIO()
+
+    with ZipFile(zip_buffer, "w") as zf:
+        for name, content in members.items():
+            zf.writestr(name, content)
+
+    return zip_buffer.getvalue()
+
+
+def test_iter_zip_members_nested() -> None:
+    nested = _build_zip({"B.CSV": b"b", "inner.zip": _build_zip({"C.csv": b"c"})})
+    outer = _build_zip({"A.CSV": b"a", "nested.zip": nested, "readme.txt": b"skip"})
+
+    members = [(name, stream.read()) for name, stream in iter_zip_members(BytesIO(outer))]
+
+    assert members == [("A.CSV", b"a"), ("B.CSV", b"b"), ("C.csv", b"c")]
+
+
+def test_iter_zip_members_all_suffixes() -> None:
+    outer = _build_zip({"A.CSV": b"a", "readme.txt": b"txt"})
+
+    assert [name for name, _ in iter_zip_members(BytesIO(outer), suffixes=None)] == ["A.CSV", "readme.txt"]
+
+
+def test_iter_zip_members_nested_stream() -> None:
+    outer = _build_zip({"nested.zip": _build_zip({"B.CSV": b"b" * 10_000, "C.CSV": b"c"})})
+
+    members = [(name, len(stream.read())) for name, stream in iter_zip_members(BytesIO(outer))]
+
+    assert members == [("B.CSV", 10_000), ("C.CSV", 1)], "Nested zips read through the parent stream"
+
+
+class _StreamResponse:
+    def __init__(self, content: bytes, status_code: int = 200) -> None:
+        self.content = content
+        self.status_code = status_code
+        self.ok = status_code == 200
+
+    def __enter__(self) -> "_StreamResponse":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        return None
+
+    def iter_content(self, chunk_size: int) -> Iterator[bytes]:
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i : i + chunk_size]
+
+
+def test_download_archive_spooled(monkeypatch) -> None:
+    monkeypatch.setattr(archive, "ARCHIVE_SPOOL_MAX", 1024)
+
+    content = _build_zip({"A.CSV": os.urandom(10_000)})
+    monkeypatch.setattr(archive.http, "get", lambda *args, **kwargs: _StreamResponse(content))
+
+    with download_archive("https://nemweb.com.au/archive.zip") as archive_file:
+        assert archive_file._rolled, "Archives larger than ARCHIVE_SPOOL_MAX are spooled to disk"
+        assert archive_file.read() == content
+
+
+def test_fix_central_directory(monkeypatch) -> None:
+    # small chunks so the end of central directory record is found across chunks
+    monkeypatch.setattr(archive, "ARCHIVE_DOWNLOAD_CHUNK_SIZE", 7)
+
+    content = _build_zip({"A.CSV": b"a"})
+
+    assert fix_central_directory(BytesIO(content + b"trailing" * 10)).read() == content
+
+
+def test_download_archive_bad_link(monkeypatch) -> None:
+    monkeypatch.setattr(archive.http, "get", lambda *args, **kwargs: _StreamResponse(b"", status_code=404))
+
+    with pytest.raises(Exception, match="Bad link returned 404"):
+        download_archive("https://nemweb.com.au/archive.zip")
@@ -0,0 +1,201 @@
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+from opennem import settings
+from opennem.aggregates import backfill, network_flows
+from opennem.aggregates.backfill import (
+    BackfillException,
+    BackfillPartition,
+    BackfillResult,
+    get_backfill_stages,
+    get_backfill_workers,
+    month_ranges,
+    plan_backfill_partitions,
+    run_backfill,
+    run_backfill_partitions,
+)
+from opennem.aggregates.network_flows import FlowWorkerException
+from opennem.core import profiler
+from opennem.schema.network import NetworkNEM, NetworkWEM
+
+NEM_TZ = NetworkNEM.get_fixed_offset()
+INTERVAL_MAX = datetime.fromisoformat("2023-03-15T09:30:00+10:00")
+
+
+@pytest.fixture(autouse=True)
+def _interval_max(monkeypatch) -> None:
+    monkeypatch.setattr(backfill, "get_last_completed_interval_for_network", lambda network: INTERVAL_MAX)
+
+
+def test_month_ranges() -> None:
+    ranges = month_ranges(datetime(2022, 12, 10, tzinfo=NEM_TZ), datetime(2023, 2, 3, tzinfo=NEM_TZ))
+
+    assert ranges == [
+        (datetime(2023, 2, 1, tzinfo=NEM_TZ), datetime(2023, 2, 3, tzinfo=NEM_TZ)),
+        (datetime(2023, 1, 1, tzinfo=NEM_TZ), datetime(2023, 2, 1, tzinfo=NEM_TZ)),
+        (datetime(2022, 12, 10, tzinfo=NEM_TZ), datetime(2023, 1, 1, tzinfo=NEM_TZ)),
+    ]
+
+
+def test_plan_backfill_partitions() -> None:
+    partitions = plan_backfill_partitions(["demand", "energy"], date_min=datetime(2023, 1, 1))
+
+    demand = [i for i in partitions if i.aggregate == "demand"]
+    energy = [i for i in partitions if i.aggregate == "energy"]
+
+    assert {i.network_code for i in demand} == {"NEM", "WEM"}
+    assert len(demand) == 6
+    assert demand[0].date_max == INTERVAL_MAX, "Clipped to the latest interval"
+    assert demand[0].date_min == datetime(2023, 3, 1, tzinfo=NEM_TZ), "Newest month first"
+
+    assert len(energy) == 3 * len(NetworkNEM.regions)  # type: ignore
+    assert {i.network_region for i in energy} == set(NetworkNEM.regions)  # type: ignore
+
+
+def test_plan_backfill_partitions_networks_and_regions() -> None:
+    partitions = plan_backfill_partitions(
+        ["energy", "flows"],
+        networks=[NetworkNEM, NetworkWEM],
+        date_min=datetime(2023, 2, 1),
+        date_max=datetime(2023, 3, 1),
+        network_regions=["NSW1"],
+    )
+
+    assert partitions == [
+        BackfillPartition("energy", "NEM", datetime(2023, 2, 1, tzinfo=NEM_TZ), datetime(2023, 3, 1, tzinfo=NEM_TZ), "NSW1"),
+        BackfillPartition("flows", "NEM", datetime(2023, 2, 1, tzinfo=NEM_TZ), datetime(2023, 3, 1, tzinfo=NEM_TZ)),
+    ]
+
+
+def test_plan_backfill_partitions_unknown_aggregate() -> None:
+    with pytest.raises(BackfillException):
+        plan_backfill_partitions(["invalid"])
+
+
+def test_get_backfill_stages() -> None:
+    assert get_backfill_stages(["facility_daily", "flows", "energy", "demand"]) == [
+        ["flows", "energy", "demand"],
+        ["facility_daily"],
+    ]
+    assert get_backfill_stages(["flows", "facility_daily"]) == [["flows", "facility_daily"]]
+
+
+def test_run_backfill_stages(monkeypatch) -> None:
+    """Energy is run to completion before the facility daily aggregate that sums it"""
+    stages: list[set[str]] = []
+
+    def _run_partitions(partitions: list[BackfillPartition], workers: int | None = None) -> BackfillResult:
+        stages.append({i.aggregate for i in partitions})
+        return BackfillResult(completed=partitions)
+
+    monkeypatch.setattr(backfill, "run_backfill_partitions", _run_partitions)
+    monkeypatch.setattr(profiler.profile_buffer, "add_task_profile", lambda record: None)
+    monkeypatch.setattr(profiler.profile_buffer, "add_span", lambda span: None)
+
+    result = run_backfill(["energy", "facility_daily"], networks=[NetworkNEM], date_min=datetime(2023, 3, 1))
+
+    assert stages == [{"energy"}, {"facility_daily"}]
+    assert {i.aggregate for i in result.completed} == {"energy", "facility_daily"}
+
+
+def test_get_backfill_workers(monkeypatch) -> None:
+    monkeypatch.setattr(backfill.os, "cpu_count", lambda: 64)
+    monkeypatch.setattr(settings, "backfill_workers", 4)
+    monkeypatch.setattr(settings, "backfill_db_connections", 20)
+
+    assert get_backfill_workers() == 4
+    assert get_backfill_workers(2) == 2
+    assert get_backfill_workers(1000) == 20 // backfill.BACKFILL_PARTITION_DB_CONNECTIONS
+
+
+def test_run_backfill_partitions_retries(monkeypatch) -> None:
+    """Partitions that fail are retried after the rest of the run"""
+    partitions = plan_backfill_partitions(["demand"], networks=[NetworkNEM], date_min=datetime(2023, 1, 1))
+    flaky = partitions[1]
+    attempts: list[BackfillPartition] = []
+
+    def _run_partition(partition: BackfillPartition) -> float:
+        attempts.append(partition)
+
+        if partition == flaky and attempts.count(flaky) < 2:
+            raise Exception("connection reset")
+
+        return 0.0
+
+    monkeypatch.setattr(backfill, "run_backfill_partition", _run_partition)
+
+    result = run_backfill_partitions(partitions, workers=1, retries=1)
+
+    assert attempts == partitions + [flaky]
+    assert sorted(result.completed, key=partitions.index) == partitions
+    assert not result.failed
+    assert result.days == sum(i.days for i in partitions)
+
+
+def test_run_backfill_partitions_failed(monkeypatch) -> None:
+    partitions = plan_backfill_partitions(["demand"], networks=[NetworkNEM], date_min=datetime(2023, 3, 1))
+
+    def _run_partition(partition: BackfillPartition) -> float:
+        raise Exception("error")
+
+    monkeypatch.setattr(backfill, "run_backfill_partition", _run_partition)
+
+    result = run_backfill_partitions(partitions, workers=1, retries=2)
+
+    assert result.failed == partitions
+    assert not result.completed
+
+
+def test_plan_backfill_partitions_fueltechs() -> None:
+    partitions = plan_backfill_partitions(
+        ["energy", "flows"],
+        date_min=datetime(2023, 3, 1),
+        network_regions=["NSW1"],
+        fueltech_ids=["coal_black", "wind"],
+    )
+
+    assert [(i.aggregate, i.fueltech_id) for i in partitions] == [
+        ("energy", "coal_black"),
+        ("energy", "wind"),
+        ("flows", None),
+    ], "Only aggregates by fueltech are limited to fueltechs"
+
+
+def test_run_backfill_partitions_in_process_from_daemon(monkeypatch) -> None:
+    """A huey process worker is daemonic and can't start a pool so partitions run in process"""
+    partitions = plan_backfill_partitions(["demand"], networks=[NetworkNEM], date_min=datetime(2023, 1, 1))
+    ran: list[BackfillPartition] = []
+
+    monkeypatch.setattr(backfill, "can_start_process_pool", lambda: False)
+    monkeypatch.setattr(backfill, "run_backfill_partition", lambda partition: ran.append(partition) or 0.0)
+
+    result = run_backfill_partitions(partitions, workers=4)
+
+    assert ran == partitions
+    assert result.completed == partitions
+
+
+def test_run_flows_partition_insert_error(monkeypatch) -> None:
+    """Flows that fail to insert fail the partition rather than counting as completed"""
+    partition = plan_backfill_partitions(["flows"], date_min=datetime(2023, 3, 1))[0]
+
+    monkeypatch.setattr(network_flows, "calc_flows_for_range", lambda *args, **kwargs: pd.DataFrame({"energy_imports": [1.0]}))
+    monkeypatch.setattr(network_flows, "insert_flows", lambda flows: 0)
+
+    with pytest.raises(FlowWorkerException):
+        backfill._run_flows(partition, NetworkNEM)
+
+
+def test_run_energy_partition_fueltech(monkeypatch) -> None:
+    partition = plan_backfill_partitions(
+        ["energy"], date_min=datetime(2023, 3, 1), network_regions=["NSW1"], fueltech_ids=["wind"]
+    )[0]
+    calls: list[dict] = []
+
+    monkeypatch.setattr(backfill, "run_energy_calc", lambda *args, **kwargs: calls.append(kwargs) or 0)
+
+    backfill._run_energy(partition, NetworkNEM)
+
+    assert [(i["region"], i["fueltech_id"], i["raise_errors"]) for i in calls] == [("NSW1", "wind", True)]
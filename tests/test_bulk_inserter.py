@@ -0,0 +1,206 @@
+import struct
+from datetime import UTC, datetime, timedelta, timezone
+
+import pandas as pd
+import pytest
+
+from opennem.db import bulk_insert_binary
+from opennem.db.bulk_insert_binary import (
+    PGCOPY_HEADER,
+    PGCOPY_TRAILER,
+    BulkInsertBinaryException,
+    bulkinsert_binary,
+    generate_bulkinsert_binary_from_columns,
+    generate_bulkinsert_binary_from_records,
+    supports_binary_copy,
+)
+from opennem.db.bulk_insert_csv import build_insert_query
+from opennem.db.models.opennem import BalancingSummary, FacilityScada
+
+NEM_TZ = timezone(timedelta(hours=10))
+
+
+def _decode_binary_copy(buffer: bytes) -> list[list[bytes | None]]:
+    """Decode a binary COPY buffer back to a list of raw field values per row"""
+    assert buffer.startswith(PGCOPY_HEADER)
+    assert buffer.endswith(PGCOPY_TRAILER)
+
+    position = len(PGCOPY_HEADER)
+    rows = []
+
+    while True:
+        (num_fields,) = struct.unpack_from(">h", buffer, position)
+        position += 2
+
+        if num_fields == -1:
+            break
+
+        row: list[bytes | None] = []
+
+        for _ in range(num_fields):
+            (length,) = struct.unpack_from(">i", buffer, position)
+            position += 4
+
+            if length == -1:
+                row.append(None)
+                continue
+
+            row.append(buffer[position : position + length])
+            position += length
+
+        rows.append(row)
+
+    assert position == len(buffer)
+
+    return rows
+
+
+def test_bulk_insert_binary_facility_scada() -> None:
+    records = [
+        {
+            "network_id": "NEM",
+            "trading_interval": datetime(2023, 1, 1, 0, 5, tzinfo=NEM_TZ),
+            "facility_code": "BAYSW1",
+            "generated": 512.25,
+            "eoi_quantity": None,
+            "is_forecast": False,
+        },
+        {
+            "network_id": "NEM",
+            "trading_interval": datetime(2023, 1, 1, 0, 10, tzinfo=NEM_TZ),
+            "facility_code": "ERARING1",
+            "generated": None,
+            "eoi_quantity": -1.5,
+            "is_forecast": True,
+        },
+    ]
+
+    assert supports_binary_copy(FacilityScada, list(records[0].keys()))
+
+    rows = _decode_binary_copy(generate_bulkinsert_binary_from_records(FacilityScada, records).getvalue())
+
+    assert len(rows) == 2
+
+    network_id, trading_interval, facility_code, generated, eoi_quantity, is_forecast = rows[0]
+
+    assert network_id == b"NEM"
+    assert facility_code == b"BAYSW1"
+    assert struct.unpack(">d", generated) == (512.25,)  # type: ignore
+    assert eoi_quantity is None
+    assert is_forecast == b"\x00"
+
+    # timestamps are microseconds from 2000-01-01 UTC
+    (interval_us,) = struct.unpack(">q", trading_interval)  # type: ignore
+    assert datetime(2000, 1, 1, tzinfo=UTC) + timedelta(microseconds=interval_us) == records[0]["trading_interval"]
+
+    assert rows[1][2] == b"ERARING1"
+    assert rows[1][3] is None
+    assert struct.unpack(">d", rows[1][4]) == (-1.5,)  # type: ignore
+    assert rows[1][5] == b"\x01"
+
+
+def _decode_timestamptz(value: bytes | None) -> datetime:
+    (value_us,) = struct.unpack(">q", value)  # type: ignore
+
+    return datetime(2000, 1, 1, tzinfo=UTC) + timedelta(microseconds=value_us)
+
+
+def test_bulk_insert_binary_naive_timestamps() -> None:
+    """Naive timestamps are network time, or UTC without a network, not the host zone"""
+    records = [
+        {"network_id": "NEM", "trading_interval": datetime(2023, 1, 1, 0, 5), "facility_code": "BAYSW1"},
+        {"network_id": None, "trading_interval": datetime(2023, 1, 1, 0, 5), "facility_code": "BAYSW1"},
+    ]
+
+    rows = _decode_binary_copy(generate_bulkinsert_binary_from_records(FacilityScada, records).getvalue())
+
+    assert _decode_timestamptz(rows[0][1]) == datetime(2023, 1, 1, 0, 5, tzinfo=NEM_TZ)
+    assert _decode_timestamptz(rows[1][1]) == datetime(2023, 1, 1, 0, 5, tzinfo=UTC)
+
+
+class _Cursor:
+    def __init__(self) -> None:
+        self.rowcount = -1
+
+    def execute(self, query: str) -> None:
+        # one of the two rows in the chunk conflicts
+        self.rowcount = 1 if query.strip().startswith("INSERT") else -1
+
+    def copy_expert(self, query: str, buffer) -> None:
+        pass
+
+
+class _Connection:
+    def cursor(self) -> _Cursor:
+        return _Cursor()
+
+    def commit(self) -> None:
+        pass
+
+    def rollback(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class _Engine:
+    def raw_connection(self) -> _Connection:
+        return _Connection()
+
+    def dispose(self) -> None:
+        pass
+
+
+def test_bulk_insert_binary_counts_inserted_rows(monkeypatch) -> None:
+    monkeypatch.setattr(bulk_insert_binary, "get_database_engine", lambda: _Engine())
+
+    records = [
+        {"network_id": "NEM", "trading_interval": datetime(2023, 1, 1, 0, 5, tzinfo=NEM_TZ), "facility_code": code}
+        for code in ["BAYSW1", "ERARING1", "LOYYB1"]
+    ]
+
+    result = bulkinsert_binary(FacilityScada, records, chunk_size=2)
+
+    assert result.chunks == 2
+    assert result.rows_inserted == 3, "Counted as records stored like the CSV loader"
+    assert result.rows_changed == 2, "Rows that conflict aren't counted as changed"
+
+    frame_result = bulkinsert_binary(FacilityScada, pd.DataFrame(records), chunk_size=2)
+
+    assert (frame_result.chunks, frame_result.rows_inserted) == (2, 3)
+
+
+def test_bulk_insert_binary_from_frame() -> None:
+    """A frame is encoded from its column arrays to the same buffer as the records"""
+    records = [
+        {
+            "network_id": network_id,
+            "trading_interval": datetime(2023, 1, 1, 0, 5),
+            "facility_code": "BAYSW1",
+            "generated": generated,
+            "is_forecast": False,
+        }
+        for network_id, generated in [("NEM", 512.25), (None, None), ("NEM", -1.5)]
+    ]
+
+    buffer = generate_bulkinsert_binary_from_records(FacilityScada, records).getvalue()
+
+    assert generate_bulkinsert_binary_from_columns(FacilityScada, pd.DataFrame(records)).getvalue() == buffer
+
+
+def test_bulk_insert_binary_balancing_summary_supported() -> None:
+    column_names = [c.name for c in BalancingSummary.__table__.columns.values()]  # type: ignore
+
+    assert supports_binary_copy(BalancingSummary, column_names)
+
+
+def test_bulk_insert_binary_invalid_column() -> None:
+    with pytest.raises(BulkInsertBinaryException):
+        generate_bulkinsert_binary_from_records(FacilityScada, [{"not_a_column": 1}])
+
+    assert not supports_binary_copy(FacilityScada, ["not_a_column"])
+
+
+def test_bulk_insert_tmp_table_names_unique() -> None:
+    assert build_insert_query(FacilityScada) != build_insert_query(FacilityScada)
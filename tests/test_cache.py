@@ -0,0 +1,171 @@
+from datetime import UTC, datetime
+
+import pytest
+
+from opennem.api.stats.schema import ScadaDateRange
+from opennem.schema.network import NetworkNEM, NetworkWEM
+from opennem.utils import cache
+from opennem.utils.cache import TwoTierCache
+
+
+class SharedCacheStandin:
+    """Dict backed stand-in for the redis commands the cache uses"""
+
+    def __init__(self) -> None:
+        self.values: dict[str, str] = {}
+        self.fail = False
+
+    def _check(self) -> None:
+        if self.fail:
+            raise ConnectionError("redis down")
+
+    def get(self, key: str) -> str | None:
+        self._check()
+        return self.values.get(key)
+
+    def set(self, key: str, value: str, ex: int | None = None) -> None:
+        self._check()
+        self.values[key] = value
+
+    def incr(self, key: str) -> int:
+        self._check()
+        self.values[key] = str(int(self.values.get(key, 0)) + 1)
+        return int(self.values[key])
+
+
+@pytest.fixture(autouse=True)
+def _no_generation_check_delay(monkeypatch) -> None:
+    monkeypatch.setattr(cache, "CACHE_GENERATION_CHECK_SEC", 0)
+
+
+def test_two_tier_cache_shared_between_processes() -> None:
+    shared = SharedCacheStandin()
+    api_cache = TwoTierCache("test", ttl=60, shared_client=shared)
+    worker_cache = TwoTierCache("test", ttl=60, shared_client=shared)
+
+    assert worker_cache.get("NEM") is None
+    worker_cache.set("NEM", "range")
+
+    assert api_cache.get("NEM") == "range"
+    assert api_cache.get("NEM") == "range"
+
+    assert api_cache.stats.hits_shared == 1
+    assert api_cache.stats.hits_local == 1
+    assert worker_cache.stats.misses == 1
+
+
+def test_two_tier_cache_invalidation() -> None:
+    shared = SharedCacheStandin()
+    api_cache = TwoTierCache("test", ttl=60, shared_client=shared)
+    ingest_cache = TwoTierCache("test", ttl=60, shared_client=shared)
+
+    api_cache.set("NEM", "range")
+    assert api_cache.get("NEM") == "range"
+
+    ingest_cache.invalidate()
+
+    assert api_cache.get("NEM") is None, "Local tier dropped after invalidation"
+    assert api_cache.get_stats()["generation"] == 1
+
+
+def test_two_tier_cache_scoped_invalidation() -> None:
+    shared = SharedCacheStandin()
+    api_cache = TwoTierCache("test", ttl=60, shared_client=shared)
+    ingest_cache = TwoTierCache("test", ttl=60, shared_client=shared)
+
+    api_cache.set("NEM", "nem range", scopes=("NEM",))
+    api_cache.set("WEM", "wem range", scopes=("WEM",))
+    api_cache.set("facilities", "facility range", scopes=(cache.CACHE_SCOPE_ANY,))
+
+    ingest_cache.invalidate(scopes=["NEM"])
+
+    assert api_cache.get("NEM", scopes=("NEM",)) is None
+    assert api_cache.get("WEM", scopes=("WEM",)) == "wem range", "Other networks are kept"
+    assert api_cache.get("facilities", scopes=(cache.CACHE_SCOPE_ANY,)) is None, "Unscoped keys are invalidated"
+
+    # a new process reads the same generations and shares the keys set since
+    api_cache.set("NEM", "nem range updated", scopes=("NEM",))
+
+    assert TwoTierCache("test", ttl=60, shared_client=shared).get("NEM", scopes=("NEM",)) == "nem range updated"
+
+
+def test_two_tier_cache_shared_unavailable() -> None:
+    shared = SharedCacheStandin()
+    shared.fail = True
+
+    local_cache = TwoTierCache("test", ttl=60, shared_client=shared)
+
+    local_cache.set("NEM", "range")
+
+    assert local_cache.get("NEM") == "range", "Falls back to the local tier"
+    assert local_cache.stats.shared_errors == 1, "Stops using redis after an error"
+
+
+def test_cache_scada_result(monkeypatch) -> None:
+    monkeypatch.setattr(cache, "scada_cache", TwoTierCache("test", ttl=60, shared_client=SharedCacheStandin()))
+
+    calls = []
+
+    @cache.cache_scada_result
+    def get_range(network=None, networks=None, network_region=None, facilities=None, energy=False):  # type: ignore
+        calls.append(network_region)
+        return ScadaDateRange(start=datetime(2020, 1, 1, tzinfo=UTC), end=datetime(2021, 1, 1, tzinfo=UTC), network=network)
+
+    first = get_range(network=NetworkNEM)
+    second = get_range(network=NetworkNEM)
+    get_range(network=NetworkNEM, network_region="NSW1")
+
+    assert first == second
+    assert calls == [None, "NSW1"], "Network region is part of the key"
+
+
+def test_invalidate_scada_cache_scoped(monkeypatch) -> None:
+    monkeypatch.setattr(cache, "scada_cache", TwoTierCache("test", ttl=60, shared_client=SharedCacheStandin()))
+
+    calls = []
+
+    @cache.cache_scada_result
+    def get_range(network=None, networks=None, network_region=None, facilities=None, energy=False):  # type: ignore
+        calls.append((network.code, energy))
+        return ScadaDateRange(start=datetime(2020, 1, 1, tzinfo=UTC), end=datetime(2021, 1, 1, tzinfo=UTC), network=network)
+
+    def get_ranges() -> None:
+        for network in [NetworkNEM, NetworkWEM]:
+            for energy in [False, True]:
+                get_range(network=network, energy=energy)
+
+    get_ranges()
+    calls.clear()
+
+    cache.invalidate_scada_cache(NetworkNEM, energy=False)
+    get_ranges()
+
+    assert calls == [("NEM", False)], "Only the network and stat written are invalidated"
+
+    calls.clear()
+    cache.invalidate_scada_cache()
+    get_ranges()
+
+    assert len(calls) == 4
+
+
+def test_unit_scada_invalidates_power_only(monkeypatch) -> None:
+    from opennem.controllers import nem
+    from opennem.core.parsers.aemo.mms import AEMOTableSchema
+
+    invalidated = []
+
+    monkeypatch.setattr(nem, "bulkinsert_mms_items", lambda table, records, update_fields: len(records))
+    monkeypatch.setattr(nem, "mark_facility_daily_dirty", lambda network, trading_intervals: 0)
+    monkeypatch.setattr(nem, "invalidate_scada_cache", lambda network, energy=True: invalidated.append((network.code, energy)))
+
+    table = AEMOTableSchema(
+        name="unit_scada",
+        namespace="dispatch",
+        fieldnames=["settlementdate", "duid", "scadavalue"],
+        records=[{"settlementdate": "2023-01-01 00:05:00", "duid": "BW01", "scadavalue": "500"}],
+    )
+
+    nem.process_unit_scada(table)
+
+    assert invalidated == [("NEM", False)], "Dispatch scada has no energy values"
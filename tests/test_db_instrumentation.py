@@ -0,0 +1,198 @@
+import itertools
+import threading
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy import text as sql_text
+from sqlalchemy.exc import OperationalError
+
+from opennem import settings
+from opennem.db import instrumentation
+from opennem.db.instrumentation import (
+    QueryInstrumentation,
+    explain_statement,
+    fingerprint_statement,
+    normalize_statement,
+    register_query_instrumentation,
+)
+
+
+@pytest.mark.parametrize(
+    ["statement", "expected"],
+    [
+        (
+            "select * from facility_scada\n  where network_id = 'NEM' and  generated > 10.5 limit 5",
+            "select * from facility_scada where network_id = ? and generated > ? limit ?",
+        ),
+        (
+            "select * from facility where code in (%(code_1)s, %(code_2)s) and id = %(id)s",
+            "select * from facility where code in (?...) and id = ?",
+        ),
+        (
+            "insert into balancing_summary values (%(a_1)s, %(b_1)s), (%(a_2)s, %(b_2)s)",
+            "insert into balancing_summary values (?...)",
+        ),
+        ("select :date_min::timestamp, $1, 'it''s'", "select ?::timestamp, ?, ?"),
+        ("select interval_5m, col1 from t", "select interval_5m, col1 from t"),
+    ],
+)
+def test_normalize_statement(statement: str, expected: str) -> None:
+    assert normalize_statement(statement) == expected
+
+
+def test_fingerprint_statement() -> None:
+    assert fingerprint_statement("select * from t where id = 1") == fingerprint_statement("SELECT *  FROM t WHERE id = 2")
+    assert fingerprint_statement("select * from t where id = 1") != fingerprint_statement("select * from t where code = 1")
+
+
+@pytest.fixture
+def query_instrumentation(monkeypatch) -> QueryInstrumentation:
+    recording = QueryInstrumentation()
+    monkeypatch.setattr(instrumentation, "query_instrumentation", recording)
+
+    return recording
+
+
+def _run_queries() -> None:
+    engine = create_engine("sqlite://")
+    register_query_instrumentation(engine)
+
+    with engine.connect() as conn:
+        conn.execute(sql_text("create table t (id integer)"))
+        conn.execute(sql_text("insert into t values (1), (2), (3)"))
+
+        for i in range(3):
+            conn.execute(sql_text("select * from t where id >= :id"), {"id": i}).fetchall()
+
+        with pytest.raises(OperationalError):
+            conn.execute(sql_text("select * from missing"))
+
+        conn.execute(sql_text("select count(*) from t")).fetchall()
+
+
+def test_query_instrumentation(query_instrumentation: QueryInstrumentation, monkeypatch) -> None:
+    monkeypatch.setattr(settings, "db_query_caller_sample", 1)
+
+    _run_queries()
+
+    stats = {i.statement: i for i in query_instrumentation.top()}
+
+    select_stats = stats["select * from t where id >= ?"]
+
+    assert select_stats.calls == 3
+    assert select_stats.total_ms > 0
+    assert select_stats.max_ms <= select_stats.total_ms
+    assert [i.rsplit(":", 1)[0] for i in select_stats.callers] == [f"{__name__}._run_queries"]
+    assert stats["insert into t values (?...)"].rows == 3
+    assert "select * from missing" not in stats, "Failed statements aren't recorded"
+    assert stats["select count(*) from t"].calls == 1, "Failed statements don't offset later ones"
+    assert not query_instrumentation.slow_queries
+
+
+def test_slow_query_log(query_instrumentation: QueryInstrumentation, monkeypatch, caplog) -> None:
+    monkeypatch.setattr(settings, "db_slow_query_ms", 0)
+
+    _run_queries()
+
+    slow_query = query_instrumentation.slow_queries[-1]
+
+    assert slow_query.statement == "select count(*) from t"
+    assert slow_query.explain is None, "Only explained on postgres"
+    assert query_instrumentation.top(1)[0].slow_calls >= 1
+    assert "Slow query" in caplog.text
+
+
+def test_slow_query_explained_once(query_instrumentation: QueryInstrumentation, monkeypatch) -> None:
+    monkeypatch.setattr(settings, "db_slow_query_ms", 0)
+    explained: list[str] = []
+
+    def _explain() -> str:
+        explained.append("plan")
+        return "Seq Scan on t"
+
+    for _ in range(3):
+        query_instrumentation.record("select * from t where id = 1", duration_ms=10, rows=1, explain=_explain)
+
+    query_instrumentation.wait_for_explains()
+
+    assert explained == ["plan"]
+    assert [i.explain for i in query_instrumentation.slow_queries] == ["Seq Scan on t", None, None]
+
+
+def test_slow_query_explained_in_background(query_instrumentation: QueryInstrumentation, monkeypatch) -> None:
+    monkeypatch.setattr(settings, "db_slow_query_ms", 0)
+    explain_threads: list[str] = []
+
+    def _explain() -> str:
+        explain_threads.append(threading.current_thread().name)
+        return "Seq Scan on t"
+
+    query_instrumentation.record("select * from t where id = 1", duration_ms=10, rows=1, explain=_explain)
+    query_instrumentation.wait_for_explains()
+
+    assert explain_threads and explain_threads[0] != threading.current_thread().name
+    assert query_instrumentation.slow_queries[0].explain == "Seq Scan on t"
+
+
+def test_query_caller_sampled(query_instrumentation: QueryInstrumentation, monkeypatch) -> None:
+    monkeypatch.setattr(settings, "db_query_caller_sample", 1000)
+    monkeypatch.setattr(instrumentation, "_caller_sample_counter", itertools.count(1))
+
+    _run_queries()
+
+    assert not any(i.callers for i in query_instrumentation.top()), "Callers are only looked up for sampled statements"
+
+    monkeypatch.setattr(settings, "db_slow_query_ms", 0)
+
+    _run_queries()
+
+    assert all(i.callers for i in query_instrumentation.top()), "Slow statements always look up the caller"
+
+
+def test_register_query_instrumentation_once(query_instrumentation: QueryInstrumentation) -> None:
+    engine = create_engine("sqlite://")
+    register_query_instrumentation(engine)
+    register_query_instrumentation(engine)
+
+    with engine.connect() as conn:
+        conn.execute(sql_text("select 1")).scalar()
+
+    assert query_instrumentation.top(1)[0].calls == 1
+
+
+def test_explain_statement_checkout_error() -> None:
+    class _Engine:
+        class dialect:
+            driver = "psycopg2"
+
+        def raw_connection(self) -> None:
+            raise OperationalError("checkout", {}, Exception("pool exhausted"))
+
+    assert explain_statement(_Engine(), "select * from t", {}) is None
+
+
+def test_query_instrumentation_never_raises(query_instrumentation: QueryInstrumentation, monkeypatch) -> None:
+    def _record(*args, **kwargs) -> None:
+        raise RuntimeError("broken instrumentation")
+
+    monkeypatch.setattr(query_instrumentation, "record", _record)
+
+    engine = create_engine("sqlite://")
+    register_query_instrumentation(engine)
+
+    with engine.connect() as conn:
+        assert conn.execute(sql_text("select 1")).scalar() == 1
+
+
+def test_format_summary(query_instrumentation: QueryInstrumentation) -> None:
+    query_instrumentation.record("select * from a", duration_ms=5, rows=1, caller="opennem.tasks.a:1", task_name="a")
+    query_instrumentation.record("select * from b", duration_ms=50, rows=2, caller="opennem.tasks.b:1")
+    query_instrumentation.record("select * from a", duration_ms=5, rows=1)
+
+    summary = query_instrumentation.format_summary(limit=1).splitlines()
+
+    assert len(summary) == 3
+    assert "opennem.tasks.b:1" in summary[1]
+    assert summary[2].strip() == "select * from b"
+    assert instrumentation.get_query_stats(limit=1)[0]["statement"] == "select * from b"
+    assert query_instrumentation.top()[1].tasks == {"a": 1}
@@ -0,0 +1,122 @@
+import asyncio
+from io import BytesIO
+from zipfile import ZipFile
+
+import httpx
+
+from opennem.core.downloader_async import ConditionalRequestCache, download_urls, download_urls_async
+
+NEMWEB_STANDIN_HOST = "http://nemweb.standin"
+
+
+def _zip_content(filename: str, content: bytes) -> bytes:
+    zip_buffer = BytesIO()
+
+    with ZipFile(zip_buffer, "w") as zf:
+        zf.writestr(filename, content)
+
+    return zip_buffer.getvalue()
+
+
+class NemwebStandin:
+    """Local stand-in for NEMWeb that serves files with validators and tracks concurrency"""
+
+    def __init__(self, delay: float = 0.01, fail_first: int = 0) -> None:
+        self.delay = delay
+        self.fail_first = fail_first
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.requests: list[httpx.Request] = []
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+        try:
+            await asyncio.sleep(self.delay)
+
+            if self.fail_first:
+                self.fail_first -= 1
+                return httpx.Response(503)
+
+            filename = request.url.path.split("/")[-1]
+
+            if filename.startswith("missing"):
+                return httpx.Response(404)
+
+            etag = f'"{filename}"'
+
+            if request.headers.get("if-none-match") == etag:
+                return httpx.Response(304, headers={"etag": etag})
+
+            content = _zip_content(filename.replace(".zip", ".CSV"), f"C,{filename}".encode())
+
+            return httpx.Response(200, content=content, headers={"etag": etag, "last-modified": "Mon, 02 Jan 2023 00:00:00 GMT"})
+        finally:
+            self.in_flight -= 1
+
+
+def _standin_urls(num_files: int) -> list[str]:
+    return [f"{NEMWEB_STANDIN_HOST}/Reports/Current/DispatchIS_Reports/PUBLIC_DISPATCHIS_{i:04d}.zip" for i in range(num_files)]
+
+
+def test_download_urls_concurrent_per_host_cap() -> None:
+    standin = NemwebStandin()
+    urls = _standin_urls(40)
+
+    results = download_urls(urls, concurrency_per_host=4, cache=None, transport=httpx.MockTransport(standin))
+
+    assert [i.url for i in results] == urls, "Results are in request order"
+    assert all(i.ok for i in results)
+    assert results[3].content == b"C,PUBLIC_DISPATCHIS_0003.zip", "Zip content is unpacked"
+    assert standin.max_in_flight == 4, "Concurrency is capped per host"
+
+
+def test_download_urls_conditional_requests() -> None:
+    standin = NemwebStandin()
+    cache = ConditionalRequestCache()
+    urls = _standin_urls(3)
+
+    first = download_urls(urls, cache=cache, transport=httpx.MockTransport(standin))
+    assert not any(i.not_modified for i in first)
+    assert len(cache) == 3
+
+    second = download_urls(urls, cache=cache, transport=httpx.MockTransport(standin))
+    assert all(i.not_modified and i.content is None for i in second)
+    assert standin.requests[-1].headers["if-modified-since"] == "Mon, 02 Jan 2023 00:00:00 GMT"
+
+    cache.invalidate(urls[0])
+
+    third = download_urls(urls, cache=cache, transport=httpx.MockTransport(standin))
+    assert [i.not_modified for i in third] == [False, True, True]
+
+
+def test_download_urls_conditional_store_content() -> None:
+    cache = ConditionalRequestCache()
+    urls = _standin_urls(1)
+
+    download_urls(urls, cache=cache, store_content=True, transport=httpx.MockTransport(NemwebStandin()))
+    (result,) = download_urls(urls, cache=cache, store_content=True, transport=httpx.MockTransport(NemwebStandin()))
+
+    assert result.not_modified
+    assert result.content == b"C,PUBLIC_DISPATCHIS_0000.zip", "Stored content returned on 304"
+
+
+def test_download_urls_errors_and_retries() -> None:
+    standin = NemwebStandin(delay=0, fail_first=1)
+
+    results = download_urls(
+        [f"{NEMWEB_STANDIN_HOST}/missing.zip", f"{NEMWEB_STANDIN_HOST}/PUBLIC_DISPATCHIS_0001.zip"],
+        concurrency_per_host=1,
+        cache=None,
+        retries=1,
+        transport=httpx.MockTransport(standin),
+    )
+
+    assert not results[0].ok and results[0].status_code == 404
+    assert results[1].ok, "Retried after a 503"
+
+
+def test_download_urls_async_empty() -> None:
+    assert asyncio.run(download_urls_async([])) == []
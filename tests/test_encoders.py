@@ -0,0 +1,79 @@
+import json
+from datetime import datetime
+from decimal import Decimal
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from opennem import settings
+from opennem.api.stats.schema import OpennemDataSet, load_opennem_dataset_from_file
+from opennem.exporter.encoders import (
+    JSONSerializerException,
+    get_json_serializer,
+    iter_model_json,
+    model_dict,
+    opennem_model_serialize,
+    opennem_serialize,
+)
+from opennem.settings_schema import OpennemSettings, SettingsException
+
+FIXTURE_PATH = Path(__file__).parent / "fixtures"
+
+STAT_SET_FIXTURES = ["nem_nsw1_7d.json", "nem_qld1_1y.json", "nem_sa1_all.json", "nem_vic1_week.json"]
+
+
+@pytest.fixture(params=["json", "orjson"])
+def json_serializer(request, monkeypatch) -> str:
+    monkeypatch.setattr(settings, "json_serializer", request.param)
+    return request.param
+
+
+def test_get_json_serializer_unknown() -> None:
+    with pytest.raises(JSONSerializerException):
+        get_json_serializer("yaml")
+
+
+def test_json_serializer_setting_default() -> None:
+    assert OpennemSettings.__fields__["json_serializer"].default == "json"
+
+
+def test_json_serializer_setting_invalid() -> None:
+    with pytest.raises(SettingsException):
+        OpennemSettings.validate_json_serializer("yaml")
+
+
+def test_opennem_serialize_types(json_serializer: str) -> None:
+    subject = {
+        "decimal": Decimal("1.5"),
+        "datetime": datetime(2023, 1, 1, 10, 30),
+        "int64": np.int64(3),
+        "float64": np.float64(2.5),
+        "array": np.array([1.0, 2.0]),
+    }
+
+    assert json.loads(opennem_serialize(subject)) == {
+        "decimal": 1.5,
+        "datetime": "2023-01-01T10:30:00",
+        "int64": 3,
+        "float64": 2.5,
+        "array": [1.0, 2.0],
+    }
+
+
+@pytest.mark.parametrize("fixture_name", STAT_SET_FIXTURES)
+def test_opennem_model_serialize_matches_pydantic(fixture_name: str, json_serializer: str) -> None:
+    stat_set = load_opennem_dataset_from_file(FIXTURE_PATH / fixture_name)
+
+    expected = json.loads(stat_set.json(exclude_unset=True))
+
+    assert model_dict(stat_set)["data"][0]["history"]["data"] is stat_set.data[0].history.data
+    assert json.loads(opennem_model_serialize(stat_set)) == expected
+    assert json.loads(b"".join(iter_model_json(stat_set))) == expected
+
+
+def test_iter_model_json_empty_data(json_serializer: str) -> None:
+    stat_set = OpennemDataSet(network="nem", created_at=datetime(2023, 1, 1), data=[])
+
+    assert json.loads(b"".join(iter_model_json(stat_set))) == json.loads(stat_set.json(exclude_unset=True))
+    assert json.loads(b"".join(iter_model_json(OpennemDataSet()))) == {}
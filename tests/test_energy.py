@@ -1,6 +1,9 @@
 import csv
+from datetime import datetime, timedelta
 from pathlib import Path
 
+import pandas as pd
+
 from opennem.core.energy import energy_sum, shape_energy_dataframe
 from opennem.schema.network import NetworkNEM
 
@@ -53,3 +56,70 @@ def _test_energy_sum_outputs() -> None:
     assert es.eoi_quantity.sum() > 1000, "Has energy value"
 
     return es
+
+
+def _generate_power_records(facility_codes: list[str], intervals: int) -> list[dict]:
+    """Generate a power series with gaps and nulls on the 5 minute grid"""
+    start = datetime(2021, 1, 1, 0, 10)
+    records = []
+
+    for facility_index, facility_code in enumerate(facility_codes):
+        for interval_index in range(intervals):
+            # punch some holes in the series
+            if (interval_index + facility_index) % 17 == 0:
+                continue
+
+            generated = None if (interval_index * 7 + facility_index) % 53 == 0 else (interval_index * 37 % 101) * 1.37
+
+            records.append(
+                {
+                    "trading_interval": start + timedelta(minutes=5 * interval_index),
+                    "facility_code": facility_code,
+                    "network_id": "NEM",
+                    "fueltech_id": "coal_black",
+                    "generated": generated,
+                }
+            )
+
+    return records
+
+
+def test_energy_sum_batched_matches_compat() -> None:
+    power_df = shape_energy_dataframe(_generate_power_records(["BW01", "BW02", "ER01"], 300))
+
+    es_compat = energy_sum(power_df.copy(), NetworkNEM, batched=False)
+    es_batched = energy_sum(power_df.copy(), NetworkNEM)
+
+    assert len(es_batched) > 0, "Has energy values"
+
+    pd.testing.assert_frame_equal(es_compat, es_batched, check_exact=True)
+
+
+def test_energy_sum_batched_rooftop_single_readings() -> None:
+    """Rooftop half hours with a single reading go through the trapezium sum like every other facility"""
+    records = _generate_power_records(["BW01"], 300)
+    start = datetime(2021, 1, 1, 0, 0)
+
+    records += [
+        {
+            "trading_interval": start + timedelta(minutes=30 * interval_index),
+            "facility_code": "ROOFTOP_NEM_NSW1",
+            "network_id": "NEM",
+            "fueltech_id": "solar_rooftop",
+            "generated": 10.0 * interval_index,
+        }
+        for interval_index in range(50)
+    ]
+
+    power_df = shape_energy_dataframe(records)
+
+    es_compat = energy_sum(power_df.copy(), NetworkNEM, batched=False)
+    es_batched = energy_sum(power_df.copy(), NetworkNEM)
+
+    pd.testing.assert_frame_equal(es_compat, es_batched, check_exact=True)
+
+    rooftop = es_batched[es_batched.facility_code == "ROOFTOP_NEM_NSW1"].set_index("trading_interval")
+    rooftop_interval = datetime.fromisoformat("2021-01-01T02:55:00+10:00")
+
+    # the single reading in the half hour is weighted as an inner reading, not halved
+    assert rooftop.eoi_quantity[rooftop_interval] == 0.5 * 2 * 10.0 * 6 / 12
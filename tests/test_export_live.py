@@ -0,0 +1,143 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from opennem.api.export.live import LiveExportCache, get_tail_start, merge_tail_stat_set
+from opennem.api.stats.controllers import stats_factory
+from opennem.api.stats.schema import DataQueryColumns, OpennemDataSet
+from opennem.api.time import human_to_interval
+from opennem.core.networks import network_from_network_code
+from opennem.core.units import get_unit
+from opennem.utils import cache
+from opennem.utils.cache import TwoTierCache
+from tests.test_cache import SharedCacheStandin
+
+NETWORK = network_from_network_code("NEM")
+INTERVAL = timedelta(minutes=5)
+WINDOW = timedelta(hours=2)
+FIRST_INTERVAL = datetime(2023, 1, 1, 10, 0, tzinfo=NETWORK.get_fixed_offset())
+
+rng = random.Random(0)
+
+# interval, fueltech, power - solar stops and gas starts later in the day
+ROWS = [
+    (FIRST_INTERVAL + INTERVAL * i, fueltech, round(rng.uniform(1, 500), 3))
+    for i in range(72)
+    for fueltech in ["coal_black", "solar_utility", "gas_ocgt"]
+    if not (fueltech == "solar_utility" and i > 50) and not (fueltech == "gas_ocgt" and i < 40)
+]
+
+
+ROOFTOP_INTERVAL = timedelta(minutes=30)
+
+
+def rooftop_value(interval: datetime) -> float:
+    return round(100 + (interval - FIRST_INTERVAL) / ROOFTOP_INTERVAL, 3)
+
+
+def rooftop_stat_set(start: datetime, end: datetime) -> OpennemDataSet:
+    """Rooftop with the forecast forward from the end of the series as power_week builds it"""
+
+    def _rooftop_factory(interval_start: datetime, interval_end: datetime) -> OpennemDataSet:
+        intervals = [FIRST_INTERVAL + ROOFTOP_INTERVAL * i for i in range(-4, 48)]
+        rows = [(i, "solar_rooftop", rooftop_value(i)) for i in intervals if interval_start <= i < interval_end]
+
+        return stats_factory(
+            DataQueryColumns.from_rows(rows, interval=0, result=2, group_by=1),
+            network=NETWORK,
+            interval=human_to_interval("30m"),
+            units=get_unit("power"),
+            region="NSW1",
+            fueltech_group=True,
+            cast_nulls=False,
+        )
+
+    rooftop = _rooftop_factory(start, end)
+    rooftop.data[0].forecast = _rooftop_factory(end, end + timedelta(hours=12)).data[0].history
+
+    return rooftop
+
+
+def power_stat_set(start: datetime, end: datetime, rooftop: bool = False) -> OpennemDataSet:
+    rows = [i for i in ROWS if start <= i[0] <= end]
+
+    stat_set = stats_factory(
+        DataQueryColumns.from_rows(rows, interval=0, result=2, group_by=1),
+        network=NETWORK,
+        interval=human_to_interval("5m"),
+        units=get_unit("power"),
+        region="NSW1",
+        fueltech_group=True,
+    )
+    stat_set.created_at = None
+
+    if rooftop:
+        stat_set.append_set(rooftop_stat_set(start, end))
+
+    return stat_set
+
+
+@pytest.mark.parametrize("num_new_intervals", [1, 3, 24])
+def test_merge_tail_stat_set_matches_full_build(num_new_intervals: int) -> None:
+    published_end = FIRST_INTERVAL + INTERVAL * 40
+    end = published_end + INTERVAL * num_new_intervals
+
+    published = power_stat_set(published_end - WINDOW, published_end)
+
+    tail_start = get_tail_start(published, interval=INTERVAL, overlap_intervals=3)
+    assert tail_start == published_end - INTERVAL * 3
+
+    merged = merge_tail_stat_set(published, power_stat_set(tail_start, end), window_start=end - WINDOW)
+
+    assert merged
+    assert merged.json() == power_stat_set(end - WINDOW, end).json()
+
+
+def test_merge_tail_stat_set_rooftop_forecast() -> None:
+    published_end = FIRST_INTERVAL + INTERVAL * 40
+    end = published_end + INTERVAL * 6
+
+    published = power_stat_set(published_end - WINDOW, published_end, rooftop=True)
+    tail_start = get_tail_start(published, interval=INTERVAL, overlap_intervals=3)
+
+    merged = merge_tail_stat_set(published, power_stat_set(tail_start, end, rooftop=True), window_start=end - WINDOW)
+
+    assert merged, "Forecast series don't force a full rebuild"
+
+    rooftop = merged.get_id("au.nem.nsw1.fuel_tech.solar_rooftop.power")
+
+    assert rooftop and rooftop.forecast
+    assert rooftop.forecast.start > published_end, "Forecast is taken from the tail"
+    assert merged.json() == power_stat_set(end - WINDOW, end, rooftop=True).json()
+
+
+def test_merge_tail_stat_set_new_series_needs_rebuild() -> None:
+    published_end = FIRST_INTERVAL + INTERVAL * 30
+    end = published_end + INTERVAL * 20
+
+    published = power_stat_set(published_end - WINDOW, published_end)
+
+    assert not merge_tail_stat_set(published, power_stat_set(published_end, end), window_start=end - WINDOW)
+
+
+def test_live_export_cache(monkeypatch) -> None:
+    monkeypatch.setattr(cache, "CACHE_GENERATION_CHECK_SEC", 0)
+
+    shared = SharedCacheStandin()
+    export_cache = LiveExportCache(full_rebuild_sec=60, generation_cache=TwoTierCache("test", ttl=60, shared_client=shared))
+    crawler_cache = LiveExportCache(full_rebuild_sec=60, generation_cache=TwoTierCache("test", ttl=60, shared_client=shared))
+
+    stat_set = power_stat_set(FIRST_INTERVAL, FIRST_INTERVAL + WINDOW)
+
+    export_cache.set("v3/stats/au/NEM/NSW1/power/7d.json", stat_set)
+    assert export_cache.get("v3/stats/au/NEM/NSW1/power/7d.json") is stat_set
+
+    crawler_cache.invalidate()
+
+    assert export_cache.get("v3/stats/au/NEM/NSW1/power/7d.json") is None, "Invalidated from another process"
+
+    export_cache.full_rebuild_sec = 0
+    export_cache.set("v3/stats/au/NEM/NSW1/power/7d.json", stat_set)
+
+    assert export_cache.get("v3/stats/au/NEM/NSW1/power/7d.json") is None, "Due for full rebuild"
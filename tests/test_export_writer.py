@@ -0,0 +1,113 @@
+import gzip
+import json
+from datetime import datetime
+
+import pytest
+from botocore.stub import Stubber
+
+from opennem.api.stats.schema import OpennemDataSet
+from opennem.exporter.aws import stat_set_hash_content
+from opennem.exporter.writer import ExportWriter, ExportWriterException, LocalBackend, S3Backend
+
+
+def test_export_writer_compression(tmp_path) -> None:
+    writer = ExportWriter(LocalBackend(tmp_path), compression="gzip")
+
+    assert writer.write("/v3/stats/au/NEM/power/7d.json", '{"data": []}') > 0
+
+    written_path = tmp_path / "v3/stats/au/NEM/power/7d.json"
+
+    assert gzip.decompress(written_path.read_bytes()) == b'{"data": []}'
+    assert json.loads(written_path.with_name("7d.json.meta.json").read_text())["content_encoding"] == "gzip"
+
+
+def test_export_writer_skips_unchanged(tmp_path) -> None:
+    backend = LocalBackend(tmp_path / "bucket")
+
+    writer = ExportWriter(backend, skip_unchanged=True)
+
+    keys = [f"v3/stats/historic/weekly/NEM/NSW1/year/2022/week/{i}.json" for i in range(1, 53)]
+
+    futures = [writer.submit(key, json.dumps({"week": i})) for i, key in enumerate(keys)]
+    assert all(i.result() for i in futures)
+
+    stats = writer.flush()
+    assert stats.written == 52
+
+    # another writer (ie. a later run or another process) compares with what is in the bucket
+    writer_next = ExportWriter(backend, skip_unchanged=True)
+
+    for i, key in enumerate(keys):
+        writer_next.submit(key, json.dumps({"week": i if i else "changed"}))
+
+    stats = writer_next.flush()
+
+    assert stats.written == 1
+    assert stats.skipped == 51
+    assert json.loads((tmp_path / "bucket" / keys[0]).read_text()) == {"week": "changed"}
+
+    # changing back to the first content writes it again
+    assert writer.write(keys[0], json.dumps({"week": 0})) > 0
+    assert json.loads((tmp_path / "bucket" / keys[0]).read_text()) == {"week": 0}
+
+    # unless skipping is turned off for the write
+    assert writer.write(keys[1], json.dumps({"week": 1})) == 0
+    assert writer.write(keys[1], json.dumps({"week": 1}), skip_unchanged=False) > 0
+
+
+def test_s3_backend_content_hash() -> None:
+    backend = S3Backend("data.opennem.org.au")
+
+    with Stubber(backend.client) as stubber:
+        stubber.add_response(
+            "head_object", {"Metadata": {"content-hash": "abc"}}, {"Bucket": "data.opennem.org.au", "Key": "metadata.json"}
+        )
+        stubber.add_client_error("head_object", service_error_code="404", http_status_code=404)
+
+        assert backend.get_content_hash("metadata.json") == "abc"
+        assert backend.get_content_hash("missing.json") is None
+
+
+def test_export_writer_logs_errors(tmp_path, caplog) -> None:
+    class _FailingBackend(LocalBackend):
+        def put(
+            self, key: str, body: bytes, content_type: str, content_encoding: str | None = None, content_hash: str | None = None
+        ) -> None:
+            if key.endswith("fail.json"):
+                raise ExportWriterException("Error writing - response code 503")
+
+            super().put(key, body, content_type=content_type, content_encoding=content_encoding, content_hash=content_hash)
+
+    writer = ExportWriter(_FailingBackend(tmp_path))
+
+    writer.submit("v3/stats/au/NEM/fail.json", "{}")
+    writer.submit("v3/stats/au/NEM/ok.json", "{}")
+
+    stats = writer.flush()
+
+    assert stats.written == 1
+    assert stats.errors == 1
+    assert "v3/stats/au/NEM/fail.json" in caplog.text
+    assert "response code 503" in caplog.text
+
+    # stats are per run
+    writer.submit("v3/stats/au/NEM/ok.json", "{}")
+
+    stats = writer.flush()
+
+    assert stats.written == 1
+    assert stats.errors == 0
+
+
+def test_export_writer_invalid_compression(tmp_path) -> None:
+    with pytest.raises(ExportWriterException):
+        ExportWriter(LocalBackend(tmp_path), compression="zstd")
+
+
+def test_stat_set_hash_content_ignores_created_at() -> None:
+    stat_set_content = [
+        OpennemDataSet(network="nem", created_at=datetime(2023, 1, day), data=[]).json(exclude_unset=True) for day in [1, 2]
+    ]
+
+    assert stat_set_content[0] != stat_set_content[1]
+    assert stat_set_hash_content(stat_set_content[0]) == stat_set_hash_content(stat_set_content[1])
@@ -0,0 +1,153 @@
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from opennem import settings
+from opennem.aggregates import facility_daily
+from opennem.aggregates.facility_daily import get_trading_day_ranges, get_trading_days, mark_facility_daily_dirty
+from opennem.schema.network import NetworkNEM, NetworkWEM
+
+INTERVAL_MAX = datetime.fromisoformat("2023-06-10T09:30:00+10:00")
+
+# without the profiler which logs to the database
+_run_incremental = facility_daily.run_aggregates_facility_daily_incremental.__wrapped__  # type: ignore
+
+
+def test_get_trading_days() -> None:
+    trading_days = get_trading_days(
+        [
+            datetime.fromisoformat("2023-06-01T23:55:00+10:00"),
+            datetime.fromisoformat("2023-06-01T14:00:00+00:00"),
+            datetime(2023, 6, 3, 0, 5),
+            pd.Timestamp("2023-06-04T12:00:00+10:00"),
+            pd.NaT,
+            None,  # type: ignore
+        ],
+        network=NetworkNEM,
+    )
+
+    assert trading_days == {date(2023, 6, 1), date(2023, 6, 2), date(2023, 6, 3), date(2023, 6, 4)}
+
+
+def test_get_trading_days_network_time() -> None:
+    trading_interval = datetime.fromisoformat("2023-06-01T23:00:00+10:00")
+
+    assert get_trading_days([trading_interval], network=NetworkNEM) == {date(2023, 6, 1)}
+    assert get_trading_days([trading_interval], network=NetworkWEM) == {date(2023, 6, 1)}
+    assert get_trading_days([trading_interval + timedelta(hours=1)], network=NetworkWEM) == {date(2023, 6, 1)}
+    assert get_trading_days([trading_interval + timedelta(hours=3)], network=NetworkWEM) == {date(2023, 6, 2)}
+
+
+def test_get_trading_day_ranges() -> None:
+    trading_days = [date(2023, 1, 5), date(2023, 1, 1), date(2023, 1, 2), date(2023, 1, 3), date(2023, 1, 3)]
+
+    assert get_trading_day_ranges(trading_days) == [
+        (date(2023, 1, 1), date(2023, 1, 3)),
+        (date(2023, 1, 5), date(2023, 1, 5)),
+    ]
+    assert get_trading_day_ranges(trading_days, max_days=2) == [
+        (date(2023, 1, 1), date(2023, 1, 2)),
+        (date(2023, 1, 3), date(2023, 1, 3)),
+        (date(2023, 1, 5), date(2023, 1, 5)),
+    ]
+    assert get_trading_day_ranges([]) == []
+
+
+def test_mark_facility_daily_dirty_disabled(monkeypatch) -> None:
+    monkeypatch.setattr(settings, "aggregate_facility_daily_incremental", False)
+
+    assert mark_facility_daily_dirty(NetworkNEM, [INTERVAL_MAX]) == 0
+
+
+def test_mark_facility_daily_dirty_clock_timestamp(monkeypatch) -> None:
+    """Days are marked with the statement clock time rather than the transaction start"""
+    statements: list = []
+
+    class _Connection:
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *args) -> None:
+            pass
+
+        def execute(self, stmt) -> None:
+            statements.append(stmt)
+
+    class _Engine:
+        def begin(self) -> _Connection:
+            return _Connection()
+
+    monkeypatch.setattr(settings, "aggregate_facility_daily_incremental", True)
+    monkeypatch.setattr(facility_daily, "get_database_engine", lambda: _Engine())
+
+    assert mark_facility_daily_dirty(NetworkNEM, [INTERVAL_MAX]) == 1
+
+    sql = str(statements[0].compile(dialect=postgresql.dialect()))
+
+    assert "now()" not in sql
+    assert sql.count("clock_timestamp()") == 2
+
+
+@pytest.fixture
+def incremental_run(monkeypatch) -> dict:
+    """Runs the incremental aggregate against recorded calls rather than the database"""
+    calls: dict = {"exec": [], "cleared": None, "watermark": None}
+    state: dict = {"watermark": INTERVAL_MAX - timedelta(days=1), "dirty": [date(2023, 1, 2), date(2023, 1, 3), date(2023, 3, 1)]}
+
+    monkeypatch.setattr(settings, "dry_run", False)
+    monkeypatch.setattr(facility_daily, "get_last_completed_interval_for_network", lambda network: INTERVAL_MAX)
+    monkeypatch.setattr(facility_daily, "get_facility_daily_watermark", lambda network: state["watermark"])
+    monkeypatch.setattr(
+        facility_daily,
+        "get_facility_daily_dirty_days",
+        lambda network: (state["dirty"], INTERVAL_MAX) if state["dirty"] else ([], None),
+    )
+    monkeypatch.setattr(
+        facility_daily,
+        "exec_aggregates_facility_daily_query",
+        lambda date_min, date_max, network: calls["exec"].append((date_min, date_max)),
+    )
+    monkeypatch.setattr(
+        facility_daily,
+        "clear_facility_daily_dirty_days",
+        lambda network, trading_days, marked_at_max: calls.update(cleared=trading_days),
+    )
+    monkeypatch.setattr(
+        facility_daily,
+        "set_facility_daily_watermark",
+        lambda network, trading_interval: calls.update(watermark=trading_interval),
+    )
+
+    return {"calls": calls, "state": state}
+
+
+def test_run_aggregates_facility_daily_incremental(incremental_run: dict) -> None:
+    calls = incremental_run["calls"]
+
+    days_run = _run_incremental(network=NetworkNEM)
+
+    assert days_run == 5
+
+    tz = NetworkNEM.get_fixed_offset()
+
+    assert calls["exec"] == [
+        (datetime(2023, 1, 2, tzinfo=tz), datetime(2023, 1, 4, tzinfo=tz)),
+        (datetime(2023, 3, 1, tzinfo=tz), datetime(2023, 3, 2, tzinfo=tz)),
+        (datetime(2023, 6, 9, tzinfo=tz), INTERVAL_MAX + timedelta(minutes=5)),
+    ]
+    assert calls["cleared"] == [date(2023, 1, 2), date(2023, 1, 3), date(2023, 3, 1)]
+    assert calls["watermark"] == INTERVAL_MAX
+
+
+def test_run_aggregates_facility_daily_incremental_first_run(incremental_run: dict) -> None:
+    incremental_run["state"].update(watermark=None, dirty=[])
+    calls = incremental_run["calls"]
+
+    days_run = _run_incremental(network=NetworkNEM, days=2)
+
+    assert days_run == 3
+    assert calls["exec"][0][0] == datetime(2023, 6, 8, tzinfo=NetworkNEM.get_fixed_offset())
+    assert calls["cleared"] is None
+    assert calls["watermark"] == INTERVAL_MAX
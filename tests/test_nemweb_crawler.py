@@ -0,0 +1,31 @@
+from datetime import datetime
+
+from opennem.core.crawlers.history import CrawlHistoryEntry
+from opennem.core.downloader_async import DownloadResult
+from opennem.core.parsers.dirlisting import DirectoryListing, DirlistingEntry
+from opennem.crawlers import nemweb
+from opennem.crawlers.nemweb import AEMONNemwebDispatchScada, run_nemweb_aemo_crawl
+
+
+def test_nemweb_crawl_not_modified_records_history(monkeypatch) -> None:
+    link = f"{AEMONNemwebDispatchScada.url}PUBLIC_DISPATCHSCADA_202310180305_0000000400000000.zip"
+    entry = DirlistingEntry(
+        filename="PUBLIC_DISPATCHSCADA_202310180305_0000000400000000.zip",
+        link=link,
+        modified_date=datetime(2023, 10, 18, 3, 5),
+        file_size=1000,
+    )
+    recorded: list[CrawlHistoryEntry] = []
+
+    monkeypatch.setattr(
+        nemweb,
+        "get_dirlistings",
+        lambda urls, timezone=None: {i: DirectoryListing(url=i, timezone=timezone, entries=[entry]) for i in urls},
+    )
+    monkeypatch.setattr(
+        nemweb, "download_urls", lambda urls: [DownloadResult(url=i, status_code=304, not_modified=True) for i in urls]
+    )
+    monkeypatch.setattr(nemweb, "set_crawler_history", lambda crawler_name, histories: recorded.extend(histories))
+
+    assert run_nemweb_aemo_crawl(AEMONNemwebDispatchScada, latest=False) is None
+    assert recorded == [CrawlHistoryEntry(interval=entry.aemo_interval_date)]
@@ -0,0 +1,76 @@
+from datetime import datetime
+
+import pytest
+
+from opennem.aggregates.network_fueltech_intervals import (
+    AggregateNetworkFueltechIntervalsException,
+    aggregates_network_fueltech_intervals_query,
+)
+from opennem.api.export.queries import (
+    power_and_emissions_network_fueltech_intervals_query,
+    power_network_fueltech_intervals_query,
+    power_network_fueltech_query,
+)
+from opennem.api.time import human_to_interval, human_to_period
+from opennem.controllers.output.schema import OpennemExportSeries
+from opennem.schema.network import NetworkAPVI, NetworkNEM, NetworkWEM
+
+DATE_MIN = datetime.fromisoformat("2023-01-01T00:00:00+10:00")
+DATE_MAX = datetime.fromisoformat("2023-01-08T00:00:00+10:00")
+
+
+def _time_series(network=NetworkNEM, interval: str = "5m") -> OpennemExportSeries:  # type: ignore
+    return OpennemExportSeries(
+        start=DATE_MIN,
+        end=DATE_MAX,
+        network=network,
+        interval=human_to_interval(interval),
+        period=human_to_period("7d"),
+    )
+
+
+def test_aggregates_network_fueltech_intervals_query() -> None:
+    query = aggregates_network_fueltech_intervals_query(date_min=DATE_MIN, date_max=DATE_MAX, network=NetworkNEM)
+
+    assert "insert into at_network_fueltech_intervals" in query
+    assert "f.network_id = 'NEM'" in query
+    assert "fs.generated / 12.0 * f.emissions_factor_co2" in query
+    assert "on conflict (trading_interval, network_id, network_region, fueltech_id)" in query
+
+
+def test_aggregates_network_fueltech_intervals_query_range() -> None:
+    with pytest.raises(AggregateNetworkFueltechIntervalsException):
+        aggregates_network_fueltech_intervals_query(date_min=DATE_MAX, date_max=DATE_MIN, network=NetworkNEM)
+
+
+def test_power_network_fueltech_intervals_query_filters() -> None:
+    time_series = _time_series(NetworkWEM, interval="30m")
+
+    query = power_network_fueltech_intervals_query(time_series, network_region="WEM", networks_query=[NetworkWEM, NetworkAPVI])
+    raw_query = power_network_fueltech_query(time_series, network_region="WEM", networks_query=[NetworkWEM, NetworkAPVI])
+
+    query_sql = str(query)
+    query_params = query.compile().params
+
+    assert "from at_network_fueltech_intervals fi" in query_sql
+    assert "facility_scada" not in query_sql
+    assert "fi.network_region = :network_region" in query_sql
+    assert "(fi.network_id='APVI' and fi.network_region='WEM')" in query_sql
+    assert query_params["network_region"] == "WEM"
+
+    # same exclusions as the facility_scada query
+    assert "fi.fueltech_id <> all(:fueltechs_exclude)" in query_sql
+    assert query_params["fueltechs_exclude"] == ["exports", "imports", "interconnector", "solar_rooftop"]
+    assert raw_query.compile().params["fueltechs_exclude"] == query_params["fueltechs_exclude"]
+
+
+def test_power_and_emissions_network_fueltech_intervals_query() -> None:
+    query = power_and_emissions_network_fueltech_intervals_query(_time_series(), network_region="NSW1")
+
+    query_sql = str(query)
+    query_params = query.compile().params
+
+    assert "time_bucket_gapfill('5 minutes', t.trading_interval, :date_min, :date_max)" in query_sql
+    assert "at time zone 'AEST'" in query_sql
+    assert query_params["network_id"] == "NEM"
+    assert query_params["network_region"] == "NSW1"
@@ -1,6 +1,8 @@
+import random
+
 import pytest
 
-from opennem.utils.numbers import sigfig_compact, trim_nulls
+from opennem.utils.numbers import sigfig_compact, sigfig_compact_series, trim_nulls
 
 
 @pytest.mark.parametrize(
@@ -32,6 +34,18 @@ def test_sigfig_compact(number: float, number_expected: float) -> None:
     assert number == number_expected
 
 
+def test_sigfig_compact_series() -> None:
+    rng = random.Random(0)
+
+    subject = [0, 0.0, -0.0, None, float("nan"), 1, 1000.0, 9999.5, 99995.0, 1e-300, 1e300]
+    subject += [rng.uniform(-1, 1) * 10 ** rng.randint(-10, 10) for _ in range(10_000)]
+
+    expected = [None if i is None or i != i else float(sigfig_compact(i, 4)) for i in subject]
+
+    assert sigfig_compact_series(subject, 4) == expected
+    assert sigfig_compact_series([]) == []
+
+
 def test_trim_nulls() -> None:
     subject = {"a": None, "b": 1, "c": None}
 
@@ -0,0 +1,119 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from opennem.controllers.schema import ControllerReturn
+from opennem.pipelines.dag import PipelineDAG, PipelineDAGException, PipelineEvent
+from opennem.schema.network import NetworkNEM
+
+INTERVAL = datetime.fromisoformat("2023-06-01T10:05:00+10:00")
+
+
+def _event(interval: datetime = INTERVAL, source: str = "crawl") -> PipelineEvent:
+    return PipelineEvent(source=source, network_code="NEM", interval=interval, inserted_records=10)
+
+
+def _pipeline(runs: list[str], unchanged: list[str] | None = None) -> PipelineDAG:
+    """crawl -> flows -> energy -> export <- rooftop"""
+    pipeline = PipelineDAG("test", sources=["crawl", "rooftop"])
+
+    def _step(name: str):
+        def _run(event: PipelineEvent) -> bool:
+            runs.append(name)
+            return name not in (unchanged or [])
+
+        return _run
+
+    pipeline.step("flows", depends_on=["crawl"])(_step("flows"))
+    pipeline.step("energy", depends_on=["flows"])(_step("energy"))
+    pipeline.step("export", depends_on=["energy", "rooftop"])(_step("export"))
+
+    return pipeline
+
+
+def test_pipeline_event_from_controller_return() -> None:
+    cr = ControllerReturn(server_latest=INTERVAL, inserted_records=10)
+
+    assert PipelineEvent.from_controller_return("crawl", cr, network=NetworkNEM) == _event()
+    assert PipelineEvent.from_controller_return("crawl", ControllerReturn(server_latest=INTERVAL), network=NetworkNEM) is None
+    assert PipelineEvent.from_controller_return("crawl", None, network=NetworkNEM) is None
+
+
+def test_pipeline_runs_in_dependency_order() -> None:
+    runs: list[str] = []
+    pipeline = _pipeline(runs)
+
+    assert pipeline.validate() == ["flows", "energy", "export"]
+    assert pipeline.trigger("crawl", _event()) == ["flows"]
+    assert runs == ["flows", "energy", "export"]
+
+
+def test_pipeline_no_new_data() -> None:
+    runs: list[str] = []
+    pipeline = _pipeline(runs)
+
+    assert pipeline.trigger("crawl", None) == []
+    assert not runs
+
+
+def test_pipeline_unchanged_step_stops_downstream() -> None:
+    runs: list[str] = []
+    pipeline = _pipeline(runs, unchanged=["energy"])
+
+    pipeline.trigger("crawl", _event())
+
+    assert runs == ["flows", "energy"]
+
+
+def test_pipeline_interval_runs_once() -> None:
+    runs: list[str] = []
+    pipeline = _pipeline(runs)
+
+    pipeline.trigger("crawl", _event())
+    pipeline.trigger("crawl", _event())
+    pipeline.trigger("crawl", _event(INTERVAL - timedelta(minutes=5)))
+
+    assert runs == ["flows", "energy", "export"]
+
+    pipeline.trigger("rooftop", _event(source="rooftop"))
+    pipeline.trigger("crawl", _event(INTERVAL + timedelta(minutes=5)))
+
+    assert runs == ["flows", "energy", "export", "export", "flows", "energy", "export"]
+
+
+def test_pipeline_scheduler() -> None:
+    runs: list[str] = []
+    scheduled: list[tuple[str, PipelineEvent]] = []
+    pipeline = _pipeline(runs)
+    pipeline.scheduler = lambda step_name, event: scheduled.append((step_name, event))
+
+    pipeline.trigger("crawl", _event())
+
+    assert scheduled == [("flows", _event())]
+    assert not runs
+
+    pipeline.run_step(*scheduled.pop())
+
+    assert scheduled == [("energy", _event())]
+    assert runs == ["flows"]
+
+
+def test_pipeline_validate() -> None:
+    pipeline = _pipeline([])
+    pipeline.step("unknown", depends_on=["invalid"])(lambda event: True)
+
+    with pytest.raises(PipelineDAGException):
+        pipeline.validate()
+
+    pipeline = PipelineDAG("test", sources=["crawl"])
+    pipeline.step("a", depends_on=["crawl", "b"])(lambda event: True)
+    pipeline.step("b", depends_on=["a"])(lambda event: True)
+
+    with pytest.raises(PipelineDAGException):
+        pipeline.validate()
+
+
+def test_nem_pipeline() -> None:
+    from opennem.pipelines.nem import nem_pipeline
+
+    assert nem_pipeline.validate() == ["nem_flows", "nem_energy", "nem_export_power"]
@@ -0,0 +1,202 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy import text as sql_text
+
+from opennem import settings
+from opennem.core import profiler
+from opennem.core.profiler import (
+    ProfileRecordBuffer,
+    ProfilerLevel,
+    flush_profiles_at_worker_exit,
+    profile_span,
+    profile_span_add_rows,
+    profile_task,
+    profiler_level_string_to_enum,
+)
+
+
+class _RecordingBuffer(ProfileRecordBuffer):
+    """Buffer that keeps what it's given rather than writing it"""
+
+    def __init__(self) -> None:
+        super().__init__(flush_size=1000, flush_interval=60)
+        self.task_profiles: list[dict[str, Any]] = []
+        self.spans: list[dict[str, Any]] = []
+
+    def add_task_profile(self, record: dict[str, Any]) -> None:
+        self.task_profiles.append(record)
+
+    def add_span(self, span: profiler.ProfileSpan) -> None:
+        self.spans.append(span.as_record())
+
+
+@pytest.fixture
+def buffer(monkeypatch) -> _RecordingBuffer:
+    recording_buffer = _RecordingBuffer()
+    monkeypatch.setattr(profiler, "profile_buffer", recording_buffer)
+    monkeypatch.setattr(settings, "profiler_noisy_sample_rate", 1.0)
+
+    return recording_buffer
+
+
+engine = create_engine("sqlite://")
+
+
+@profile_task()
+def _crawl(fail: bool = False) -> int:
+    with profile_span("parse"):
+        profile_span_add_rows(10)
+
+    with profile_span("store"):
+        with profile_span("bulk_insert"):
+            with engine.connect() as conn:
+                conn.execute(sql_text("select 1"))
+                conn.execute(sql_text("select 2"))
+
+            profile_span_add_rows(5)
+
+        if fail:
+            raise ValueError("store failed")
+
+    return 5
+
+
+def test_profile_task_spans(buffer: _RecordingBuffer) -> None:
+    assert _crawl() == 5
+
+    (task_profile,) = buffer.task_profiles
+    spans = {i["name"]: i for i in buffer.spans}
+
+    assert task_profile["task_name"] == "_crawl"
+    assert task_profile["invokee_name"] == "test_profile_task_spans"
+    assert task_profile["errors"] == 0
+
+    assert list(spans) == ["parse", "bulk_insert", "store", "_crawl"], "Spans are recorded as they finish"
+    assert {i["task_profile_id"] for i in buffer.spans} == {task_profile["id"]}
+    assert spans["_crawl"]["id"] == task_profile["id"]
+    assert spans["_crawl"]["parent_id"] is None
+    assert spans["parse"]["parent_id"] == task_profile["id"]
+    assert spans["bulk_insert"]["parent_id"] == spans["store"]["id"]
+
+    assert spans["parse"]["rows"] == 10
+    assert spans["bulk_insert"]["rows"] == 5
+    assert spans["store"]["rows"] == 0
+
+    assert spans["bulk_insert"]["db_queries"] == 2
+    assert spans["store"]["db_queries"] == 2, "Database time includes nested spans"
+    assert spans["_crawl"]["db_queries"] == 2
+    assert spans["parse"]["db_queries"] == 0
+    assert spans["_crawl"]["wall_ms"] >= spans["store"]["wall_ms"] >= spans["bulk_insert"]["db_ms"] > 0
+    assert spans["_crawl"]["memory_peak_kb"] > 0
+
+
+def test_profile_task_errors(buffer: _RecordingBuffer) -> None:
+    with pytest.raises(ValueError):
+        _crawl(fail=True)
+
+    spans = {i["name"]: i for i in buffer.spans}
+
+    assert buffer.task_profiles[0]["errors"] == 1
+    assert spans["store"]["errors"] == 1
+    assert spans["bulk_insert"]["errors"] == 0
+
+
+def test_profile_task_sampled(buffer: _RecordingBuffer, monkeypatch) -> None:
+    monkeypatch.setattr(settings, "profiler_noisy_sample_rate", 0.0)
+
+    assert _crawl() == 5
+    assert not buffer.task_profiles
+    assert not buffer.spans
+
+
+def test_profile_span_outside_task(buffer: _RecordingBuffer) -> None:
+    with profile_span("parse") as span:
+        profile_span_add_rows(10)
+
+    assert span is None
+    assert not buffer.spans
+
+
+class _Connection:
+    def __init__(self, executed: list) -> None:
+        self.executed = executed
+
+    def execute(self, query: Any, records: list[dict]) -> None:
+        self.executed.append((query.table.name, records))
+
+
+class _Engine:
+    def __init__(self) -> None:
+        self.executed: list = []
+
+    @contextmanager
+    def begin(self):
+        yield _Connection(self.executed)
+
+
+def test_profile_record_buffer_flush(monkeypatch) -> None:
+    engine = _Engine()
+    monkeypatch.setattr(profiler, "get_database_engine", lambda: engine)
+
+    profile_buffer = ProfileRecordBuffer(flush_size=1000, flush_interval=60)
+    profile_buffer.add_task_profile({"task_name": "task"})
+    profile_buffer.add_task_profile({"task_name": "task"})
+    profile_buffer.add_span(profiler.ProfileSpan(name="parse", task_name="task", task_profile_id=profiler.uuid.uuid4()))
+
+    assert profile_buffer.flush() == 3
+    assert [(table, len(records)) for table, records in engine.executed] == [("task_profile", 2), ("task_profile_span", 1)]
+    assert profile_buffer.flush() == 0
+
+
+class _FileEngine:
+    """Engine that appends the records a forked worker writes to a file"""
+
+    def __init__(self, path: str) -> None:
+        self.path = Path(path)
+
+    @contextmanager
+    def begin(self):
+        executed: list = []
+        yield _Connection(executed)
+
+        with self.path.open("a") as fh:
+            for table, records in executed:
+                fh.write(f"{table} {len(records)}\n")
+
+
+def _profile_worker_init(path: str) -> None:
+    profiler.get_database_engine = lambda: _FileEngine(path)
+    flush_profiles_at_worker_exit()
+
+
+def _profile_worker_task(i: int) -> int:
+    profiler.profile_buffer.add_task_profile({"task_name": f"task {i}"})
+    return i
+
+
+def test_profile_record_buffer_pool_workers(tmp_path) -> None:
+    written_path = tmp_path / "written.txt"
+
+    # a worker forked while the parent holds the buffer lock can still buffer
+    with profiler.profile_buffer._lock:
+        with ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=multiprocessing.get_context("fork"),
+            initializer=_profile_worker_init,
+            initargs=(str(written_path),),
+        ) as pool:
+            assert [i.result(timeout=30) for i in [pool.submit(_profile_worker_task, i) for i in range(3)]] == [0, 1, 2]
+
+    assert written_path.read_text() == "task_profile 3\n", "Worker writes its profiles when it exits"
+
+
+def test_profiler_level_string_to_enum() -> None:
+    assert profiler_level_string_to_enum("noisy") == ProfilerLevel.NOISY
+    assert profiler_level_string_to_enum("info") == ProfilerLevel.INFO
+    assert profiler_level_string_to_enum("ESSENTIAL") == ProfilerLevel.ESSENTIAL
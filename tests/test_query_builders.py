@@ -0,0 +1,199 @@
+"""
+Tests for the bound parameter export and stats queries and server-side prepared statements
+"""
+from datetime import UTC, date, datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from opennem.api.export.queries import (
+    energy_network_fueltech_query,
+    power_network_fueltech_query,
+    power_network_interconnector_emissions_query,
+)
+from opennem.api.stats.queries import power_facility_query
+from opennem.api.time import human_to_interval, human_to_period
+from opennem.controllers.output.schema import OpennemExportSeries
+from opennem.db.prepared import (
+    _prepare_before_cursor_execute,
+    get_parameter_type,
+    prepared_statement_name,
+    to_prepared_statement,
+)
+from opennem.queries.utils import bind_query
+from opennem.schema.network import NetworkAEMORooftop, NetworkNEM, NetworkSchema, NetworkWEM
+
+_DIALECT = postgresql.psycopg2.dialect()  # type: ignore
+
+
+def _time_series(
+    network: NetworkSchema = NetworkNEM, start: datetime = datetime(2023, 1, 1), interval: str = "5m"
+) -> OpennemExportSeries:
+    return OpennemExportSeries(
+        start=start,
+        end=datetime(2023, 1, 8),
+        network=network,
+        interval=human_to_interval(interval),
+        period=human_to_period("7d"),
+    )
+
+
+def test_query_text_stable_across_values() -> None:
+    query = power_network_fueltech_query(_time_series(), network_region="NSW1", networks_query=[NetworkNEM])
+    query_other = power_network_fueltech_query(
+        _time_series(start=datetime(2023, 1, 2)), network_region="VIC1", networks_query=[NetworkNEM, NetworkAEMORooftop]
+    )
+
+    assert str(query) == str(query_other)
+    assert "NSW1" not in str(query)
+    assert query.compile().params["network_region"] == "NSW1"
+    assert query_other.compile().params["network_ids"] == ["NEM", "AEMO_ROOFTOP"]
+
+
+def test_query_cache_key_stable_across_values() -> None:
+    query = energy_network_fueltech_query(_time_series(interval="1d"), network_region="NSW1")
+    query_other = energy_network_fueltech_query(_time_series(start=datetime(2022, 1, 1), interval="1d"), network_region="QLD1")
+
+    assert query._generate_cache_key().key == query_other._generate_cache_key().key
+
+
+def test_energy_query_binds_network_days() -> None:
+    time_series = OpennemExportSeries(
+        start=datetime(2022, 1, 1, tzinfo=NetworkNEM.get_fixed_offset()),
+        end=datetime(2022, 1, 8, tzinfo=NetworkNEM.get_fixed_offset()),
+        network=NetworkNEM,
+        interval=human_to_interval("1d"),
+        period=human_to_period("7d"),
+    )
+
+    params = energy_network_fueltech_query(time_series, network_region="NSW1").compile().params
+
+    assert params["date_min"] == date(2022, 1, 1), "Not shifted to the previous day in a UTC session"
+    assert params["date_max"] == date(2022, 1, 8)
+
+
+def test_query_shape_changes_text() -> None:
+    assert str(power_network_fueltech_query(_time_series(NetworkWEM))) != str(power_network_fueltech_query(_time_series()))
+
+
+def test_interconnector_emissions_query_without_region() -> None:
+    query = power_network_interconnector_emissions_query(_time_series())
+    query_sql = str(query)
+
+    assert "t.network_id = :network_id\n" in query_sql
+    assert "network_region = :network_region" not in query_sql
+    assert "network_region" not in query.compile().params
+
+
+def test_stats_query_normalizes_facility_codes() -> None:
+    query = power_facility_query(_time_series(), ["bayswater1", "ER01"])
+
+    assert "fs.facility_code = any(:facility_codes)" in str(query)
+    assert query.compile().params["facility_codes"] == ["BAYSWATER1", "ER01"]
+
+
+def test_to_prepared_statement() -> None:
+    query = energy_network_fueltech_query(_time_series(interval="1d"), network_region="NSW1")
+    statement = str(query.compile(dialect=_DIALECT))
+
+    (prepared, param_names) = to_prepared_statement(statement)
+
+    assert "%(" not in prepared
+    assert "coalesce(sum(t.energy) / 1000, $1)" in prepared
+    assert prepared.count("$1") == 3, "Repeated parameters share a placeholder"
+    assert param_names == ["coalesce_with", "date_max", "date_min", "network_ids", "network_region"]
+
+
+def test_to_prepared_statement_unescapes_percent() -> None:
+    (prepared, param_names) = to_prepared_statement("select 1 from t where a like 'x%%' and b = %(b)s")
+
+    assert prepared == "select 1 from t where a like 'x%' and b = $1"
+    assert param_names == ["b"]
+
+
+class _FakeCursor:
+    def __init__(self) -> None:
+        self.executed: list[str] = []
+
+    def execute(self, statement: str) -> None:
+        self.executed.append(statement)
+
+
+def _context(prepared: bool = True) -> SimpleNamespace:
+    return SimpleNamespace(execution_options={"prepared": prepared}, dialect=SimpleNamespace(paramstyle="pyformat"))
+
+
+@pytest.mark.parametrize("repeat", [1, 3])
+def test_prepare_before_cursor_execute(repeat: int) -> None:
+    conn = SimpleNamespace(connection=SimpleNamespace(info={}))
+    cursor = _FakeCursor()
+    params = {"a": 1, "b": "NSW1"}
+
+    for _ in range(repeat):
+        (statement, statement_params) = _prepare_before_cursor_execute(
+            conn, cursor, "select %(a)s, %(b)s, %(a)s", params, _context(), False
+        )
+
+    statement_name = prepared_statement_name("select $1, $2, $1", ["bigint", "unknown"])
+
+    assert cursor.executed == [f"PREPARE {statement_name} (bigint, unknown) AS select $1, $2, $1"], "Prepared once per connection"
+    assert statement == f"EXECUTE {statement_name} (%(a)s, %(b)s)"
+    assert statement_params is params
+
+
+def test_prepare_before_cursor_execute_typed() -> None:
+    """Parameters the server can't infer, like the time_bucket_gapfill bounds, are typed from their values"""
+    conn = SimpleNamespace(connection=SimpleNamespace(info={}))
+    cursor = _FakeCursor()
+    statement = "select time_bucket_gapfill('5 minutes', t.trading_interval, %(date_min)s, %(date_max)s) from t"
+
+    _prepare_before_cursor_execute(
+        conn,
+        cursor,
+        statement,
+        {"date_min": datetime(2023, 1, 1, tzinfo=UTC), "date_max": datetime(2023, 1, 2)},
+        _context(),
+        False,
+    )
+    _prepare_before_cursor_execute(
+        conn, cursor, statement, {"date_min": date(2023, 1, 1), "date_max": date(2023, 1, 2)}, _context(), False
+    )
+
+    assert [i.split(" AS ")[0].split(" ", 2)[2] for i in cursor.executed] == ["(timestamptz, timestamp)", "(date, date)"]
+    assert len(conn.connection.info["opennem_prepared_statements"]) == 2, "Other types are prepared under another name"
+
+
+@pytest.mark.parametrize(
+    ["value", "expected"],
+    [
+        (None, "unknown"),
+        ("NSW1", "unknown"),
+        (True, "boolean"),
+        (5, "bigint"),
+        (1.5, "double precision"),
+        (timedelta(minutes=5), "interval"),
+        (["NEM", "WEM"], "text[]"),
+        ([], "text[]"),
+        ([1, 2], "bigint[]"),
+    ],
+)
+def test_get_parameter_type(value, expected: str) -> None:
+    assert get_parameter_type(value) == expected
+
+
+def test_bind_query_ignores_unused_params() -> None:
+    query = bind_query("select * from t where a = :a", a=1, b=2)
+
+    assert query.compile().params == {"a": 1}
+    assert query.get_execution_options()["prepared"]
+
+
+def test_prepare_before_cursor_execute_not_prepared() -> None:
+    conn = SimpleNamespace(connection=SimpleNamespace(info={}))
+    cursor = _FakeCursor()
+
+    (statement, _) = _prepare_before_cursor_execute(conn, cursor, "select %(a)s", {"a": 1}, _context(prepared=False), False)
+
+    assert statement == "select %(a)s"
+    assert not cursor.executed
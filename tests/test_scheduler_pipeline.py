@@ -0,0 +1,60 @@
+from datetime import datetime
+
+import pytest
+
+from opennem.pipelines.dag import PipelineEvent
+from opennem.workers import scheduler
+
+EVENT = PipelineEvent(
+    source="nem_rooftop_crawl",
+    network_code="NEM",
+    interval=datetime.fromisoformat("2023-06-01T10:05:00+10:00"),
+    inserted_records=10,
+)
+
+
+@pytest.fixture
+def huey_immediate():  # type: ignore
+    scheduler.huey.immediate = True
+    yield scheduler.huey
+    scheduler.huey.immediate = False
+
+
+def test_run_pipeline_step(huey_immediate, monkeypatch) -> None:
+    runs: list[tuple[str, PipelineEvent]] = []
+    monkeypatch.setattr(scheduler.nem_pipeline, "run_step", lambda step_name, event: runs.append((step_name, event)))
+
+    scheduler.run_pipeline_step.call_local("nem_export_power", EVENT)
+
+    assert runs == [("nem_export_power", EVENT)]
+
+
+def test_run_pipeline_step_locked(huey_immediate, monkeypatch) -> None:
+    """A step that is already running for another event is queued to run after it rather than dropped"""
+    runs: list[tuple[str, PipelineEvent]] = []
+    monkeypatch.setattr(scheduler.nem_pipeline, "run_step", lambda step_name, event: runs.append((step_name, event)))
+
+    with huey_immediate.lock_task("pipeline_nem_export_power"):
+        scheduler.run_pipeline_step.call_local("nem_export_power", EVENT)
+
+    assert not runs
+
+    queued = huey_immediate.scheduled()
+
+    assert len(queued) == 1
+    assert queued[0].args == ("nem_export_power", EVENT)
+    assert queued[0].kwargs == {"locked_count": 1}
+
+    # the queued step runs once the lock is released
+    scheduler.run_pipeline_step.call_local(*queued[0].args, **queued[0].kwargs)
+
+    assert runs == [("nem_export_power", EVENT)]
+
+
+def test_run_pipeline_step_locked_max(huey_immediate, monkeypatch) -> None:
+    monkeypatch.setattr(scheduler.nem_pipeline, "run_step", lambda step_name, event: None)
+
+    with huey_immediate.lock_task("pipeline_nem_export_power"):
+        scheduler.run_pipeline_step.call_local("nem_export_power", EVENT, locked_count=scheduler.PIPELINE_STEP_LOCKED_MAX)
+
+    assert not huey_immediate.scheduled()
@@ -0,0 +1,20 @@
+import multiprocessing
+
+from opennem.utils.process import can_start_process_pool
+
+
+def _can_start_process_pool_worker(queue: multiprocessing.Queue) -> None:
+    queue.put(can_start_process_pool())
+
+
+def test_can_start_process_pool() -> None:
+    assert can_start_process_pool()
+
+    context = multiprocessing.get_context("fork")
+    queue = context.Queue()
+    process = context.Process(target=_can_start_process_pool_worker, args=(queue,), daemon=True)
+    process.start()
+
+    assert queue.get(timeout=30) is False, "Daemonic processes can't have children"
+
+    process.join()